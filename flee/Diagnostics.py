@@ -2,6 +2,7 @@ from __future__ import annotations, print_function
 
 import os
 from flee.SimulationSettings import SimulationSettings
+from flee import agentlog
 
 if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
     from beartype import beartype as check_args_type
@@ -66,6 +67,10 @@ def write_agents_par(
     Returns:
         None.
     """
+    if agentlog.use_binary_agent_log():
+        agentlog.write_agents_par(rank=rank, agents=agents, time=time, max_written=max_written, timestep_interval=timestep_interval)
+        return
+
     my_file = None
     if time == 0:
         my_file = open("agents.out.%s" % rank, "w", encoding="utf-8")
@@ -248,14 +253,16 @@ def write_links_par(
                     )
 
                     if SimulationSettings.log_levels["link"] > 1:
-                        for a in l.cumNumAgentsByAttribute:
-                            for v in l.cumNumAgentsByAttribute[a]:
+                        # Computed from the link flow counters on each access.
+                        counts = l.cumNumAgentsByAttribute
+                        for a in counts:
+                            for v in counts[a]:
                                 print(
                                     "{},{},{},{},{}:{}".format(
                                     time,
                                     l.startpoint.region,
                                     l.endpoint.region,
-                                    l.cumNumAgentsByAttribute[a][v],
+                                    counts[a][v],
                                     a,
                                     v,
                                     ),
@@ -278,14 +285,16 @@ def write_links_par(
                     )
 
                     if SimulationSettings.log_levels["link"] > 1:
-                        for a in l.cumNumAgentsByAttribute:
-                            for v in l.cumNumAgentsByAttribute[a]:
+                        # Computed from the link flow counters on each access.
+                        counts = l.cumNumAgentsByAttribute
+                        for a in counts:
+                            for v in counts[a]:
                                 print(
                                     "{},{},{},{},{}:{}".format(
                                     time,
                                     l.startpoint.name,
                                     l.endpoint.name,
-                                    l.cumNumAgentsByAttribute[a][v],
+                                    counts[a][v],
                                     a,
                                     v,
                                     ),
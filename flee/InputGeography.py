@@ -3,8 +3,9 @@ import os
 import sys
 from typing import List
 
+import numpy as np
 from flee.SimulationSettings import SimulationSettings
-import flee.lib_math as lib_math
+from flee import scheduler, timeseries
 
 if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
     from beartype import beartype as check_args_type
@@ -18,6 +19,23 @@ else:
         return func
 
 
+def _parse_int(value: str, default: int = 0) -> int:
+    """
+    Parses an integer CSV field, returning <default> if it is not an integer.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _parse_float(value: str) -> float:
+    """
+    Parses a float CSV field, with an empty field meaning 0.0.
+    """
+    return float(value) if len(value) > 0 else 0.0
+
+
 class InputGeography:
     """
     Class which reads in Geographic information.
@@ -27,8 +45,15 @@ class InputGeography:
         self.locations = []
         self.links = []
         self.major_routes = []
-        self.conflicts = {}
-        self.attributes = {}
+        self.conflicts = {} # location name -> conflict intensity per day (columns of conflict_table).
+        self.attributes = {} # attribute name -> location/region name -> value per day (columns of attribute_tables).
+        self.conflict_table = None # conflicts.csv as a timeseries.TimeSeriesTable.
+        self.attribute_tables = {} # attribute name -> timeseries.TimeSeriesTable.
+        self.__attribute_columns = {} # attribute name -> timeseries.LocationColumns, resolved on first use.
+        self.closures = []
+        self.location_changes = []
+        self.schedule = None # timed inputs indexed by day, built on first use (see BuildSchedule).
+        self.__flood_level_state = None # (ecosystem, day) of the last flood level update.
 
 
     @check_args_type
@@ -42,29 +67,12 @@ class InputGeography:
         Returns:
             None.
         """
-        self.conflicts = {}
+        self.schedule = None
 
-        row_count = 0
-        headers = []
+        # field 0 is day.
+        self.conflict_table = timeseries.read_time_series_csv(csv_name, first_column=1)
+        self.conflicts = self.conflict_table.series
 
-        with open(csv_name, newline="", encoding="utf-8") as csvfile:
-            values = csv.reader(csvfile)
-
-            for row in values:
-                # print(row)
-                if row_count == 0:
-                    headers = row
-                    for i in range(1, len(headers)):  # field 0 is day.
-                        headers[i] = headers[i].strip()
-                        if len(headers[i]) > 0:
-                            self.conflicts[headers[i]] = []
-                else:
-                    for i in range(1, len(row)):  # field 0 is day.
-                        # print(row[0])
-                        self.conflicts[headers[i]].append(float(row[i].strip()))
-                row_count += 1
-
-        # print(self.conflicts)
         # TODO: make test verifying this in test_csv.py
 
 
@@ -82,32 +90,12 @@ class InputGeography:
         Returns:
             None.
         """
-        self.attributes[attribute_name] = {}
+        self.schedule = None
 
-        row_count = 0
-        headers = []
-
-        with open(csv_name, newline="", encoding="utf-8") as csvfile:
-            values = csv.reader(csvfile)
-
-            for row in values:
-                # print(row)
-                if row_count == 0:
-                    headers = row
-                    for i in range(0, len(headers)):  # field 0 is "#Day".
-                        headers[i] = headers[i].strip()
-                        if len(headers[i]) > 0:
-                            self.attributes[attribute_name][headers[i]] = []
-                else:
-                    for i in range(0, len(row)):  # field 0 is "#Day".
-                        # print("RAICSV", row[0], row[i], file=sys.stderr)
-                        if attribute_type == "int":
-                            self.attributes[attribute_name][headers[i]].append(int(row[i].strip()))
-                        elif attribute_type == "float":
-                            self.attributes[attribute_name][headers[i]].append(float(row[i].strip()))
-                row_count += 1
-
-        #print(self.attributes, file=sys.stderr)
+        # field 0 is "#Day", and is kept for the interpolation of regional attributes.
+        table = timeseries.read_time_series_csv(csv_name, first_column=0, value_type=attribute_type)
+        self.attribute_tables[attribute_name] = table
+        self.attributes[attribute_name] = table.series
 
 
     @check_args_type
@@ -146,6 +134,7 @@ class InputGeography:
             None.
         """
 
+        self.schedule = None
         if "flood_driven_spawning" in SimulationSettings.spawn_rules.keys():
             # Read flood location attributes.
             if SimulationSettings.spawn_rules["flood_driven_spawning"] is True:
@@ -353,6 +342,7 @@ class InputGeography:
         Returns:
             None.
         """
+        self.schedule = None
         self.location_changes = []
 
         if not os.path.isfile(csv_name):
@@ -403,170 +393,144 @@ class InputGeography:
                     for i in range (1, len(row)):
                         attr[headers[i-1]] = row[i]
 
-                    loc_found = False
-                    for i in range(0, len(e.locationNames)):
-                        if e.locationNames[i] == row[0]:
-                            e.addAgent(e.locations[i], attributes=attr)
-                            loc_found= True
-
-                    if not loc_found:
+                    x = e.location_index.get(row[0], -1)
+                    if x >= 0:
+                        e.addAgent(e.locations[x], attributes=attr)
+                    else:
                         print("could not map location to CSV-loaded agent on line. (not count commented lines or empty lines)", sys.stderr)
                 i += 1
 
 
-    def StoreInputGeographyInEcosystem(self, e):
+    def ParseGeographyColumns(self) -> dict:
         """
         Summary:
-            Store the geographic information in this class in a Flee simulation,
-            overwriting existing entries.
+            Parses the numeric fields of the locations and links.
 
         Args:
-            e (Ecosystem): ecosystem object
+            None.
 
         Returns:
-            Tuple[Ecosystem, Dict]: tuple of ecosystem object and location dictionary
+            dict: column name -> array, with the gps_x, gps_y, pop/cap and conflict_date
+            of each location ("location_x", "location_y", "location_population",
+            "location_conflict_date") and the distance and forced_redirection of
+            each link ("link_distance", "link_forced_redirection").
         """
 
         #0"name",1"region",2"country",3"gps_x",4"gps_y",5"location_type",6"conflict_date",7"pop/cap"
 
+        # if population field is empty, just set it to 0.
+        population = np.zeros(len(self.locations), dtype=np.int64)
+        for i, loc in enumerate(self.locations):
+            if len(loc[7]) > 0:
+                try:
+                    population[i] = int(loc[7])
+                except ValueError:
+                    print(f"ERROR: location {loc[0]} has population value of {loc[7]}, which is not an int.", file=sys.stderr)
+                    sys.exit()
+
+        return {
+            "location_x": np.array([_parse_float(loc[3]) for loc in self.locations], dtype=np.float64),
+            "location_y": np.array([_parse_float(loc[4]) for loc in self.locations], dtype=np.float64),
+            "location_population": population,
+            "location_conflict_date": np.array([_parse_int(loc[6]) for loc in self.locations], dtype=np.int64),
+            "link_distance": np.array([float(link[2]) for link in self.links], dtype=np.float64),
+            "link_forced_redirection": np.array(
+                [int(link[3]) if len(link) > 3 and len(link[3]) > 0 else 0 for link in self.links], dtype=np.int64
+            ),
+        }
+
+
+    def StoreColumnsInEcosystem(self, e, columns) -> dict:
+        """
+        Summary:
+            Adds the locations, links and closures in this class to a Flee
+            simulation, with their numeric fields taken from parsed columns.
+            Used by StoreInputGeographyInEcosystem, and by inputbundle to set up
+            an Ecosystem from the columns of a compiled bundle.
 
+        Args:
+            e (Ecosystem): ecosystem object
+            columns: columns returned by ParseGeographyColumns (or the arrays of a bundle).
+
+        Returns:
+            dict: location name -> Location.
+        """
         lm = {}
         num_conflict_zones = 0
+        scaledown = SimulationSettings.optimisations["PopulationScaleDownFactor"]
+
+        # Major routes starting at, and (reversed) ending at each location.
+        major_routes = {}
+        for mr in self.major_routes:
+            major_routes.setdefault(mr[0], []).append([x for x in mr[1:] if x])
+            # operator below reverses the list, then skips the first value.
+            major_routes.setdefault(mr[-1], []).append([x for x in mr[-2::-1] if x])
 
         # Home country is assumed to be the country of the first location.
-        home_country = self.locations[0][2]
+        home_country = self.locations[0][2] if len(self.locations) > 0 else ""
         print("Home country set to: ", home_country, file=sys.stderr)
         if len(home_country) < 1:
             home_country = "unknown"
 
-        for loc in self.locations:
-
-            name = loc[0]
-            # if population field is empty, just set it to 0.
-            if len(loc[7]) < 1:
-                population = 0
-            else:
-                try:
-                    population = int(int(loc[7]) // SimulationSettings.optimisations["PopulationScaleDownFactor"])
-                except ValueError:
-                    print(f"ERROR: location {loc[0]} has population value of {loc[7]}, which is not an int.", file=sys.stderr)
-                    sys.exit()
+        location_columns = getattr(self, "columns", [])
+        xs = columns["location_x"].tolist()
+        ys = columns["location_y"].tolist()
+        populations = (columns["location_population"] // scaledown).tolist()
+        conflict_dates = columns["location_conflict_date"].tolist()
 
-            x = float(loc[3]) if len(loc[3]) > 0 else 0.0
-            y = float(loc[4]) if len(loc[4]) > 0 else 0.0
+        for i, loc in enumerate(self.locations):
 
-            # if region field is empty, just set it to unknown.
-            if len(loc[1]) < 1:
-                region = "unknown"
-            else:
-                region = loc[1]
-
-            foreign = True
-            # if country field is empty, just set it to unknown.
-            if len(loc[2]) < 1:
-                country = "unknown"
-            else:
-                country = loc[2]
+            name = loc[0]
 
-            foreign = True
-            if country == home_country:
-                foreign = False
+            # if region or country field is empty, just set it to unknown.
+            region = loc[1] if len(loc[1]) > 0 else "unknown"
+            country = loc[2] if len(loc[2]) > 0 else "unknown"
 
-            # print(loc, file=sys.stderr)
             location_type = loc[5]
             if "conflict" in location_type.lower():
                 num_conflict_zones += 1
-                if int(loc[6]) > 0:
+                if conflict_dates[i] > 0:
                     location_type = "town"
 
-            attributes = {}
-
             # Loading of static attributes.
-            if len(loc) > 8:
-                for i in range(8, len(loc)):
-                    attributes[self.columns[i]] = loc[i]
+            attributes = {}
+            for j in range(8, len(loc)):
+                attributes[location_columns[j]] = loc[j]
 
             if "camp" in location_type.lower():
-                lm[name] = e.addLocation(
-                    name=name,
-                    region=region,
-                    location_type=location_type,
-                    capacity=population,
-                    x=x,
-                    y=y,
-                    foreign=foreign,
-                    country=country,
-                    attributes=attributes
-                )
+                size = {"capacity": populations[i]}
             else:
-                lm[name] = e.addLocation(
-                    name=name,
-                    region=region,
-                    location_type=location_type,
-                    pop=population,
-                    x=x,
-                    y=y,
-                    foreign=foreign,
-                    country=country,
-                    attributes=attributes
-                )
+                size = {"pop": populations[i]}
+            lm[name] = e.addLocation(
+                name=name,
+                region=region,
+                location_type=location_type,
+                x=xs[i],
+                y=ys[i],
+                foreign=country != home_country,
+                country=country,
+                attributes=attributes,
+                **size
+            )
 
             # Add major link information
-            for mr in self.major_routes:
-                if mr[0] == name:
-                    major_route = [x for x in mr[1:] if x]
-                    #lm[name].major_routes.append(mr[1:])
-                    lm[name].major_routes.append(major_route)
-                if mr[-1] == name:
-                    major_route = [x for x in mr[-2::-1] if x]
-                    # operator below reverses the list, then skips the first value.
-                    #lm[name].major_routes.append(mr[-2::-1])
-                    lm[name].major_routes.append(major_route)
-
-
-        for link in self.links:
+            for major_route in major_routes.get(name, []):
+                lm[name].major_routes.append(list(major_route))
+
+        link_columns = getattr(self, "link_columns", [])
+        distances = columns["link_distance"].tolist()
+        forced = columns["link_forced_redirection"].tolist()
+        for i, link in enumerate(self.links):
             attributes = {}
-            if len(link) > 4:
-                for i in range(4, len(link)):
-                    attributes[self.link_columns[i]] = link[i]
-
-            if len(link) > 3:
-                l3 = link[3]
-                if len(l3) == 0:
-                    l3 = 0
-
-                if int(l3) == 1:
-                    e.linkUp(
-                        endpoint1=link[0],
-                        endpoint2=link[1],
-                        distance=float(link[2]),
-                        forced_redirection=True,
-                        attributes=attributes,
-                    )
-                if int(l3) == 2:
-                    e.linkUp(
-                        endpoint1=link[1],
-                        endpoint2=link[0],
-                        distance=float(link[2]),
-                        forced_redirection=True,
-                        attributes=attributes,
-                    )
-                else:
-                    e.linkUp(
-                        endpoint1=link[0],
-                        endpoint2=link[1],
-                        distance=float(link[2]),
-                        forced_redirection=False,
-                        attributes=attributes,
-                    )
+            for j in range(4, len(link)):
+                attributes[link_columns[j]] = link[j]
+
+            if forced[i] == 1:
+                e.linkUp(endpoint1=link[0], endpoint2=link[1], distance=distances[i], forced_redirection=True, attributes=attributes)
+            if forced[i] == 2:
+                e.linkUp(endpoint1=link[1], endpoint2=link[0], distance=distances[i], forced_redirection=True, attributes=attributes)
             else:
-                e.linkUp(
-                    endpoint1=link[0],
-                    endpoint2=link[1],
-                    distance=float(link[2]),
-                    forced_redirection=False,
-                    attributes = {},
-                )
+                e.linkUp(endpoint1=link[0], endpoint2=link[1], distance=distances[i], forced_redirection=False, attributes=attributes)
 
         e.closures = []
         for link in self.closures:
@@ -578,9 +542,26 @@ class InputGeography:
                 file=sys.stderr,
             )
 
-        # Add location type changes
         if "region_IPC_level" in self.attributes.keys():
             self.UpdateLocationAttributes(e, "region_IPC_level", 0) # Read in dynamic attributes for time = 0.
+        return lm
+
+
+    def StoreInputGeographyInEcosystem(self, e):
+        """
+        Summary:
+            Store the geographic information in this class in a Flee simulation,
+            overwriting existing entries.
+
+        Args:
+            e (Ecosystem): ecosystem object
+
+        Returns:
+            Tuple[Ecosystem, Dict]: tuple of ecosystem object and location dictionary
+        """
+        lm = self.StoreColumnsInEcosystem(e, self.ParseGeographyColumns())
+
+        # Add location type changes
         self.ReadLocationChangesFromCSV("location_changes.csv")
 
         return e, lm
@@ -604,40 +585,37 @@ class InputGeography:
         #e.g {'F1': [0, 0, 1, 1, 2, 1, 1, 1, 1, 1, 1], 'F2': [1, 1, 1, 3, 1, 1, 0, 0, 0, 0, 1], 'F3': [0, 0, 0, 1, 1, 2, 3, 2, 1, 1, 0]}
         attrlist = self.attributes[attribute_name]
 
-        # Get the length of the first array in attrlist 
-        for key, value in attrlist.items():
-            attrlength = int(len(value))
-            break
-
-        #Iterate through the locations and update their attributes
-        for i in range(0, len(e.locations)):
-            loc_name = e.locations[i].name
-            region_name = e.locations[i].region
-            
-            #If the attibute has been specified by the input file: 
-            if loc_name in attrlist:
-                if attribute_name == "forecast_flood_levels":
-                    #Set forecast_flood_levels attribute for flood_zones
-                    e.locations[i].attributes[attribute_name] = attrlist[loc_name]
-                elif attribute_name.startswith("region_") is False:
-                    #Set flood_levels attribute for flood zones
-                    e.locations[i].attributes[attribute_name] = int(attrlist[loc_name][time])
+        table = self.attribute_tables.get(attribute_name)
+        if table is None or table.source is not attrlist:
+            # The attribute was set directly, rather than read with ReadAttributeInputCSV.
+            table = timeseries.TimeSeriesTable.from_dict(attrlist)
+            self.attribute_tables[attribute_name] = table
+
+        # Columns of the locations are resolved once, and values are gathered from the table.
+        columns = self.__attribute_columns.get(attribute_name)
+        if columns is None or not columns.matches(e, table):
+            columns = timeseries.LocationColumns(e, table, attribute_name)
+            self.__attribute_columns[attribute_name] = columns
+
+        locations = e.locations
+        if attribute_name == "forecast_flood_levels":
+            #Set forecast_flood_levels attribute for flood_zones, and an array of zeros for towns/camps.
+            for i, j in enumerate(columns.own_columns.tolist()):
+                if j >= 0:
+                    locations[i].attributes[attribute_name] = attrlist[locations[i].name]
+                else:
+                    locations[i].attributes[attribute_name] = columns.zero_forecast
 
+        elif attribute_name.startswith("region_"):
             # Support for dynamic regional attributes.
-            elif attribute_name.startswith("region_"):
-                if region_name in attrlist:
-                    e.locations[i].attributes[attribute_name] = lib_math.dict_interp(attrlist, region_name, "#Day", time)
-
-            else: 
-                #If the location name is not in the attribute list, then set the attribute to default value of zero
-                if attribute_name == "forecast_flood_levels":
-                    #Set default forecast_flood_levels attribute to array of zeros for towns/camps
-                    e.locations[i].attributes[attribute_name] = [0] * attrlength #array of zeros with length equal to the length of the first array in attrlist
-                else:
-                    #Set default flood_levels attribute to zero for towns/camps
-                    e.locations[i].attributes[attribute_name] = 0
-                
-            # print(e.time, loc_name, e.locations[i].attributes, file=sys.stderr)
+            if len(columns.region_locations) > 0:
+                for i, value in zip(columns.region_locations.tolist(), columns.region_values(time)):
+                    locations[i].attributes[attribute_name] = value
+
+        else:
+            #Set flood_levels attribute for flood zones. Default value is zero.
+            for loc, value in zip(locations, columns.own_values(time)):
+                loc.attributes[attribute_name] = value
 
 
     @check_args_type
@@ -658,12 +636,12 @@ class InputGeography:
             None.
         """
 
+        if self.schedule is None:
+            self.schedule = self.BuildSchedule()
+
         #Incorporate Location changes from location_changes.csv
-        #print(self.location_changes, file=sys.stderr)
-        for change in self.location_changes:
-            #print(f"loc change? {int(change[2])}, {time}", file=sys.stderr)
-            if int(change[2]) == time:
-                e.change_location_type(change[0],change[1])
+        for location_name, location_type in self.schedule.due(time, "location_change"):
+            e.change_location_type(location_name, location_type)
 
 
         if "region_IPC_level" in self.attributes.keys():
@@ -672,60 +650,130 @@ class InputGeography:
         #Add New Flood Zones
         if SimulationSettings.move_rules["FloodRulesEnabled"] is True:
             #Current flood_level attribute is set to the flood level at the current time step specified in flood_level.csv. Default value is zero.
-            self.UpdateLocationAttributes(e, "flood_level", time)
+            state = self.__flood_level_state
+            if state is not None and state[0] is e and state[1] == time - 1:
+                # Consecutive days: only the locations with a changed flood level are updated.
+                for loc_name, flood_level in self.schedule.due(time, "flood_level"):
+                    i = e.location_index.get(loc_name, -1)
+                    if i >= 0:
+                        e.locations[i].attributes["flood_level"] = flood_level
+            else:
+                self.UpdateLocationAttributes(e, "flood_level", time)
+            self.__flood_level_state = (e, time)
             if SimulationSettings.move_rules["FloodForecaster"] is True:
                 #Store future flood levels in the forecast_flood_levels attribute. Default value is array of zeros.
                 self.UpdateLocationAttributes(e, "forecast_flood_levels", time) 
 
-        elif len(SimulationSettings.ConflictInputFile) == 0:
-            for loc in self.locations:
-                if "conflict" in loc[4].lower() and int(loc[5]) == time:
-                    conflict_intensity = 1.0
-                    if e.print_location_output:
+        else:
+            if len(SimulationSettings.ConflictInputFile) > 0:
+                if Debug and e.getRankN(e.time) is True:
+                    for conflict_name in self.getConflictLocationNames():
+                        print("L:", conflict_name, self.conflicts[conflict_name], time, file=sys.stderr)
+                if time >= self.conflict_table_length:
+                    print(f"Error: conflict value at time {time} requested, but the conflicts table only has values up to t = {self.conflict_table_length - 1}.", file=sys.stderr)
+
+            for action, conflict_name, conflict_intensity in self.schedule.due(time, "conflict"):
+                if action == "add":
+                    if len(SimulationSettings.ConflictInputFile) == 0:
+                        # Conflict date from locations.csv.
+                        if e.print_location_output:
+                            print(
+                                "Time = {}. Adding a new conflict zone [{}] with pop. {} and intensity {}".format(
+                                    time, conflict_name, e.locations[e.location_index[conflict_name]].pop if conflict_name in e.location_index else 0, conflict_intensity
+                                ),
+                                file=sys.stderr,
+                            )
+                    elif e.getRankN(e.time) is True:
                         print(
-                            "Time = {}. Adding a new conflict zone [{}] with pop. {} and intensity {}".format(
-                                time, loc[0], int(loc[1]), conflict_intensity
+                            "Time = {}. Adding a new conflict zone [{}] with intensity {}".format(
+                                time, conflict_name, conflict_intensity
                             ),
                             file=sys.stderr,
                         )
-                    e.add_conflict_zone(name=loc[0], conflict_intensity=conflict_intensity)
-        else:
-            conflict_names = self.getConflictLocationNames()
-            # print(confl_names)
-
-
-            for conflict_name in conflict_names:
-                if len(self.conflicts[conflict_name]) < (time - 1):
-                    print(f"Error: conflict value at time {time} requested, but the conflicts table for {conflict_name} only has values up to t = {len(conflicts[conflict_name])}.", file=sys.stderr)
-
-                if Debug and e.getRankN(e.time) is True:
-                    print("L:", conflict_name, self.conflicts[conflict_name], time, file=sys.stderr)
-                if self.conflicts[conflict_name][time] > 0.000001:
-                    if time > 0:
-                        if self.conflicts[conflict_name][time - 1] < 0.000001:
-                            if e.getRankN(e.time) is True:
-                                print(
-                                    "Time = {}. Adding a new conflict zone [{}] with intensity {}".format(
-                                        time, conflict_name, self.conflicts[conflict_name][time]
-                                    ),
-                                    file=sys.stderr,
-                                )
-                            e.set_conflict_intensity(name=conflict_name, conflict_intensity=self.conflicts[conflict_name][time])
-                    else:
-                        if e.getRankN(e.time) is True:
+                    e.add_conflict_zone(name=conflict_name, conflict_intensity=conflict_intensity)
+                else:
+                    if e.getRankN(e.time) is True:
+                        if conflict_intensity > scheduler.CONFLICT_THRESHOLD:
                             print(
                                 "Time = {}. Adding a new conflict zone [{}] with intensity {}".format(
-                                    time, conflict_name, self.conflicts[conflict_name][time]
+                                    time, conflict_name, conflict_intensity
                                 ),
                                 file=sys.stderr,
                             )
-                        e.add_conflict_zone(name=conflict_name, conflict_intensity=self.conflicts[conflict_name][time])
-                if self.conflicts[conflict_name][time] < 0.000001 and time > 0:
-                    if self.conflicts[conflict_name][time - 1] >= 0.000001:
-                        if e.getRankN(e.time) is True:
+                        else:
                             print(
                                 "Time = {}. Removing conflict zone [{}]".format(time, conflict_name),
                                 file=sys.stderr,
                             )
-                        e.set_conflict_intensity(name=conflict_name, conflict_intensity=self.conflicts[conflict_name][time])
+                    e.set_conflict_intensity(name=conflict_name, conflict_intensity=conflict_intensity)
+
+
+    @check_args_type
+    def GetCheckpointState(self) -> dict:
+        """
+        Summary:
+            Returns the state of the time stepping through the inputs (see
+            flee/checkpoint.py). The inputs themselves are re-read on restart.
+
+        Args:
+            None.
+
+        Returns:
+            dict: day of the last flood level update (or None).
+        """
+        state = self.__flood_level_state
+        return {"flood_level_day": state[1] if state is not None else None}
+
+
+    @check_args_type
+    def RestoreCheckpointState(self, e, state: dict) -> None:
+        """
+        Summary:
+            Restores the state returned by GetCheckpointState, for Ecosystem e.
+
+        Args:
+            e (Ecosystem): ecosystem object
+            state (dict): state returned by GetCheckpointState.
+
+        Returns:
+            None.
+        """
+        # Built here rather than on first use, so that the (type checked) build
+        # happens before the random number generator states are restored.
+        self.schedule = self.BuildSchedule()
+        self.__flood_level_state = None
+        if state["flood_level_day"] is not None:
+            self.__flood_level_state = (e, state["flood_level_day"])
+
+
+    @check_args_type
+    def BuildSchedule(self) -> scheduler.EventSchedule:
+        """
+        Summary:
+            Indexes the timed inputs by day: location type changes, conflict
+            zones (from conflicts.csv, or from the conflict dates in locations.csv)
+            and flood level changes. Called by AddNewConflictZones once all
+            inputs have been read, and again after any of them is re-read.
+
+        Args:
+            None.
+
+        Returns:
+            scheduler.EventSchedule: the schedule.
+        """
+        schedule = scheduler.EventSchedule()
+        scheduler.add_location_change_events(schedule, self.location_changes)
+
+        self.conflict_table_length = 0
+        if SimulationSettings.move_rules["FloodRulesEnabled"] is True:
+            if "flood_level" in self.attributes:
+                scheduler.add_attribute_change_events(schedule, "flood_level", self.attributes["flood_level"])
+        elif len(SimulationSettings.ConflictInputFile) == 0:
+            scheduler.add_location_conflict_events(schedule, self.locations)
+        else:
+            conflicts = {name: self.conflicts[name] for name in self.getConflictLocationNames()}
+            scheduler.add_conflict_table_events(schedule, conflicts)
+            if len(conflicts) > 0:
+                self.conflict_table_length = min(len(intensities) for intensities in conflicts.values())
 
+        return schedule
@@ -32,6 +32,7 @@ class SimulationSettings:
     spawn_rules = {} # ABM spawning rules
     move_rules = {} # ABM movement rules
     optimisations = {} # Settings to improve runtime performance
+    checkpoints = {} # Checkpoint/restart settings
 
     sqrt_ten = 3.16227766017  # square root of ten (10^0.5).
 
@@ -105,10 +106,16 @@ class SimulationSettings:
         dpll = fetchss(dp,"log_levels",None)
 
         SimulationSettings.log_levels["agent"] = int(fetchss(dpll,"agent",0))
+        # csv, binary for compressed columnar agent logs, or events for trajectory logs (see flee/agentlog.py).
+        SimulationSettings.log_levels["agent_format"] = fetchss(dpll,"agent_format","csv")
         # set to 1 to obtain average times for agents to reach camps at any time
         # set to 2 to obtain duplicate entries when agents do multiple hops in one timestep.
         # step (aggregate info).
         SimulationSettings.log_levels["link"] = int(fetchss(dpll,"link",0))
+        # csv for links.out.<rank>, or aggregated for a single links.out.csv.gz (see flee/linkflow.py).
+        SimulationSettings.log_levels["link_format"] = fetchss(dpll,"link_format","csv")
+        # days between aggregated link log entries.
+        SimulationSettings.log_levels["link_interval"] = int(fetchss(dpll,"link_interval",1))
         # set to 1 to obtain cumulative agent counts on links at any time
         # step (aggregate info).
         SimulationSettings.log_levels["camp"] = int(fetchss(dpll,"camp",0))
@@ -289,6 +296,13 @@ class SimulationSettings:
         # Higher values mean less pruning.
         SimulationSettings.move_rules["PruningThreshold"] = float(fetchss(dpr,"pruning_threshold",1.0))
 
+        # Route selection engine. "enumerate" evaluates all routes (selectRoute), "dp" draws a single
+        # route from precomputed walk counts (moving.sampleWalkTableRoute), which scales to higher AwarenessLevel.
+        SimulationSettings.move_rules["RouteEngine"] = str(fetchss(dpr,"route_engine","enumerate"))
+        if SimulationSettings.move_rules["RouteEngine"] not in ["enumerate", "dp"]:
+            print("ERROR in simulationsetting.yml: move_rules.route_engine should be either enumerate or dp, not {}.".format(SimulationSettings.move_rules["RouteEngine"]), file=sys.stderr)
+            sys.exit()
+
 
         # Flee 3.0 Prototyping conditionals (see design document)
         # TODO: embed these in a more flexible/powerful framework of conditionals
@@ -367,6 +381,37 @@ class SimulationSettings:
         dpo = fetchss(dp, "optimisations", None)
         SimulationSettings.optimisations["PopulationScaleDownFactor"] = int(fetchss(dpo,"hasten",1))
 
+        # Agent storage: "list" (a Python list of Person objects) or "array" (NumPy columns, see flee/agentstore.py).
+        SimulationSettings.optimisations["AgentStore"] = str(fetchss(dpo,"agent_store","list"))
+        if SimulationSettings.optimisations["AgentStore"] not in ["list", "array"]:
+            print("ERROR in simulationsetting.yml: optimisations.agent_store should be either list or array, not {}.".format(SimulationSettings.optimisations["AgentStore"]), file=sys.stderr)
+            sys.exit()
+
+        # Draw all move decisions in a single vectorised step (see moving.drawMoveDecisions).
+        SimulationSettings.optimisations["BatchedMoveChance"] = bool(fetchss(dpo,"batched_movechance",False))
+
+        # Reuse route weights per location, time step and decision class (see moving.chooseCachedRoute).
+        SimulationSettings.optimisations["RouteCache"] = bool(fetchss(dpo,"route_cache",False))
+
+        # Enumerate candidate paths once per location instead of every step (see flee/topology.py).
+        SimulationSettings.optimisations["PathTables"] = bool(fetchss(dpo,"path_tables",False))
+
+        # Store resident agents as counts per cohort, and only create Person objects for travel (see flee/cohorts.py).
+        SimulationSettings.optimisations["Cohorts"] = bool(fetchss(dpo,"cohorts",False))
+
+        # Directory with compiled input bundles, to set up the scenario without parsing CSV files (see flee/inputbundle.py).
+        # Empty: read the input CSV files directly.
+        SimulationSettings.optimisations["InputBundleCache"] = str(fetchss(dpo,"input_bundle_cache",""))
+
+        dpc = fetchss(dp, "checkpoints", None)
+        # Write a checkpoint every <interval> days (0 disables checkpointing, see flee/checkpoint.py).
+        SimulationSettings.checkpoints["Interval"] = int(fetchss(dpc,"interval",0))
+        SimulationSettings.checkpoints["Directory"] = str(fetchss(dpc,"directory","checkpoints"))
+        # Checkpoint file to resume the simulation from (empty: start from day 0).
+        SimulationSettings.checkpoints["RestartFile"] = str(fetchss(dpc,"restart_file",""))
+        # Write parallel checkpoints into a single file with MPI-IO, rather than one file per rank (pflee only).
+        SimulationSettings.checkpoints["MPIIO"] = bool(fetchss(dpc,"mpi_io",False))
+
         if SimulationSettings.UseV1Rules is True:
             SimulationSettings.move_rules["MaxMoveSpeed"] = 200
             SimulationSettings.move_rules["StartOnFoot"] = False
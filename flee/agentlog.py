@@ -0,0 +1,1182 @@
+import atexit
+import json
+import operator
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+import numpy as np
+from flee.SimulationSettings import SimulationSettings
+from flee import agentstore
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Columnar binary agent logs.
+# Enabled with log_levels.agent_format: binary in simsetting.yml. Instead of
+# a CSV line per agent and day (agents.out.<rank>), the rows of each day are
+# gathered into preallocated column buffers, and full buffers are compressed
+# and written to agents.out.<rank>.bin by a background thread. The file stays
+# open for the whole run. Locations and attribute values are stored as integer
+# codes, with their labels written once in dictionary records.
+# convert_to_csv() reproduces the CSV agent log from a binary log.
+#
+# With log_levels.agent_format: events, agents.out.<rank>.events is a
+# trajectory log instead: it has the same layout, but rows are events that
+# change the state of an agent (see the event codes), found by comparing the
+# agents with their state when they were last logged. Agents in camps or at
+# home add nothing to the log. trajectory_snapshot() and agent_trajectory()
+# reconstruct the agents of a day, or the path of an agent.
+#
+# File layout: a sequence of records, each a 1-byte type, a uint64 payload
+# length and the payload:
+#   H: JSON header, which starts a session (and resets the dictionaries).
+#   P: JSON list of new places, as [name, region, x, y, is_link], coded in order.
+#   A: JSON {"names": new attribute names, "values": {name: new value strings}}.
+#   C: zlib-compressed chunk of rows (uint32 rows, uint32 attribute count, then
+#      each column in the header, then each attribute code column).
+#   R: int64 new index of each agent (-1 if removed), for agents removed from
+#      the agent list after the rows before it (trajectory logs only).
+
+FORMAT_VERSION = 1
+BUFFER_ROWS = 1 << 18 # rows per compressed chunk.
+COMPRESSION_LEVEL = 1
+
+RECORD = struct.Struct("<cQ")
+CHUNK = struct.Struct("<II")
+
+# name and dtype of each row column.
+ROW_COLUMNS = [
+    ("time", np.int32),
+    ("hop", np.int32), # 0 for the row of the agent, and 1, 2, ... for its extra hops in the day.
+    ("agent", np.int64),
+    ("home_location", np.int32),
+    ("location", np.int32),
+    ("flags", np.uint8),
+    ("distance_travelled", np.float64),
+    ("places_travelled", np.int32),
+    ("distance_moved_this_timestep", np.float64),
+]
+
+# name and dtype of each event column (trajectory logs).
+EVENT_COLUMNS = [
+    ("time", np.int32),
+    ("agent", np.int64),
+    ("event", np.uint8),
+    ("place", np.int32),
+    ("places_travelled", np.int32),
+]
+
+COLUMN_TYPES = dict(ROW_COLUMNS + EVENT_COLUMNS)
+
+# Trajectory events, and the place they refer to.
+SPAWN = 0 # added to the simulation, in its home location.
+DEPART = 1 # travelling on a link (the place), at the end of the time step.
+ARRIVE = 2 # in a location (the place), at the end of the time step.
+PASS = 3 # reached a location (the place) and travelled on, within the time step.
+DEACTIVATE = 4 # deactivated (e.g. in a camp that is a sink), in its last location.
+HARVEST_LEAVE = 5 # left to harvest in its home location (the place).
+HARVEST_RETURN = 6 # returned from harvesting, to its location (the place).
+REMOVE = 7 # removed from the agents of the simulation, in its last location.
+EVENT_NAMES = ["spawn", "depart", "arrive", "pass", "deactivate", "harvest_leave", "harvest_return", "remove"]
+
+# bits of the flags column.
+TRAVELLING = 1
+INT_DISTANCE_TRAVELLED = 2 # distance_travelled is an int (rather than a float) in the agent.
+INT_DISTANCE_MOVED = 4 # distance_moved_this_timestep is an int in the agent.
+
+CSV_HEADER = (
+    "#time,rank-agentid,original_location,current_location,gps_x,gps_y,is_travelling,distance_travelled,"
+    "places_travelled,distance_moved_this_timestep"
+)
+
+# file name -> AgentLogWriter, for the logs that are open in this process.
+__writers = {}
+
+
+@check_args_type
+def use_binary_agent_log() -> bool:
+    """
+    Summary:
+        Returns whether agent logs are written in a binary format (columnar rows or trajectory events).
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if agent logs are written with an AgentLogWriter.
+    """
+    return SimulationSettings.log_levels.get("agent_format", "csv") in ["binary", "events"]
+
+
+class AgentLogWriter:
+    """
+    Agent log of one rank, written in the columnar binary format.
+    """
+
+    FORMAT = "rows"
+    COLUMNS = ROW_COLUMNS
+
+    def __init__(self, file_name: str, rank: int, append: bool = False, buffer_rows: int = BUFFER_ROWS):
+        """
+        Summary:
+            Opens an agent log, and starts its writer thread.
+
+        Args:
+            file_name (str): name of the binary log file.
+            rank (int): rank of the MPI process.
+            append (bool, optional): append a new session to an existing log (e.g. after a restart).
+            buffer_rows (int, optional): number of rows in each compressed chunk.
+
+        Returns:
+            None.
+        """
+        self.file_name = file_name
+        self.rank = rank
+        self.buffer_rows = buffer_rows
+        self.started = False
+
+        # Place code per object (kept referenced, so that ids remain unique).
+        self.place_codes = {}
+        self.places = []
+        self.place_is_link = []
+        # Codes of the locations and links of an AgentStore, by store index.
+        self.store_location_codes = np.zeros(0, dtype=np.int32)
+        self.store_link_codes = np.zeros(0, dtype=np.int32)
+
+        self.attribute_index = {} # attribute name -> attribute column.
+        self.attribute_codes = {} # attribute name -> {(type, value): code}.
+        self.attribute_values = {} # attribute name -> list of value strings, indexed by code.
+        self.store_attribute_codes = {} # attribute name -> codes of the AgentStore values.
+        self.attribute_sets = [] # (attribute column, code) pairs of each distinct attributes dict.
+        self.attribute_set_codes = {}
+        self.set_table = np.zeros([0, 0], dtype=np.int32)
+        self.new_places = []
+        self.new_attribute_names = []
+        self.new_attribute_values = {}
+
+        self.__allocate()
+        self.error = None
+        self.queue = queue.Queue(maxsize=4)
+        self.file = open(file_name, "ab" if append else "wb")
+        self.thread = threading.Thread(target=self.__write_records, daemon=True)
+        self.thread.start()
+
+    def __allocate(self) -> None:
+        self.buffers = {name: np.empty(self.buffer_rows, dtype=dtype) for name, dtype in self.COLUMNS}
+        self.attribute_buffer = np.full([max(1, len(self.attribute_index)), self.buffer_rows], -1, dtype=np.int32)
+        self.rows = 0
+
+    def __write_records(self) -> None:
+        """
+        Summary:
+            Writer thread: compresses chunks and writes the records in the queue,
+            until it receives None.
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                kind, payload = item
+                if kind == b"C":
+                    payload = zlib.compress(payload, COMPRESSION_LEVEL)
+                self.file.write(RECORD.pack(kind, len(payload)))
+                self.file.write(payload)
+            except Exception as error:
+                self.error = error
+
+    def _submit(self, kind: bytes, payload: bytes) -> None:
+        if self.error is not None:
+            print("ERROR: unable to write agent log {}: {}".format(self.file_name, self.error), file=sys.stderr)
+            sys.exit()
+        self.queue.put((kind, payload))
+
+    def start(self, time: int, attribute_keys: list) -> None:
+        """
+        Summary:
+            Writes the header of a session.
+
+        Args:
+            time (int): time step of the first rows.
+            attribute_keys (list): attribute names in the CSV header (those of the first agent).
+
+        Returns:
+            None.
+        """
+        header = {
+            "version": FORMAT_VERSION,
+            "rank": self.rank,
+            "time": time,
+            "agent_log_level": SimulationSettings.log_levels["agent"],
+            "granularity": SimulationSettings.log_levels["granularity"],
+            "format": self.FORMAT,
+            "columns": [name for name, _ in self.COLUMNS],
+            "attribute_keys": [str(k) for k in attribute_keys],
+        }
+        self._submit(b"H", json.dumps(header).encode("utf-8"))
+        self.started = True
+
+    def place_code(self, place) -> int:
+        """
+        Summary:
+            Returns the code of a Location or Link, adding it to the places if needed.
+
+        Args:
+            place (Location or Link): place.
+
+        Returns:
+            int: code, or -1 for None.
+        """
+        if place is None:
+            return -1
+        code = self.place_codes.get(id(place))
+        if code is None:
+            code = len(self.places)
+            self.places.append(place)
+            self.place_codes[id(place)] = code
+            x, y = place.x, place.y
+            if isinstance(x, np.generic):
+                x, y = x.item(), y.item()
+            is_link = hasattr(place, "endpoint")
+            self.place_is_link.append(is_link)
+            self.new_places.append([place.name, getattr(place, "region", place.name), x, y, int(is_link)])
+        return code
+
+    def attribute_column(self, name) -> int:
+        """
+        Summary:
+            Returns the column of an attribute, adding it if needed.
+        """
+        j = self.attribute_index.get(name)
+        if j is None:
+            j = len(self.attribute_index)
+            self.attribute_index[name] = j
+            self.attribute_codes[name] = {}
+            self.attribute_values[name] = []
+            self.new_attribute_names.append(str(name))
+            if j >= self.attribute_buffer.shape[0]:
+                grown = np.full([2 * self.attribute_buffer.shape[0], self.buffer_rows], -1, dtype=np.int32)
+                grown[:self.attribute_buffer.shape[0]] = self.attribute_buffer
+                self.attribute_buffer = grown
+        return j
+
+    def attribute_code(self, name, value) -> int:
+        """
+        Summary:
+            Returns the code of an attribute value, adding it if needed.
+            Values are logged as their string representation.
+        """
+        codes = self.attribute_codes[name]
+        try:
+            # type is part of the key, so that e.g. 1, 1.0 and True remain distinct values.
+            key = (type(value), value)
+            code = codes.get(key)
+        except TypeError: # unhashable values are coded by their string.
+            key = (str, str(value))
+            code = codes.get(key)
+        if code is None:
+            code = len(self.attribute_values[name])
+            self.attribute_values[name].append(str(value))
+            self.new_attribute_values.setdefault(str(name), []).append(str(value))
+            codes[key] = code
+        return code
+
+    def _write_dictionaries(self) -> None:
+        if len(self.new_places) > 0:
+            self._submit(b"P", json.dumps(self.new_places).encode("utf-8"))
+            self.new_places = []
+        if len(self.new_attribute_names) > 0 or len(self.new_attribute_values) > 0:
+            self._submit(b"A", json.dumps({"names": self.new_attribute_names, "values": self.new_attribute_values}).encode("utf-8"))
+            self.new_attribute_names = []
+            self.new_attribute_values = {}
+
+    def append(self, columns: dict, attributes: dict) -> None:
+        """
+        Summary:
+            Appends rows to the buffers, writing full buffers.
+
+        Args:
+            columns (dict): column name -> array of values, for each column in COLUMNS.
+            attributes (dict): attribute column -> array of codes (-1 if not set).
+
+        Returns:
+            None.
+        """
+        # Rows may only refer to places and values that precede them in the file.
+        self._write_dictionaries()
+
+        n = len(columns["time"])
+        first = 0
+        while first < n:
+            count = min(n - first, self.buffer_rows - self.rows)
+            for name, _ in self.COLUMNS:
+                self.buffers[name][self.rows:self.rows + count] = columns[name][first:first + count]
+            for j, codes in attributes.items():
+                self.attribute_buffer[j, self.rows:self.rows + count] = codes[first:first + count]
+            self.rows += count
+            first += count
+            if self.rows == self.buffer_rows:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Summary:
+            Hands the buffered rows to the writer thread.
+        """
+        self._write_dictionaries()
+        if self.rows == 0:
+            return
+        n = self.rows
+        num_attributes = len(self.attribute_index)
+        parts = [CHUNK.pack(n, num_attributes)]
+        for name, _ in self.COLUMNS:
+            parts.append(self.buffers[name][:n].tobytes())
+        parts.append(np.ascontiguousarray(self.attribute_buffer[:num_attributes, :n]).tobytes())
+        self._submit(b"C", b"".join(parts))
+        # The writer thread owns the bytes; the buffers are reused.
+        self.attribute_buffer[:, :n] = -1
+        self.rows = 0
+
+    def close(self) -> None:
+        """
+        Summary:
+            Writes the buffered rows, waits for the writer thread and closes the file.
+        """
+        if self.file.closed:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.error is not None:
+            print("ERROR: unable to write agent log {}: {}".format(self.file_name, self.error), file=sys.stderr)
+
+    def attribute_set(self, attributes: dict) -> int:
+        """
+        Summary:
+            Returns the code of a set of attribute values (an agent's attributes dict),
+            adding it to attribute_sets if needed, or -1 if it has unhashable values.
+        """
+        try:
+            key = tuple(attributes.items())
+            code = self.attribute_set_codes.get(key)
+        except TypeError:
+            return -1
+        if code is None:
+            code = len(self.attribute_sets)
+            self.attribute_sets.append([(self.attribute_column(name), self.attribute_code(name, value)) for name, value in attributes.items()])
+            self.attribute_set_codes[key] = code
+        return code
+
+    def attribute_set_table(self):
+        """
+        Summary:
+            Returns the attribute codes of each attribute set, as a 2-D array
+            (attribute set, attribute column), with -1 for attributes that are not set.
+        """
+        shape = (len(self.attribute_sets), len(self.attribute_index))
+        if self.set_table.shape != shape:
+            self.set_table = np.full(shape, -1, dtype=np.int32)
+            for i, codes in enumerate(self.attribute_sets):
+                for j, code in codes:
+                    self.set_table[i, j] = code
+        return self.set_table
+
+    def write_agent_list(self, agents, time: int, max_written: int) -> None:
+        """
+        Summary:
+            Appends the rows of the agents in a list (see write_agents_par).
+        """
+        hops = SimulationSettings.log_levels["agent"] > 1
+        place_codes = self.place_codes
+        place_code = self.place_code
+        attribute_set = self.attribute_set
+
+        agent_ids = []
+        homes = []
+        locations = []
+        flags = []
+        distances = []
+        places_travelled = []
+        moved = []
+        sets = []
+        unhashable = [] # (row, attribute codes) of the agents with unhashable attribute values.
+        hop_rows = [] # (row of the agent, hop, place code) of the extra hops.
+        for k in range(0, max_written):
+            a = agents[k]
+            location = a.location
+            if location is None: # removed agents are not logged.
+                continue
+
+            home = a.home_location
+            code = place_codes.get(id(home))
+            homes.append(place_code(home) if code is None else code)
+            code = place_codes.get(id(location))
+            locations.append(place_code(location) if code is None else code)
+
+            distance = a.distance_travelled
+            distance_moved = a.distance_moved_this_timestep
+            flag = TRAVELLING if a.travelling else 0
+            if type(distance) is int:
+                flag |= INT_DISTANCE_TRAVELLED
+            if type(distance_moved) is int:
+                flag |= INT_DISTANCE_MOVED
+
+            if hops and len(a.locations_visited) > 0:
+                row = len(agent_ids)
+                for hop, place in enumerate(a.locations_visited):
+                    hop_rows.append((row, hop + 1, place_code(place)))
+
+            agent_ids.append(k)
+            flags.append(flag)
+            distances.append(distance)
+            places_travelled.append(a.places_travelled)
+            moved.append(distance_moved)
+            attribute_codes = attribute_set(a.attributes)
+            if attribute_codes < 0:
+                unhashable.append((len(sets), [(self.attribute_column(name), self.attribute_code(name, value)) for name, value in a.attributes.items()]))
+            sets.append(attribute_codes)
+
+        n = len(agent_ids)
+        columns = {
+            "time": np.full(n, time, dtype=np.int32),
+            "hop": np.zeros(n, dtype=np.int32),
+            "agent": np.asarray(agent_ids, dtype=np.int64),
+            "home_location": np.asarray(homes, dtype=np.int32),
+            "location": np.asarray(locations, dtype=np.int32),
+            "flags": np.asarray(flags, dtype=np.uint8),
+            "distance_travelled": np.asarray(distances, dtype=np.float64),
+            "places_travelled": np.asarray(places_travelled, dtype=np.int32),
+            "distance_moved_this_timestep": np.asarray(moved, dtype=np.float64),
+        }
+
+        # Attribute codes of each row, from the codes of its attribute set.
+        sets = np.asarray(sets, dtype=np.int64)
+        set_codes = np.full([n, len(self.attribute_index)], -1, dtype=np.int32)
+        set_codes[sets >= 0] = self.attribute_set_table()[sets[sets >= 0]]
+        for row, codes in unhashable:
+            for j, code in codes:
+                set_codes[row, j] = code
+        attributes = {j: set_codes[:, j] for j in range(0, len(self.attribute_index))}
+
+        if len(hop_rows) > 0:
+            self._add_hop_rows(columns, attributes, hop_rows)
+        self.append(columns, attributes)
+
+    def _add_hop_rows(self, columns: dict, attributes: dict, hop_rows: list) -> None:
+        """
+        Summary:
+            Adds the rows of extra hops to the rows of a time step, after the row of their agent.
+
+        Args:
+            columns (dict): rows of the agents, updated in place.
+            attributes (dict): attribute codes of the rows, updated in place.
+            hop_rows (list): (row of the agent, hop, place code) of each extra hop.
+
+        Returns:
+            None.
+        """
+        hop_rows = np.asarray(hop_rows, dtype=np.int64).reshape(-1, 3)
+        rows = np.concatenate([np.arange(len(columns["time"])), hop_rows[:, 0]])
+        hop = np.concatenate([columns["hop"], hop_rows[:, 1].astype(np.int32)])
+        location = np.concatenate([columns["location"], hop_rows[:, 2].astype(np.int32)])
+        order = np.lexsort((hop, rows))
+        rows = rows[order]
+        for name in list(columns.keys()):
+            columns[name] = columns[name][rows]
+        columns["hop"] = hop[order]
+        columns["location"] = location[order]
+        for j in list(attributes.keys()):
+            attributes[j] = attributes[j][rows]
+
+    def _store_codes(self, store) -> None:
+        """
+        Summary:
+            Extends the place codes of the locations and links of an AgentStore.
+        """
+        locations = store.e.locations
+        if len(self.store_location_codes) < len(locations):
+            self.store_location_codes = np.array([self.place_code(loc) for loc in locations], dtype=np.int32)
+        if len(self.store_link_codes) < len(store.links):
+            self.store_link_codes = np.array([self.place_code(link) for link in store.links], dtype=np.int32)
+
+    def _place_codes(self, locations, links):
+        """
+        Summary:
+            Returns the place codes of location indices (or -1), with link indices for -1 locations.
+        """
+        located = locations >= 0
+        codes = np.full(len(locations), -1, dtype=np.int32)
+        codes[located] = self.store_location_codes[locations[located]]
+        if links is not None:
+            on_link = ~located & (links >= 0)
+            codes[on_link] = self.store_link_codes[links[on_link]]
+        return codes
+
+    def write_agent_store(self, store, time: int, max_written: int) -> None:
+        """
+        Summary:
+            Appends the rows of the agents in an AgentStore, gathered from its columns.
+        """
+        self._store_codes(store)
+        n = min(max_written, len(store))
+        active = (store.location[:n] >= 0) | (store.link[:n] >= 0)
+        index = np.flatnonzero(active)
+        flags = np.where(store.travelling[index], TRAVELLING, 0).astype(np.uint8)
+        columns = {
+            "time": np.full(len(index), time, dtype=np.int32),
+            "hop": np.zeros(len(index), dtype=np.int32),
+            "agent": index,
+            "home_location": self._place_codes(store.home_location[index], None),
+            "location": self._place_codes(store.location[index], store.link[index]),
+            "flags": flags,
+            "distance_travelled": store.distance_travelled[index],
+            "places_travelled": store.places_travelled[index],
+            "distance_moved_this_timestep": store.distance_moved_this_timestep[index],
+        }
+
+        attributes = {}
+        for name, store_codes in store.attributes.items():
+            j = self.attribute_column(name)
+            values = store.attribute_values[name]
+            translation = self.store_attribute_codes.get(name, [])
+            for value in values[len(translation):]:
+                translation.append(self.attribute_code(name, value))
+            self.store_attribute_codes[name] = translation
+
+            agent_codes = store_codes[index]
+            codes = np.full(len(index), -1, dtype=np.int32)
+            coded = agent_codes >= 0
+            codes[coded] = np.asarray(translation, dtype=np.int32)[agent_codes[coded]]
+            for i in np.flatnonzero(agent_codes == agentstore.OBJECT):
+                codes[i] = self.attribute_code(name, store.object_attributes[name][int(index[i])])
+            attributes[j] = codes
+
+        if SimulationSettings.log_levels["agent"] > 1 and len(store.locations_visited) > 0:
+            # Rows of the extra hops follow the row of their agent.
+            position = np.full(n, -1, dtype=np.int64)
+            position[index] = np.arange(len(index))
+            hop_rows = []
+            for i, visited in store.locations_visited.items():
+                if i < n and position[i] >= 0:
+                    for hop, place in enumerate(visited):
+                        hop_rows.append((position[i], hop + 1, self.place_code(place)))
+            if len(hop_rows) > 0:
+                self._add_hop_rows(columns, attributes, hop_rows)
+
+        self.append(columns, attributes)
+
+
+class TrajectoryLogWriter(AgentLogWriter):
+    """
+    Trajectory log of one rank: only the changes in the state of the agents
+    (see the event codes), rather than a row per agent and day.
+    """
+
+    FORMAT = "events"
+    COLUMNS = EVENT_COLUMNS
+
+    def __init__(self, file_name: str, rank: int, append: bool = False, buffer_rows: int = BUFFER_ROWS):
+        super().__init__(file_name, rank, append=append, buffer_rows=buffer_rows)
+        # State of each agent when it was last logged.
+        self.place = np.zeros(0, dtype=np.int32)
+        self.harvesting = np.zeros(0, dtype=bool)
+        self.places_travelled = np.zeros(0, dtype=np.int32)
+        self.previous_agents = [] # agent list when last logged, to detect renumbering.
+
+    def renumber(self, time: int, new_index) -> None:
+        """
+        Summary:
+            Logs a renumbering of the agents (removal of agents from the agent
+            list), with a REMOVE event for each removed agent.
+
+        Args:
+            time (int): time step.
+            new_index (array of int): new index of each agent (-1 if removed).
+
+        Returns:
+            None.
+        """
+        new_index = np.asarray(new_index, dtype=np.int64)
+        removed = np.flatnonzero(new_index < 0)
+        self.append({
+            "time": np.full(len(removed), time, dtype=np.int32),
+            "agent": removed,
+            "event": np.full(len(removed), REMOVE, dtype=np.uint8),
+            "place": self.place[removed],
+            "places_travelled": self.places_travelled[removed],
+        }, {})
+        # Events must not be reordered across the renumbering.
+        self.flush()
+        self._submit(b"R", new_index.tobytes())
+
+        kept = np.flatnonzero(new_index >= 0)
+        n = int(new_index.max()) + 1 if len(kept) > 0 else 0
+        for name in ["place", "harvesting", "places_travelled"]:
+            old = getattr(self, name)
+            new = np.zeros(n, dtype=old.dtype)
+            new[new_index[kept]] = old[kept]
+            setattr(self, name, new)
+
+    def write_events(self, time: int, place, harvesting, home, places_travelled, passes: dict) -> None:
+        """
+        Summary:
+            Logs the events that turn the last logged state of the agents into their current state.
+
+        Args:
+            time (int): time step.
+            place (array of int): place code of each agent (-1 if not active).
+            harvesting (array of bool): harvesting flag of each agent.
+            home (array of int): place code of the home location of each agent.
+            places_travelled (array of int): places_travelled of each agent.
+            passes (dict): agent index -> place codes of the locations passed in this time step.
+
+        Returns:
+            None.
+        """
+        n = len(place)
+        known = min(n, len(self.place))
+
+        # New agents are spawned in their home location.
+        spawned = np.arange(known, n)
+        previous_place = np.concatenate([self.place[:known], home[known:]])
+        previous_harvesting = np.concatenate([self.harvesting[:known], np.zeros(n - known, dtype=bool)])
+        previous_places_travelled = np.concatenate([self.places_travelled[:known], places_travelled[known:]])
+
+        is_link = np.asarray(self.place_is_link + [False], dtype=bool)
+        moved = np.flatnonzero((place != previous_place) | (places_travelled != previous_places_travelled))
+        # Deactivated agents remain inactive.
+        moved = moved[previous_place[moved] >= 0]
+        move_place = place[moved]
+        move_event = np.where(move_place < 0, DEACTIVATE, np.where(is_link[move_place], DEPART, ARRIVE)).astype(np.uint8)
+        move_place = np.where(move_place < 0, previous_place[moved], move_place).astype(np.int32)
+
+        changed = np.flatnonzero((harvesting != previous_harvesting) & (place >= 0))
+        leave = changed[harvesting[changed]]
+        back = changed[~harvesting[changed]]
+
+        pass_agents = []
+        pass_places = []
+        pass_order = []
+        for i, codes in passes.items():
+            if codes[-1] == place[i]:
+                # The agent stopped in the last location it reached (see the move event).
+                codes = codes[:-1]
+            pass_agents += [i] * len(codes)
+            pass_places += codes
+            pass_order += list(range(2, 2 + len(codes)))
+
+        # Events of an agent are ordered: spawn, return from harvest, passes, move, leave to harvest.
+        agents = np.concatenate([spawned, back, np.asarray(pass_agents, dtype=np.int64), moved, leave])
+        order = np.concatenate([
+            np.zeros(len(spawned), dtype=np.int64),
+            np.ones(len(back), dtype=np.int64),
+            np.asarray(pass_order, dtype=np.int64),
+            np.full(len(moved), 1 << 30, dtype=np.int64),
+            np.full(len(leave), (1 << 30) + 1, dtype=np.int64),
+        ])
+        events = np.concatenate([
+            np.full(len(spawned), SPAWN, dtype=np.uint8),
+            np.full(len(back), HARVEST_RETURN, dtype=np.uint8),
+            np.full(len(pass_agents), PASS, dtype=np.uint8),
+            move_event,
+            np.full(len(leave), HARVEST_LEAVE, dtype=np.uint8),
+        ])
+        places = np.concatenate([
+            home[spawned],
+            place[back],
+            np.asarray(pass_places, dtype=np.int32),
+            move_place,
+            home[leave],
+        ]).astype(np.int32)
+        sort = np.lexsort((order, agents))
+        agents = agents[sort]
+
+        self.append({
+            "time": np.full(len(agents), time, dtype=np.int32),
+            "agent": agents,
+            "event": events[sort],
+            "place": places[sort],
+            "places_travelled": places_travelled[agents],
+        }, {})
+
+        self.place = np.asarray(place, dtype=np.int32)
+        self.harvesting = np.asarray(harvesting, dtype=bool)
+        self.places_travelled = np.asarray(places_travelled, dtype=np.int32)
+
+    def write_agent_list(self, agents, time: int, max_written: int) -> None:
+        """
+        Summary:
+            Logs the events of the agents in a list (see write_agents_par).
+        """
+        previous = self.previous_agents
+        if len(previous) > 0 and (len(agents) < len(previous) or not all(map(operator.is_, previous, agents))):
+            position = {id(a): i for i, a in enumerate(agents)}
+            self.renumber(time, [position.get(id(a), -1) for a in previous])
+
+        hops = SimulationSettings.log_levels["agent"] > 1
+        place_codes = self.place_codes
+        place_code = self.place_code
+        places = []
+        homes = []
+        harvesting = []
+        places_travelled = []
+        passes = {}
+        for k in range(0, max_written):
+            a = agents[k]
+            location = a.location
+            if location is None:
+                places.append(-1)
+            else:
+                code = place_codes.get(id(location))
+                places.append(place_code(location) if code is None else code)
+                if hops and len(a.locations_visited) > 0:
+                    # Locations visited are the links that were completed before travelling on.
+                    passes[k] = [place_code(link.endpoint) for link in a.locations_visited]
+            home = a.home_location
+            code = place_codes.get(id(home))
+            homes.append(place_code(home) if code is None else code)
+            harvesting.append(a.harvesting)
+            places_travelled.append(a.places_travelled)
+
+        self.write_events(
+            time,
+            np.asarray(places, dtype=np.int32),
+            np.asarray(harvesting, dtype=bool),
+            np.asarray(homes, dtype=np.int32),
+            np.asarray(places_travelled, dtype=np.int32),
+            passes,
+        )
+        self.previous_agents = agents[:max_written]
+
+    def write_agent_store(self, store, time: int, max_written: int) -> None:
+        """
+        Summary:
+            Logs the events of the agents in an AgentStore, from its columns.
+        """
+        if store.renumbering is not None and (len(store.renumbering) != len(self.place) or np.any(store.renumbering != np.arange(len(store.renumbering)))):
+            self.renumber(time, store.renumbering[:len(self.place)])
+
+        self._store_codes(store)
+        n = min(max_written, len(store))
+        passes = {}
+        if SimulationSettings.log_levels["agent"] > 1:
+            for i, visited in store.locations_visited.items():
+                if i < n and len(visited) > 0 and store.places[i] is not None:
+                    passes[i] = [self.place_code(link.endpoint) for link in visited]
+
+        self.write_events(
+            time,
+            self._place_codes(store.location[:n], store.link[:n]),
+            store.harvesting[:n].copy(),
+            self._place_codes(store.home_location[:n], None),
+            store.places_travelled[:n].copy(),
+            passes,
+        )
+        # Agents that are removed from the store from now on are renumbered (see AgentStore.retain).
+        store.renumbering = np.arange(n, dtype=np.int64)
+
+
+@check_args_type
+def write_agents_par(rank: int, agents, time: int, max_written: int = -1, timestep_interval: int = 1) -> None:
+    """
+    Summary:
+        Binary counterpart of Diagnostics.write_agents_par: appends the agent
+        rows of a time step to agents.out.<rank>.bin or, with agent_format
+        events, the trajectory events of the agents to agents.out.<rank>.events.
+
+    Args:
+        rank (int): rank of the MPI process
+        agents (List[Person] or AgentStore): agents to write
+        time (int): current time step
+        max_written (int, optional): maximum number of agents to write
+        timestep_interval (int, optional): interval between writing rows
+
+    Returns:
+        None.
+    """
+    if SimulationSettings.log_levels["agent_format"] == "events":
+        file_name = "agents.out.{}.events".format(rank)
+        writer_class = TrajectoryLogWriter
+    else:
+        file_name = "agents.out.{}.bin".format(rank)
+        writer_class = AgentLogWriter
+    writer = __writers.get(file_name)
+    if writer is None or time == 0:
+        if writer is not None:
+            writer.close()
+        # A log that is opened after day 0 (e.g. after a restart) continues the existing file.
+        writer = writer_class(file_name, rank, append=time > 0)
+        __writers[file_name] = writer
+
+    if not writer.started:
+        keys = list(agents[0].attributes.keys()) if len(agents) > 0 else []
+        writer.start(time, keys)
+
+    if max_written < 0:
+        max_written = len(agents)
+    if time % timestep_interval == 0:
+        if isinstance(agents, agentstore.AgentStore):
+            writer.write_agent_store(agents, time, max_written)
+        else:
+            writer.write_agent_list(agents, time, max_written)
+
+
+@check_args_type
+def close_agent_logs() -> None:
+    """
+    Summary:
+        Writes all buffered rows and closes the binary agent logs of this process.
+        Called automatically at exit.
+
+    Args:
+        None.
+
+    Returns:
+        None.
+    """
+    for writer in __writers.values():
+        writer.close()
+    __writers.clear()
+
+
+atexit.register(close_agent_logs)
+
+
+def _read_records(file_name: str):
+    with open(file_name, "rb") as f:
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) == 0:
+                return
+            if len(head) < RECORD.size:
+                print("ERROR: agent log {} is truncated.".format(file_name), file=sys.stderr)
+                sys.exit()
+            kind, length = RECORD.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                print("ERROR: agent log {} is truncated.".format(file_name), file=sys.stderr)
+                sys.exit()
+            yield kind, payload
+
+
+def _decode_chunk(payload: bytes, names: list):
+    data = zlib.decompress(payload)
+    n, num_attributes = CHUNK.unpack_from(data, 0)
+    offset = CHUNK.size
+    columns = {}
+    for name in names:
+        dtype = COLUMN_TYPES[name]
+        columns[name] = np.frombuffer(data, dtype=dtype, count=n, offset=offset)
+        offset += n * np.dtype(dtype).itemsize
+    attributes = np.frombuffer(data, dtype=np.int32, count=n * num_attributes, offset=offset).reshape(num_attributes, n)
+    return columns, attributes
+
+
+def _iter_sessions(file_name: str):
+    """
+    Summary:
+        Reads the records of a binary agent log, and yields each new session,
+        and each chunk of rows of the current session.
+    """
+    session = None
+    for kind, payload in _read_records(file_name):
+        if kind == b"H":
+            session = {"header": json.loads(payload), "places": [], "attribute_names": [], "attribute_values": {},
+                       "renumberings": [], "rows": 0}
+            yield session, None, None
+        elif session is None:
+            print("ERROR: {} is not a binary agent log.".format(file_name), file=sys.stderr)
+            sys.exit()
+        elif kind == b"P":
+            session["places"] += json.loads(payload)
+        elif kind == b"A":
+            new = json.loads(payload)
+            session["attribute_names"] += new["names"]
+            for name in new["names"]:
+                session["attribute_values"].setdefault(name, [])
+            for name, values in new["values"].items():
+                session["attribute_values"][name] += values
+        elif kind == b"R":
+            # Agents were renumbered after the rows read so far (see TrajectoryLogWriter).
+            session["renumberings"].append((session["rows"], np.frombuffer(payload, dtype=np.int64)))
+        elif kind == b"C":
+            columns, attributes = _decode_chunk(payload, session["header"]["columns"])
+            session["rows"] += len(columns[session["header"]["columns"][0]])
+            yield session, columns, attributes
+
+
+@check_args_type
+def iter_agent_log(file_name: str):
+    """
+    Summary:
+        Reads a binary agent log chunk by chunk.
+
+    Args:
+        file_name (str): name of the binary log file.
+
+    Returns:
+        generator of (session, columns, attributes): session is a dict with the
+        header, places, attribute_names and attribute_values read so far, columns
+        maps each column name in the header to an array, and attributes is a 2-D
+        array of attribute value codes (one row per attribute in attribute_names).
+    """
+    for session, columns, attributes in _iter_sessions(file_name):
+        if columns is not None:
+            yield session, columns, attributes
+
+
+@check_args_type
+def read_agent_log(file_name: str) -> list:
+    """
+    Summary:
+        Reads a binary agent log into memory.
+
+    Args:
+        file_name (str): name of the binary log file.
+
+    Returns:
+        list: a dict per session (see iter_agent_log), with all its rows in
+        "columns" and "attributes".
+    """
+    sessions = []
+    chunks = []
+    for session, columns, attributes in _iter_sessions(file_name):
+        if columns is None:
+            sessions.append(session)
+            chunks.append([])
+        else:
+            chunks[-1].append((columns, attributes))
+
+    for session, parts in zip(sessions, chunks):
+        session["columns"] = {
+            name: np.concatenate([np.zeros(0, dtype=COLUMN_TYPES[name])] + [c[name] for c, _ in parts])
+            for name in session["header"]["columns"]
+        }
+        num_attributes = len(session["attribute_names"])
+        padded = [np.zeros([num_attributes, 0], dtype=np.int32)]
+        for _, attributes in parts:
+            block = np.full([num_attributes, attributes.shape[1]], -1, dtype=np.int32)
+            block[:attributes.shape[0]] = attributes
+            padded.append(block)
+        session["attributes"] = np.concatenate(padded, axis=1)
+    return sessions
+
+
+def _stable_agent_ids(session) -> np.ndarray:
+    """
+    Summary:
+        Returns the agent of each event of a trajectory log session as a stable
+        agent id (the order in which agents were spawned), rather than the
+        agent index, which changes when agents are removed.
+    """
+    agent = session["columns"]["agent"]
+    event = session["columns"]["event"]
+    ids = np.zeros(len(agent), dtype=np.int64)
+    index_ids = np.zeros(0, dtype=np.int64) # stable id of each agent index.
+    next_id = 0
+    boundaries = session["renumberings"] + [(len(agent), None)]
+    first = 0
+    for last, new_index in boundaries:
+        spawned = agent[first:last][event[first:last] == SPAWN]
+        if len(spawned) > 0:
+            grown = np.full(max(len(index_ids), int(spawned.max()) + 1), -1, dtype=np.int64)
+            grown[:len(index_ids)] = index_ids
+            grown[spawned] = np.arange(next_id, next_id + len(spawned))
+            index_ids = grown
+            next_id += len(spawned)
+        ids[first:last] = index_ids[agent[first:last]]
+        if new_index is not None:
+            kept = np.flatnonzero(new_index >= 0)
+            renumbered = np.full(int(new_index.max()) + 1 if len(kept) > 0 else 0, -1, dtype=np.int64)
+            renumbered[new_index[kept]] = index_ids[kept]
+            index_ids = renumbered
+        first = last
+    return ids
+
+
+@check_args_type
+def read_trajectory_log(file_name: str) -> list:
+    """
+    Summary:
+        Reads a trajectory log (log_levels.agent_format: events) into memory.
+
+    Args:
+        file_name (str): name of the trajectory log file.
+
+    Returns:
+        list: a dict per session (see read_agent_log), with the stable agent id
+        of each event (spawn order) in columns["agent_id"].
+    """
+    sessions = read_agent_log(file_name)
+    for session in sessions:
+        if session["header"].get("format") != "events":
+            print("ERROR: {} is not a trajectory log.".format(file_name), file=sys.stderr)
+            sys.exit()
+        session["columns"]["agent_id"] = _stable_agent_ids(session)
+    return sessions
+
+
+@check_args_type
+def trajectory_snapshot(session: dict, time: int) -> dict:
+    """
+    Summary:
+        Reconstructs the state of all active agents at the end of time step <time>
+        from a trajectory log session.
+
+    Args:
+        session (dict): session of read_trajectory_log.
+        time (int): time step.
+
+    Returns:
+        dict: arrays with, per active agent (ordered by agent id), "agent_id",
+        "location" (name of the location or link), "travelling", "harvesting",
+        "home_location" (name) and "places_travelled".
+    """
+    columns = session["columns"]
+    logged = np.flatnonzero(columns["time"] <= time)
+    ids = columns["agent_id"][logged]
+    event = columns["event"][logged]
+
+    # Last event of each agent that sets its place (events are in order of time).
+    moves = logged[(event != HARVEST_LEAVE) & (event != HARVEST_RETURN) & (event != PASS)]
+    agent_ids, last = np.unique(columns["agent_id"][moves][::-1], return_index=True)
+    last = moves[::-1][last]
+    active = (columns["event"][last] != DEACTIVATE) & (columns["event"][last] != REMOVE)
+    agent_ids = agent_ids[active]
+    last = last[active]
+
+    # All events record the places_travelled of the agent at the end of their time step.
+    _, last_event = np.unique(ids[::-1], return_index=True)
+    last_event = logged[::-1][last_event]
+    last_event = last_event[np.isin(columns["agent_id"][last_event], agent_ids)]
+
+    spawns = logged[event == SPAWN]
+    home = np.full(int(agent_ids.max()) + 1 if len(agent_ids) > 0 else 0, -1, dtype=np.int64)
+    spawn_ids = columns["agent_id"][spawns]
+    in_range = spawn_ids < len(home)
+    home[spawn_ids[in_range]] = columns["place"][spawns[in_range]]
+
+    harvests = logged[(event == HARVEST_LEAVE) | (event == HARVEST_RETURN)]
+    harvesting = np.zeros(len(home), dtype=bool)
+    harvest_ids = columns["agent_id"][harvests]
+    in_range = harvest_ids < len(home)
+    # Later events overwrite earlier ones.
+    harvesting[harvest_ids[in_range]] = columns["event"][harvests[in_range]] == HARVEST_LEAVE
+
+    places = session["places"]
+    place = columns["place"][last]
+    return {
+        "agent_id": agent_ids,
+        "location": np.array([places[p][0] for p in place.tolist()], dtype=object),
+        "travelling": np.array([places[p][4] == 1 for p in place.tolist()], dtype=bool),
+        "harvesting": harvesting[agent_ids],
+        "home_location": np.array([places[p][0] if p >= 0 else None for p in home[agent_ids].tolist()], dtype=object),
+        "places_travelled": columns["places_travelled"][last_event],
+    }
+
+
+@check_args_type
+def agent_trajectory(session: dict, agent_id: int) -> list:
+    """
+    Summary:
+        Returns the events of one agent in a trajectory log session.
+
+    Args:
+        session (dict): session of read_trajectory_log.
+        agent_id (int): stable agent id.
+
+    Returns:
+        list: (time, event name, place name, places_travelled) per event.
+    """
+    columns = session["columns"]
+    places = session["places"]
+    rows = np.flatnonzero(columns["agent_id"] == agent_id)
+    return [
+        (int(columns["time"][i]), EVENT_NAMES[columns["event"][i]], places[columns["place"][i]][0], int(columns["places_travelled"][i]))
+        for i in rows
+    ]
+
+
+def _format_number(value, is_int: bool) -> str:
+    if is_int:
+        return str(int(value))
+    return str(float(value))
+
+
+@check_args_type
+def convert_to_csv(file_name: str, csv_name: str) -> None:
+    """
+    Summary:
+        Converts a binary agent log to the CSV agent log written by
+        Diagnostics.write_agents_par.
+
+    Args:
+        file_name (str): name of the binary log file.
+        csv_name (str): name of the CSV file to write.
+
+    Returns:
+        None.
+    """
+    with open(csv_name, "w", encoding="utf-8") as out:
+        current = None
+        for session, columns, attributes in iter_agent_log(file_name):
+            header = session["header"]
+            if header.get("format", "rows") != "rows":
+                print("ERROR: {} is a trajectory log, which can not be converted to CSV.".format(file_name), file=sys.stderr)
+                sys.exit()
+            if session is not current:
+                current = session
+                if header["time"] == 0:
+                    keys = "".join("{},".format(k) for k in header["attribute_keys"])
+                    print(CSV_HEADER + (",{}".format(keys) if len(keys) > 0 else ""), file=out)
+
+            region = header["granularity"] == "region"
+            hop_numbers = header["agent_log_level"] > 2
+            rank = header["rank"]
+            places = session["places"]
+            labels = [(p[1], 0.0, 0.0) if region else (p[0], p[2], p[3]) for p in places]
+            names = [p[0] for p in places]
+            values = [session["attribute_values"][name] for name in session["attribute_names"][:attributes.shape[0]]]
+
+            lines = []
+            for i, (time, hop, agent, home, location, flags, distance, places_travelled, moved) in enumerate(zip(
+                columns["time"].tolist(), columns["hop"].tolist(), columns["agent"].tolist(),
+                columns["home_location"].tolist(), columns["location"].tolist(), columns["flags"].tolist(),
+                columns["distance_travelled"].tolist(), columns["places_travelled"].tolist(),
+                columns["distance_moved_this_timestep"].tolist(),
+            )):
+                name, x, y = labels[location]
+                attribute_values = "".join(
+                    "{},".format(values[j][code]) for j, code in enumerate(attributes[:, i].tolist()) if code >= 0
+                )
+                lines.append("{},{}-{},{},{},{},{},{},{},{},{},{}\n".format(
+                    "{}-{}".format(time, hop) if hop > 0 and hop_numbers else time,
+                    rank,
+                    agent,
+                    names[home] if home >= 0 else None,
+                    name,
+                    x,
+                    y,
+                    bool(flags & TRAVELLING),
+                    _format_number(distance, flags & INT_DISTANCE_TRAVELLED),
+                    places_travelled,
+                    _format_number(moved, flags & INT_DISTANCE_MOVED),
+                    attribute_values,
+                ))
+            out.writelines(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Please run using: python3 -m flee.agentlog <binary agent log> <csv file>")
+        sys.exit()
+    convert_to_csv(sys.argv[1], sys.argv[2])
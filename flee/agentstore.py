@@ -0,0 +1,879 @@
+import os
+import sys
+import numpy as np
+from collections.abc import MutableMapping
+from flee.SimulationSettings import SimulationSettings
+from flee import demographics
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Struct-of-arrays storage for the agent population.
+# Enabled with optimisations.agent_store: array in simsetting.yml. Agents are
+# stored as NumPy columns, and the existing Person API is provided through
+# lightweight views that read and write those columns.
+# The store reduces memory use; it does not by itself vectorise Ecosystem.evolve.
+# Agents that move or travel are still evolved one at a time through views, and
+# only the stages written over the columns (prepare_evolve with the batched
+# move-chance stage, and the end-of-step counters) process all agents in bulk.
+
+
+MISSING = -1 # code for an attribute that is not set for an agent.
+OBJECT = -2 # code for an attribute value that is stored outside the columns (e.g. lists).
+
+# name, dtype and initial value of each scalar agent column.
+COLUMNS = [
+    ("location", np.int32, -1),
+    ("link", np.int32, -1),
+    ("home_location", np.int32, -1),
+    ("travelling", np.bool_, False),
+    ("harvesting", np.bool_, False),
+    ("distance_travelled_on_link", np.float64, 0.0),
+    ("distance_travelled", np.float64, 0.0),
+    ("distance_moved_this_timestep", np.float64, 0.0),
+    ("recent_travel_distance", np.float64, 0.0),
+    ("timesteps_since_departure", np.int32, 0),
+    ("places_travelled", np.int32, 1),
+    ("days_in_current_location", np.int32, 0),
+    ("last_connection_update", np.int32, 0),
+]
+
+
+@check_args_type
+def use_agent_store() -> bool:
+    """
+    Summary:
+        Returns whether the array-backed agent store is enabled in simsetting.yml.
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if agents should be stored in an AgentStore.
+    """
+    return SimulationSettings.optimisations.get("AgentStore", "list") == "array"
+
+
+class AttributeView(MutableMapping):
+    """
+    Dictionary interface to the categorical attribute columns of one agent.
+    """
+
+    __slots__ = ["_s", "_i"]
+
+    def __init__(self, store, index):
+        self._s = store
+        self._i = index
+
+    def __getitem__(self, key):
+        return self._s.get_attribute(self._i, key)
+
+    def __setitem__(self, key, value):
+        self._s.set_attribute(self._i, key, value)
+
+    def __delitem__(self, key):
+        self._s.del_attribute(self._i, key)
+
+    def __iter__(self):
+        for name, codes in self._s.attributes.items():
+            if codes[self._i] != MISSING:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self.__iter__())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class ColumnView:
+    """
+    Mixin that maps the Person fields onto the columns of an AgentStore.
+    Combined with the Person class of the Ecosystem in make_view_class().
+    """
+
+    __slots__ = []
+
+    @property
+    def location(self):
+        return self._s.places[self._i]
+
+    @location.setter
+    def location(self, value):
+        self._s.set_location(self._i, value)
+
+    @property
+    def home_location(self):
+        loc = self._s.home_location[self._i]
+        if loc >= 0:
+            return self._s.e.locations[loc]
+        return None
+
+    @home_location.setter
+    def home_location(self, value):
+        self._s.home_location[self._i] = self._s.location_index(value)
+
+    @property
+    def travelling(self):
+        return bool(self._s.travelling[self._i])
+
+    @travelling.setter
+    def travelling(self, value):
+        self._s.travelling[self._i] = value
+
+    @property
+    def harvesting(self):
+        return bool(self._s.harvesting[self._i])
+
+    @harvesting.setter
+    def harvesting(self, value):
+        self._s.harvesting[self._i] = value
+
+    @property
+    def distance_travelled_on_link(self):
+        return float(self._s.distance_travelled_on_link[self._i])
+
+    @distance_travelled_on_link.setter
+    def distance_travelled_on_link(self, value):
+        self._s.distance_travelled_on_link[self._i] = value
+
+    @property
+    def distance_travelled(self):
+        return float(self._s.distance_travelled[self._i])
+
+    @distance_travelled.setter
+    def distance_travelled(self, value):
+        self._s.distance_travelled[self._i] = value
+
+    @property
+    def distance_moved_this_timestep(self):
+        return float(self._s.distance_moved_this_timestep[self._i])
+
+    @distance_moved_this_timestep.setter
+    def distance_moved_this_timestep(self, value):
+        self._s.distance_moved_this_timestep[self._i] = value
+
+    @property
+    def recent_travel_distance(self):
+        return float(self._s.recent_travel_distance[self._i])
+
+    @recent_travel_distance.setter
+    def recent_travel_distance(self, value):
+        self._s.recent_travel_distance[self._i] = value
+
+    @property
+    def timesteps_since_departure(self):
+        return int(self._s.timesteps_since_departure[self._i])
+
+    @timesteps_since_departure.setter
+    def timesteps_since_departure(self, value):
+        self._s.timesteps_since_departure[self._i] = value
+
+    @property
+    def places_travelled(self):
+        return int(self._s.places_travelled[self._i])
+
+    @places_travelled.setter
+    def places_travelled(self, value):
+        self._s.places_travelled[self._i] = value
+
+    @property
+    def days_in_current_location(self):
+        return int(self._s.days_in_current_location[self._i])
+
+    @days_in_current_location.setter
+    def days_in_current_location(self, value):
+        self._s.days_in_current_location[self._i] = value
+
+    @property
+    def last_connection_update(self):
+        return int(self._s.last_connection_update[self._i])
+
+    @last_connection_update.setter
+    def last_connection_update(self, value):
+        self._s.last_connection_update[self._i] = value
+
+    @property
+    def route(self):
+        # Routes are short-lived, so only agents with a planned route have an entry.
+        return self._s.routes.get(self._i, [])
+
+    @route.setter
+    def route(self, value):
+        if len(value) > 0:
+            self._s.routes[self._i] = value
+        else:
+            self._s.routes.pop(self._i, None)
+
+    @property
+    def locations_visited(self):
+        return self._s.locations_visited.setdefault(self._i, [])
+
+    @locations_visited.setter
+    def locations_visited(self, value):
+        self._s.locations_visited[self._i] = value
+
+    @property
+    def attributes(self):
+        return AttributeView(self._s, self._i)
+
+    @attributes.setter
+    def attributes(self, value):
+        for key in list(AttributeView(self._s, self._i)):
+            self._s.del_attribute(self._i, key)
+        for key in value:
+            self._s.set_attribute(self._i, key, value[key])
+
+    @property
+    def e(self):
+        return self._s.e
+
+    @property
+    def index(self):
+        return self._i
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnView) and other._s is self._s and other._i == self._i
+
+    def __hash__(self):
+        return hash((id(self._s), self._i))
+
+
+__view_classes = {}
+
+
+def make_view_class(person_class):
+    """
+    Summary:
+        Creates (once) a Person subclass whose fields are backed by AgentStore columns.
+
+    Args:
+        person_class (type): the Person class of the Ecosystem (flee.Person or pflee.Person).
+
+    Returns:
+        type: view class.
+    """
+    if person_class not in __view_classes:
+        __view_classes[person_class] = type(
+            "{}View".format(person_class.__name__),
+            (ColumnView, person_class),
+            {"__slots__": ["_s", "_i"]},
+        )
+    return __view_classes[person_class]
+
+
+class AgentStore:
+    """
+    Array-backed agent population. Supports the list operations used on
+    Ecosystem.agents (len, indexing, iteration and append).
+    """
+
+    def __init__(self, e, person_class, capacity: int = 1024):
+        """
+        Summary:
+            Creates an empty agent store.
+
+        Args:
+            e (Ecosystem): the Ecosystem that owns the agents.
+            person_class (type): the Person class of the Ecosystem.
+            capacity (int, optional): initial number of agents that fit in the columns.
+
+        Returns:
+            None.
+        """
+        self.e = e
+        self.view_class = make_view_class(person_class)
+        self.size = 0
+        self.capacity = max(1, capacity)
+        for name, dtype, value in COLUMNS:
+            setattr(self, name, np.full(self.capacity, value, dtype=dtype))
+
+        self.attributes = {} # attribute name -> int32 array of value codes.
+        self.attribute_values = {} # attribute name -> list of values, indexed by code.
+        self.attribute_codes = {} # attribute name -> {(type, value): code}.
+        self.object_attributes = {} # attribute name -> {agent index: unhashable value}.
+
+        # Location, Link or None per agent. Mirrors the location/link columns, so that
+        # the per-agent code paths avoid NumPy scalar access on every lookup.
+        self.places = []
+
+        self.routes = {} # agent index -> route, only for agents with a planned route.
+        self.locations_visited = {} # agent index -> list of locations (agent log level > 1).
+
+        self.links = [] # Link objects referenced by the link column.
+        # New index (-1 if removed) of each agent since the array was set, maintained
+        # by retain() for the trajectory log (see flee/agentlog.py). Not tracked if None.
+        self.renumbering = None
+        self.__link_ids = {}
+        self.__location_ids = {}
+
+
+    def __len__(self):
+        return self.size
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if index < 0 or index >= self.size:
+            raise IndexError("agent index out of range")
+        return self.view(index)
+
+
+    def __iter__(self):
+        for i in range(0, self.size):
+            yield self.view(i)
+
+
+    def view(self, index: int):
+        """
+        Summary:
+            Returns a Person view on agent <index>.
+
+        Args:
+            index (int): agent index.
+
+        Returns:
+            Person: view object.
+        """
+        a = self.view_class.__new__(self.view_class)
+        a._s = self
+        a._i = index
+        return a
+
+
+    def _grow(self, min_capacity: int) -> None:
+        """
+        Summary:
+            Enlarges all columns (capacity doubling).
+
+        Args:
+            min_capacity (int): minimum required capacity.
+
+        Returns:
+            None.
+        """
+        new_capacity = self.capacity
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+        if new_capacity == self.capacity:
+            return
+
+        for name, dtype, value in COLUMNS:
+            col = np.full(new_capacity, value, dtype=dtype)
+            col[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, col)
+        for name in self.attributes:
+            col = np.full(new_capacity, MISSING, dtype=np.int32)
+            col[:self.size] = self.attributes[name][:self.size]
+            self.attributes[name] = col
+        self.capacity = new_capacity
+
+
+    def location_index(self, loc) -> int:
+        """
+        Summary:
+            Converts a Location object to its index in Ecosystem.locations.
+
+        Args:
+            loc (Location): location (or None).
+
+        Returns:
+            int: index, or -1 for None.
+        """
+        if loc is None:
+            return -1
+        i = self.__location_ids.get(id(loc))
+        if i is None:
+            # Locations were added since the last lookup.
+            self.__location_ids = {id(l): k for k, l in enumerate(self.e.locations)}
+            i = self.__location_ids.get(id(loc))
+            if i is None:
+                print("ERROR: agent placed in location {} which is not part of the Ecosystem.".format(loc.name), file=sys.stderr)
+                sys.exit()
+        return i
+
+
+    def link_index(self, link) -> int:
+        """
+        Summary:
+            Converts a Link object to its index in the link registry of the store.
+
+        Args:
+            link (Link): link.
+
+        Returns:
+            int: index in AgentStore.links.
+        """
+        i = self.__link_ids.get(id(link))
+        if i is None:
+            i = len(self.links)
+            self.links.append(link)
+            self.__link_ids[id(link)] = i
+        return i
+
+
+    def set_location(self, index: int, value) -> None:
+        """
+        Summary:
+            Places agent <index> in a Location, on a Link, or removes it (None).
+
+        Args:
+            index (int): agent index.
+            value: Location, Link or None.
+
+        Returns:
+            None.
+        """
+        self.places[index] = value
+        if value is None:
+            self.location[index] = -1
+            self.link[index] = -1
+        elif hasattr(value, "endpoint"): # This means it's a Link object
+            self.location[index] = -1
+            self.link[index] = self.link_index(value)
+        else:
+            self.location[index] = self.location_index(value)
+            self.link[index] = -1
+
+
+    def get_attribute(self, index: int, name: str):
+        codes = self.attributes.get(name)
+        if codes is None:
+            raise KeyError(name)
+        code = codes[index]
+        if code == MISSING:
+            raise KeyError(name)
+        if code == OBJECT:
+            return self.object_attributes[name][index]
+        return self.attribute_values[name][code]
+
+
+    def set_attribute(self, index: int, name: str, value) -> None:
+        codes = self.attributes.get(name)
+        if codes is None:
+            codes = np.full(self.capacity, MISSING, dtype=np.int32)
+            self.attributes[name] = codes
+            self.attribute_values[name] = []
+            self.attribute_codes[name] = {}
+            self.object_attributes[name] = {}
+
+        if codes[index] == OBJECT:
+            del self.object_attributes[name][index]
+
+        try:
+            code = self._code(name, value)
+        except TypeError: # unhashable values (e.g. temporary routes).
+            self.object_attributes[name][index] = value
+            codes[index] = OBJECT
+            return
+        codes[index] = code
+
+
+    def _code(self, name: str, value) -> int:
+        """
+        Summary:
+            Returns the code of an attribute value, adding it to the value table if needed.
+            Raises TypeError for unhashable values.
+
+        Args:
+            name (str): attribute name.
+            value: attribute value.
+
+        Returns:
+            int: code.
+        """
+        # type is part of the key, so that e.g. 1, 1.0 and True remain distinct values.
+        key = (type(value), value)
+        code = self.attribute_codes[name].get(key)
+        if code is None:
+            code = len(self.attribute_values[name])
+            self.attribute_values[name].append(value)
+            self.attribute_codes[name][key] = code
+        return code
+
+
+    def get_attribute_column(self, name: str, default=None):
+        """
+        Summary:
+            Returns the decoded values of one attribute for all agents.
+
+        Args:
+            name (str): attribute name.
+            default (optional): value used for agents that do not have the attribute.
+
+        Returns:
+            numpy array (dtype object) with one value per agent.
+        """
+        n = self.size
+        out = np.empty(n, dtype=object)
+        if name not in self.attributes:
+            out[:] = [default] * n
+            return out
+
+        values = self.attribute_values[name]
+        table = np.empty(len(values) + 1, dtype=object)
+        table[:len(values)] = values
+        table[len(values)] = default
+
+        codes = self.attributes[name][:n]
+        out[:] = table[np.where(codes >= 0, codes, len(values))]
+        for i, v in self.object_attributes[name].items():
+            out[i] = v
+        return out
+
+
+    def set_attribute_column(self, name: str, indices, values) -> None:
+        """
+        Summary:
+            Sets one (hashable) attribute for a set of agents at once.
+
+        Args:
+            name (str): attribute name.
+            indices (array of int): agent indices.
+            values (array): new values, one per index.
+
+        Returns:
+            None.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return
+        if name not in self.attributes:
+            self.set_attribute(int(indices[0]), name, values[0])
+
+        codes = self.attributes[name]
+        for i in indices[codes[indices] == OBJECT]:
+            del self.object_attributes[name][int(i)]
+
+        unique, inverse = np.unique(np.asarray(values), return_inverse=True)
+        unique_codes = np.array([self._code(name, u.item() if isinstance(u, np.generic) else u) for u in unique], dtype=np.int32)
+        codes[indices] = unique_codes[inverse.reshape(-1)]
+
+
+    def del_attribute(self, index: int, name: str) -> None:
+        codes = self.attributes.get(name)
+        if codes is None or codes[index] == MISSING:
+            raise KeyError(name)
+        if codes[index] == OBJECT:
+            del self.object_attributes[name][index]
+        codes[index] = MISSING
+
+
+    @check_args_type
+    def append(self, person) -> None:
+        """
+        Summary:
+            Adds an agent to the store. The fields of the (fully initialised)
+            Person object are copied into the columns, after which the object
+            itself is no longer needed.
+
+        Args:
+            person (Person): agent to add.
+
+        Returns:
+            None.
+        """
+        if self.size == self.capacity:
+            self._grow(self.size + 1)
+        i = self.size
+        self.size += 1
+
+        self.places.append(None)
+        self.set_location(i, person.location)
+        self.home_location[i] = self.location_index(person.home_location)
+        self.travelling[i] = person.travelling
+        self.harvesting[i] = person.harvesting
+        self.distance_travelled_on_link[i] = person.distance_travelled_on_link
+        self.distance_moved_this_timestep[i] = person.distance_moved_this_timestep
+        self.recent_travel_distance[i] = person.recent_travel_distance
+        self.timesteps_since_departure[i] = person.timesteps_since_departure
+        self.places_travelled[i] = person.places_travelled
+        self.days_in_current_location[i] = person.days_in_current_location
+        self.last_connection_update[i] = person.last_connection_update
+        if SimulationSettings.log_levels["agent"] > 0:
+            self.distance_travelled[i] = person.distance_travelled
+        if len(person.route) > 0:
+            self.routes[i] = person.route
+        for name, value in person.attributes.items():
+            self.set_attribute(i, name, value)
+
+
+    @check_args_type
+    def append_block(self, location, number: int, attribute_columns: dict) -> None:
+        """
+        Summary:
+            Adds <number> new agents at <location> in one block, without
+            constructing Person objects. The new agents are initialised as in
+            Person.__init__: they are counted in the location, have 0 connections
+            unless given, and draw a farmer attribute if the location has a farmer_fraction.
+
+        Args:
+            location (Location): location of the new agents.
+            number (int): number of agents.
+            attribute_columns (dict): attribute name -> sequence of <number> values.
+
+        Returns:
+            None.
+        """
+        if number < 1:
+            return
+        start = self.size
+        self._grow(start + number)
+        self.size += number
+
+        # Columns beyond the old size still hold their initial values.
+        self.places.extend([location] * number)
+        self.location[start:self.size] = self.location_index(location)
+        self.home_location[start:self.size] = self.location_index(location)
+
+        indices = np.arange(start, self.size)
+        columns = {"connections": [0] * number} | attribute_columns
+        if "farmer_fraction" in location.attributes:
+            farmer = np.random.random(number) < float(location.attributes["farmer_fraction"])
+            columns["farmer"] = farmer.astype(np.int64).tolist()
+        for name, values in columns.items():
+            self.set_attribute_column(name, indices, list(values))
+
+        location.IncrementNumAgents(None, number)
+        demographics.count_agent_columns(location, columns, number)
+
+
+    @check_args_type
+    def retain(self, keep) -> None:
+        """
+        Summary:
+            Removes all agents for which <keep> is False, preserving the order
+            of the remaining agents.
+
+        Args:
+            keep (array of bool): one flag per agent.
+
+        Returns:
+            None.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        new_index = np.full(self.size, -1, dtype=np.int64)
+        kept = np.flatnonzero(keep)
+        new_index[kept] = np.arange(len(kept))
+        n = len(kept)
+
+        for name, _, value in COLUMNS:
+            col = getattr(self, name)
+            col[:n] = col[kept]
+            col[n:self.size] = value
+        for name, codes in self.attributes.items():
+            codes[:n] = codes[kept]
+            codes[n:self.size] = MISSING
+            self.object_attributes[name] = {int(new_index[i]): v for i, v in self.object_attributes[name].items() if keep[i]}
+
+        self.places = [self.places[i] for i in kept]
+        self.routes = {int(new_index[i]): r for i, r in self.routes.items() if keep[i]}
+        self.locations_visited = {int(new_index[i]): l for i, l in self.locations_visited.items() if keep[i]}
+        self.size = n
+        if self.renumbering is not None:
+            self.renumbering = np.where(self.renumbering >= 0, new_index[self.renumbering], -1)
+
+
+    def export_columns(self, link_ids: dict):
+        """
+        Summary:
+            Returns the agents as columns, and the agent state that is not
+            stored in columns (see flee/checkpoint.py).
+
+        Args:
+            link_ids (dict): id(Link) -> index of the link in the exported link list.
+
+        Returns:
+            Tuple[dict, dict]: column name -> array, and the attribute value tables,
+            object attributes, routes and visited locations.
+        """
+        n = self.size
+        columns = {name: getattr(self, name)[:n].copy() for name, _, _ in COLUMNS}
+        # The last entry maps the -1 of agents that are not on a link.
+        registry = np.array([link_ids[id(link)] for link in self.links] + [-1], dtype=np.int32)
+        columns["link"] = registry[columns["link"]]
+
+        names = list(self.attributes.keys())
+        columns["attribute_codes"] = np.zeros((len(names), n), dtype=np.int32)
+        for k, name in enumerate(names):
+            columns["attribute_codes"][k] = self.attributes[name][:n]
+
+        state = {
+            "attribute_names": names,
+            "attribute_values": [self.attribute_values[name] for name in names],
+            "object_attributes": [self.object_attributes[name] for name in names],
+            "routes": self.routes,
+            "locations_visited": self.locations_visited,
+        }
+        return columns, state
+
+
+    def import_columns(self, columns: dict, state: dict, links: list) -> None:
+        """
+        Summary:
+            Replaces the agents by the columns and state of export_columns().
+
+        Args:
+            columns (dict): column name -> array.
+            state (dict): attribute value tables, object attributes, routes and visited locations.
+            links (list): Link objects, indexed by the link column.
+
+        Returns:
+            None.
+        """
+        n = len(columns["location"])
+        self.size = 0
+        self.attributes = {}
+        self.attribute_values = {}
+        self.attribute_codes = {}
+        self.object_attributes = {}
+        self.links = []
+        self.__link_ids = {}
+        for name, dtype, value in COLUMNS:
+            setattr(self, name, np.full(self.capacity, value, dtype=dtype))
+        self._grow(n)
+        self.size = n
+
+        for name, _, _ in COLUMNS:
+            getattr(self, name)[:n] = columns[name]
+        link_column = np.asarray(columns["link"])
+        for g in np.unique(link_column[link_column >= 0]):
+            self.link[:n][link_column == g] = self.link_index(links[int(g)])
+
+        for k, name in enumerate(state["attribute_names"]):
+            codes = np.full(self.capacity, MISSING, dtype=np.int32)
+            codes[:n] = columns["attribute_codes"][k]
+            self.attributes[name] = codes
+            self.attribute_values[name] = list(state["attribute_values"][k])
+            self.attribute_codes[name] = {(type(v), v): code for code, v in enumerate(self.attribute_values[name])}
+            self.object_attributes[name] = dict(state["object_attributes"][k])
+
+        self.routes = dict(state["routes"])
+        self.locations_visited = dict(state["locations_visited"])
+        locations = self.e.locations
+        self.places = [
+            locations[l] if l >= 0 else (self.links[k] if k >= 0 else None)
+            for l, k in zip(self.location[:n].tolist(), self.link[:n].tolist())
+        ]
+
+
+    @check_args_type
+    def prepare_evolve(self, time: int):
+        """
+        Summary:
+            Vectorised equivalent of the start of Person.evolve() for all agents:
+            updates social connectivity (see Person.update_social_connectivity)
+            and the days spent in the current location. Location populations are
+            taken from the start of the time step.
+            Used together with the batched move-chance stage.
+
+        Args:
+            time (int): current time step.
+
+        Returns:
+            numpy array of bool: agents that reside in a location (and can move).
+        """
+        n = self.size
+        at_location = np.flatnonzero(self.location[:n] >= 0)
+        if len(at_location) == 0:
+            return np.zeros(n, dtype=bool)
+
+        locs = self.e.locations
+        loc = self.location[at_location]
+        num_agents = np.array([l.numAgents for l in locs])[loc]
+        in_camp = np.array([l.camp or l.idpcamp for l in locs], dtype=bool)[loc]
+        in_conflict = np.array([l.conflict for l in locs])[loc] > 0.5
+
+        current = self.get_attribute_column("connections", 0)[at_location].astype(np.int64)
+        connections = current.copy()
+        changed = np.zeros(len(at_location), dtype=bool)
+
+        # Factor 1: Population density effect
+        crowded = num_agents > 100
+        connections[crowded] = np.minimum(10, current[crowded] + np.minimum(2, num_agents[crowded] // 100))
+        isolated = num_agents < 10
+        connections[isolated] = np.maximum(0, current[isolated] - 1)
+        changed |= crowded | isolated
+
+        # Factor 2: Camp effect
+        days = self.days_in_current_location[at_location] + 1
+        settled = in_camp & (days > 7)
+        connections[settled] = np.minimum(8, current[settled] + 1)
+        changed |= settled
+        self.days_in_current_location[at_location] = np.where(in_camp, days, 0)
+
+        # Factor 3: Conflict zones disrupt social networks
+        connections[in_conflict] = np.maximum(0, current[in_conflict] - 2)
+        changed |= in_conflict
+
+        # Factor 4: Time decay
+        decayed = (time - self.last_connection_update[at_location]) > 30
+        connections[decayed] = np.maximum(0, current[decayed] - 1)
+        changed |= decayed
+
+        self.last_connection_update[at_location] = time
+        self.set_attribute_column("connections", at_location[changed], connections[changed].tolist())
+
+        # Agents at a location are not travelling: count the day spent there.
+        self.days_in_current_location[at_location] += 1
+
+        mask = np.zeros(n, dtype=bool)
+        mask[at_location] = True
+        return mask
+
+
+    def active(self):
+        """
+        Summary:
+            Returns a boolean mask of agents that are still part of the simulation
+            (i.e. not deactivated by setting their location to None).
+
+        Args:
+            None.
+
+        Returns:
+            numpy array of bool.
+        """
+        return (self.location[:self.size] >= 0) | (self.link[:self.size] >= 0)
+
+
+    @check_args_type
+    def advance_departure_counters(self, mask) -> None:
+        """
+        Summary:
+            Vectorised equivalent of incrementing timesteps_since_departure
+            for the agents in <mask>.
+
+        Args:
+            mask (array of bool): agents to update.
+
+        Returns:
+            None.
+        """
+        self.timesteps_since_departure[:self.size][mask] += 1
+
+
+    @check_args_type
+    def update_recent_travel_distance(self, max_move_speed: float) -> None:
+        """
+        Summary:
+            Vectorised update of recent_travel_distance at the end of a time step,
+            resetting distance_moved_this_timestep.
+
+        Args:
+            max_move_speed (float): MaxMoveSpeed move rule.
+
+        Returns:
+            None.
+        """
+        n = self.size
+        self.recent_travel_distance[:n] = (
+            self.recent_travel_distance[:n] + (self.distance_moved_this_timestep[:n] / max_move_speed)
+        ) / 2.0
+        self.distance_moved_this_timestep[:n] = 0.0
@@ -0,0 +1,596 @@
+import io
+import os
+import pickle
+import random
+import sys
+from typing import Optional
+import numpy as np
+from flee.SimulationSettings import SimulationSettings
+from flee import agentstore, moving, scheduler, spawning
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Binary checkpoint/restart.
+# A checkpoint is a single .npz file. The agents are stored as the columns of
+# an AgentStore (see AgentStore.export_columns), whichever agent storage the
+# Ecosystem uses. The remaining state (Ecosystem, Location and Link fields,
+# cohorts, spawning, InputGeography and the random number generators) is
+# pickled into the "state" array, with Ecosystem, Location and Link objects
+# stored as references. A checkpoint is restored into an Ecosystem that has
+# been set up from the same inputs, after which the simulation continues
+# exactly as it would have without interruption.
+# Parallel (pflee) checkpoints consist of one such .npz shard per MPI rank,
+# either as separate files (see shard_file_name) or concatenated in a single
+# container file (see CheckpointShards), and can be restored on a different
+# number of ranks (see pflee.Ecosystem.read_checkpoint).
+
+CHECKPOINT_VERSION = 1
+
+CONTAINER_MAGIC = b"FLEECKPT" # start of a single-file parallel checkpoint.
+
+# Ecosystem fields that are restored separately, or rebuilt on demand.
+ECOSYSTEM_SKIP = {
+    "locations", "agents", "cohorts", "graph", "closure_schedule", "capacity_growth",
+    "spawn_weights", "spawn_weight_buffer", "mpi",
+}
+
+# Location fields that are caches, rebuilt on demand, or belong to the Ecosystem.
+LOCATION_SKIP = {"routes", "route_cache", "path_tables", "path_dependents", "flood_forecast", "graph", "counted_attributes"}
+
+
+@check_args_type
+def use_checkpoints() -> bool:
+    """
+    Summary:
+        Returns whether periodic checkpoints are enabled in simsetting.yml.
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if checkpoints.interval is larger than 0.
+    """
+    return SimulationSettings.checkpoints.get("Interval", 0) > 0
+
+
+@check_args_type
+def checkpoint_due(time: int) -> bool:
+    """
+    Summary:
+        Returns whether a checkpoint should be written once the simulation has reached day <time>.
+
+    Args:
+        time (int): current day (Ecosystem.time, after evolve()).
+
+    Returns:
+        bool: True if a checkpoint is due.
+    """
+    return use_checkpoints() and time > 0 and time % SimulationSettings.checkpoints["Interval"] == 0
+
+
+@check_args_type
+def checkpoint_file_name(time: int) -> str:
+    """
+    Summary:
+        Returns the name of the checkpoint file of day <time> in checkpoints.directory.
+
+    Args:
+        time (int): day of the checkpoint.
+
+    Returns:
+        str: file name.
+    """
+    return os.path.join(SimulationSettings.checkpoints["Directory"], "checkpoint-{}.npz".format(time))
+
+
+@check_args_type
+def shard_file_name(file_name: str, rank: int) -> str:
+    """
+    Summary:
+        Returns the name of the shard of one MPI rank of a parallel checkpoint
+        (e.g. checkpoint-10.npz -> checkpoint-10-rank3.npz).
+
+    Args:
+        file_name (str): name of the checkpoint.
+        rank (int): MPI rank.
+
+    Returns:
+        str: file name of the shard.
+    """
+    base, extension = os.path.splitext(file_name)
+    return "{}-rank{}{}".format(base, rank, extension)
+
+
+def enumerate_links(e) -> list:
+    """
+    Summary:
+        Returns all Link objects of the Ecosystem (open and closed), in location order.
+
+    Args:
+        e (Ecosystem): ecosystem object.
+
+    Returns:
+        list: Link objects.
+    """
+    return [link for loc in e.locations for link in loc.links + loc.closed_links]
+
+
+class _StatePickler(pickle.Pickler):
+    """
+    Pickler that stores the Ecosystem, its Locations and its Links as references.
+    """
+
+    def __init__(self, file, e, links):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.ids = {id(e): ("e",)}
+        self.ids.update({id(loc): ("location", i) for i, loc in enumerate(e.locations)})
+        self.ids.update({id(link): ("link", k) for k, link in enumerate(links)})
+
+    def persistent_id(self, obj):
+        return self.ids.get(id(obj))
+
+
+class _StateUnpickler(pickle.Unpickler):
+    """
+    Unpickler that resolves the references of _StatePickler in a (new) Ecosystem.
+    """
+
+    def __init__(self, file, e, links):
+        super().__init__(file)
+        self.e = e
+        self.links = links
+
+    def persistent_load(self, pid):
+        if pid[0] == "e":
+            return self.e
+        if pid[0] == "location":
+            return self.e.locations[pid[1]]
+        return self.links[pid[1]]
+
+
+def _agents_as_store(e, person_class):
+    """
+    Returns Ecosystem.agents as an AgentStore (a copy, if the agents are a list).
+    """
+    if isinstance(e.agents, agentstore.AgentStore):
+        return e.agents
+    store = agentstore.AgentStore(e, person_class, capacity=len(e.agents))
+    for a in e.agents:
+        store.append(a)
+        if SimulationSettings.log_levels["agent"] > 1:
+            store.locations_visited[len(store) - 1] = a.locations_visited
+    return store
+
+
+def _person_from_store(store, i: int, person_class):
+    """
+    Returns agent <i> of an AgentStore as a Person object.
+    """
+    view = store.view(i)
+    a = person_class.__new__(person_class)
+    for name in ["location", "home_location", "travelling", "harvesting", "distance_travelled_on_link",
+                 "distance_moved_this_timestep", "recent_travel_distance", "timesteps_since_departure",
+                 "places_travelled", "days_in_current_location", "last_connection_update"]:
+        setattr(a, name, getattr(view, name))
+    if "e" in getattr(person_class, "__slots__", []):
+        a.e = store.e # pflee.Person.
+    a.attributes = dict(view.attributes.items())
+    a.route = list(view.route)
+    if SimulationSettings.log_levels["agent"] > 0:
+        a.distance_travelled = view.distance_travelled
+    if SimulationSettings.log_levels["agent"] > 1:
+        a.locations_visited = store.locations_visited.get(i, [])
+    return a
+
+
+def get_state(e, person_class, ig=None, links=None, shared=True, extra=None) -> dict:
+    """
+    Summary:
+        Collects the checkpoint state of an Ecosystem as arrays (see write_checkpoint).
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        person_class (type): the Person class of the Ecosystem.
+        ig (InputGeography, optional): input geography whose time stepping state is saved.
+        links (list, optional): Link objects to store the agents with (defaults to enumerate_links(e)).
+        shared (bool, optional): whether to include the state that is not specific to
+            the agents of this process (all of it, in serial runs).
+        extra (dict, optional): additional entries of the pickled state (pflee).
+
+    Returns:
+        dict: array name -> array.
+    """
+    if links is None:
+        links = enumerate_links(e)
+    columns, agent_state = _agents_as_store(e, person_class).export_columns({id(link): k for k, link in enumerate(links)})
+
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "agents": agent_state,
+    }
+    if shared:
+        state.update({
+            "ecosystem": {k: v for k, v in e.__dict__.items() if k not in ECOSYSTEM_SKIP},
+            "spawn_weights": e.spawn_weights.copy(),
+            "locations": [{k: v for k, v in loc.__dict__.items() if k not in LOCATION_SKIP} for loc in e.locations],
+            "links": [link.__dict__ for link in links],
+            "cohorts": None if e.cohorts is None else (e.cohorts.counts, e.cohorts.deactivated),
+            "spawning": spawning.get_spawning_state(),
+            "input_geography": None if ig is None else ig.GetCheckpointState(),
+        })
+    if extra is not None:
+        state.update(extra)
+    # Last, as type checking (FLEE_TYPE_CHECK) draws from the random module.
+    state["random"] = random.getstate()
+    state["numpy_random"] = np.random.get_state()
+    buffer = io.BytesIO()
+    _StatePickler(buffer, e, links).dump(state)
+
+    arrays = {"agent_" + name: column for name, column in columns.items()}
+    arrays["link_start"] = np.array([e.location_index[link.startpoint.name] for link in links], dtype=np.int32)
+    arrays["link_end"] = np.array([e.location_index[link.endpoint.name] for link in links], dtype=np.int32)
+    arrays["link_distance"] = np.array([link.get_distance() for link in links], dtype=np.float64)
+    arrays["state"] = np.frombuffer(buffer.getvalue(), dtype=np.uint8)
+    return arrays
+
+
+def match_links(e, arrays) -> list:
+    """
+    Summary:
+        Finds the Link objects of an Ecosystem that correspond to the links of a
+        checkpoint, by start location, end location and distance.
+
+    Args:
+        e (Ecosystem): ecosystem object, set up from the same inputs as the checkpoint.
+        arrays (dict): checkpoint arrays.
+
+    Returns:
+        list: Link objects, in checkpoint order.
+    """
+    link_start = np.asarray(arrays["link_start"])
+    link_end = np.asarray(arrays["link_end"])
+    if len(link_start) > 0 and max(link_start.max(), link_end.max()) >= len(e.locations):
+        print("ERROR: the checkpoint has more locations than the Ecosystem.", file=sys.stderr)
+        sys.exit()
+
+    candidates = {}
+    for link in enumerate_links(e):
+        key = (e.location_index[link.startpoint.name], e.location_index[link.endpoint.name], link.get_distance())
+        candidates.setdefault(key, []).append(link)
+
+    links = []
+    for start, end, distance in zip(link_start.tolist(), link_end.tolist(), np.asarray(arrays["link_distance"]).tolist()):
+        matches = candidates.get((start, end, distance), [])
+        if len(matches) == 0:
+            print("ERROR: the checkpoint contains a link from {} to {} which is not part of the Ecosystem.".format(
+                e.locations[start].name, e.locations[end].name), file=sys.stderr)
+            sys.exit()
+        links.append(matches.pop(0))
+    return links
+
+
+def load_state(e, arrays, links: list) -> dict:
+    """
+    Summary:
+        Unpickles the state of a checkpoint, resolving the Location and Link
+        references in Ecosystem e.
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        arrays (dict): checkpoint arrays.
+        links (list): Link objects, in checkpoint order (see match_links).
+
+    Returns:
+        dict: the unpickled state.
+    """
+    state = _StateUnpickler(io.BytesIO(np.asarray(arrays["state"]).tobytes()), e, links).load()
+    if state["version"] != CHECKPOINT_VERSION:
+        print("ERROR: checkpoint version {} is not supported (expected {}).".format(state["version"], CHECKPOINT_VERSION), file=sys.stderr)
+        sys.exit()
+    return state
+
+
+def agent_columns(arrays) -> dict:
+    """
+    Summary:
+        Returns the agent columns of a checkpoint (see AgentStore.export_columns).
+
+    Args:
+        arrays (dict): checkpoint arrays.
+
+    Returns:
+        dict: column name -> array.
+    """
+    return {name[len("agent_"):]: np.asarray(arrays[name]) for name in arrays if name.startswith("agent_")}
+
+
+def restore_shared_state(e, state: dict, links: list, ig=None) -> None:
+    """
+    Summary:
+        Restores the Ecosystem, Location and Link fields, cohorts, spawning and
+        InputGeography state of a checkpoint, and discards all derived caches.
+
+    Args:
+        e (Ecosystem): ecosystem object, set up from the same inputs as the checkpoint.
+        state (dict): unpickled checkpoint state.
+        links (list): Link objects, in checkpoint order (see match_links).
+        ig (InputGeography, optional): input geography whose time stepping state is restored.
+
+    Returns:
+        None.
+    """
+    if len(state["locations"]) != len(e.locations):
+        print("ERROR: the checkpoint has {} locations, the Ecosystem has {}.".format(len(state["locations"]), len(e.locations)), file=sys.stderr)
+        sys.exit()
+
+    e.__dict__.update(state["ecosystem"])
+    # spawn_weights is a view of spawn_weight_buffer (see spawning.add_spawn_location).
+    e.spawn_weights[:] = state["spawn_weights"]
+    for loc, fields in zip(e.locations, state["locations"]):
+        loc.__dict__.update(fields)
+        loc.routes = {}
+        loc.route_cache = {}
+        loc.path_tables = {}
+        loc.path_dependents = {}
+        loc.flood_forecast = None
+    for link, fields in zip(links, state["links"]):
+        link.__dict__.update(fields)
+
+    if e.cohorts is not None:
+        e.cohorts.counts, e.cohorts.deactivated = state["cohorts"]
+    spawning.set_spawning_state(state["spawning"])
+    if ig is not None:
+        ig.RestoreCheckpointState(e, state["input_geography"])
+
+    e.closure_schedule = scheduler.build_closure_schedule(e.closures)
+    e.capacity_growth = None
+    e.graph.invalidate()
+    moving.clearRouteCaches()
+
+
+def restore_random_state(state: dict) -> None:
+    """
+    Summary:
+        Restores the states of the random and numpy.random generators of a checkpoint.
+
+    Args:
+        state (dict): unpickled checkpoint state.
+
+    Returns:
+        None.
+    """
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy_random"])
+
+
+def set_state(e, arrays, person_class, ig=None) -> dict:
+    """
+    Summary:
+        Restores the state collected by get_state into an Ecosystem that has been
+        set up from the same inputs (locations, links and closures), except for
+        the random number generator states (see restore_random_state).
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        arrays (dict): checkpoint arrays.
+        person_class (type): the Person class of the Ecosystem.
+        ig (InputGeography, optional): input geography whose time stepping state is restored.
+
+    Returns:
+        dict: the unpickled state.
+    """
+    links = match_links(e, arrays)
+    state = load_state(e, arrays, links)
+    restore_shared_state(e, state, links, ig)
+    set_agents(e, agent_columns(arrays), state["agents"], person_class, links)
+    return state
+
+
+def merge_agent_columns(parts: list):
+    """
+    Summary:
+        Concatenates ranges of agents from several checkpoints (or shards), whose
+        attribute value tables differ, into one set of agent columns.
+
+    Args:
+        parts (list): (columns, agent state, start, stop) per range of agents.
+
+    Returns:
+        Tuple[dict, dict]: column name -> array, and the agent state (see AgentStore.export_columns).
+    """
+    names = []
+    values = {}
+    codes = {}
+    for _, agent_state, _, _ in parts:
+        for name, name_values in zip(agent_state["attribute_names"], agent_state["attribute_values"]):
+            if name not in values:
+                names.append(name)
+                values[name] = []
+                codes[name] = {}
+            for v in name_values:
+                if (type(v), v) not in codes[name]:
+                    codes[name][(type(v), v)] = len(values[name])
+                    values[name].append(v)
+
+    n = sum(stop - start for _, _, start, stop in parts)
+    columns = {
+        name: np.concatenate([np.zeros(0, dtype=dtype)] + [c[name][start:stop] for c, _, start, stop in parts])
+        for name, dtype, _ in agentstore.COLUMNS
+    }
+    columns["attribute_codes"] = np.full((len(names), n), agentstore.MISSING, dtype=np.int32)
+    state = {
+        "attribute_names": names,
+        "attribute_values": [values[name] for name in names],
+        "object_attributes": [{} for _ in names],
+        "routes": {},
+        "locations_visited": {},
+    }
+
+    offset = 0
+    for part_columns, agent_state, start, stop in parts:
+        for k, name in enumerate(agent_state["attribute_names"]):
+            j = names.index(name)
+            # Special codes (MISSING, OBJECT) are negative and kept as they are.
+            table = np.array([codes[name][(type(v), v)] for v in agent_state["attribute_values"][k]], dtype=np.int32)
+            part_codes = part_columns["attribute_codes"][k][start:stop]
+            if len(table) > 0:
+                part_codes = np.where(part_codes >= 0, table[np.maximum(part_codes, 0)], part_codes)
+            columns["attribute_codes"][j][offset:offset + stop - start] = part_codes
+            for i, v in agent_state["object_attributes"][k].items():
+                if start <= i < stop:
+                    state["object_attributes"][j][i - start + offset] = v
+        for key in ["routes", "locations_visited"]:
+            for i, v in agent_state[key].items():
+                if start <= i < stop:
+                    state[key][i - start + offset] = v
+        offset += stop - start
+    return columns, state
+
+
+def set_agents(e, columns: dict, agent_state: dict, person_class, links: list) -> None:
+    """
+    Summary:
+        Replaces the agents of an Ecosystem by checkpointed agent columns, in the
+        agent storage that the Ecosystem uses.
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        columns (dict): column name -> array (see AgentStore.export_columns).
+        agent_state (dict): agent state that is not stored in columns.
+        person_class (type): the Person class of the Ecosystem.
+        links (list): Link objects, indexed by the link column.
+
+    Returns:
+        None.
+    """
+    store = agentstore.AgentStore(e, person_class, capacity=len(columns["location"]))
+    store.import_columns(columns, agent_state, links)
+    if isinstance(e.agents, agentstore.AgentStore):
+        e.agents = store
+    else:
+        e.agents = [_person_from_store(store, i, person_class) for i in range(0, len(store))]
+
+
+@check_args_type
+def write_checkpoint(e, file_name: str, person_class, ig=None) -> None:
+    """
+    Summary:
+        Writes the state of a serial simulation to a checkpoint file. To be
+        called between time steps (after Ecosystem.evolve()).
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        file_name (str): name of the .npz file.
+        person_class (type): the Person class of the Ecosystem.
+        ig (InputGeography, optional): input geography whose time stepping state is saved.
+
+    Returns:
+        None.
+    """
+    directory = os.path.dirname(file_name)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    with open(file_name, "wb") as f:
+        np.savez(f, **get_state(e, person_class, ig))
+
+
+@check_args_type
+def read_checkpoint(e, file_name: str, person_class, ig=None) -> None:
+    """
+    Summary:
+        Restores a checkpoint written by write_checkpoint into an Ecosystem
+        that has been set up from the same inputs. The simulation continues
+        from day Ecosystem.time.
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        file_name (str): name of the .npz file.
+        person_class (type): the Person class of the Ecosystem.
+        ig (InputGeography, optional): input geography whose time stepping state is restored.
+
+    Returns:
+        None.
+    """
+    with np.load(file_name) as data:
+        arrays = {name: data[name] for name in data.files}
+    state = set_state(e, arrays, person_class, ig)
+    # Last, as type checking (FLEE_TYPE_CHECK) draws from the random module.
+    restore_random_state(state)
+
+
+@check_args_type
+def container_header(sizes: list) -> bytes:
+    """
+    Summary:
+        Returns the header of a single-file parallel checkpoint: CONTAINER_MAGIC,
+        followed by the number of shards and the size of each shard (int64). The
+        shards follow the header, in rank order.
+
+    Args:
+        sizes (list): size in bytes of each shard.
+
+    Returns:
+        bytes: header.
+    """
+    return CONTAINER_MAGIC + np.array([len(sizes)] + list(sizes), dtype="<i8").tobytes()
+
+
+class CheckpointShards:
+    """
+    The shards of a parallel checkpoint, stored in a single container file
+    (see container_header) or as one file per rank (see shard_file_name).
+    """
+
+    def __init__(self, file_name: str):
+        """
+        Summary:
+            Locates the shards of the checkpoint <file_name>.
+
+        Args:
+            file_name (str): name of the checkpoint.
+
+        Returns:
+            None.
+        """
+        self.file_name = file_name
+        self.extents = None # (offset, size) of each shard in the container file.
+        if os.path.isfile(file_name):
+            with open(file_name, "rb") as f:
+                if f.read(len(CONTAINER_MAGIC)) != CONTAINER_MAGIC:
+                    print("ERROR: {} is not a parallel checkpoint.".format(file_name), file=sys.stderr)
+                    sys.exit()
+                count = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+                sizes = np.frombuffer(f.read(8 * count), dtype="<i8")
+            offsets = len(CONTAINER_MAGIC) + 8 * (count + 1) + np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            self.extents = list(zip(offsets.tolist(), sizes.tolist()))
+        elif not os.path.isfile(shard_file_name(file_name, 0)):
+            print("ERROR: checkpoint {} not found.".format(file_name), file=sys.stderr)
+            sys.exit()
+
+    def load(self, shard: int, names: Optional[list] = None) -> dict:
+        """
+        Summary:
+            Reads (some of) the arrays of one shard.
+
+        Args:
+            shard (int): rank that wrote the shard.
+            names (list, optional): names of the arrays to read. Defaults to all arrays.
+
+        Returns:
+            dict: array name -> array.
+        """
+        if self.extents is None:
+            source = shard_file_name(self.file_name, shard)
+        else:
+            offset, size = self.extents[shard]
+            with open(self.file_name, "rb") as f:
+                f.seek(offset)
+                source = io.BytesIO(f.read(size))
+        with np.load(source) as data:
+            if names is None:
+                names = data.files
+            return {name: data[name] for name in names}
@@ -0,0 +1,330 @@
+import os
+import sys
+import numpy as np
+from flee.SimulationSettings import SimulationSettings
+from flee import moving, demographics
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Cohort (aggregated-agent) simulation mode.
+# Enabled with optimisations.cohorts: True in simsetting.yml. Agents that reside
+# in a location without a planned route are statistically interchangeable, and
+# are stored as a count per cohort: (location index, travel state, attributes).
+# Each time step, binomial draws decide how many agents of a cohort leave, and a
+# multinomial draw distributes them over the candidate routes. Only agents in
+# transit exist as Person objects (in Ecosystem.agents); they are merged back
+# into a cohort once they come to a stop.
+
+
+@check_args_type
+def use_cohorts() -> bool:
+    """
+    Summary:
+        Returns whether cohort mode is enabled in simsetting.yml.
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if resident agents should be stored as cohorts.
+    """
+    return SimulationSettings.optimisations.get("Cohorts", False) is True
+
+
+@check_args_type
+def check_cohort_settings() -> None:
+    """
+    Summary:
+        Exits with an error if a setting is enabled that needs the individual
+        state of resident agents, which cohorts do not keep.
+
+    Args:
+        None.
+
+    Returns:
+        None.
+    """
+    if SimulationSettings.farming:
+        print("ERROR in simulationsetting.yml: optimisations.cohorts can not be combined with farming.", file=sys.stderr)
+        sys.exit()
+    if SimulationSettings.move_rules["TwoSystemDecisionMaking"] is True:
+        print("ERROR in simulationsetting.yml: optimisations.cohorts can not be combined with move_rules.two_system_decision_making.", file=sys.stderr)
+        sys.exit()
+    if SimulationSettings.log_levels["agent"] > 0:
+        print("ERROR in simulationsetting.yml: optimisations.cohorts can not be combined with log_levels.agent > 0.", file=sys.stderr)
+        sys.exit()
+    if SimulationSettings.move_rules["AvoidShortStints"]:
+        # Agents that leave a cohort would start with recent_travel_distance 0.
+        print("ERROR in simulationsetting.yml: optimisations.cohorts can not be combined with move_rules.avoid_short_stints.", file=sys.stderr)
+        sys.exit()
+
+
+def attribute_key(attributes: dict):
+    """
+    Summary:
+        Returns a hashable key for a dictionary of agent attributes.
+
+    Args:
+        attributes (dict): agent attributes.
+
+    Returns:
+        tuple: sorted (name, value) pairs, or None if a value is unhashable.
+    """
+    key = tuple(sorted(attributes.items()))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class CohortStore:
+    """
+    Counts of indistinguishable resident agents, per (location index,
+    travel state, attribute key). The travel state is True for agents that
+    have travelled before, which StartOnFoot depends on.
+    """
+
+    def __init__(self, e, person_class):
+        """
+        Summary:
+            Creates an empty cohort store.
+
+        Args:
+            e (Ecosystem): the Ecosystem that owns the cohorts.
+            person_class (type): the Person class of the Ecosystem.
+
+        Returns:
+            None.
+        """
+        self.e = e
+        self.person_class = person_class
+        self.counts = {} # (location index, travelled, attribute key) -> number of agents.
+        self.deactivated = 0 # agents removed by camps_are_sinks (still counted, as in the default mode).
+        self.__location_ids = {}
+
+
+    def __len__(self):
+        """
+        Returns the number of distinct cohorts.
+        """
+        return len(self.counts)
+
+
+    @check_args_type
+    def total(self) -> int:
+        """
+        Summary:
+            Returns the number of agents represented by the cohorts.
+
+        Args:
+            None.
+
+        Returns:
+            int: number of agents.
+        """
+        return sum(self.counts.values()) + self.deactivated
+
+
+    def location_index(self, loc) -> int:
+        """
+        Summary:
+            Returns the index of a Location in Ecosystem.locations.
+
+        Args:
+            loc (Location): location.
+
+        Returns:
+            int: index in Ecosystem.locations.
+        """
+        i = self.__location_ids.get(id(loc))
+        if i is None:
+            self.__location_ids = {id(l): j for j, l in enumerate(self.e.locations)}
+            i = self.__location_ids[id(loc)]
+        return i
+
+
+    def _add(self, key, number: int) -> None:
+        self.counts[key] = self.counts.get(key, 0) + number
+
+
+    def _remove(self, key, number: int) -> None:
+        self.counts[key] -= number
+        if self.counts[key] == 0:
+            del self.counts[key]
+
+
+    @check_args_type
+    def add(self, location, attributes: dict, number: int = 1) -> None:
+        """
+        Summary:
+            Adds <number> new agents to the cohort of <location>. Mirrors
+            Person.__init__: the agents are counted in the location, and
+            receive a farmer attribute if the location has a farmer_fraction.
+
+        Args:
+            location (Location): location of the new agents.
+            attributes (dict): attributes of the new agents.
+            number (int, optional): number of agents. Defaults to 1.
+
+        Returns:
+            None.
+        """
+        if number < 1:
+            return
+        attributes = {"connections": 0} | attributes
+        i = self.location_index(location)
+        location.IncrementNumAgents(None, number)
+        demographics.count_agents(location, attributes, number)
+
+        if "farmer_fraction" in location.attributes:
+            farmers = np.random.binomial(number, float(location.attributes["farmer_fraction"]))
+            for farmer, n in [(1, farmers), (0, number - farmers)]:
+                if n > 0:
+                    self._add((i, False, attribute_key(attributes | {"farmer": farmer})), n)
+            return
+
+        key = attribute_key(attributes)
+        if key is None:
+            print("ERROR: agent attributes {} can not be stored in a cohort.".format(attributes), file=sys.stderr)
+            sys.exit()
+        self._add((i, False, key), number)
+
+
+    def _create_person(self, location, travelled: bool, attributes: dict, route: list):
+        """
+        Summary:
+            Creates a Person for an agent that leaves its cohort. The agent
+            is already counted in <location>, so numAgents is not changed.
+        """
+        a = self.person_class(location=None, attributes=attributes)
+        a.location = location
+        a.home_location = location
+        if travelled:
+            a.places_travelled = 2
+        a.route = list(route)
+        return a
+
+
+    @check_args_type
+    def evolve(self, time: int) -> None:
+        """
+        Summary:
+            Draws the number of leaving agents of each cohort (binomial, using the
+            location move chance of moving.calculateLocationMoveChances), distributes
+            them over the candidate routes (multinomial, see moving.selectRouteCounts),
+            and turns them into Person objects that start travelling.
+
+        Args:
+            time (int): current time step.
+
+        Returns:
+            None.
+        """
+        movechances, forecasts = moving.calculateLocationMoveChances(self.e, time)
+
+        for key, count in list(self.counts.items()):
+            i, travelled, attributes = key
+            p = movechances[i]
+            if forecasts is not None:
+                awareness_weights = SimulationSettings.move_rules["FloodAwarenessWeights"]
+                p *= forecasts[i] * float(awareness_weights[int(dict(attributes)["floodawareness"])])
+
+            movers = np.random.binomial(count, min(max(p, 0.0), 1.0))
+            if movers == 0:
+                continue
+
+            location = self.e.locations[i]
+            attributes = dict(attributes)
+            representative = self.person_class(location=None, attributes=attributes)
+            representative.location = location
+            if travelled:
+                representative.places_travelled = 2
+
+            for route, n in moving.selectRouteCounts(representative, time, movers):
+                self._remove(key, n)
+                for _ in range(0, n):
+                    self.e.agents.append(self._create_person(location, travelled, attributes, route))
+                    self.e.agents[-1].move(self.e, time=time)
+
+
+    @check_args_type
+    def absorb(self) -> None:
+        """
+        Summary:
+            Merges the agents in Ecosystem.agents that reside in a location
+            without a planned route back into their cohorts.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+        keep = []
+        for a in self.e.agents:
+            if a.location is None or a.travelling or a.harvesting or len(a.route) > 0:
+                keep.append(True)
+                continue
+            # Social connectivity is only used by TwoSystemDecisionMaking, and is not kept per cohort.
+            key = attribute_key(dict(a.attributes) | {"connections": 0})
+            if key is None:
+                keep.append(True)
+                continue
+            # The agent is already counted in its location.
+            self._add((self.location_index(a.location), a.places_travelled > 1, key), 1)
+            keep.append(False)
+
+        if all(keep):
+            return
+        if isinstance(self.e.agents, list):
+            self.e.agents = [a for a, k in zip(self.e.agents, keep) if k]
+        else:
+            self.e.agents.retain(keep)
+
+
+    @check_args_type
+    def deactivate_in_camps(self) -> None:
+        """
+        Summary:
+            Cohort version of spawn_rules.camps_are_sinks: removes agents in camps
+            with the deactivation_probability of the camp (binomial draw).
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+        for key, count in list(self.counts.items()):
+            location = self.e.locations[key[0]]
+            if location.camp == True:
+                n = np.random.binomial(count, float(location.attributes.get("deactivation_probability", 0.0)))
+                if n > 0:
+                    self._remove(key, n)
+                    self.deactivated += n
+                    demographics.count_agents(location, dict(key[2]), -n)
+
+
+    @check_args_type
+    def clear_locations(self, location_indices: set) -> None:
+        """
+        Summary:
+            Removes all cohorts in the given locations (see Ecosystem.clearLocationsFromAgents).
+
+        Args:
+            location_indices (set): indices of the locations to clear.
+
+        Returns:
+            None.
+        """
+        for key, count in list(self.counts.items()):
+            if key[0] in location_indices:
+                self.e.locations[key[0]].numAgents -= count
+                demographics.count_agents(self.e.locations[key[0]], dict(key[2]), -count)
+                del self.counts[key]
+
@@ -5,6 +5,7 @@ import random
 import flee.lib_math as lm
 from beartype.typing import List, Optional, Tuple
 from flee.SimulationSettings import SimulationSettings
+import flee.topology as topology
 
 
 if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
@@ -172,6 +173,36 @@ def calculateLocCrawlLinkWeight(
                     )
 
 
+@check_args_type
+def addPathTableLocationRoutes(l, time: int) -> None:
+  """
+  Summary:
+      Equivalent of calling calculateLocCrawlLinkWeight for every link of a location,
+      using its precomputed paths (see flee/topology.py).
+
+  Args:
+      l: Location
+      time (int): Current time
+
+  Returns:
+      None (routes are stored in l.routes)
+  """
+  table = topology.getPathTable(l, "crawl")
+  denominators = table.getDistanceDenominators().tolist()
+  scores = {}
+
+  for k in range(0, len(table)):
+      link = table.links[k]
+      e = int(table.endpoint_index[k])
+      if e not in scores:
+          scores[e] = float(SimulationSettings.move_rules["WeightSoftening"] + (float(getLocationCrawlEndPointScore(link=link, time=time))))
+
+      weight = (scores[e] / denominators[k])**SimulationSettings.move_rules["WeightPower"]
+
+      if weight > l.routes.get(link.endpoint.name, [0,None])[0]:
+          l.routes[link.endpoint.name] = [weight, table.getRoute(k), link.endpoint]
+
+
 @check_args_type
 def insertMajorRoutesForLocation(
   source_loc, 
@@ -267,16 +298,19 @@ def generateLocationRoutes(l, time: int, debug: bool = False):
     linklen = len(l.links)
     return [np.random.randint(0, linklen)]
 
-  for k, e in enumerate(l.links):
-    calculateLocCrawlLinkWeight(
-         l,
-         l,
-         link=e,
-         prior_distance=0.0,
-         origin_names=[l.name],
-         step=1,
-         time=time,
-    )
+  if topology.use_path_tables():
+    addPathTableLocationRoutes(l, time)
+  else:
+    for k, e in enumerate(l.links):
+      calculateLocCrawlLinkWeight(
+           l,
+           l,
+           link=e,
+           prior_distance=0.0,
+           origin_names=[l.name],
+           step=1,
+           time=time,
+      )
 
   insertAllMajorRoutesAtLocation(l, time)
 
@@ -2,7 +2,7 @@ import csv
 import os
 import sys
 from datetime import datetime, timedelta
-from functools import wraps
+from functools import lru_cache, wraps
 
 import numpy as np
 
@@ -18,6 +18,15 @@ else:
         return wrapper
 
 
+@lru_cache(maxsize=4096)
+def _parse_date(date: str) -> datetime:
+    """
+    Parses a date in %Y-%m-%d format. Validation data files mostly share the
+    same dates, so parsed dates are cached.
+    """
+    return datetime.strptime(date, "%Y-%m-%d")
+
+
 @check_args_type
 def subtract_dates(date1: str, date2: str) -> int:
     """
@@ -30,10 +39,7 @@ def subtract_dates(date1: str, date2: str) -> int:
     Returns:
         int: Description
     """
-    date_format = "%Y-%m-%d"
-    a = datetime.strptime(date1, date_format)
-    b = datetime.strptime(date2, date_format)
-    delta = a - b
+    delta = _parse_date(date1) - _parse_date(date2)
     # print(date1,"-",date2,"=",delta.days)
     return delta.days
 
@@ -83,35 +89,51 @@ def _processEntry(
     Returns:
         np.ndarray: Description
     """
-    if len(row) < 2:
+    entry = _parseEntry(
+        row=row,
+        data_type=data_type,
+        date_column=date_column,
+        count_column=count_column,
+        start_date=start_date,
+        population_scaledown_factor=population_scaledown_factor,
+    )
+    if entry is None:
         return table
 
+    return np.vstack([table, entry])
+
+
+def _parseEntry(
+    row: list,
+    data_type: str,
+    date_column: int,
+    count_column: int,
+    start_date: str,
+    population_scaledown_factor: int = 1,
+):
+    """
+    Parses a population count from a CSV file row (see _processEntry).
+
+    Returns:
+        list: [day offset, count], or None if the row has no entry.
+    """
+    if len(row) < 2:
+        return None
+
     if row[0][0] == "#":
-        return table
+        return None
 
     if row[1] == "":
-        return table
+        return None
 
     # Make sure the date column becomes an integer, which contains the offset
     # in days relative to the start date.
     row[date_column] = subtract_dates(date1=row[date_column], date2=start_date)
 
     if data_type == "int":
-        table = np.vstack(
-            [table, [int(row[date_column]), int(row[count_column]) / population_scaledown_factor]]
-        )
-    else:
-        table = np.vstack(
-            [
-                table,
-                [
-                    float(row[date_column]),
-                    float(row[count_column]) / float(population_scaledown_factor),
-                ],
-            ]
-        )
+        return [int(row[date_column]), int(row[count_column]) / population_scaledown_factor]
 
-    return table
+    return [float(row[date_column]), float(row[count_column]) / float(population_scaledown_factor)]
 
 
 @check_args_type
@@ -127,7 +149,7 @@ def AddCSVTables(table1: np.ndarray, table2: np.ndarray) -> np.ndarray:
     Returns:
         np.ndarray: Description
     """
-    table = np.zeros([0, 2])
+    entries = []
 
     offset = 0
     last_c2 = np.zeros(([1, 2]))
@@ -136,7 +158,7 @@ def AddCSVTables(table1: np.ndarray, table2: np.ndarray) -> np.ndarray:
         # If table 2 date value is higher, then keep adding entries from table
         # 1
         while c2[0] > table1[offset][0]:
-            table = np.vstack([table, [table1[offset][0], last_c2[1] + table1[offset][1]]])
+            entries.append([table1[offset][0], last_c2[1] + table1[offset][1]])
             if offset < len(table1) - 1:
                 offset += 1
             else:
@@ -144,7 +166,7 @@ def AddCSVTables(table1: np.ndarray, table2: np.ndarray) -> np.ndarray:
 
         # If the two match, add a total.
         if c2[0] == table1[offset][0]:
-            table = np.vstack([table, [c2[0], c2[1] + table1[offset][1]]])
+            entries.append([c2[0], c2[1] + table1[offset][1]])
             if offset < len(table1) - 1:
                 offset += 1
             last_c2 = c2
@@ -153,11 +175,11 @@ def AddCSVTables(table1: np.ndarray, table2: np.ndarray) -> np.ndarray:
         # If table 1 value is higher, add an aggregate entry, and go to the
         # next iteration without increasing the offset.
         if c2[0] < table1[offset][0]:
-            table = np.vstack([table, [c2[0], c2[1] + table1[offset][1]]])
+            entries.append([c2[0], c2[1] + table1[offset][1]])
             last_c2 = c2
             continue
 
-    return table
+    return _entriesToTable(entries)
 
 
 @check_args_type
@@ -178,7 +200,7 @@ def ConvertCsvFileToNumPyTable(
     - subtract_dates is used on column 0.
     - Use # sign to comment out lines. (first line is NOT ignored by default)
     """
-    table = np.zeros([0, 2])
+    entries = []
 
     with open(csv_name, newline="", encoding="utf_8") as csvfile:
         values = csv.reader(csvfile)
@@ -187,28 +209,39 @@ def ConvertCsvFileToNumPyTable(
 
         if len(row) > 1:
             if len(row[0]) > 0 and row[0] not in ["DateTime", "Date"]:
-                table = _processEntry(
+                entries.append(
+                    _parseEntry(
+                        row=row,
+                        data_type=data_type,
+                        date_column=date_column,
+                        count_column=count_column,
+                        start_date=start_date,
+                        population_scaledown_factor=population_scaledown_factor,
+                    )
+                )
+
+        for row in values:
+            entries.append(
+                _parseEntry(
                     row=row,
-                    table=table,
                     data_type=data_type,
                     date_column=date_column,
                     count_column=count_column,
                     start_date=start_date,
                     population_scaledown_factor=population_scaledown_factor,
                 )
-
-        for row in values:
-            table = _processEntry(
-                row=row,
-                table=table,
-                data_type=data_type,
-                date_column=date_column,
-                count_column=count_column,
-                start_date=start_date,
-                population_scaledown_factor=population_scaledown_factor,
             )
 
-    return table
+    return _entriesToTable([entry for entry in entries if entry is not None])
+
+
+def _entriesToTable(entries: list) -> np.ndarray:
+    """
+    Converts a list of [day, count] entries to an Nx2 table.
+    """
+    if len(entries) == 0:
+        return np.zeros([0, 2])
+    return np.array(entries, dtype=np.float64)
 
 
 class DataTable:
@@ -229,23 +262,12 @@ class DataTable:
         """
         read in CSV data files containing refugee data.
         """
-        self.total_refugee_column = 1
-        self.days_column = 0
-        self.header = []
-        self.data_table = []
-        self.start_date = start_date
-        # Use modified input data for FLEE simulations
-        self.override_refugee_input = False
-        self.override_refugee_input_file = ""
-        self.data_directory = data_directory
-        self.population_scaledown_factor = population_scaledown_factor
-        self.day0pops = {}
-        # if set to 1, then all files are corrected such that existing refugees
-        # on Day 0 are left out of the simulation and the validation data.
-        if start_empty is False:
-            self.start_empty = 0
-        else:
-            self.start_empty = 1
+        self._init_fields(
+            data_directory=data_directory,
+            start_date=start_date,
+            population_scaledown_factor=population_scaledown_factor,
+            start_empty=start_empty,
+        )
 
         with open(
             os.path.join(data_directory, data_layout), newline="", encoding="utf-8"
@@ -281,6 +303,176 @@ class DataTable:
 
         # print(self.header, self.data_table)
 
+        self.update_dense_tables()
+
+    @classmethod
+    def from_tables(
+        cls,
+        header: list,
+        data_table: list,
+        start_date: str = "2012-02-29",
+        population_scaledown_factor: int = 1,
+        start_empty: bool = False,
+        data_directory: str = "",
+    ):
+        """
+        Creates a data table from tables that have already been read, e.g. from
+        a compiled input bundle (see flee/inputbundle.py), without reading any CSV files.
+
+        Args:
+            header (list): column names.
+            data_table (list): per column, an Nx2 array of (day, count) entries.
+            start_date (str, optional): Description
+            population_scaledown_factor (int, optional): Description
+            start_empty (bool, optional): Description
+            data_directory (str, optional): Description
+
+        Returns:
+            DataTable: the data table.
+        """
+        table = cls.__new__(cls)
+        table._init_fields(
+            data_directory=data_directory,
+            start_date=start_date,
+            population_scaledown_factor=population_scaledown_factor,
+            start_empty=start_empty,
+        )
+        table.header = list(header)
+        table.data_table = list(data_table)
+        table.update_dense_tables()
+        return table
+
+    def _init_fields(
+        self,
+        data_directory: str,
+        start_date: str,
+        population_scaledown_factor: int,
+        start_empty: bool,
+    ) -> None:
+        """
+        Sets the fields of an empty data table.
+        """
+        self.total_refugee_column = 1
+        self.days_column = 0
+        self.header = []
+        self.data_table = []
+        self.start_date = start_date
+        # Use modified input data for FLEE simulations
+        self.override_refugee_input = False
+        self.override_refugee_input_file = ""
+        self.data_directory = data_directory
+        self.population_scaledown_factor = population_scaledown_factor
+        self.day0pops = {}
+        # if set to 1, then all files are corrected such that existing refugees
+        # on Day 0 are left out of the simulation and the validation data.
+        if start_empty is False:
+            self.start_empty = 0
+        else:
+            self.start_empty = 1
+
+        # Dense tables (see update_dense_tables).
+        self.header_index = {}
+        self.num_days = 0
+        self.dense_interpolated = np.zeros([0, 0], dtype=np.int64)
+        self.dense_raw = np.zeros([0, 0], dtype=np.int64)
+        self.dense_measured = np.zeros([0, 0], dtype=bool)
+        self.dense_columns = np.zeros(0, dtype=bool)
+        self.dense_camp_totals = np.zeros([2, 0], dtype=np.int64)
+        self.dense_camps = False
+
+    def update_dense_tables(self) -> None:
+        """
+        Precomputes, for every column and every day from 0 until after the last
+        data entry, the interpolated and raw values (see get_interpolated_data
+        and get_raw_data) and whether the day has a data entry, as well as the
+        header -> column index. Values for later days equal those of the last
+        day. To be called after the header or data_table has been changed.
+        """
+        self.header_index = {}
+        for i, name in enumerate(self.header):
+            self.header_index.setdefault(name, i)
+
+        last_day = 0
+        for table in self.data_table:
+            if len(table) > 0:
+                last_day = max(last_day, int(np.max(table[:, 0])))
+        self.num_days = last_day + 2
+
+        columns = len(self.data_table)
+        self.dense_interpolated = np.zeros([columns, self.num_days], dtype=np.int64)
+        self.dense_raw = np.zeros([columns, self.num_days], dtype=np.int64)
+        self.dense_measured = np.zeros([columns, self.num_days], dtype=bool)
+        self.dense_columns = np.zeros(columns, dtype=bool)
+        for i in range(0, columns):
+            self._fill_dense_column(i)
+        self._update_dense_totals()
+
+    def update_dense_column(self, column: int) -> None:
+        """
+        Recomputes the dense values of a column after its data table has been
+        changed (without adding entries after the last day, see update_dense_tables).
+
+        Args:
+            column (int): Description
+        """
+        self._fill_dense_column(column)
+        self._update_dense_totals()
+
+    def _fill_dense_column(self, column: int) -> None:
+        """
+        Computes the dense values of a column. Columns with entries that are
+        not in chronological order are left to the linear search of
+        get_interpolated_data, get_raw_data and is_interpolated.
+        """
+        table = self.data_table[column]
+        self.dense_measured[column] = False
+        self.dense_columns[column] = len(table) > 0 and bool(np.all(np.diff(table[:, 0]) >= 0))
+        if not self.dense_columns[column]:
+            return
+
+        days = table[:, 0]
+        counts = table[:, 1]
+        x = np.arange(0, self.num_days)
+        # Index of the first entry after day x.
+        following = np.searchsorted(days, x, side="right")
+
+        if len(days) == 1:
+            interpolated = np.full(self.num_days, counts[0])
+        else:
+            k = np.clip(following, 1, len(days) - 1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                fraction = (x - days[k - 1]) / (days[k] - days[k - 1])
+                interpolated = counts[k - 1] + fraction * (counts[k] - counts[k - 1])
+            interpolated = np.where(following >= len(days), counts[-1], interpolated)
+            interpolated = np.where(x <= days[0], counts[0], interpolated)
+        self.dense_interpolated[column] = np.trunc(interpolated)
+
+        self.dense_raw[column] = np.trunc(counts[np.maximum(following - 1, 0)])
+
+        entry_days = days.astype(np.int64)
+        entry_days = entry_days[(entry_days >= 0) & (entry_days < self.num_days)]
+        self.dense_measured[column, entry_days] = True
+
+    def _update_dense_totals(self) -> None:
+        """
+        Sums the dense values of all columns after the first (the camps, see get_daily_difference).
+        """
+        self.dense_camps = bool(np.all(self.dense_columns[1:]))
+        self.dense_camp_totals = np.array(
+            [self.dense_raw[1:].sum(axis=0), self.dense_interpolated[1:].sum(axis=0)], dtype=np.int64
+        ).reshape(2, self.num_days)
+
+    def _dense_day(self, column: int, day: int) -> int:
+        """
+        Returns the index of <day> in the dense values of <column>, or -1 if the
+        value has to be looked up in the data table.
+        """
+        if day < 0 or not self.dense_columns[column]:
+            return -1
+        if self.total_refugee_column != 1 or self.days_column != 0:
+            return -1
+        return min(day, self.num_days - 1)
+
     @check_args_type
     def override_input(self, data_file_name: str) -> None:
         """
@@ -301,6 +493,7 @@ class DataTable:
                 population_scaledown_factor=self.population_scaledown_factor,
             )
         )
+        self.update_dense_tables()
 
     @check_args_type
     def get_daily_difference(
@@ -376,7 +569,11 @@ class DataTable:
         else:
 
             new_refugees = 0
-            if SumFromCamps is True:
+            if SumFromCamps is True and day > 0 and self.dense_camps and self.total_refugee_column == 1 and self.days_column == 0:
+                # The day 0 offsets of get_field cancel out in the differences.
+                totals = self.dense_camp_totals[1 if FullInterpolation else 0]
+                new_refugees = int(totals[min(day, self.num_days - 1)] - totals[min(day - 1, self.num_days - 1)])
+            elif SumFromCamps is True:
                 for i in self.header[1:]:
                     new_refugees += self.get_field(
                         name=i, day=day, FullInterpolation=FullInterpolation
@@ -415,6 +612,15 @@ class DataTable:
         Returns:
             int: Description
         """
+        i = self._dense_day(column, day)
+        if i >= 0:
+            return int(self.dense_interpolated[column, i])
+        return self._scan_interpolated_data(column, day)
+
+    def _scan_interpolated_data(self, column: int, day: int) -> int:
+        """
+        Computes the interpolated value of get_interpolated_data from the data table.
+        """
         ref_table = self.data_table[column]
 
         old_val = None
@@ -468,6 +674,9 @@ class DataTable:
         Returns:
             int: Description
         """
+        i = self._dense_day(column, day)
+        if i >= 0:
+            return int(self.dense_raw[column, i])
 
         ref_table = self.data_table[column]
 
@@ -493,6 +702,10 @@ class DataTable:
         Returns:
             int: Description
         """
+        i = self.header_index.get(name, -1)
+        if i >= 0:
+            return i
+
         for i in range(0, len(self.header)):
             if self.header[i] == name:
                 return i
@@ -513,7 +726,15 @@ class DataTable:
         Returns:
             int: Description
         """
-        i = self._find_headerindex(name=name)
+        i = self.header_index.get(name, -1)
+        if i < 0:
+            i = self._find_headerindex(name=name)
+
+        j = self._dense_day(i, day)
+        if j >= 0:
+            if FullInterpolation:
+                return int(self.dense_interpolated[i, j]) - (self.day0pops.get(name,0) * self.start_empty)
+            return int(self.dense_raw[i, j]) - (self.day0pops.get(name,0) * self.start_empty)
 
         if FullInterpolation:
             # print(name, day, self.day0pops.get(name,0), self.start_empty, file=sys.stderr)
@@ -545,6 +766,12 @@ class DataTable:
         Returns:
             bool: Description
         """
+        i = self.header_index.get(name, -1)
+        if i >= 0:
+            j = self._dense_day(i, int(day))
+            if j >= 0:
+                return not self.dense_measured[i, j]
+
         for i in range(0, len(self.header)):
             if self.header[i] == name:
                 ref_table = self.data_table[i]
@@ -4,8 +4,10 @@ import sys
 import os     
 import pandas as pd
 import glob
+from collections import Counter
 
 __demographics = {}
+__demographics_cdfs = {} # attribute -> (list of values, {location name or "Default": cumulative distribution}).
 
 
 def get_attribute_ratio(location, attr_name):
@@ -63,6 +65,39 @@ def _read_demographic_csv(e, csvname):
   print("INFO: ", attribute, " attributes loaded, with columns:", df.columns, file=sys.stderr)
 
   __demographics[attribute] = df
+  if attribute not in df.columns:
+      print(f"WARNING: {csvname} has no column named {attribute}, so this attribute will not be assigned to agents.", file=sys.stderr)
+      return
+  __demographics_cdfs[attribute] = _compile_cdfs(df, attribute)
+
+
+def _compile_cdfs(df, attribute):
+  """
+  Summary:
+        Compiles a demographics table into a cumulative distribution array
+        per location column (and for the Default column).
+        Columns without positive weights are skipped, so that the
+        Default distribution is used for those locations.
+
+  Args:
+        df (DataFrame): table read from demographics_<attribute>.csv.
+        attribute (str): Attribute name.
+
+  Returns:
+        Tuple[list, dict]: attribute values, and cumulative distribution per column name.
+  """
+  values = df[attribute].to_list()
+  cdfs = {}
+  for column in df.columns:
+      if column == attribute:
+          continue
+      weights = pd.to_numeric(df[column], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+      total = weights.sum()
+      if total <= 0.0 or (weights < 0.0).any():
+          continue
+      cdfs[column] = np.cumsum(weights) / total
+
+  return values, cdfs
 
 
 def get_attribute_values(attribute):
@@ -116,17 +151,34 @@ def _draw_sample(e, loc, attribute):
   Returns:
       float: Sample from the attribute distribution.
   """
-  #print(__demographics[attribute], file=sys.stderr)
-  #print(__demographics[attribute].iloc[0]['Default'], file=sys.stderr)
-  if attribute in __demographics:
-    if loc.name in __demographics[attribute].columns:
-      a = __demographics[attribute].sample(n=1,weights=loc.name)
-    else:
-      a = __demographics[attribute].sample(n=1,weights='Default')
-  else:
+  if attribute not in __demographics_cdfs:
     return -1
 
-  return a.iloc[0][attribute]
+  return __demographics_cdfs[attribute][0][_draw_codes(loc, attribute, 1)[0]]
+
+
+def _draw_codes(loc, attribute, n):
+  """
+  Summary:
+      Draw n samples from the attribute distribution for a location,
+      by inverse transform sampling on the precompiled cumulative distribution.
+
+  Args:
+      loc (Location): Location object
+      attribute (str): Attribute name
+      n (int): Number of samples
+
+  Returns:
+      np.ndarray: indices of the sampled values in the attribute value list.
+  """
+  values, cdfs = __demographics_cdfs[attribute]
+  cdf = cdfs.get(loc.name, cdfs.get("Default"))
+  if cdf is None:
+    print(f"ERROR: demographics_{attribute}.csv has no valid weights for location {loc.name}, and no valid Default column.", file=sys.stderr)
+    sys.exit()
+
+  codes = np.searchsorted(cdf, np.random.random(n), side="right")
+  return np.minimum(codes, len(values) - 1)
 
 
 def draw_samples(e,loc):
@@ -142,55 +194,163 @@ def draw_samples(e,loc):
         Dict: Dictionary of attribute names and values.
     """
     samples = {}
-    for a in __demographics.keys():
+    for a in __demographics_cdfs.keys():
         samples[a] = _draw_sample(e, loc, a)
     return samples
 
 
-def update_locations_demographic_attributes(e, parallel_mode=False):
-    #Gather and sum all scores and copy them to location attribute values
+def draw_samples_batch(e, loc, n):
+    """
+    Summary:
+        Draw samples from all optional attributes for n agents at once.
+
+    Args:
+        e (Ecosystem): Ecosystem object
+        loc (Location): Location object
+        n (int): Number of agents
+
+    Returns:
+        Dict: Dictionary of attribute names and coded values (np.ndarray of
+        indices in the attribute value list, see decode_samples).
+    """
+    columns = {}
+    for a in __demographics_cdfs.keys():
+        columns[a] = _draw_codes(loc, a, n)
+    return columns
+
+
+def decode_columns(columns):
+    """
+    Summary:
+        Converts coded attribute columns (see draw_samples_batch) into
+        columns of attribute values.
+
+    Args:
+        columns (Dict): Dictionary of attribute names and coded values.
+
+    Returns:
+        Dict: Dictionary of attribute names and lists of values.
+    """
+    decoded = {}
+    for a, codes in columns.items():
+        values = np.empty(len(__demographics_cdfs[a][0]), dtype=object)
+        values[:] = __demographics_cdfs[a][0]
+        decoded[a] = values[codes].tolist()
+    return decoded
+
+
+def decode_samples(columns, n):
+    """
+    Summary:
+        Converts coded attribute columns (see draw_samples_batch) into one
+        attribute dictionary per agent, as returned by draw_samples.
+
+    Args:
+        columns (Dict): Dictionary of attribute names and coded values.
+        n (int): Number of agents
+
+    Returns:
+        List[Dict]: Dictionary of attribute names and values, per agent.
+    """
+    samples = [{} for _ in range(0, n)]
+    for a, values in decode_columns(columns).items():
+        for sample, value in zip(samples, values):
+            sample[a] = value
+    return samples
 
-    if parallel_mode:
+
+def count_agents(location, attributes, number=1):
+    """
+    Summary:
+        Adds <number> agents with the given attributes to the demographic
+        counts of a location, for the attributes in location.counted_attributes
+        (see Ecosystem.addLocation). A negative <number> removes agents.
+
+    Args:
+        location (Location): Location object
+        attributes (dict): attributes of the agents.
+        number (int, optional): number of agents. Defaults to 1.
+
+    Returns:
+        None.
+    """
+    counts = location.demographic_counts
+    for attribute_name in location.counted_attributes:
+        value = attributes[attribute_name]
+        counts[value] = counts.get(value, 0) + number
+
+
+def count_agent_columns(location, attribute_columns, number):
+    """
+    Summary:
+        Adds a block of <number> new agents to the demographic counts of a
+        location, with the attributes given per column (see Ecosystem.addAgents).
+
+    Args:
+        location (Location): Location object
+        attribute_columns (dict): attribute name -> sequence of <number> values.
+        number (int): number of agents.
+
+    Returns:
+        None.
+    """
+    counts = location.demographic_counts
+    for attribute_name in location.counted_attributes:
+        for value, n in Counter(list(attribute_columns[attribute_name])[:number]).items():
+            counts[value] = counts.get(value, 0) + n
+
+
+def demographic_count_buffer(e):
+    """
+    Summary:
+        Returns the demographic counts of all locations as one array, ordered
+        by location and then by the values in Ecosystem.demographics_list.
+
+    Args:
+        e (Ecosystem): Ecosystem object
+
+    Returns:
+        np.ndarray: counts, of length (number of locations) x (number of values).
+    """
+    values = [v for attr_name in e.demographics_list for v in e.demographics_list[attr_name]]
+    buffer = np.zeros(len(e.locations) * len(values), dtype="i")
+    index = 0
+    for l in e.locations:
+        for v in values:
+            buffer[index] = l.demographic_counts.get(v, 0)
+            index += 1
+    return buffer
+
+
+def update_demographic_attributes(e, totals=None):
+    """
+    Summary:
+        Copies the number of agents with each demographic attribute value in
+        each location to the location attributes (read by get_attribute_ratio).
+        The counts are maintained incrementally by Location.IncrementNumAgents
+        and Location.DecrementNumAgents; agents on links are not counted.
+
+    Args:
+        e (Ecosystem): Ecosystem object
+        totals (np.ndarray, optional): counts summed over all processes, in the
+            layout of demographic_count_buffer (pflee). Defaults to the local counts.
+
+    Returns:
+        None.
+    """
+    if len(e.demographics_list) == 0:
+        return
+
+    if totals is None:
         for l in e.locations:
-            i = 0
             for attr_name in e.demographics_list:
                 for v in e.demographics_list[attr_name]:
-                    l.attributes[v] = Ecosystem.scores[self.id * self.e.scores_per_location + i]
-                    i += 1
-
-    else:
+                    l.attributes[v] = l.demographic_counts.get(v, 0)
         return
 
-
-def update_demographic_attributes(e, parallel_mode=False):
-
-    # Reset the values of all the demographic attributes to 0.
+    index = 0
     for l in e.locations:
         for attr_name in e.demographics_list:
             for v in e.demographics_list[attr_name]:
-                l.attributes[v] = 0
-
-    # Collect all the attributes
-    if parallel_mode:
-        num_demographic_values = e.scores_per_location - 1
-        for l in e.locations:
-            for i in range(num_demographic_values):
-                Ecosystem.scores[self.id * self.e.scores_per_location + i] = 0
-
-        for a in e.agents:
-            attribute_offset = 0
-            for attribute_name in e.demographics_list.keys():
-                agent_attribute_value = a.attributes[attribute_name]
-                val_index = 0
-                for v in e.demographics_list[attribute_name]:
-                    if agent_attribute_value == v:
-                        break
-                    val_index += 1
-                Ecosystem.scores[self.id * self.e.scores_per_location + attribute_offset + val_index] += 1
-                attribute_offset += len(e.demographics_list[attribute_name])
-        
-    else:
-        for a in e.agents:
-            for attribute_name in e.demographics_list.keys():
-                agent_attribute_value = a.attributes[attribute_name]
-                a.location.attributes[agent_attribute_value] += 1
+                l.attributes[v] = int(totals[index])
+                index += 1
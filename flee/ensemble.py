@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import random
+import sys
+from typing import List, Optional
+import numpy as np
+from flee.SimulationSettings import SimulationSettings
+from flee import spawning
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Fork-based ensemble runs of serial simulations.
+# The scenario (Ecosystem, InputGeography and refugee DataTable) is read and
+# set up once in the parent process. Each replica then runs in a process that
+# is forked from the parent, so that it starts from a copy-on-write copy of
+# the set-up scenario rather than re-reading the input files. Replicas differ
+# in their random seed, and optionally in their simulation settings.
+
+# Scenario shared with the forked replica processes (see run_ensemble).
+__scenario = None
+
+
+@check_args_type
+def warm_up(e, ig) -> None:
+    """
+    Summary:
+        Builds the lookup structures that are otherwise built on first use
+        during a time step, so that forked replicas share them.
+
+    Args:
+        e (Ecosystem): ecosystem object, set up with StoreInputGeographyInEcosystem.
+        ig (InputGeography): input geography of the ecosystem.
+
+    Returns:
+        None.
+    """
+    if ig.schedule is None:
+        ig.schedule = ig.BuildSchedule()
+    e.get_graph()
+    spawning.refresh_spawn_weights(e)
+
+
+@check_args_type
+def run_replica(e, ig, d, end_time: int, camp_names: List[str]) -> dict:
+    """
+    Summary:
+        Runs a simulation from day Ecosystem.time up to <end_time>, as in
+        runscripts/run.py, and records the number of agents in each camp.
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        ig (InputGeography): input geography of the ecosystem.
+        d (DataTable): refugee data table.
+        end_time (int): number of days to simulate.
+        camp_names (List[str]): names of the camps to record.
+
+    Returns:
+        dict: camp name -> number of agents per day, and "total" -> number of agents per day.
+    """
+    camps = [e.locations[e.location_index[name]] for name in camp_names]
+    days = max(0, end_time - e.time)
+    series = {name: np.zeros(days, dtype=np.int64) for name in camp_names}
+    series["total"] = np.zeros(days, dtype=np.int64)
+
+    for k, t in enumerate(range(e.time, end_time)):
+        ig.AddNewConflictZones(e, t)
+        spawning.spawn_daily_displaced(e, t, d)
+        spawning.refresh_spawn_weights(e)
+        e.enact_border_closures(t)
+        e.evolve()
+
+        for name, camp in zip(camp_names, camps):
+            series[name][k] = camp.numAgents
+        series["total"][k] = e.numAgents()
+    return series
+
+
+def apply_settings(settings: Optional[dict]) -> None:
+    """
+    Summary:
+        Overrides simulation settings, e.g. {"move_rules": {"CampWeight": 2.0}}.
+
+    Args:
+        settings (dict, optional): settings section (attribute of SimulationSettings) -> {name: value}.
+
+    Returns:
+        None.
+    """
+    if settings is None:
+        return
+    for section, values in settings.items():
+        if not hasattr(SimulationSettings, section):
+            print("ERROR: unknown simulation settings section {}.".format(section), file=sys.stderr)
+            sys.exit()
+        if isinstance(getattr(SimulationSettings, section), dict):
+            getattr(SimulationSettings, section).update(values)
+        else:
+            setattr(SimulationSettings, section, values)
+
+
+def _run_forked_replica(replica: int) -> dict:
+    """
+    Runs replica <replica> of the scenario stored by run_ensemble, in a forked process.
+    """
+    e, ig, d, end_time, camp_names, seeds, settings = __scenario
+    apply_settings(settings[replica])
+    random.seed(seeds[replica])
+    np.random.seed(seeds[replica])
+    return run_replica(e, ig, d, end_time, camp_names)
+
+
+@check_args_type
+def run_ensemble(
+    e,
+    ig,
+    d,
+    end_time: int,
+    seeds: List[int],
+    camp_names: Optional[List[str]] = None,
+    settings: Optional[list] = None,
+    processes: Optional[int] = None,
+) -> list:
+    """
+    Summary:
+        Runs an ensemble of replicas of a set-up scenario, each in a process
+        forked from this one, with at most <processes> replicas at a time.
+        The scenario is left unchanged in this process.
+
+    Args:
+        e (Ecosystem): ecosystem object, set up with StoreInputGeographyInEcosystem
+            (and the initial agents).
+        ig (InputGeography): input geography of the ecosystem.
+        d (DataTable): refugee data table.
+        end_time (int): number of days to simulate.
+        seeds (List[int]): random seed of each replica.
+        camp_names (Optional[List[str]], optional): camps to record. Defaults to all camps.
+        settings (Optional[list], optional): per replica, settings overrides (see apply_settings) or None.
+        processes (Optional[int], optional): number of concurrent replicas. Defaults to the number of CPUs.
+
+    Returns:
+        list: per replica, the series returned by run_replica.
+    """
+    global __scenario
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        print("ERROR: ensemble runs require the fork start method, which is not available on this platform.", file=sys.stderr)
+        sys.exit()
+    if settings is None:
+        settings = [None] * len(seeds)
+    if len(settings) != len(seeds):
+        print("ERROR: run_ensemble got {} seeds, but {} settings overrides.".format(len(seeds), len(settings)), file=sys.stderr)
+        sys.exit()
+    if camp_names is None:
+        camp_names = e.get_camp_names()
+    if processes is None:
+        processes = os.cpu_count()
+
+    warm_up(e, ig)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    __scenario = (e, ig, d, end_time, camp_names, seeds, settings)
+    try:
+        # A new process is forked for each replica, so that all replicas start from the same state.
+        with multiprocessing.get_context("fork").Pool(processes=min(processes, max(1, len(seeds))), maxtasksperchild=1) as pool:
+            results = pool.map(_run_forked_replica, range(0, len(seeds)), chunksize=1)
+    finally:
+        __scenario = None
+    return results
@@ -1,6 +1,5 @@
 from __future__ import annotations, print_function
 
-import copy
 import os
 import random
 import math
@@ -12,7 +11,7 @@ from datetime import datetime, timedelta
 import numpy as np
 from flee.Diagnostics import write_agents, write_links
 from flee.SimulationSettings import SimulationSettings
-from flee import moving, spawning, scoring, demographics
+from flee import moving, spawning, scoring, demographics, agentstore, topology, cohorts, scheduler, checkpoint, linkflow
 
 if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
     from beartype import beartype as check_args_type
@@ -168,7 +167,7 @@ class Person:
         Returns:
             None.
         """
-        self.location.DecrementNumAgents() 
+        self.location.DecrementNumAgents(self)
         
         # Only reset days counter when actually changing locations (not links)
         if not travelling and self.location != location:
@@ -192,15 +191,15 @@ class Person:
         Returns:
             True if the destination camp is full, False otherwise.
         """
-        for i in range(0, len(e.locationNames)):
-            if e.locationNames[i] == self.route[-1]:
-                if e.locations[i].camp and moving.getCapMultiplier(e.locations[i],1) < 0.5:
-                    #print(e.time, e.locationNames[i], self.route[-1], file=sys.stderr)
-                    return True
-                else: 
-                    return False
-        print(f"Error: camp {self.route[-1]} not found in check_dest_is_full_camp", file=sys.stderr)
-        sys.exit()
+        i = e.location_index.get(self.route[-1], -1)
+        if i < 0:
+            print(f"Error: camp {self.route[-1]} not found in check_dest_is_full_camp", file=sys.stderr)
+            sys.exit()
+
+        if e.locations[i].camp and moving.getCapMultiplier(e.locations[i],1) < 0.5:
+            #print(e.time, e.locationNames[i], self.route[-1], file=sys.stderr)
+            return True
+        return False
     
     def take_next_step(self,e):
         """
@@ -232,7 +231,7 @@ class Person:
 
 
     @check_args_type
-    def evolve(self, e, time: int, ForceTownMove: bool = False) -> None:
+    def evolve(self, e, time: int, ForceTownMove: bool = False, move_decision: Optional[bool] = None) -> None:
         """
         Summary:
             Updates the agent's location and state 
@@ -241,6 +240,9 @@ class Person:
         Args:
             time (int): The current simulation timestep.
             ForceTownMove (bool, optional): Whether or not the agent is forced to move to a town.
+            move_decision (bool, optional): Move decision drawn in advance by the batched
+                move-chance stage (moving.drawMoveDecisions). If None, the move chance is
+                calculated and drawn for this agent individually.
     
         Returns:
             None.
@@ -256,41 +258,62 @@ class Person:
             if SimulationSettings.farming:
                 if e.date.month in SimulationSettings.move_rules["HarvestMonths"]:
                     if not self.harvesting:
-                        self.location.DecrementNumAgents()
+                        self.location.DecrementNumAgents(self)
                         self.home_location.IncrementNumAgents(self)
                     self.harvesting = True
                     return #harvesting agents do not move.
                 else:
                     if self.harvesting:
                         self.location.IncrementNumAgents(self)
-                        self.home_location.DecrementNumAgents()
+                        self.home_location.DecrementNumAgents(self)
                     self.harvesting = False
         
-            # Calculate the agent's move chance with System 1/System 2 logic
-            movechance, system2_active = moving.calculateMoveChance(self, ForceTownMove, time)
+            system2_active = False
+            if move_decision is None:
+                # Calculate the agent's move chance with System 1/System 2 logic
+                movechance, system2_active = moving.calculateMoveChance(self, ForceTownMove, time)
     
-            # Generate a random number and compare it to the move chance
-            outcome = random.random()
+                # Generate a random number and compare it to the move chance
+                outcome = random.random()
+                move_decision = outcome < movechance
     
             # If the outcome is less than the move chance, then the agent moves
-            if outcome < movechance:
-                # If the agent does not have an existing route, then plan a new route
-                if len(self.route) == 0:
-                    # System 2 route planning: use pre-calculated route if available
-                    if system2_active and "_temp_route" in self.attributes:
-                        self.route = self.attributes["_temp_route"]
-                        del self.attributes["_temp_route"]
-                    else:
-                        # System 1 route planning: calculate route on the fly
-                        self.route = moving.selectRoute(self, time=time)
-    
-                # Attempt to follow route. Return None if fail.  
-                chosenDest = self.take_next_step(e)
-    
-                # If there is a viable route to a different location, then move to the next location
-                if chosenDest:
-                    # update location to link endpoint
-                    self.handle_travel(chosenDest, travelling=True)
+            if move_decision:
+                self.move(e, time, system2_active=system2_active)
+
+
+    @check_args_type
+    def move(self, e, time: int, system2_active: bool = False) -> None:
+        """
+        Summary:
+            Plans a route if needed, and starts travelling along it.
+            Called for agents that have decided to move in this time step.
+
+        Args:
+            e: The ecosystem object.
+            time (int): The current simulation timestep.
+            system2_active (bool, optional): Whether System 2 thinking is active.
+
+        Returns:
+            None.
+        """
+        # If the agent does not have an existing route, then plan a new route
+        if len(self.route) == 0:
+            # System 2 route planning: use pre-calculated route if available
+            if system2_active and "_temp_route" in self.attributes:
+                self.route = self.attributes["_temp_route"]
+                del self.attributes["_temp_route"]
+            else:
+                # System 1 route planning: calculate route on the fly
+                self.route = moving.selectRoute(self, time=time)
+
+        # Attempt to follow route. Return None if fail.  
+        chosenDest = self.take_next_step(e)
+
+        # If there is a viable route to a different location, then move to the next location
+        if chosenDest:
+            # update location to link endpoint
+            self.handle_travel(chosenDest, travelling=True)
 
 
     @check_args_type
@@ -431,6 +454,13 @@ class Location:
         self.movechance = movechance
         self.links = []  # paths connecting to other towns
         self.routes = {}  # if Location-based routing is enabled, this will contain routes to other towns (may have multiple steps).
+        self.route_cache = {}  # route weights per decision class, reused within a time step (optimisations.route_cache).
+        self.path_tables = {}  # precomputed candidate paths from this location (optimisations.path_tables).
+        self.path_dependents = {}  # locations with path tables that pass through this location.
+        self.graph = None  # CompiledGraph of the Ecosystem, set by Ecosystem.addLocation.
+        self.flood_forecast = None  # forecast-weighted flood terms of the current day (see moving.getFloodForecast).
+        self.demographic_counts = {}  # demographic attribute value -> number of agents residing here (see demographics.count_agents).
+        self.counted_attributes = ()  # Ecosystem.counted_attributes, set by Ecosystem.addLocation.
         self.major_routes = []  # paths connecting to other towns
         # paths connecting to other towns that are closed.
         self.closed_links = []
@@ -602,22 +632,25 @@ class Location:
 
 
     @check_args_type
-    def DecrementNumAgents(self) -> None:
+    def DecrementNumAgents(self, agent=None) -> None:
         """
         Summary:
             Decrements the number of agents in the location.
 
         Args:
-            None.
+            agent (optional): The agent that leaves the location,
+            needed to update the demographic counts of the location.
 
         Returns:
             None.
         """
         self.numAgents -= 1
+        if agent is not None:
+            demographics.count_agents(self, agent.attributes, -1)
 
 
     @check_args_type
-    def IncrementNumAgents(self, agent) -> None:
+    def IncrementNumAgents(self, agent, number: int = 1) -> None:
         """
         Summary: 
             Increments the number of agents in the location.
@@ -626,11 +659,14 @@ class Location:
             agent: The agent to add to the location. 
             Needed to specify which agent is being added to the location, 
             because there may be multiple agents in a location.
+            number (int, optional): The number of agents added (for blocks of new agents). Defaults to 1.
 
         Returns:
             None.
         """
-        self.numAgents += 1
+        self.numAgents += number
+        if agent is not None:
+            demographics.count_agents(self, agent.attributes, number)
 
 
     @check_args_type
@@ -770,9 +806,9 @@ class Link:
 
         # number of agents that are in transit.
         self.numAgents = 0
-        self.cumNumAgents = 0 # cumulative # of agents
-        if SimulationSettings.log_levels["link"] > 1:
-            self.cumNumAgentsByAttribute = {}
+        # cumulative # of agents, counted by Ecosystem.link_flows (see linkflow.py).
+        self.flows = None
+        self.flow_id = -1
         # refugee population on current rank (for pflee).
         self.numAgentsOnRank = 0
 
@@ -783,13 +819,13 @@ class Link:
 
 
     @check_args_type
-    def DecrementNumAgents(self) -> None:
+    def DecrementNumAgents(self, agent=None) -> None:
         """
         Summary:
             Decrements the number of agents on the link.
 
         Args:
-            None.
+            agent (optional): The agent that leaves the link.
 
         Returns:
             None.
@@ -826,14 +862,46 @@ class Link:
             None.
         """
         self.numAgents += 1
-        self.cumNumAgents += 1
+        if self.flows is None:
+            print("Error: link {} - {} was not created by Ecosystem.linkUp, and has no agent counts.".format(
+                self.startpoint.name, self.endpoint.name), file=sys.stderr)
+            sys.exit()
+        self.flows.add(self, agent)
+
+
+    @property
+    def cumNumAgents(self) -> int:
+        """
+        Summary:
+            Returns the cumulative number of agents that entered the link (on this rank).
+
+        Args:
+            None.
+
+        Returns:
+            int: number of agents.
+        """
+        if self.flows is None:
+            return 0
+        return self.flows.count(self)
+
+
+    @property
+    def cumNumAgentsByAttribute(self) -> dict:
+        """
+        Summary:
+            Returns the cumulative number of agents that entered the link (on this rank),
+            per attribute name and value (link log level 2).
+
+        Args:
+            None.
 
-        if SimulationSettings.log_levels["link"] > 1:
-            for a in agent.attributes:
-                category = self.cumNumAgentsByAttribute.get(a, {})
-                category[agent.attributes[a]] = category.get(agent.attributes[a], 0) + 1
-                self.cumNumAgentsByAttribute[a] = category
-            #print(category, file=sys.stderr)
+        Returns:
+            dict: attribute name -> attribute value -> number of agents.
+        """
+        if self.flows is None:
+            return {}
+        return self.flows.count_by_attribute(self)
 
 
     @check_args_type
@@ -887,8 +955,20 @@ class Ecosystem:
         """
         self.locations = []
         self.locationNames = []
+        self.location_index = {}  # location name -> index in self.locations.
+        self.link_index = {}  # (startpoint name, endpoint name) -> list of open Links.
         self.agents = []
+        if agentstore.use_agent_store():
+            self.agents = agentstore.AgentStore(self, Person)
+        self.link_flows = linkflow.LinkFlows()  # cumulative agent counts per link.
+        self.cohorts = None  # resident agents stored as counts (optimisations.cohorts).
+        if cohorts.use_cohorts():
+            cohorts.check_cohort_settings()
+            self.cohorts = cohorts.CohortStore(self, Person)
         self.closures = []  # format [type, source, dest, start, end]
+        self.closure_schedule = None  # closures indexed by day (see scheduler.build_closure_schedule).
+        self.graph = topology.CompiledGraph(self)  # CSR view of locations and links (see get_graph).
+        self.capacity_growth = None  # (number of locations, [(location, capacity_per_day)]), parsed once.
         self.time = 0
         self.print_location_output = True  # print location output data
         self.demographics_test_prefix = demographics_test_prefix # Should be empty unless testing demographics.
@@ -906,9 +986,13 @@ class Ecosystem:
             SimulationSettings.move_rules["MatchConflictEthnicity"]) is True:
             ethnicities = demographics.get_attribute_values("ethnicity")
             self.demographics_list["ethnicity"] = ethnicities
+        self.counted_attributes = tuple(self.demographics_list.keys())  # attributes counted in Location.demographic_counts.
 
         # FLEE3 does not have a conflict zone list, and spawn weights cover all locations.
         self.spawn_weights = np.array([])
+        self.spawn_weight_buffer = np.zeros(0)  # preallocated storage of spawn_weights.
+        self.spawn_weights_dirty = set()  # indices of locations whose spawn weight needs recomputation.
+        self.spawn_weight_time = 0  # e.time of the last full refresh (see spawning.refresh_spawn_weights).
 
         if SimulationSettings.log_levels["camp"] > 0:
             self.num_arrivals = []  # one element per time step.
@@ -938,23 +1022,31 @@ class Ecosystem:
 
 
     @check_args_type
-    def export_graph(self, use_ids_instead_of_names: bool = False) -> Tuple[List[str], List[List]]:
+    def export_graph(self, use_ids_instead_of_names: bool = False, file_name: Optional[str] = None) -> Tuple[List, List[List]]:
         """
         Summary: 
-            Exports the simulation graph as a list of vertices and a list of edges.
+            Exports the simulation graph as a list of vertices and a list of edges,
+            taken from the compiled graph (see get_graph).
 
         Args:
             use_ids_instead_of_names (bool, optional): Whether to use location IDs instead of location names for the vertices. Defaults to False.
+            file_name (Optional[str], optional): if given, the arrays of the compiled graph are also written to this .npz file. Defaults to None.
 
         Returns:
-            Tuple[List[str], List[List]]: A tuple containing a list of vertices and a list of edges.
+            Tuple[List, List[List]]: A tuple containing a list of vertices and a list of edges.
         """
-        vertices = []
+        g = self.get_graph()
+        if file_name is not None:
+            np.savez_compressed(file_name, **g.toDict())
+
+        names = self.locationNames
+        if use_ids_instead_of_names:
+            names = list(range(0, len(self.locations)))
+        vertices = list(names)
         edges = []
-        for loc in self.locations:
-            vertices += [loc.name]
-            for p in loc.links:
-                edges += [[loc.name, p.endpoint.name, p.get_distance()]]
+        for i in range(0, g.num_locations):
+            for slot in g.open_links(i).tolist():
+                edges += [[names[i], names[int(g.link_end[slot])], float(g.link_distance[slot])]]
 
         return vertices, edges
 
@@ -1010,47 +1102,53 @@ class Ecosystem:
             None.
         """
         # print("Enact border closures: ", self.closures)
-        if len(self.closures) > 0:
-            for c in self.closures:
-                if time == c[3]:
-                    if c[0] == "country":
-                        if Debug:
-                            print(
-                                "Time = {}. Closing Border between "
-                                "[{}] and [{}]".format(time, c[1], c[2]),
-                                file=sys.stderr,
-                            )
-                        self.close_border(source_country=c[1], dest_country=c[2], twoway=twoway)
-                    elif c[0] == "location":
-                        self.close_location(location_name=c[1], twoway=twoway)
-                    elif c[0] == "link":
-                        self.close_link(startpoint=c[1], endpoint=c[2], twoway=twoway)
-                    elif c[0] == "camp":
-                        self.close_camp(c[1], IDP=False)
-                    elif c[0] == "idpcamp":
-                        self.close_camp(c[1], IDP=True)
-                    elif c[0] == "remove_forced_redirection":
-                        self.set_forced_redirection(c[1], c[2], False)
-
-                if time == c[4]:
-                    if c[0] == "country":
-                        if Debug:
-                            print(
-                                "Time = {}. Reopening Border between "
-                                "[{}] and [{}]".format(time, c[1], c[2]),
-                                file=sys.stderr,
-                            )
-                        self.reopen_border(source_country=c[1], dest_country=c[2], twoway=twoway)
-                    elif c[0] == "location":
-                        self.reopen_location(location_name=c[1], twoway=twoway)
-                    elif c[0] == "link":
-                        self.reopen_link(startpoint=c[1], endpoint=c[2], twoway=twoway)
-                    elif c[0] == "camp":
-                        self.open_camp(c[1], IDP=False)
-                    elif c[0] == "idpcamp":
-                        self.open_camp(c[1], IDP=True)
-                    elif c[0] == "remove_forced_redirection":
-                        self.set_forced_redirection(c[1], c[2], True)
+        if len(self.closures) == 0:
+            return
+
+        # Only the closures that open or close today are visited.
+        if self.closure_schedule is None or self.closure_schedule.is_stale(self.closures):
+            self.closure_schedule = scheduler.build_closure_schedule(self.closures)
+
+        for action, c in self.closure_schedule.due(time, "closure"):
+            if action == "close":
+                if c[0] == "country":
+                    if Debug:
+                        print(
+                            "Time = {}. Closing Border between "
+                            "[{}] and [{}]".format(time, c[1], c[2]),
+                            file=sys.stderr,
+                        )
+                    self.close_border(source_country=c[1], dest_country=c[2], twoway=twoway)
+                elif c[0] == "location":
+                    self.close_location(location_name=c[1], twoway=twoway)
+                elif c[0] == "link":
+                    self.close_link(startpoint=c[1], endpoint=c[2], twoway=twoway)
+                elif c[0] == "camp":
+                    self.close_camp(c[1], IDP=False)
+                elif c[0] == "idpcamp":
+                    self.close_camp(c[1], IDP=True)
+                elif c[0] == "remove_forced_redirection":
+                    self.set_forced_redirection(c[1], c[2], False)
+
+            else:
+                if c[0] == "country":
+                    if Debug:
+                        print(
+                            "Time = {}. Reopening Border between "
+                            "[{}] and [{}]".format(time, c[1], c[2]),
+                            file=sys.stderr,
+                        )
+                    self.reopen_border(source_country=c[1], dest_country=c[2], twoway=twoway)
+                elif c[0] == "location":
+                    self.reopen_location(location_name=c[1], twoway=twoway)
+                elif c[0] == "link":
+                    self.reopen_link(startpoint=c[1], endpoint=c[2], twoway=twoway)
+                elif c[0] == "camp":
+                    self.open_camp(c[1], IDP=False)
+                elif c[0] == "idpcamp":
+                    self.open_camp(c[1], IDP=True)
+                elif c[0] == "remove_forced_redirection":
+                    self.set_forced_redirection(c[1], c[2], True)
 
 
     @check_args_type
@@ -1065,15 +1163,8 @@ class Ecosystem:
         Returns:
             int: The index of the location in the `locations` list, or -1 if the location is not found.
         """
-        x = -1
         # Convert name "startpoint" to index "x".
-        for i, loc in enumerate(self.locations):
-            if loc.name == name:
-                x = i
-
-        # for i in range(0, len(self.locations)):
-        #     if self.locations[i].name == name:
-        #         x = i
+        x = self.location_index.get(name, -1)
 
         if x < 0:
             print("#Warning: location not found in remove_link", file=sys.stderr)
@@ -1098,33 +1189,21 @@ class Ecosystem:
         Returns:
             bool: Description
         """
-        new_links = []
         x = self._convert_location_name_to_index(name=startpoint)
-        removed = False
-
-        for i in range(0, len(self.locations[x].links)):
-            if self.locations[x].links[i].endpoint.name is not endpoint:
-                new_links += [self.locations[x].links[i]]
-                continue
+        links = list(self.link_index.get((startpoint, endpoint), []))
 
+        for link in links:
             if close_only:
-                # print("Closing [%s] to [%s]" % (startpoint, endpoint),
-                #       file=sys.stderr
-                #       )
-                self.locations[x].links[i].closed = True
-                # we copy the route link to have a backup.
-                self.locations[x].closed_links += [copy.copy(self.locations[x].links[i])]
-                # The original object might still be used by agents as part of
-                # finish_travel, but will be orphaned eventually.
-
-                # make sure agent counts are set to 0.
-                self.locations[x].closed_links[-1].numAgents = 0
-                # ditto.
-                self.locations[x].closed_links[-1].numAgentsOnRank = 0
-            removed = True
-
-        self.locations[x].links = new_links
-        if not removed:
+                # The Link object is kept, so agents travelling on it see that it is closed.
+                self._close_link_object(x, link)
+            else:
+                self.locations[x].links.remove(link)
+                self.link_index.pop((startpoint, endpoint), None)
+
+        removed = len(links) > 0
+        if removed:
+            self._links_changed(x)
+        else:
             print(
                 "Warning: cannot remove link from {}, "
                 "as there is no link to {}".format(startpoint, endpoint),
@@ -1146,36 +1225,16 @@ class Ecosystem:
         Returns:
             bool: Description
         """
-        new_closed_links = []
         x = self._convert_location_name_to_index(name=startpoint)
-        reopened = False
-        # print("Reopening link from {} to {}, "
-        #       "closed link list length = {}.".format(
-        #           startpoint, endpoint,
-        #           len(self.locations[x].closed_links)),
-        #       file=sys.stderr
-        #       )
-
-        for i in range(0, len(self.locations[x].closed_links)):
-            if self.locations[x].closed_links[i].endpoint.name is not endpoint:
-                # print("[{}] to [{}] ({})".format(
-                #     startpoint,
-                #     self.locations[x].closed_links[i].endpoint.name,
-                #     endpoint),
-                #     file=sys.stderr)
-                new_closed_links += [self.locations[x].closed_links[i]]
-            else:
-                # print("Match: [{}] to [{}] ({})".format(
-                #     startpoint,
-                #     self.locations[x].closed_links[i].endpoint.name,
-                #     endpoint),
-                #     file=sys.stderr)
-                self.locations[x].links += [self.locations[x].closed_links[i]]
-                self.locations[x].links[-1].closed = False
-                reopened = True
-
-        self.locations[x].closed_links = new_closed_links
-        if not reopened:
+        links = [link for link in self.locations[x].closed_links if link.endpoint.name == endpoint]
+
+        for link in links:
+            self._reopen_link_object(x, link)
+
+        reopened = len(links) > 0
+        if reopened:
+            self._links_changed(x)
+        else:
             print(
                 "Warning: cannot reopen link from {},"
                 " as there is no link to {}".format(startpoint, endpoint),
@@ -1184,6 +1243,46 @@ class Ecosystem:
         return reopened
 
 
+    def _close_link_object(self, x: int, link) -> None:
+        """
+        Summary:
+            Closes a single open link of location x: the Link is flagged as
+            closed and moved to Location.closed_links. The caller invalidates
+            the caches (see _links_changed).
+        """
+        self.locations[x].links.remove(link)
+        link.closed = True
+        self.locations[x].closed_links.append(link)
+
+        key = (self.locations[x].name, link.endpoint.name)
+        open_links = self.link_index.get(key, [])
+        if link in open_links:
+            open_links.remove(link)
+            if len(open_links) == 0:
+                del self.link_index[key]
+
+
+    def _reopen_link_object(self, x: int, link) -> None:
+        """
+        Summary:
+            Reopens a single closed link of location x (the reverse of _close_link_object).
+        """
+        self.locations[x].closed_links.remove(link)
+        link.closed = False
+        self.locations[x].links.append(link)
+        self.link_index.setdefault((self.locations[x].name, link.endpoint.name), []).append(link)
+
+
+    def _links_changed(self, x: int) -> None:
+        """
+        Summary:
+            Invalidates the caches that depend on the links of location x.
+        """
+        self.graph.mark_location(x)
+        self.invalidate_route_cache()
+        topology.invalidatePathTables(self.locations[x])
+
+
     @check_args_type
     def remove_link(
         self, startpoint: str, endpoint: str, twoway: bool = True, close_only: bool = False
@@ -1289,71 +1388,63 @@ class Ecosystem:
         )
         changed_anything = False
 
-        for i in range(0, len(self.locationNames)):
-            if self.locationNames[i] == location_name:
-                changed_anything = True
-
-                link_set = self.locations[i].links
-                if mode == "reopen":
-                    link_set = self.locations[i].closed_links
+        i = self.location_index.get(location_name, -1)
+        if i >= 0:
+            changed_anything = True
+            loc = self.locations[i]
+            changed = {}
+
+            # Neighbours, whether the links to them are currently open or closed.
+            neighbours = list(dict.fromkeys(link.endpoint.name for link in loc.links + loc.closed_links))
+
+            for neighbour in neighbours:
+                if Debug:
+                    print(
+                        "starting to {} link "
+                        "[{}] [{}] in direction {}".format(
+                            mode, location_name, neighbour, direction
+                        ),
+                        file=sys.stderr,
+                    )
+                j = self.location_index[neighbour]
+
+                if dir_mode % 2 == 0:
+                    # Incoming links, from the neighbour to this location.
+                    if mode == "close":
+                        links = list(self.link_index.get((neighbour, location_name), []))
+                    else:
+                        links = [link for link in self.locations[j].closed_links if link.endpoint is loc]
+                    for link in links:
+                        self._change_link_object(j, link, mode)
+                        changed[j] = True
 
-                j = 0
-                while j < len(link_set):
-                    if Debug:
-                        print(
-                            "starting to {} link "
-                            "[{}] [{}] in direction {}".format(
-                                mode, location_name, link_set[j].endpoint.name, direction
-                            ),
-                            file=sys.stderr,
-                        )
+                if dir_mode > 0:
+                    # Outgoing links, from this location to the neighbour.
                     if mode == "close":
+                        links = list(self.link_index.get((location_name, neighbour), []))
+                    else:
+                        links = [link for link in loc.closed_links if link.endpoint.name == neighbour]
+                    for link in links:
+                        self._change_link_object(i, link, mode)
+                        changed[i] = True
 
-                        if dir_mode % 2 == 0:
-                            self.close_link(
-                                startpoint=link_set[j].endpoint.name,
-                                endpoint=self.locationNames[i],
-                                twoway=False,
-                            )
-
-                        if dir_mode > 0:
-                            if self.close_link(
-                                startpoint=self.locationNames[i],
-                                endpoint=link_set[j].endpoint.name,
-                                twoway=False,
-                            ):
-                                # shrink the link list. # This operation
-                                # affects the overall loop, so no major
-                                # operations should take place after this.
-                                link_set = self.locations[i].links
-                        else:
-                            j += 1
-
-                    elif mode == "reopen":
-
-                        if dir_mode % 2 == 0:
-                            self.reopen_link(
-                                startpoint=link_set[j].endpoint.name,
-                                endpoint=self.locationNames[i],
-                                twoway=False,
-                            )
-
-                        if dir_mode > 0:
-                            if self.reopen_link(
-                                startpoint=self.locationNames[i],
-                                endpoint=link_set[j].endpoint.name,
-                                twoway=False,
-                            ):
-                                # shrink the closed link list. # This operation
-                                # affects the overall loop, so no major
-                                # operations should take place after this.
-                                link_set = self.locations[i].closed_links
-                            else:
-                                j += 1
+            for x in changed.keys():
+                self._links_changed(x)
 
         return changed_anything
 
 
+    def _change_link_object(self, x: int, link, mode: str) -> None:
+        """
+        Summary:
+            Closes (mode "close") or reopens (mode "reopen") a single link of location x.
+        """
+        if mode == "close":
+            self._close_link_object(x, link)
+        elif mode == "reopen":
+            self._reopen_link_object(x, link)
+
+
     @check_args_type
     def _change_border_1way(
         self, source_country: str, dest_country: str, mode: str = "close", Debug: bool = False
@@ -1375,44 +1466,33 @@ class Ecosystem:
         # print("{} border 1 way [{}] [{}]".format(
         #     mode, source_country, dest_country),file=sys.stderr)
         changed_anything = False
-        for i in range(0, len(self.locationNames)):
-            if self.locations[i].country == source_country:
-
-                link_set = self.locations[i].links
-                if mode == "reopen":
-                    link_set = self.locations[i].closed_links
-
-                j = 0
-                while j < len(link_set):
-                    if link_set[j].endpoint.country == dest_country:
-                        if Debug:
-                            print(
-                                "starting to {} border 1 way "
-                                "[{}/{}] [{}/{}]".format(
-                                    mode,
-                                    source_country,
-                                    self.locations[i].name,
-                                    dest_country,
-                                    link_set[j].endpoint.name,
-                                ),
-                                file=sys.stderr,
-                            )
-                        changed_anything = True
-                        if mode == "close":
-                            if self.close_link(
-                                startpoint=self.locationNames[i],
-                                endpoint=link_set[j].endpoint.name,
-                                twoway=False,
-                            ):
-                                link_set = self.locations[i].links
-                                continue
-                        elif mode == "reopen":
-                            if self.reopen_link(
-                                self.locationNames[i], link_set[j].endpoint.name, twoway=False
-                            ):
-                                link_set = self.locations[i].closed_links
-                                continue
-                    j += 1
+        for i in range(0, len(self.locations)):
+            if self.locations[i].country != source_country:
+                continue
+
+            link_set = self.locations[i].links
+            if mode == "reopen":
+                link_set = self.locations[i].closed_links
+
+            links = [link for link in link_set if link.endpoint.country == dest_country]
+            for link in links:
+                if Debug:
+                    print(
+                        "starting to {} border 1 way "
+                        "[{}/{}] [{}/{}]".format(
+                            mode,
+                            source_country,
+                            self.locations[i].name,
+                            dest_country,
+                            link.endpoint.name,
+                        ),
+                        file=sys.stderr,
+                    )
+                self._change_link_object(i, link, mode)
+
+            if len(links) > 0:
+                changed_anything = True
+                self._links_changed(i)
 
         if not changed_anything:
             print(
@@ -1489,7 +1569,10 @@ class Ecosystem:
         Returns:
             None.
         """     
-        self.locations[self._convert_location_name_to_index(location_name)].close_camp(IDP)
+        i = self._convert_location_name_to_index(location_name)
+        self.locations[i].close_camp(IDP)
+        self.graph.mark_location(i)
+        self.invalidate_route_cache()
         print("Time = {}. Close camp {}, IDP: {}.".format(self.time, location_name, IDP), file=sys.stderr)
 
 
@@ -1507,7 +1590,8 @@ class Ecosystem:
             None.
         """
 
-        l = self.locations[self._convert_location_name_to_index(location_name)]
+        i = self._convert_location_name_to_index(location_name)
+        l = self.locations[i]
 
         l.town = False
         l.camp = False
@@ -1547,6 +1631,9 @@ class Ecosystem:
                 file=sys.stderr
             )
 
+        topology.invalidatePathTables(l)
+        self.graph.mark_location(i)
+        self.invalidate_route_cache()
         print(f"Time = {self.time}. Location {location_name} changed type to {location_type}.", file=sys.stderr)
 
 
@@ -1563,7 +1650,10 @@ class Ecosystem:
         Returns:
             None.
         """
-        self.locations[self._convert_location_name_to_index(location_name)].open_camp(IDP)
+        i = self._convert_location_name_to_index(location_name)
+        self.locations[i].open_camp(IDP)
+        self.graph.mark_location(i)
+        self.invalidate_route_cache()
         print("Time = {}. Open camp {}, IDP: {}.".format(self.time, location_name, IDP), file=sys.stderr)
 
 
@@ -1581,12 +1671,11 @@ class Ecosystem:
         Returns:
             None.
         """
-        id1 = self._convert_location_name_to_index(loc1_name)
-        for i in range(0, len(self.locations[id1].links)):
-            if self.locations[id1].links[i].endpoint.name == loc2_name:
-                old_val = self.locations[id1].links[i].forced_redirection
-                self.locations[id1].links[i].forced_redirection = value
-                print("Time = {}. Redirection {}-{} changed from {} to {}.".format(self.time, loc1_name, loc2_name, old_val, value), file=sys.stderr)
+        for link in self.link_index.get((loc1_name, loc2_name), []):
+            old_val = link.forced_redirection
+            link.forced_redirection = value
+            print("Time = {}. Redirection {}-{} changed from {} to {}.".format(self.time, loc1_name, loc2_name, old_val, value), file=sys.stderr)
+        self.graph.mark_location(self.location_index.get(loc1_name, -1))
 
 
     @check_args_type
@@ -1650,20 +1739,23 @@ class Ecosystem:
         Returns:
             None.
         """
-        for i in range(0, len(self.locationNames)):
-            if self.locationNames[i] == name:
-                if change_movechance:
-                    self.locations[i].movechance = SimulationSettings.move_rules["ConflictMoveChance"]
-                    self.locations[i].conflict = conflict_intensity
-                    self.locations[i].town = False
-
-                self.locations[i].time_of_conflict = self.time                  
-                spawning.refresh_spawn_weights(self)
-
-                if SimulationSettings.log_levels["init"] > 0:
-                    print("Added conflict zone: {}, pop. {}, intensity: {}".format(name, self.locations[i].pop, conflict_intensity), file=sys.stderr)
-                    print("New total spawn weight: ", sum(self.spawn_weights), file=sys.stderr)
-                return
+        i = self.location_index.get(name, -1)
+        if i >= 0:
+            if change_movechance:
+                self.locations[i].movechance = SimulationSettings.move_rules["ConflictMoveChance"]
+                self.locations[i].conflict = conflict_intensity
+                self.locations[i].town = False
+
+            self.locations[i].time_of_conflict = self.time                  
+            spawning.mark_spawn_weight_dirty(self, i)
+            self.graph.mark_location(i)
+            self.invalidate_route_cache()
+
+            if SimulationSettings.log_levels["init"] > 0:
+                spawning.update_spawn_weights(self)
+                print("Added conflict zone: {}, pop. {}, intensity: {}".format(name, self.locations[i].pop, conflict_intensity), file=sys.stderr)
+                print("New total spawn weight: ", sum(self.spawn_weights), file=sys.stderr)
+            return
 
         print("Diagnostic: self.locationNames: ", self.locationNames, file=sys.stderr)
         print(
@@ -1689,14 +1781,16 @@ class Ecosystem:
             None.
         """
         
-        for i in range(0, len(self.locationNames)):
-            if self.locationNames[i] == name:
-                if change_movechance:
-                    self.locations[i].movechance = SimulationSettings.move_rules["DefaultMoveChance"]
-                self.locations[i].conflict = -1.0
-                self.locations[i].town = True
+        i = self.location_index.get(name, -1)
+        if i >= 0:
+            if change_movechance:
+                self.locations[i].movechance = SimulationSettings.move_rules["DefaultMoveChance"]
+            self.locations[i].conflict = -1.0
+            self.locations[i].town = True
+            spawning.mark_spawn_weight_dirty(self, i)
+            self.graph.mark_location(i)
 
-        spawning.refresh_spawn_weights(self)
+        self.invalidate_route_cache()
 
 
     @check_args_type
@@ -1734,6 +1828,7 @@ class Ecosystem:
         Returns:
             list[Location]: A list of unique locations.
         """
+        spawning.update_spawn_weights(self)
         spawn_weight_total = sum(self.spawn_weights)
 
         assert spawn_weight_total > 0
@@ -1745,6 +1840,91 @@ class Ecosystem:
         ).tolist()
 
 
+    @check_args_type
+    def invalidate_route_cache(self) -> None:
+        """
+        Summary:
+            Clears the cached route weights of all locations (see moving.chooseCachedRoute).
+            Called at the start of each time step, and whenever links, location types or
+            conflict zones change.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+        moving.clearRouteCaches()
+
+
+    @check_args_type
+    def store_location_scores(self, locations: list, scores: np.ndarray) -> None:
+        """
+        Summary:
+            Stores the location scores calculated by scoring.calculateLocationScores.
+
+        Args:
+            locations (list): The locations.
+            scores (np.ndarray): The score of each location.
+
+        Returns:
+            None.
+        """
+        for loc, score in zip(locations, scores.tolist()):
+            loc.scores[0] = score
+
+
+    @check_args_type
+    def get_graph(self) -> topology.CompiledGraph:
+        """
+        Summary:
+            Returns the compiled CSR view of the locations and links (see
+            topology.CompiledGraph), brought up to date with any link closures,
+            reopenings and location type changes since the last call.
+
+        Args:
+            None.
+
+        Returns:
+            topology.CompiledGraph: the graph view.
+        """
+        return self.graph.update()
+
+
+    @check_args_type
+    def write_checkpoint(self, file_name: str, ig=None) -> None:
+        """
+        Summary:
+            Writes the simulation state to a binary checkpoint file (see flee/checkpoint.py).
+            To be called between time steps.
+
+        Args:
+            file_name (str): name of the .npz file.
+            ig (InputGeography, optional): input geography whose time stepping state is saved.
+
+        Returns:
+            None.
+        """
+        checkpoint.write_checkpoint(self, file_name, Person, ig)
+
+
+    @check_args_type
+    def read_checkpoint(self, file_name: str, ig=None) -> None:
+        """
+        Summary:
+            Restores the simulation state from a checkpoint file. The Ecosystem
+            must have been set up from the same inputs as the checkpointed one.
+
+        Args:
+            file_name (str): name of the .npz file.
+            ig (InputGeography, optional): input geography whose time stepping state is restored.
+
+        Returns:
+            None.
+        """
+        checkpoint.read_checkpoint(self, file_name, Person, ig)
+
+
     @check_args_type
     def evolve(self) -> None:
         """
@@ -1762,53 +1942,96 @@ class Ecosystem:
         # update location scores
         for loc in self.locations:
             loc.routes = {}
-            scoring.updateLocationScore(self.time, loc)
+        scoring.updateLocationScores(self.time, self)
 
-            # update location capacity if a daily capacity increase is set.
-            capacity_per_day = int(loc.attributes.get("capacity_per_day","0"))
-            if capacity_per_day > 0:
-                loc.capacity += capacity_per_day
+        # update location capacities if a daily capacity increase is set.
+        if self.capacity_growth is None or self.capacity_growth[0] != len(self.locations):
+            growth = [(loc, int(loc.attributes.get("capacity_per_day","0"))) for loc in self.locations]
+            self.capacity_growth = (len(self.locations), [(loc, c) for loc, c in growth if c > 0])
+        for loc, capacity_per_day in self.capacity_growth[1]:
+            loc.capacity += capacity_per_day
 
         demographics.update_demographic_attributes(self)
 
+        self.invalidate_route_cache()
+
         # update agent locations
-        for a in self.agents:
+        decisions = None
+        if moving.use_batched_movechance():
+            decisions = moving.drawMoveDecisions(self, self.time)
+
+        if decisions is not None and isinstance(self.agents, agentstore.AgentStore) and not SimulationSettings.farming:
+            # Fully batched: only agents that decided to move are handled individually.
             if SimulationSettings.log_levels["agent"] > 1:
-                a.locations_visited = []
-            if a.location is not None:
-                a.evolve(self, time=self.time)
+                self.agents.locations_visited = {}
+            movers = self.agents.prepare_evolve(self.time) & decisions
+            for i in np.flatnonzero(movers):
+                self.agents.view(i).move(self, time=self.time)
+        else:
+            for i, a in enumerate(self.agents):
+                if SimulationSettings.log_levels["agent"] > 1:
+                    a.locations_visited = []
+                if a.location is not None:
+                    if decisions is None:
+                        a.evolve(self, time=self.time)
+                    else:
+                        a.evolve(self, time=self.time, move_decision=bool(decisions[i]))
+
+        if self.cohorts is not None:
+            # Agents leaving their cohort start travelling as individual agents.
+            self.cohorts.evolve(self.time)
+
+        if isinstance(self.agents, agentstore.AgentStore):
+            active = self.agents.active()
+            # finish_travel() only affects agents that are on a link.
+            for i in np.flatnonzero(active & self.agents.travelling[:len(self.agents)]):
+                self.agents.view(i).finish_travel(self, time=self.time)
+            self.agents.advance_departure_counters(active)
+        else:
+            for a in self.agents:
+                if a.location is not None:
+                    a.finish_travel(self, time=self.time)
+                    a.timesteps_since_departure += 1
 
-        for a in self.agents:
-            if a.location is not None:
-                a.finish_travel(self, time=self.time)
-                a.timesteps_since_departure += 1
-        
 
         if SimulationSettings.log_levels["agent"] > 0:
             write_agents(agents=self.agents, time=self.time)
 
         if SimulationSettings.log_levels["link"] > 0:
-            write_links(locations=self.locations, time=self.time)
+            if linkflow.use_aggregated_link_log():
+                linkflow.write_link_flows(self, self.time)
+            else:
+                write_links(locations=self.locations, time=self.time)
 
-        for a in self.agents:
-            a.recent_travel_distance = (
-                a.recent_travel_distance
-                + (a.distance_moved_this_timestep / SimulationSettings.move_rules["MaxMoveSpeed"])
-            ) / 2.0
-            a.distance_moved_this_timestep = 0
+        if isinstance(self.agents, agentstore.AgentStore):
+            self.agents.update_recent_travel_distance(SimulationSettings.move_rules["MaxMoveSpeed"])
+        else:
+            for a in self.agents:
+                a.recent_travel_distance = (
+                    a.recent_travel_distance
+                    + (a.distance_moved_this_timestep / SimulationSettings.move_rules["MaxMoveSpeed"])
+                ) / 2.0
+                a.distance_moved_this_timestep = 0
 
         # update link properties
         if SimulationSettings.log_levels["camp"] > 0:
             self._aggregate_arrivals()
 
+        if self.cohorts is not None:
+            # Agents that have come to a stop rejoin their cohort.
+            self.cohorts.absorb()
+
         # Deactivate agents in camps with a certain probability.
         if SimulationSettings.spawn_rules["camps_are_sinks"] == True:
+            if self.cohorts is not None:
+                self.cohorts.deactivate_in_camps()
             for a in self.agents:
                 if a.travelling == False:
                     if a.location is not None:
                         if a.location.camp == True:
                             outcome = random.random()
                             if outcome < a.location.attributes.get("deactivation_probability", 0.0):
+                                demographics.count_agents(a.location, a.attributes, -1)
                                 a.location = None
 
         self.time += 1
@@ -1869,10 +2092,12 @@ class Ecosystem:
             print("Location:", name, x, y, loc.movechance, capacity, ", pop. ", pop, foreign, ", attrib. ", attributes, file=sys.stderr)
 
         self.locations.append(loc)
-        self.spawn_weights = np.append(self.spawn_weights, [0.0])
         self.locationNames.append(loc.name)
+        self.location_index[loc.name] = len(self.locations) - 1
+        loc.graph = self.graph
+        loc.counted_attributes = self.counted_attributes
 
-        spawning.refresh_spawn_weights(self)
+        spawning.add_spawn_location(self)
         return loc
 
 
@@ -1900,6 +2125,10 @@ class Ecosystem:
                 location.print()
             location.numAgentsSpawned += 1
 
+        if self.cohorts is not None:
+            self.cohorts.add(location, attributes)
+            return
+
         self.agents.append(Person(location=location, attributes=attributes))
 
 
@@ -1916,11 +2145,48 @@ class Ecosystem:
         Returns:
             None.
         """
+        if self.cohorts is not None:
+            self.cohorts.add(location, attributes)
+            return
+
         self.agents.append(Person(location=location, attributes=attributes))
 
 
     @check_args_type
-    def insertAgents(self, location, number: int) -> None:
+    def addAgents(self, location, number: int, attribute_columns: Optional[dict] = None) -> None:
+        """
+        Summary:
+            Adds a specified number of agents to the simulation at the
+            specified location, taking them from the population once.
+
+        Args:
+            location (Location): The location to add the agents to.
+            number (int): The number of agents to add.
+            attribute_columns (dict, optional): attribute name -> sequence of
+                <number> values (see spawning.draw_spawn_attribute_columns).
+
+        Returns:
+            None.
+        """
+        if number < 1:
+            return
+
+        if SimulationSettings.spawn_rules["TakeFromPopulation"]:
+            taken = min(max(location.pop, 0), number)
+            location.pop -= taken
+            if taken < number:
+                print(
+                    "WARNING: Number of agents in the simulation is larger than the"
+                    "population of the conflict zone."
+                )
+                location.print()
+            location.numAgentsSpawned += number
+
+        self._insert_agent_block(location, number, attribute_columns)
+
+
+    @check_args_type
+    def insertAgents(self, location, number: int, attribute_columns: Optional[dict] = None) -> None:
         """
         Summary: 
             Inserts a specified number of agents into the simulation
@@ -1929,12 +2195,54 @@ class Ecosystem:
         Args:
             location (Location): The location to insert the agents at.
             number (int): The number of agents to insert.
+            attribute_columns (dict, optional): attribute name -> sequence of
+                <number> values (see spawning.draw_spawn_attribute_columns).
 
         Returns:
             None.
         """
-        for _ in range(0, number):
-            self.insertAgent(location=location)
+        if number < 1:
+            return
+
+        self._insert_agent_block(location, number, attribute_columns)
+
+
+    def _insert_agent_block(self, location, number: int, attribute_columns: Optional[dict]) -> None:
+        """
+        Summary:
+            Creates <number> agents at <location> (private function, use
+            addAgents or insertAgents instead). With the array agent store the
+            agents are added as one block of columns, and in cohort mode
+            as one count per distinct combination of attribute values.
+
+        Args:
+            location (Location): The location of the new agents.
+            number (int): The number of agents.
+            attribute_columns (dict, optional): attribute name -> sequence of <number> values.
+
+        Returns:
+            None.
+        """
+        if attribute_columns is None:
+            attribute_columns = {}
+        names = list(attribute_columns.keys())
+
+        if self.cohorts is not None and len(names) == 0:
+            self.cohorts.add(location, {}, number)
+        elif self.cohorts is not None:
+            combinations = {}
+            for values in zip(*attribute_columns.values()):
+                combinations[values] = combinations.get(values, 0) + 1
+            for values, count in combinations.items():
+                self.cohorts.add(location, dict(zip(names, values)), count)
+        elif isinstance(self.agents, agentstore.AgentStore):
+            self.agents.append_block(location, number, attribute_columns)
+        elif len(names) > 0:
+            for values in zip(*attribute_columns.values()):
+                self.agents.append(Person(location=location, attributes=dict(zip(names, values))))
+        else:
+            for _ in range(0, number):
+                self.agents.append(Person(location=location, attributes={}))
 
 
     @check_args_type
@@ -1950,15 +2258,23 @@ class Ecosystem:
         Returns:
             None.
         """
-        new_agents = []
-        for i in range(0, len(self.agents)):
-            if self.agents[i].location.name not in location_names:
-                new_agents += self.agents[i]  # agent is preserved in ecosystem
+        keep = []
+        for a in self.agents:
+            if a.location.name not in location_names:
+                keep += [True]  # agent is preserved in ecosystem
             else:
                 # agent is removed from the ecosystem and number of agents
                 # drops by one.
-                self.agents[i].location.DecrementNumAgents()
-        self.agents = new_agents
+                a.location.DecrementNumAgents(a)
+                keep += [False]
+
+        if isinstance(self.agents, agentstore.AgentStore):
+            self.agents.retain(keep)
+        else:
+            self.agents = [a for a, k in zip(self.agents, keep) if k]
+
+        if self.cohorts is not None:
+            self.cohorts.clear_locations({i for i, l in enumerate(self.locations) if l.name in location_names})
 
 
     @check_args_type
@@ -1973,6 +2289,8 @@ class Ecosystem:
         Returns:
             int: The number of agents in the simulation.
         """
+        if self.cohorts is not None:
+            return len(self.agents) + self.cohorts.total()
         return len(self.agents)
 
 
@@ -2020,13 +2338,8 @@ class Ecosystem:
         Returns:
             None.
         """
-        endpoint1_index = -1
-        endpoint2_index = -1
-        for i in range(0, len(self.locationNames)):
-            if self.locationNames[i] == endpoint1:
-                endpoint1_index = i
-            if self.locationNames[i] == endpoint2:
-                endpoint2_index = i
+        endpoint1_index = self.location_index.get(endpoint1, -1)
+        endpoint2_index = self.location_index.get(endpoint2, -1)
 
         if endpoint1_index < 0:
             print("Diagnostic: Ecosystem.locationNames: ", self.locationNames, file=sys.stderr)
@@ -2041,23 +2354,30 @@ class Ecosystem:
                     endpoint2, endpoint1), file=sys.stderr)
             sys.exit()
 
-        self.locations[endpoint1_index].links.append(
-            Link(
-                startpoint=self.locations[endpoint1_index],
-                endpoint=self.locations[endpoint2_index],
-                distance=distance,
-                forced_redirection=forced_redirection,
-                attributes=attributes,
-            )
+        link1 = Link(
+            startpoint=self.locations[endpoint1_index],
+            endpoint=self.locations[endpoint2_index],
+            distance=distance,
+            forced_redirection=forced_redirection,
+            attributes=attributes,
         )
-        self.locations[endpoint2_index].links.append(
-            Link(
-                startpoint=self.locations[endpoint2_index],
-                endpoint=self.locations[endpoint1_index],
-                distance=distance,
-                attributes=attributes,
-            )
+        link2 = Link(
+            startpoint=self.locations[endpoint2_index],
+            endpoint=self.locations[endpoint1_index],
+            distance=distance,
+            attributes=attributes,
         )
+        self.link_flows.register(link1)
+        self.link_flows.register(link2)
+        self.locations[endpoint1_index].links.append(link1)
+        self.locations[endpoint2_index].links.append(link2)
+        self.link_index.setdefault((endpoint1, endpoint2), []).append(link1)
+        self.link_index.setdefault((endpoint2, endpoint1), []).append(link2)
+        self.graph.mark_location(endpoint1_index)
+        self.graph.mark_location(endpoint2_index)
+        self.invalidate_route_cache()
+        topology.invalidatePathTables(self.locations[endpoint1_index])
+        topology.invalidatePathTables(self.locations[endpoint2_index])
 
 
     @check_args_type
@@ -0,0 +1,346 @@
+import csv
+import gc
+import hashlib
+import os
+import sys
+import numpy as np
+from flee.SimulationSettings import SimulationSettings
+from flee import InputGeography
+from flee.datamanager import handle_refugee_data
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Compiled input bundles.
+# A bundle is a single .npz file with the parsed contents of a scenario's
+# input_csv and source_data directories: the locations, links, major routes,
+# closures and location changes (as typed columns, and as the rows used by
+# InputGeography), the conflict and attribute time series (as day tables),
+# the validation data tables and the registration corrections. A bundle is
+# keyed by a hash of the contents of the files that it was compiled from, and
+# of the settings that affect how these are read (see bundle_key), so that a
+# cached bundle (see load_cached_bundle) is recompiled whenever either changes.
+# Loading a bundle sets up an Ecosystem, InputGeography and RefugeeTable as
+# runscripts/run.py does, without parsing any CSV files.
+
+BUNDLE_VERSION = 1
+
+
+@check_args_type
+def input_files(input_csv_directory: str, data_directory: str, data_layout: str = "data_layout.csv") -> list:
+    """
+    Summary:
+        Returns the input files that a bundle is compiled from (whether or not they exist).
+
+    Args:
+        input_csv_directory (str): scenario input_csv directory.
+        data_directory (str): scenario source_data directory.
+        data_layout (str, optional): data layout file in data_directory.
+
+    Returns:
+        list: file names.
+    """
+    files = [
+        os.path.join(input_csv_directory, name)
+        for name in [
+            "locations.csv", "routes.csv", "major_routes.csv", "closures.csv",
+            "region_attributes_IPC.csv", "registration_corrections.csv",
+        ]
+    ]
+    files += [SimulationSettings.ConflictInputFile, SimulationSettings.FloodLevelInputFile]
+    # Read from the working directory by StoreInputGeographyInEcosystem.
+    files += ["location_changes.csv"]
+
+    layout = os.path.join(data_directory, data_layout)
+    files += [layout]
+    if os.path.isfile(layout):
+        with open(layout, newline="", encoding="utf-8") as csvfile:
+            for row in csv.reader(csvfile):
+                if len(row) > 1 and row[0][0] != "#":
+                    files += [os.path.join(data_directory, name) for name in row[1:]]
+    return files
+
+
+@check_args_type
+def bundle_key(
+    input_csv_directory: str,
+    data_directory: str,
+    start_date: str,
+    data_layout: str = "data_layout.csv",
+    population_scaledown_factor: int = 1,
+) -> str:
+    """
+    Summary:
+        Returns the content hash of a scenario, which identifies its compiled bundle.
+
+    Args:
+        input_csv_directory (str): scenario input_csv directory.
+        data_directory (str): scenario source_data directory.
+        start_date (str): simulation start date (%Y-%m-%d).
+        data_layout (str, optional): data layout file in data_directory.
+        population_scaledown_factor (int, optional): scale down factor of the validation data.
+
+    Returns:
+        str: hexadecimal SHA-256 hash.
+    """
+    h = hashlib.sha256()
+    settings = [
+        BUNDLE_VERSION,
+        start_date,
+        data_layout,
+        population_scaledown_factor,
+        SimulationSettings.ConflictInputFile,
+        SimulationSettings.FloodLevelInputFile,
+        SimulationSettings.spawn_rules.get("flood_driven_spawning", False),
+        SimulationSettings.move_rules.get("FloodRulesEnabled", False),
+    ]
+    h.update(repr(settings).encode("utf-8"))
+
+    for file_name in input_files(input_csv_directory, data_directory, data_layout):
+        h.update(b"\0" + file_name.encode("utf-8") + b"\0")
+        if os.path.isfile(file_name):
+            with open(file_name, "rb") as f:
+                h.update(f.read())
+        else:
+            h.update(b"missing")
+    return h.hexdigest()
+
+
+def _pack_rows(arrays: dict, name: str, rows: list) -> None:
+    """
+    Stores a list of CSV rows (lists of strings) as flat cells and row lengths.
+    """
+    arrays[name + "_cells"] = np.array([cell for row in rows for cell in row], dtype=str)
+    arrays[name + "_lengths"] = np.array([len(row) for row in rows], dtype=np.int64)
+
+
+def _unpack_rows(arrays, name: str) -> list:
+    """
+    Returns the rows stored by _pack_rows.
+    """
+    cells = arrays[name + "_cells"].tolist()
+    rows = []
+    start = 0
+    for length in arrays[name + "_lengths"].tolist():
+        rows.append(cells[start:start + length])
+        start += length
+    return rows
+
+
+def _pack_series(arrays: dict, name: str, series: dict) -> None:
+    """
+    Stores a dict of name -> list of values (e.g. InputGeography.conflicts) as a 2-D table.
+    """
+    lengths = [len(values) for values in series.values()]
+    table = np.full((len(series), max(lengths, default=0)), np.nan)
+    for i, values in enumerate(series.values()):
+        table[i, :len(values)] = values
+    arrays[name + "_names"] = np.array(list(series.keys()), dtype=str)
+    arrays[name + "_table"] = table
+    arrays[name + "_lengths"] = np.array(lengths, dtype=np.int64)
+
+
+def _unpack_series(arrays, name: str, value_type=float) -> dict:
+    """
+    Returns the dict stored by _pack_series.
+    """
+    table = arrays[name + "_table"]
+    series = {}
+    for i, (key, length) in enumerate(zip(arrays[name + "_names"].tolist(), arrays[name + "_lengths"].tolist())):
+        values = table[i, :length]
+        series[key] = values.astype(np.int64).tolist() if value_type is int else values.tolist()
+    return series
+
+
+@check_args_type
+def compile_bundle(
+    input_csv_directory: str,
+    data_directory: str,
+    file_name: str,
+    start_date: str,
+    data_layout: str = "data_layout.csv",
+    population_scaledown_factor: int = 1,
+) -> str:
+    """
+    Summary:
+        Reads the input files of a scenario, as runscripts/run.py does, and
+        writes them to the bundle <file_name>. The simulation settings (and
+        SimulationSettings.ConflictInputFile and FloodLevelInputFile) should be
+        set as for the run.
+
+    Args:
+        input_csv_directory (str): scenario input_csv directory.
+        data_directory (str): scenario source_data directory.
+        file_name (str): name of the bundle (.npz) file.
+        start_date (str): simulation start date (%Y-%m-%d).
+        data_layout (str, optional): data layout file in data_directory.
+        population_scaledown_factor (int, optional): scale down factor of the validation data.
+
+    Returns:
+        str: the bundle key (see bundle_key).
+    """
+    key = bundle_key(input_csv_directory, data_directory, start_date, data_layout, population_scaledown_factor)
+
+    ig = InputGeography.InputGeography()
+    ig.ReadLocationsFromCSV(os.path.join(input_csv_directory, "locations.csv"))
+    ig.ReadLinksFromCSV(os.path.join(input_csv_directory, "routes.csv"))
+    ig.ReadClosuresFromCSV(os.path.join(input_csv_directory, "closures.csv"))
+    ig.ReadLocationChangesFromCSV("location_changes.csv")
+
+    d = handle_refugee_data.RefugeeTable(
+        csvformat="generic",
+        data_directory=data_directory,
+        start_date=start_date,
+        data_layout=data_layout,
+        population_scaledown_factor=population_scaledown_factor,
+    )
+
+    corrections = []
+    corrections_file = os.path.join(input_csv_directory, "registration_corrections.csv")
+    if os.path.isfile(corrections_file):
+        with open(corrections_file, encoding="utf-8") as csvfile:
+            for row in csv.reader(csvfile, delimiter=","):
+                if len(row) > 1:
+                    corrections.append(row[0:2])
+
+    arrays = {
+        "version": np.array([BUNDLE_VERSION], dtype=np.int64),
+        "key": np.array([key]),
+        "start_date": np.array([start_date]),
+        "population_scaledown_factor": np.array([population_scaledown_factor], dtype=np.int64),
+        "columns": np.array(getattr(ig, "columns", []), dtype=str),
+        "link_columns": np.array(getattr(ig, "link_columns", []), dtype=str),
+    }
+
+    # Typed location and link columns (see InputGeography.ParseGeographyColumns).
+    arrays.update(ig.ParseGeographyColumns())
+    _pack_rows(arrays, "locations", ig.locations)
+    _pack_rows(arrays, "links", ig.links)
+
+    _pack_rows(arrays, "major_routes", ig.major_routes)
+    _pack_rows(arrays, "closures", ig.closures)
+    _pack_rows(arrays, "location_changes", ig.location_changes)
+    _pack_rows(arrays, "corrections", corrections)
+
+    _pack_series(arrays, "conflicts", ig.conflicts)
+    arrays["attribute_names"] = np.array(list(ig.attributes.keys()), dtype=str)
+    arrays["attribute_is_int"] = np.array(
+        [any(isinstance(v, int) for values in attribute.values() for v in values) for attribute in ig.attributes.values()],
+        dtype=bool,
+    )
+    for i, attribute in enumerate(ig.attributes.values()):
+        _pack_series(arrays, "attribute{}".format(i), attribute)
+
+    arrays["data_header"] = np.array(d.header, dtype=str)
+    arrays["data_lengths"] = np.array([len(table) for table in d.data_table], dtype=np.int64)
+    arrays["data_table"] = np.concatenate([np.zeros([0, 2])] + [np.asarray(table, dtype=np.float64).reshape(-1, 2) for table in d.data_table])
+
+    directory = os.path.dirname(file_name)
+    if len(directory) > 0:
+        os.makedirs(directory, exist_ok=True)
+    # Written under a temporary name first, so that a cached bundle is never read while incomplete.
+    temp_name = "{}.{}.tmp".format(file_name, os.getpid())
+    with open(temp_name, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temp_name, file_name)
+    return key
+
+
+@check_args_type
+def load_bundle(file_name: str, e, start_empty: bool = False):
+    """
+    Summary:
+        Sets up Ecosystem e from the bundle <file_name>, without reading any
+        CSV files. This is equivalent to reading the locations, routes and
+        closures with an InputGeography, calling StoreInputGeographyInEcosystem,
+        and reading the validation data (with the registration corrections)
+        into a RefugeeTable.
+
+    Args:
+        file_name (str): name of the bundle (.npz) file.
+        e (Ecosystem): empty ecosystem object.
+        start_empty (bool, optional): start_empty argument of the RefugeeTable.
+
+    Returns:
+        Tuple[Ecosystem, Dict, InputGeography, RefugeeTable]: ecosystem, location
+        dictionary, input geography and refugee data table.
+    """
+    with np.load(file_name, allow_pickle=False) as arrays:
+        if int(arrays["version"][0]) != BUNDLE_VERSION:
+            print("ERROR: input bundle {} has version {}, but version {} is required.".format(
+                file_name, int(arrays["version"][0]), BUNDLE_VERSION), file=sys.stderr)
+            sys.exit()
+
+        ig = InputGeography.InputGeography()
+        ig.columns = arrays["columns"].tolist()
+        ig.link_columns = arrays["link_columns"].tolist()
+        ig.locations = _unpack_rows(arrays, "locations")
+        ig.links = _unpack_rows(arrays, "links")
+        ig.major_routes = _unpack_rows(arrays, "major_routes")
+        ig.closures = _unpack_rows(arrays, "closures")
+        ig.location_changes = _unpack_rows(arrays, "location_changes")
+        ig.conflicts = _unpack_series(arrays, "conflicts")
+        for i, (name, is_int) in enumerate(zip(arrays["attribute_names"].tolist(), arrays["attribute_is_int"].tolist())):
+            ig.attributes[name] = _unpack_series(arrays, "attribute{}".format(i), int if is_int else float)
+
+        # The Locations and Links are created in bulk, without garbage collection passes in between.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            lm = ig.StoreColumnsInEcosystem(e, arrays)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        data_table = np.split(arrays["data_table"], np.cumsum(arrays["data_lengths"])[:-1])
+        d = handle_refugee_data.RefugeeTable.from_tables(
+            header=arrays["data_header"].tolist(),
+            data_table=[table.copy() for table in data_table] if len(arrays["data_lengths"]) > 0 else [],
+            start_date=str(arrays["start_date"][0]),
+            population_scaledown_factor=int(arrays["population_scaledown_factor"][0]),
+            start_empty=start_empty,
+        )
+        for name, date in _unpack_rows(arrays, "corrections"):
+            d.correctLevel1Registrations(name=name, date=date)
+
+    return e, lm, ig, d
+
+
+@check_args_type
+def load_cached_bundle(
+    input_csv_directory: str,
+    data_directory: str,
+    cache_directory: str,
+    e,
+    start_date: str,
+    data_layout: str = "data_layout.csv",
+    population_scaledown_factor: int = 1,
+    start_empty: bool = False,
+):
+    """
+    Summary:
+        Sets up Ecosystem e from the bundle of a scenario in <cache_directory>,
+        after compiling the bundle if it does not exist yet (or if the inputs
+        have changed since it was compiled).
+
+    Args:
+        input_csv_directory (str): scenario input_csv directory.
+        data_directory (str): scenario source_data directory.
+        cache_directory (str): directory with compiled bundles.
+        e (Ecosystem): empty ecosystem object.
+        start_date (str): simulation start date (%Y-%m-%d).
+        data_layout (str, optional): data layout file in data_directory.
+        population_scaledown_factor (int, optional): scale down factor of the validation data.
+        start_empty (bool, optional): start_empty argument of the RefugeeTable.
+
+    Returns:
+        Tuple[Ecosystem, Dict, InputGeography, RefugeeTable]: see load_bundle.
+    """
+    key = bundle_key(input_csv_directory, data_directory, start_date, data_layout, population_scaledown_factor)
+    file_name = os.path.join(cache_directory, "bundle-{}.npz".format(key))
+    if not os.path.isfile(file_name):
+        compile_bundle(input_csv_directory, data_directory, file_name, start_date, data_layout, population_scaledown_factor)
+    return load_bundle(file_name, e, start_empty)
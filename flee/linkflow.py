@@ -0,0 +1,332 @@
+import atexit
+import gzip
+import os
+import numpy as np
+from flee.SimulationSettings import SimulationSettings
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Link flow counters.
+# The cumulative number of agents that entered each link is counted in
+# arrays indexed by link id (Link.flow_id, assigned by Ecosystem.linkUp)
+# and, with link log level 2, by attribute code (a code per attribute name
+# and value). Link.IncrementNumAgents only appends the link id (and the
+# attribute set of the agent) to a list; the lists are added to the arrays in
+# bulk when the counts are needed.
+#
+# With log_levels.link_format: aggregated, the counts are written by a single
+# writer (rank 0) to links.out.csv.gz every log_levels.link_interval days, in
+# the columns of links.out.<rank>. In pflee, the counts of all ranks are
+# combined with one collective per output interval (see LinkFlows.reduce).
+
+PENDING_LIMIT = 1 << 20 # increments that are kept before they are added to the arrays.
+
+CSV_HEADER = "#time,start_location,end_location,cum_num_agents,attribute"
+
+# file name -> open link flow log.
+__logs = {}
+
+
+@check_args_type
+def use_aggregated_link_log() -> bool:
+    """
+    Summary:
+        Returns whether link logs are written as a single aggregated file.
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if link flows are written with write_link_flows.
+    """
+    return SimulationSettings.log_levels.get("link_format", "csv") == "aggregated"
+
+
+class LinkFlows:
+    """
+    Cumulative agent counts of the links of an Ecosystem (on this rank).
+    """
+
+    def __init__(self):
+        self.links = [] # Link per link id.
+        self.counts = np.zeros(0, dtype=np.int64) # agents per link id.
+        self.attribute_counts = np.zeros([0, 0], dtype=np.int64) # agents per link id and attribute code.
+        self.attributes = [] # (name, value) per attribute code.
+        self.attribute_codes = {}
+        self.attribute_sets = [] # attribute codes per attribute set (the attributes of an agent).
+        self.attribute_set_codes = {}
+        self.pending_links = []
+        self.pending_sets = []
+
+        # State of reduce(): counts that were already sent (all ranks), and the
+        # combined counts and attribute translation tables (rank 0).
+        self.sent_counts = np.zeros(0, dtype=np.int64)
+        self.sent_attribute_counts = np.zeros([0, 0], dtype=np.int64)
+        self.sent_attributes = 0
+        self.total_counts = np.zeros(0, dtype=np.int64)
+        self.total_attribute_counts = np.zeros([0, 0], dtype=np.int64)
+        self.total_attributes = []
+        self.total_attribute_codes = {}
+        self.rank_attribute_codes = {} # rank -> total attribute code per attribute code of that rank.
+
+    @check_args_type
+    def register(self, link) -> None:
+        """
+        Summary:
+            Assigns a link id to a link, and counts the agents that enter it from now on.
+
+        Args:
+            link (Link): the link.
+
+        Returns:
+            None.
+        """
+        link.flow_id = len(self.links)
+        link.flows = self
+        self.links.append(link)
+
+    def add(self, link, agent) -> None:
+        """
+        Summary:
+            Counts an agent that enters a link.
+
+        Args:
+            link (Link): the link.
+            agent (Person): the agent.
+
+        Returns:
+            None.
+        """
+        self.pending_links.append(link.flow_id)
+        if SimulationSettings.log_levels["link"] > 1:
+            self.pending_sets.append(self.attribute_set(agent.attributes))
+        if len(self.pending_links) >= PENDING_LIMIT:
+            self.update()
+
+    def attribute_set(self, attributes) -> int:
+        """
+        Summary:
+            Returns the code of a set of attribute values, adding it if needed.
+        """
+        key = tuple(attributes.items())
+        try:
+            code = self.attribute_set_codes.get(key)
+        except TypeError: # unhashable values are counted by their string.
+            key = tuple((name, value if getattr(value, "__hash__", None) else str(value)) for name, value in key)
+            code = self.attribute_set_codes.get(key)
+        if code is None:
+            code = len(self.attribute_sets)
+            codes = []
+            for pair in key:
+                pair_code = self.attribute_codes.get(pair)
+                if pair_code is None:
+                    pair_code = len(self.attributes)
+                    self.attributes.append(pair)
+                    self.attribute_codes[pair] = pair_code
+                codes.append(pair_code)
+            self.attribute_sets.append(np.asarray(codes, dtype=np.int64))
+            self.attribute_set_codes[key] = code
+        return code
+
+    def update(self) -> None:
+        """
+        Summary:
+            Adds the pending increments to the count arrays.
+        """
+        num_links = len(self.links)
+        if len(self.counts) < num_links:
+            self.counts = np.concatenate([self.counts, np.zeros(num_links - len(self.counts), dtype=np.int64)])
+        shape = (num_links, len(self.attributes))
+        if self.attribute_counts.shape != shape:
+            grown = np.zeros(shape, dtype=np.int64)
+            grown[:self.attribute_counts.shape[0], :self.attribute_counts.shape[1]] = self.attribute_counts
+            self.attribute_counts = grown
+
+        if len(self.pending_links) == 0:
+            return
+        ids = np.asarray(self.pending_links, dtype=np.int64)
+        self.counts += np.bincount(ids, minlength=num_links)
+
+        if len(self.pending_sets) > 0:
+            # Agents per (link, attribute set), spread over the attribute codes of each set.
+            sets = np.asarray(self.pending_sets, dtype=np.int64)
+            num_sets = len(self.attribute_sets)
+            keys, counts = np.unique(ids * num_sets + sets, return_counts=True)
+            set_codes = [self.attribute_sets[s] for s in (keys % num_sets).tolist()]
+            lengths = np.array([len(c) for c in set_codes], dtype=np.int64)
+            if lengths.sum() > 0:
+                np.add.at(
+                    self.attribute_counts,
+                    (np.repeat(keys // num_sets, lengths), np.concatenate(set_codes)),
+                    np.repeat(counts, lengths),
+                )
+        self.pending_links = []
+        self.pending_sets = []
+
+    def count(self, link) -> int:
+        """
+        Summary:
+            Returns the number of agents that entered a link (on this rank).
+        """
+        self.update()
+        return int(self.counts[link.flow_id])
+
+    def count_by_attribute(self, link) -> dict:
+        """
+        Summary:
+            Returns the number of agents that entered a link (on this rank), as
+            attribute name -> attribute value -> count.
+        """
+        self.update()
+        out = {}
+        row = self.attribute_counts[link.flow_id]
+        for code in np.flatnonzero(row).tolist():
+            name, value = self.attributes[code]
+            out.setdefault(name, {})[value] = int(row[code])
+        return out
+
+    def reduce(self, comm=None):
+        """
+        Summary:
+            Combines the counts of all ranks on rank 0, with a single collective:
+            a Reduce of the new counts, or (with attribute counts) a gather of the
+            new counts and attribute values of each rank.
+
+        Args:
+            comm (optional): MPI communicator, or None in serial runs.
+
+        Returns:
+            tuple: (counts, attribute_counts, attributes) of all ranks on rank 0
+            (the arrays of this rank in serial runs), or None on other ranks.
+        """
+        self.update()
+        if comm is None:
+            return self.counts, self.attribute_counts, self.attributes
+
+        num_links = len(self.links)
+        sent = np.zeros(num_links, dtype=np.int64)
+        sent[:len(self.sent_counts)] = self.sent_counts
+        delta = self.counts - sent
+        self.sent_counts = self.counts.copy()
+        if len(self.total_counts) < num_links:
+            self.total_counts = np.concatenate([self.total_counts, np.zeros(num_links - len(self.total_counts), dtype=np.int64)])
+
+        if SimulationSettings.log_levels["link"] <= 1:
+            total = np.zeros(num_links, dtype=np.int64)
+            comm.Reduce(delta, total, root=0)
+            if comm.Get_rank() != 0:
+                return None
+            self.total_counts += total
+            return self.total_counts, self.total_attribute_counts, self.total_attributes
+
+        sent = np.zeros(self.attribute_counts.shape, dtype=np.int64)
+        sent[:self.sent_attribute_counts.shape[0], :self.sent_attribute_counts.shape[1]] = self.sent_attribute_counts
+        rows, columns = np.nonzero(self.attribute_counts - sent)
+        payload = (
+            delta,
+            self.attributes[self.sent_attributes:],
+            rows,
+            columns,
+            (self.attribute_counts - sent)[rows, columns],
+        )
+        self.sent_attribute_counts = self.attribute_counts.copy()
+        self.sent_attributes = len(self.attributes)
+
+        gathered = comm.gather(payload, root=0)
+        if gathered is None:
+            return None
+
+        for rank, (delta, new_attributes, rows, columns, values) in enumerate(gathered):
+            self.total_counts += delta
+            codes = self.rank_attribute_codes.setdefault(rank, [])
+            for pair in new_attributes:
+                code = self.total_attribute_codes.get(pair)
+                if code is None:
+                    code = len(self.total_attributes)
+                    self.total_attributes.append(pair)
+                    self.total_attribute_codes[pair] = code
+                codes.append(code)
+            shape = (num_links, len(self.total_attributes))
+            if self.total_attribute_counts.shape != shape:
+                grown = np.zeros(shape, dtype=np.int64)
+                grown[:self.total_attribute_counts.shape[0], :self.total_attribute_counts.shape[1]] = self.total_attribute_counts
+                self.total_attribute_counts = grown
+            if len(rows) > 0:
+                np.add.at(self.total_attribute_counts, (rows, np.asarray(codes, dtype=np.int64)[columns]), values)
+        return self.total_counts, self.total_attribute_counts, self.total_attributes
+
+
+@check_args_type
+def write_link_flows(e, time: int, rank: int = 0, comm=None) -> None:
+    """
+    Summary:
+        Writes the cumulative agent counts of all links to links.out.csv.gz,
+        every log_levels.link_interval days. In pflee, all ranks call this
+        function, and rank 0 writes the counts of all ranks.
+
+    Args:
+        e (Ecosystem): ecosystem object.
+        time (int): current time step.
+        rank (int, optional): rank of the MPI process.
+        comm (optional): MPI communicator, or None in serial runs.
+
+    Returns:
+        None.
+    """
+    if time % max(1, int(SimulationSettings.log_levels.get("link_interval", 1))) != 0:
+        return
+
+    reduced = e.link_flows.reduce(comm)
+    if reduced is None or rank != 0:
+        return
+    counts, attribute_counts, attributes = reduced
+
+    file_name = "links.out.csv.gz"
+    log = __logs.get(file_name)
+    if log is None or time == 0:
+        if log is not None:
+            log.close()
+        # A log that is opened after day 0 (e.g. after a restart) continues the existing file.
+        log = gzip.open(file_name, "at" if time > 0 else "wt", encoding="utf-8")
+        __logs[file_name] = log
+        if time == 0:
+            print(CSV_HEADER, file=log)
+
+    region = SimulationSettings.log_levels["granularity"] == "region"
+    by_attribute = SimulationSettings.log_levels["link"] > 1
+    lines = []
+    for link, count in zip(e.link_flows.links, counts.tolist()):
+        if region:
+            prefix = "{},{},{},".format(time, link.startpoint.region, link.endpoint.region)
+        else:
+            prefix = "{},{},{},".format(time, link.startpoint.name, link.endpoint.name)
+        lines.append("{}{},total\n".format(prefix, count))
+        if by_attribute and attribute_counts.shape[1] > 0:
+            row = attribute_counts[link.flow_id]
+            for code in np.flatnonzero(row).tolist():
+                lines.append("{}{},{}:{}\n".format(prefix, row[code], attributes[code][0], attributes[code][1]))
+    log.writelines(lines)
+
+
+@check_args_type
+def close_link_logs() -> None:
+    """
+    Summary:
+        Closes the link flow logs of this process. Called automatically at exit.
+
+    Args:
+        None.
+
+    Returns:
+        None.
+    """
+    for log in __logs.values():
+        log.close()
+    __logs.clear()
+
+
+atexit.register(close_link_logs)
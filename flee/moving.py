@@ -1,4 +1,6 @@
+import itertools
 import os
+import weakref
 import sys
 import numpy as np
 import random
@@ -7,6 +9,8 @@ from beartype.typing import List, Optional, Tuple
 from flee.SimulationSettings import SimulationSettings
 import flee.spawning as spawning
 import flee.demographics as demographics
+import flee.agentstore as agentstore
+import flee.topology as topology
 
 if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
     from beartype import beartype as check_args_type
@@ -92,9 +96,6 @@ def getEndPointScore(agent, endpoint, time) -> float:
               if forecast_end_time is not None:
                 if (forecast_timescale > 1.0) and (time <= forecast_end_time): 
               
-                  #Set the base forecast value
-                  flood_forecast_base = 0.0 #no forecast, no flooding 
-
                   #Get the agents awareness level of the flood forecast
                   #Weighting of each awareness level defined in simsetting.yml
                   #Fraction of population with each level of flood awareness defined in demographics_floodawareness.csv 
@@ -103,38 +104,8 @@ def getEndPointScore(agent, endpoint, time) -> float:
                   # agents decision making process. 
                   agent_awareness_weight = float(SimulationSettings.move_rules["FloodAwarenessWeights"][int(agent.attributes["floodawareness"])])
 
-                  #Forecast loop: iterate over the location flood level weights for the forecast timescale
-                  for x in range(1, forecast_timescale + 1): #iterates over the 5 day forecast, ignoring the current day
-
-                      #the day of the forcast we're considering 
-                      forecast_day = time + x 
-
-                      #If the simulation length is less than the end of the forecast, then the forecast will be shorter
-                      if forecast_day >= forecast_end_time:
-                          #set the forecast day to the end of the simulation
-                          forecast_day = forecast_end_time #same as time + x
-                    
-                      #get the forecast flood level for location on the day we're considering in the for loop
-                      forecast_flood_level = endpoint.attributes.get("forecast_flood_levels",0)[forecast_day]
-
-                      # if it's not zero, then we need to modify the base forecast value, otherwise leave the base as it will zero.
-                      if forecast_flood_level > 0.0: 
-                        #get the endpoint locations current flood level weight based on that flood level.
-                        forecast_flood_level_weight = lm.interp(SimulationSettings.move_rules["FloodLocWeights"], flood_level)
-                        
-                        #get the current flood forecaster weight e.g. how important the current day is in the forecast
-                        flood_forecaster_weight = float(SimulationSettings.move_rules["FloodForecasterWeights"][forecast_day])
-                      
-                        #modify the flood_forecast_base using the flood level on the current day and the imporatance of the current day in the forecast loop
-                        flood_forecast_base += forecast_flood_level_weight * flood_forecaster_weight
-
-                      #break the loop if we've reached the end of the forecast data 
-                      if forecast_day == forecast_end_time:
-                        break
-                    
-                  #the flood_forecast_base now represents the total weight of the flooding during the forecast for the endpoint location,
-                  # this needed to be divided by the total number of days in the forecast to get the average weight based on the severity and relative imporatance of the forecasted days
-                  flood_forecast_base *= float(flood_forecast_base/forecast_timescale)
+                  #The forecast-weighted flood term of the endpoint is calculated once per location and day (see getFloodForecast).
+                  flood_forecast_base = getFloodForecast(endpoint, time)[1]
 
                   #down weight the overall importance of the flood forecast on the base depending on the agents awareness weighting
                   #currently using a simple down weighting, but may want lower awareness agents to only respond to high flood levels 
@@ -310,7 +281,8 @@ def normalizeWeights(weights: List[float]) -> List[float]:
   """
 
   if np.sum(weights) > 0.0:
-    weights = [x/float(sum(weights)) for x in weights]
+    total = float(sum(weights))
+    weights = [x/total for x in weights]
     #weights = weights.tolist()
   else:  # if all have zero weight, then we do equal weighting
     weights = [(x+1)/float(len(weights)) for x in weights]
@@ -441,12 +413,6 @@ def calculateMoveChance(a, ForceTownMove: bool, time) -> Tuple[float, bool]:
 
             if (forecast_timescale > 1.0) and (time <= forecast_end_time): 
                 
-                #Set the base forecast value
-                flood_forecast_base = 0.0 #no forecast, no flooding 
-
-                #Set the default movechance value
-                flood_forecast_movechance = 0.0 #no forecast, no flooding
-
                 #Get the agents awareness level of the flood forecast
                 #Weighting of each awareness level defined in simsetting.yml
                 #Fraction of population with each level of flood awareness defined in demographics_floodawareness.csv 
@@ -454,40 +420,9 @@ def calculateMoveChance(a, ForceTownMove: bool, time) -> Tuple[float, bool]:
                 #For example, low awareness will down weight the importance of the forecast or reduce the impact the forecast has on the 
                 # agents decision making process. 
                 agent_awareness_weight = float(SimulationSettings.move_rules["FloodAwarenessWeights"][int(a.attributes["floodawareness"])])
-         
-
-                #Forecast loop: iterate over the location flood level weights for the forecast timescale
-                for x in range(1, forecast_timescale + 1): #iterates over the 5 day forecast, ignoring the current day
 
-                    #the day of the forcast we're considering 
-                    forecast_day = time + x 
-
-                    #If the simulation length is less than the end of the forecast, then the forecast will be shorter
-                    if forecast_day >= forecast_end_time:
-                        #set the forecast day to the end of the simulation
-                        forecast_day = forecast_end_time #same as time + x
-                  
-                    #get the forecast flood level for location on the day we're considering in the for loop
-                    forecast_flood_level = int(a.location.attributes.get("forecast_flood_levels",0)[forecast_day])
-
-                    # if it's not zero, then we need to modify the base forecast value, otherwise leave the base as it will zero.
-                    if forecast_flood_level > 0.0: 
-                        #get the endpoint locations current flood level weight based on that flood level.
-                        forecast_flood_level_weight = lm.interp(SimulationSettings.move_rules["FloodLocWeights"], forecast_flood_level) 
-                      
-                        #get the current flood forecaster weight e.g. how important the current day is in the forecast
-                        flood_forecaster_weight = float(SimulationSettings.move_rules["FloodForecasterWeights"][forecast_day])
-                    
-                        #modify the flood_forecast_base using the flood level on the current day and the imporatance of the current day in the forecast loop
-                        flood_forecast_base += forecast_flood_level_weight * flood_forecaster_weight
-
-                    #break the loop if we've reached the end of the forecast data 
-                    if forecast_day == forecast_end_time:
-                        break
-
-                #the flood_forecast_base now represents the total weight of the flooding during the forecast for the endpoint location,
-                # this needed to be divided by the total number of days in the forecast to get the average weight based on the severity and relative imporatance of the forecasted days
-                flood_forecast_movechance = float(flood_forecast_base/forecast_timescale)
+                #The forecast movechance multiplier of the location is calculated once per location and day (see getFloodForecast).
+                flood_forecast_movechance = getFloodForecast(a.location, time)[0]
 
                 #down weight the overall importance of the flood forecast on the base depending on the agents awareness weighting
                 #currently using a simple down weighting, but may want lower awareness agents to only respond to high flood levels 
@@ -500,6 +435,233 @@ def calculateMoveChance(a, ForceTownMove: bool, time) -> Tuple[float, bool]:
     return movechance, system2_active 
 
 
+@check_args_type
+def use_batched_movechance() -> bool:
+    """
+    Summary:
+        Returns whether move decisions are drawn by the batched move-chance stage
+        (optimisations.batched_movechance in simsetting.yml).
+        TwoSystemDecisionMaking requires per-agent evaluation, and therefore
+        always uses the reference implementation (calculateMoveChance).
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if the batched stage should be used.
+    """
+    if SimulationSettings.move_rules.get("TwoSystemDecisionMaking", False):
+        return False
+    return bool(SimulationSettings.optimisations.get("BatchedMoveChance", False))
+
+
+@check_args_type
+def calculateFloodForecastMoveChance(loc, time: int) -> float:
+    """
+    Summary:
+        Calculates the flood forecaster movechance multiplier for a location,
+        before weighting by the awareness of individual agents.
+        Mirrors the forecaster branch of calculateMoveChance.
+
+    Args:
+        loc (Location): location of the agents.
+        time (int): Current time step.
+
+    Returns:
+        float: forecast movechance multiplier.
+    """
+    forecast_timescale = SimulationSettings.move_rules["FloodForecasterTimescale"]
+    forecast_end_time = SimulationSettings.move_rules["FloodForecasterEndTime"]
+
+    flood_forecast_base = 0.0
+    for x in range(1, forecast_timescale + 1):
+        forecast_day = time + x
+        if forecast_day >= forecast_end_time:
+            forecast_day = forecast_end_time
+
+        forecast_flood_level = int(loc.attributes.get("forecast_flood_levels",0)[forecast_day])
+        if forecast_flood_level > 0.0:
+            forecast_flood_level_weight = lm.interp(SimulationSettings.move_rules["FloodLocWeights"], forecast_flood_level)
+            flood_forecaster_weight = float(SimulationSettings.move_rules["FloodForecasterWeights"][forecast_day])
+            flood_forecast_base += forecast_flood_level_weight * flood_forecaster_weight
+
+        if forecast_day == forecast_end_time:
+            break
+
+    return float(flood_forecast_base/forecast_timescale)
+
+
+@check_args_type
+def calculateFloodForecastEndPointWeight(loc, time: int) -> float:
+    """
+    Summary:
+        Calculates the flood forecaster weight of a location as a route
+        endpoint, before weighting by the awareness of individual agents.
+        Mirrors the forecaster branch of getEndPointScore.
+
+    Args:
+        loc (Location): endpoint location.
+        time (int): Current time step.
+
+    Returns:
+        float: forecast endpoint weight multiplier.
+    """
+    forecast_timescale = SimulationSettings.move_rules["FloodForecasterTimescale"]
+    forecast_end_time = SimulationSettings.move_rules["FloodForecasterEndTime"]
+    flood_level = loc.attributes.get("flood_level", 0.0)
+
+    flood_forecast_base = 0.0
+    for x in range(1, forecast_timescale + 1):
+        forecast_day = time + x
+        if forecast_day >= forecast_end_time:
+            forecast_day = forecast_end_time
+
+        forecast_flood_level = loc.attributes.get("forecast_flood_levels",0)[forecast_day]
+        if forecast_flood_level > 0.0:
+            # Note: weighted by the current flood level of the location, as in getEndPointScore.
+            forecast_flood_level_weight = lm.interp(SimulationSettings.move_rules["FloodLocWeights"], flood_level)
+            flood_forecaster_weight = float(SimulationSettings.move_rules["FloodForecasterWeights"][forecast_day])
+            flood_forecast_base += forecast_flood_level_weight * flood_forecaster_weight
+
+        if forecast_day == forecast_end_time:
+            break
+
+    flood_forecast_base *= float(flood_forecast_base/forecast_timescale)
+    return flood_forecast_base
+
+
+@check_args_type
+def getFloodForecast(loc, time: int) -> Tuple[float, float]:
+    """
+    Summary:
+        Returns the forecast-weighted flood terms of a location for the current
+        day: the movechance multiplier (calculateFloodForecastMoveChance) and the
+        endpoint weight multiplier (calculateFloodForecastEndPointWeight). Both
+        are calculated once per location and day, and stored in Location.flood_forecast;
+        agents only apply their flood awareness weight to them.
+
+    Args:
+        loc (Location): location.
+        time (int): Current time step.
+
+    Returns:
+        Tuple[float, float]: movechance multiplier and endpoint weight multiplier.
+    """
+    forecast_flood_levels = loc.attributes.get("forecast_flood_levels",0)
+    key = (time, loc.attributes.get("flood_level", 0.0), id(forecast_flood_levels))
+    if loc.flood_forecast is None or loc.flood_forecast[0] != key:
+        loc.flood_forecast = (key, calculateFloodForecastMoveChance(loc, time), calculateFloodForecastEndPointWeight(loc, time))
+    return loc.flood_forecast[1], loc.flood_forecast[2]
+
+
+@check_args_type
+def calculateLocationMoveChances(e, time: int):
+    """
+    Summary:
+        Calculates the base move chance of every location once per time step.
+        This is the per-location part of calculateMoveChance for agents without
+        a planned route (MovechancePopScaleFactor, FleeWhenStarving, FloodMovechances).
+
+    Args:
+        e (Ecosystem): Ecosystem object.
+        time (int): Current time step.
+
+    Returns:
+        Tuple[np.ndarray, Optional[np.ndarray]]: base move chance per location, and the
+        flood forecaster multiplier per location (None if the forecaster is inactive).
+    """
+    pop_base = SimulationSettings.move_rules["MovechancePopBase"]
+    pop_scale_factor = SimulationSettings.move_rules["MovechancePopScaleFactor"]
+    flee_when_starving = SimulationSettings.move_rules["FleeWhenStarving"] is True
+    flood_rules = SimulationSettings.move_rules["FloodRulesEnabled"] is True
+
+    movechances = np.zeros(len(e.locations))
+    for i, loc in enumerate(e.locations):
+        movechance = loc.movechance
+
+        movechance *= (float(max(loc.pop, loc.capacity)) / pop_base)**pop_scale_factor
+
+        if flee_when_starving:
+            if "region_IPC_level" not in loc.attributes.keys():
+                print("ERROR: move_rules.FleeWhenStarving is set in simulationsetting.yml, but no IPC input data (region_attributes_IPC.csv) has been loaded.", file=sys.stderr)
+                print(f"INFO: Error occurred for Location {loc.name}, region {loc.region}.", file=sys.stderr)
+                sys.exit()
+            loc_ipc_modifier = loc.attributes["region_IPC_level"] / 100.0
+            movechance = loc_ipc_modifier + ((1.0 - loc_ipc_modifier) * movechance)
+
+        if flood_rules:
+            flood_level = loc.attributes.get("flood_level", 0.0)
+            if flood_level > 0.0:
+                movechance = lm.interp(SimulationSettings.move_rules["FloodMovechances"], flood_level)
+
+        movechances[i] = movechance
+
+    forecasts = None
+    if flood_rules and SimulationSettings.move_rules["FloodForecaster"] is True:
+        forecast_timescale = SimulationSettings.move_rules["FloodForecasterTimescale"]
+        forecast_end_time = SimulationSettings.move_rules["FloodForecasterEndTime"]
+        if forecast_timescale is None:
+            print("ERROR: flood_forecaster_timescale is not set in simsetting.yml", file=sys.stderr)
+            sys.exit()
+        if forecast_end_time is None:
+            print("ERROR: flood_forecaster_endtime is not set in simsetting.yml", file=sys.stderr)
+            sys.exit()
+
+        if (forecast_timescale > 1.0) and (time <= forecast_end_time):
+            forecasts = np.zeros(len(e.locations))
+            for i, loc in enumerate(e.locations):
+                forecasts[i] = getFloodForecast(loc, time)[0]
+
+    return movechances, forecasts
+
+
+@check_args_type
+def drawMoveDecisions(e, time: int):
+    """
+    Summary:
+        Batched move-chance stage: draws the move decision of all agents with a
+        single vectorised random draw. Agents with a planned route always move,
+        the others move with the base move chance of their location
+        (see calculateLocationMoveChances), weighted by their flood awareness
+        when the flood forecaster is active. Statistically equivalent to calling
+        calculateMoveChance for each agent, but uses numpy's random generator.
+
+    Args:
+        e (Ecosystem): Ecosystem object.
+        time (int): Current time step.
+
+    Returns:
+        np.ndarray: one boolean move decision per agent in e.agents.
+    """
+    movechances, forecasts = calculateLocationMoveChances(e, time)
+
+    n = len(e.agents)
+    if isinstance(e.agents, agentstore.AgentStore):
+        loc = e.agents.location[:n].astype(np.int64)
+        has_route = np.zeros(n, dtype=bool)
+        has_route[list(e.agents.routes.keys())] = True
+    else:
+        loc_ids = {id(l): i for i, l in enumerate(e.locations)}
+        loc = np.fromiter((loc_ids.get(id(a.location), -1) for a in e.agents), dtype=np.int64, count=n)
+        has_route = np.fromiter((len(a.route) > 0 for a in e.agents), dtype=bool, count=n)
+
+    # Agents with a known route continue to follow it (move chance 1.0).
+    p = np.ones(n)
+    idle = np.flatnonzero((loc >= 0) & ~has_route)
+    p[idle] = movechances[loc[idle]]
+
+    if forecasts is not None:
+        awareness_weights = SimulationSettings.move_rules["FloodAwarenessWeights"]
+        if isinstance(e.agents, agentstore.AgentStore):
+            awareness = e.agents.get_attribute_column("floodawareness")[idle]
+        else:
+            awareness = [e.agents[i].attributes["floodawareness"] for i in idle]
+        weights = np.array([float(awareness_weights[int(x)]) for x in awareness])
+        p[idle] *= forecasts[loc[idle]] * weights
+
+    return np.random.random(n) < p
+
+
 def check_routes(weights, routes, label):
     if len(weights) == 0 or len(routes) == 0:
         print(f"ERROR: Pruning to empty tree at {label}, W:{len(weights)} R:{len(routes)}", file=sys.stderr)
@@ -531,6 +693,390 @@ def pruneRoutes(weights, routes):
     return weights, routes
 
 
+# Profiling counters of the route cache (see chooseCachedRoute).
+route_cache_stats = {"hits": 0, "misses": 0, "revalidations": 0}
+
+# Locations with a non-empty route cache, so that invalidation does not visit every location.
+route_cache_locations = weakref.WeakSet()
+
+
+def getRouteCacheStats() -> dict:
+    """
+    Summary:
+        Returns the hit/miss counters of the route cache.
+        A revalidation is a hit on which the capacity multipliers
+        of one or more endpoints had changed, so that the weights were recomputed.
+
+    Args:
+        None.
+
+    Returns:
+        dict: number of hits, misses and revalidations since the last reset.
+    """
+    return dict(route_cache_stats)
+
+
+def resetRouteCacheStats() -> None:
+    """
+    Summary:
+        Resets the hit/miss counters of the route cache.
+
+    Args:
+        None.
+
+    Returns:
+        None.
+    """
+    for key in route_cache_stats.keys():
+        route_cache_stats[key] = 0
+
+
+def clearRouteCaches() -> None:
+    """
+    Summary:
+        Clears the route caches of all locations that have cached route weights.
+
+    Args:
+        None.
+
+    Returns:
+        None.
+    """
+    if len(route_cache_locations) == 0:
+        return
+    for loc in list(route_cache_locations):
+        loc.route_cache = {}
+    route_cache_locations.clear()
+
+
+def use_route_cache() -> bool:
+    """
+    Summary:
+        Returns whether route weights are cached per location and decision class
+        (optimisations.route_cache in simsetting.yml).
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if the route cache should be used.
+    """
+    return bool(SimulationSettings.optimisations.get("RouteCache", False))
+
+
+def getDecisionClass(agent) -> tuple:
+    """
+    Summary:
+        Returns the agent attributes that affect getEndPointScore under the active
+        move rules. Agents at the same location with the same decision class
+        obtain identical route weights.
+
+    Args:
+        agent (Person): agent making the decision
+
+    Returns:
+        tuple: decision class of the agent.
+    """
+    key = []
+    if SimulationSettings.move_rules["ChildrenAvoidHazards"]:
+        key.append(agent.attributes["age"] < 19)
+        if SimulationSettings.move_rules["BoysTakeRisk"]:
+            key.append(agent.attributes["gender"] == "male" and agent.attributes["age"] > 14)
+    if SimulationSettings.move_rules["ElderlyAvoidHazards"]:
+        key.append(agent.attributes["age"] > 59)
+    if SimulationSettings.move_rules["WomenAvoidHazards"]:
+        key.append(agent.attributes["gender"] == "female")
+
+    if SimulationSettings.move_rules["FloodRulesEnabled"] is True:
+        if SimulationSettings.move_rules["FloodForecaster"] is True:
+            key.append(int(agent.attributes["floodawareness"]))
+
+    if SimulationSettings.move_rules["MatchCampEthnicity"] or SimulationSettings.move_rules["MatchConflictEthnicity"] or SimulationSettings.move_rules["MatchTownEthnicity"]:
+        key.append(agent.attributes["ethnicity"])
+    if SimulationSettings.move_rules["MatchCampReligion"]:
+        key.append(agent.attributes["religion"])
+
+    return tuple(key)
+
+
+def calculateRouteTable(agent, link, prior_distance: float, origin_names: List[str], step: int, time: int):
+    """
+    Summary:
+        Variant of calculateLinkWeight that leaves out the capacity multiplier
+        and WeightPower, so that the result can be reused while camps fill up.
+        For each route, calculateLinkWeight returns (core * getCapMultiplier(endpoint))**WeightPower.
+
+    Args:
+        agent (Person): agent making the decision
+        link (Link): The link to calculate the weight for.
+        prior_distance (float): The distance travelled so far.
+        origin_names (List[str]): The names of the locations that have been visited so far.
+        step (int): The number of steps taken so far.
+        time (int): The current time.
+
+    Returns:
+        Tuple[List[float], List[List[str]], list]: core weights, routes and route endpoints.
+    """
+    cores = []
+    routes = []
+    endpoints = []
+    if link.endpoint.marker is False:
+        core = float(SimulationSettings.move_rules["WeightSoftening"] + (float(getEndPointScore(agent=agent, endpoint=link.endpoint, time=time)))) / float(SimulationSettings.move_rules["DistanceSoftening"] + link.get_distance() + prior_distance)**SimulationSettings.move_rules["DistancePower"]
+
+        cores = [core]
+        routes = [origin_names + [link.endpoint.name]]
+        endpoints = [link.endpoint]
+    else:
+        step -= 1
+
+    if SimulationSettings.move_rules["AwarenessLevel"] > step:
+        for lel in link.endpoint.links:
+            if lel.endpoint.name not in origin_names:
+                c, r, ep = calculateRouteTable(agent,
+                      link=lel,
+                      prior_distance=prior_distance + link.get_distance(),
+                      origin_names=origin_names + [link.endpoint.name],
+                      step=step + 1,
+                      time=time,
+                      )
+                cores += c
+                routes += r
+                endpoints += ep
+
+    return cores, routes, endpoints
+
+
+def calculatePathTableCores(a, table, time: int) -> np.ndarray:
+    """
+    Summary:
+        Calculates the core weight of every path in a path table (see calculateRouteTable).
+        Endpoint scores are evaluated once per endpoint rather than once per path.
+
+    Args:
+        a: Agent
+        table (PathTable): candidate paths from the location of the agent.
+        time (int): Current time
+
+    Returns:
+        np.ndarray: core weight per path.
+    """
+    weight_softening = SimulationSettings.move_rules["WeightSoftening"]
+    numerators = np.array([float(weight_softening + (float(getEndPointScore(agent=a, endpoint=ep, time=time)))) for ep in table.endpoints])
+    if len(numerators) == 0:
+        return numerators
+    return numerators[table.endpoint_index] / table.getDistanceDenominators()
+
+
+def choosePathTableRoute(a, time: int):
+    """
+    Summary:
+        Chooses a route like selectRoute, using the precomputed paths of the
+        location of the agent (see flee/topology.py) instead of enumerating them.
+        Only the endpoint scores and capacity multipliers are evaluated, and the
+        random draw is identical to that of chooseFromWeights.
+
+    Args:
+        a: Agent
+        time (int): Current time
+
+    Returns:
+        List[str]: the chosen route, or None if there are no routes.
+    """
+    table = topology.getPathTable(a.location)
+    if len(table) == 0:
+        return None
+
+    caps = np.array([getCapMultiplier(ep, 0) for ep in table.endpoints])
+    weights = calculatePathTableCores(a, table, time) * caps[table.endpoint_index]
+
+    weight_power = SimulationSettings.move_rules["WeightPower"]
+    if weight_power != 1.0:
+        weights = np.array([x**weight_power for x in weights.tolist()])
+
+    # Same result as pruneRoutes, without removing elements one by one.
+    keep = np.arange(len(weights))
+    threshold = SimulationSettings.move_rules["PruningThreshold"]
+    if threshold >= 1.001:
+        keep = np.flatnonzero(~(weights < max(weights.tolist()) / threshold))
+
+    cum_weights = list(itertools.accumulate(normalizeWeights(weights=weights[keep].tolist())))
+    k = random.choices(keep.tolist(), cum_weights=cum_weights)[0]
+    return table.getRoute(k)
+
+
+# Maximum number of samples drawn by the dp route engine before falling back to path enumeration.
+WALK_SAMPLING_ATTEMPTS = 1000
+
+
+def sampleWalkTableRoute(a, time: int):
+    """
+    Summary:
+        Dynamic-programming route engine (move_rules.route_engine: dp).
+        Draws a single route with probability proportional to its weight in
+        selectRoute, without enumerating all routes. Walks are drawn from the
+        binned walk counts of the location (see topology.WalkTable) using an
+        upper bound of their weight, and walks with loops are rejected. The
+        remaining walks are accepted with probability true weight / upper bound.
+        PruningThreshold is not applied.
+
+    Args:
+        a: Agent
+        time (int): Current time
+
+    Returns:
+        List[str]: the chosen route, or None if no route could be drawn.
+    """
+    distance_softening = SimulationSettings.move_rules["DistanceSoftening"]
+    distance_power = SimulationSettings.move_rules["DistancePower"]
+    weight_power = SimulationSettings.move_rules["WeightPower"]
+    if distance_power < 0.0 or weight_power < 0.0:
+        # The distance bins only give an upper bound of the weight for non-negative powers.
+        return None
+
+    table = topology.getWalkTable(a.location)
+    if len(table.nodes) < 2 or distance_softening + table.min_distance <= 0.0:
+        return None
+
+    h, weighted, totals = table.getBoundWeights(distance_softening, distance_power, weight_power)
+
+    weight_softening = SimulationSettings.move_rules["WeightSoftening"]
+    scores = [0.0] + [float(weight_softening + (float(getEndPointScore(agent=a, endpoint=node, time=time)))) for node in table.nodes[1:]]
+    caps = [1.0] + [getCapMultiplier(node, 0) for node in table.nodes[1:]]
+    endpoint_weights = np.array([(s * c)**weight_power for s, c in zip(scores, caps)]) * totals
+    cum_endpoints = np.cumsum(endpoint_weights)
+    if not cum_endpoints[-1] > 0.0:
+        return None
+
+    num_bins = table.counts.shape[2]
+    for attempt in range(0, WALK_SAMPLING_ATTEMPTS):
+        v = int(np.searchsorted(cum_endpoints, random.random() * cum_endpoints[-1], side="right"))
+
+        cum_bins = np.cumsum(weighted[:, v, :])
+        j = int(np.searchsorted(cum_bins, random.random() * cum_bins[-1], side="right"))
+        k = j // num_bins + 1
+        b = j % num_bins
+
+        # Walk backwards, choosing each previous edge in proportion to the number of walks through it.
+        links = []
+        node = v
+        remaining = b
+        for step in range(k, 0, -1):
+            candidates = []
+            counts = []
+            for e in table.in_edges[node]:
+                shift = table.edge_shift[e]
+                if shift <= remaining:
+                    candidates.append(e)
+                    counts.append(table.counts[step - 1, table.edge_start[e], remaining - shift])
+            e = random.choices(candidates, weights=counts)[0]
+            links = table.edge_links[e] + links
+            remaining -= table.edge_shift[e]
+            node = table.edge_start[e]
+
+        route = [lel.endpoint.name for lel in links]
+        if a.location.name in route or len(set(route)) < len(route):
+            continue # Loops are not allowed.
+
+        prior_distance = 0.0
+        for lel in links[:-1]:
+            prior_distance = prior_distance + lel.get_distance()
+        weight = ((scores[v] / float(distance_softening + links[-1].get_distance() + prior_distance)**distance_power) * caps[v])**weight_power
+        bound = (scores[v] * caps[v])**weight_power * h[b]
+        if random.random() * bound < weight:
+            return route
+
+    print(f"WARNING: route_engine dp could not draw a route for Location {a.location.name} in {WALK_SAMPLING_ATTEMPTS} attempts, using path enumeration.", file=sys.stderr)
+    return None
+
+
+def refreshRouteCacheEntry(entry: dict, caps: tuple) -> None:
+    """
+    Summary:
+        (Re)computes the pruned routes and cumulative weights of a route cache
+        entry for the given capacity multipliers, in the same way as selectRoute.
+
+    Args:
+        entry (dict): route cache entry (see chooseCachedRoute).
+        caps (tuple): capacity multipliers of entry["cap_locations"].
+
+    Returns:
+        None.
+    """
+    cap_of = {id(loc): cap for loc, cap in zip(entry["cap_locations"], caps)}
+    weight_power = SimulationSettings.move_rules["WeightPower"]
+
+    weights = [(core * cap_of.get(id(ep), 1.0))**weight_power for core, ep in zip(entry["cores"], entry["endpoints"])]
+    weights, routes = pruneRoutes(weights, list(entry["routes"]))
+
+    entry["caps"] = caps
+    entry["choices"] = routes
+    entry["cum_weights"] = []
+    if len(weights) > 0:
+        entry["cum_weights"] = list(itertools.accumulate(normalizeWeights(weights=weights)))
+
+
+def chooseCachedRoute(a, time: int):
+    """
+    Summary:
+        Chooses a route like selectRoute, but reuses the route weights of other
+        agents at the same location with the same decision class
+        (see getDecisionClass) within the current time step.
+        The capacity multipliers of the endpoints are checked on every use,
+        and the weights are recomputed when they have changed. The random draw
+        is identical to that of chooseFromWeights.
+
+    Args:
+        a: Agent
+        time (int): Current time
+
+    Returns:
+        List[str]: the chosen route, or None if there are no routes.
+    """
+    cache = a.location.route_cache
+    key = getDecisionClass(a)
+    entry = cache.get(key)
+
+    if entry is None:
+        route_cache_stats["misses"] += 1
+        entry = {"cores": [], "routes": [], "endpoints": []}
+        if topology.use_path_tables():
+            table = topology.getPathTable(a.location)
+            entry["cores"] = calculatePathTableCores(a, table, time).tolist()
+            entry["routes"] = table.getRoutes()
+            entry["endpoints"] = [table.endpoints[j] for j in table.endpoint_index]
+        else:
+            for link in a.location.links:
+                c, r, ep = calculateRouteTable(a, link=link, prior_distance=0.0, origin_names=[a.location.name], step=1, time=time)
+                entry["cores"] += c
+                entry["routes"] += r
+                entry["endpoints"] += ep
+
+            #Last step: delete origin from suggested routes.
+            entry["routes"] = [route[1:] for route in entry["routes"]]
+
+        cap_locations = {}
+        for ep in entry["endpoints"]:
+            if ep.capacity > 0:
+                cap_locations[id(ep)] = ep
+        entry["cap_locations"] = list(cap_locations.values())
+
+        refreshRouteCacheEntry(entry, tuple(getCapMultiplier(loc, 0) for loc in entry["cap_locations"]))
+        cache[key] = entry
+        route_cache_locations.add(a.location)
+    else:
+        caps = tuple(getCapMultiplier(loc, 0) for loc in entry["cap_locations"])
+        if caps != entry["caps"]:
+            route_cache_stats["revalidations"] += 1
+            refreshRouteCacheEntry(entry, caps)
+        else:
+            route_cache_stats["hits"] += 1
+
+    if len(entry["choices"]) == 0:
+        return None
+
+    return list(random.choices(entry["choices"], cum_weights=entry["cum_weights"])[0])
+
+
 @check_args_type
 def selectRoute(a, time: int, debug: bool = False, return_all_routes: bool = False, system2_active: bool = False):
   """
@@ -552,6 +1098,22 @@ def selectRoute(a, time: int, debug: bool = False, return_all_routes: bool = Fal
       linklen = len(a.location.links)
       return [np.random.randint(0, linklen)]
 
+  if SimulationSettings.move_rules["RouteEngine"] == "dp" and not (debug or return_all_routes or system2_active) and SimulationSettings.move_rules["FixedRoutes"] is False:
+      route = sampleWalkTableRoute(a, time)
+      if route is not None:
+          return route
+
+  if use_route_cache() and not (debug or return_all_routes or system2_active) and SimulationSettings.move_rules["FixedRoutes"] is False:
+      route = chooseCachedRoute(a, time)
+      if route is not None:
+          return route
+      # No routes available: fall through, so that the warning below reports the full tree.
+
+  if topology.use_path_tables() and not (debug or return_all_routes or system2_active) and SimulationSettings.move_rules["FixedRoutes"] is False:
+      route = choosePathTableRoute(a, time)
+      if route is not None:
+          return route
+
   # Store original parameters for System 2 modification
   original_params = {}
   if SimulationSettings.move_rules["TwoSystemDecisionMaking"] and system2_active:
@@ -617,3 +1179,41 @@ def selectRoute(a, time: int, debug: bool = False, return_all_routes: bool = Fal
   
   return route
 
+
+
+@check_args_type
+def selectRouteCounts(a, time: int, number: int) -> list:
+  """
+  Summary:
+      Selects routes for <number> agents that share the location and attributes of
+      agent <a> (used by cohort mode, see flee/cohorts.py). The route weights are
+      calculated once, and the agents are distributed over the routes with a single
+      multinomial draw.
+
+  Args:
+    a: Representative agent
+    time (int): Current time
+    number (int): Number of agents that select a route
+
+  Returns:
+      list: (route, number of agents) pairs, for routes chosen by at least one agent.
+  """
+  if SimulationSettings.move_rules["AwarenessLevel"] == 0 or SimulationSettings.move_rules["FixedRoutes"] is True:
+      # Weights are not available as a list: select the routes one by one.
+      counts = {}
+      for _ in range(0, number):
+          route = selectRoute(a, time=time)
+          if len(route) > 0:
+              counts[tuple(route)] = counts.get(tuple(route), 0) + 1
+      return [(list(route), n) for route, n in counts.items()]
+
+  weights, routes = selectRoute(a, time=time, return_all_routes=True)
+  if len(weights) == 0:
+      return []
+  weights, routes = pruneRoutes(weights, [r[1:] for r in routes])
+
+  total = sum(weights)
+  if total <= 0.0:
+      return []
+  counts = np.random.multinomial(number, np.array(weights) / total)
+  return [(routes[i], int(n)) for i, n in enumerate(counts) if n > 0]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import io
 import os
 import sys
 from functools import wraps
@@ -8,7 +9,7 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 
 import numpy as np
-from flee import flee,scoring,spawning,crawling,demographics
+from flee import flee,scoring,spawning,crawling,demographics,agentstore,moving,topology,cohorts,checkpoint,linkflow
 from flee.Diagnostics import write_agents_par,write_links_par
 from flee.SimulationSettings import SimulationSettings
 from mpi4py import MPI
@@ -95,7 +96,7 @@ class Person(flee.Person):
         self.e = e
 
     @check_args_type
-    def evolve(self, e, time: int, ForceTownMove: bool = False) -> None:
+    def evolve(self, e, time: int, ForceTownMove: bool = False, move_decision: Optional[bool] = None) -> None:
         """
         Summary:
             Evolves the person's state for a given time step.
@@ -104,11 +105,12 @@ class Person(flee.Person):
             e (Ecosystem): The ecosystem in which the person lives.
             time (int): The current time step.
             ForceTownMove (bool, optional): Whether or not to force towns to move. Defaults to False. Towns have a move chance of 1.0.
+            move_decision (bool, optional): Move decision drawn by the batched move-chance stage.
 
         Returns:
             None.
         """
-        super().evolve(e, time=time, ForceTownMove=ForceTownMove)
+        super().evolve(e, time=time, ForceTownMove=ForceTownMove, move_decision=move_decision)
 
     @check_args_type
     def finish_travel(self, e, time: int) -> None:
@@ -209,33 +211,38 @@ class Location(flee.Location):
 
 
     @check_args_type
-    def DecrementNumAgents(self) -> None:
+    def DecrementNumAgents(self, agent=None) -> None:
         """
         Summary: 
             Decrements the number of agents at the location by 1.
 
         Args:
-            None.
+            agent (optional): The agent that leaves the location,
+            needed to update the demographic counts of the location.
 
         Returns:
             None.
         """
         self.numAgentsOnRank -= 1
+        if agent is not None:
+            demographics.count_agents(self, agent.attributes, -1)
 
 
     @check_args_type
-    def IncrementNumAgents(self, agent) -> None:
+    def IncrementNumAgents(self, agent, number: int = 1) -> None:
         """
         Summary: 
-            Increments the number of agents at the location by 1.
+            Increments the number of agents at the location by 1, or by <number>.
 
         Args: 
-            None.
+            number (int, optional): The number of agents added (for blocks of new agents). Defaults to 1.
 
         Returns: 
             None.
         """
-        self.numAgentsOnRank += 1
+        self.numAgentsOnRank += number
+        if agent is not None:
+            demographics.count_agents(self, agent.attributes, number)
 
 
     @check_args_type
@@ -327,19 +334,19 @@ class Link(flee.Link):
 
 
     @check_args_type
-    def DecrementNumAgents(self) -> None:
+    def DecrementNumAgents(self, agent=None) -> None:
         """
         Summary: 
             Decrements the number of agents on the link by 1.
 
         Args:
-            None.
+            agent (optional): The agent that leaves the link.
 
         Returns:
             None.
         """
         self.numAgentsOnRank -= 1
-        super().DecrementNumAgents()
+        super().DecrementNumAgents(agent)
 
 
     @check_args_type
@@ -398,9 +405,20 @@ class Ecosystem(flee.Ecosystem):
         """
         self.locations = []
         self.locationNames = []
+        self.location_index = {}  # location name -> index in self.locations.
+        self.link_index = {}  # (startpoint name, endpoint name) -> list of open Links.
         self.agents = []
+        if agentstore.use_agent_store():
+            self.agents = agentstore.AgentStore(self, Person)
+        self.link_flows = linkflow.LinkFlows()  # cumulative agent counts per link on this rank.
+        self.cohorts = None
+        if cohorts.use_cohorts():
+            print("ERROR in simulationsetting.yml: optimisations.cohorts is only supported in serial runs.", file=sys.stderr)
+            sys.exit()
         self.total_agents = 0
         self.closures = []  # format [type, source, dest, start, end]
+        self.closure_schedule = None  # closures indexed by day (see scheduler.build_closure_schedule).
+        self.graph = topology.CompiledGraph(self)  # CSR view of locations and links (see get_graph).
         self.time = 0
         self.start_date_string = start_date
         self.date = datetime.strptime(self.start_date_string, "%Y-%m-%d") + timedelta(days=self.time)
@@ -420,17 +438,19 @@ class Ecosystem(flee.Ecosystem):
         demographics.init_demographics(self)
         if SimulationSettings.move_rules["MatchCampReligion"] is True:
             religions = demographics.get_attribute_values("religion")
-            self.scores_per_location += len(religions)
             self.demographics_list["religion"] = religions
         if (SimulationSettings.move_rules["MatchCampEthnicity"] or 
             SimulationSettings.move_rules["MatchTownEthnicity"] or 
             SimulationSettings.move_rules["MatchConflictEthnicity"]) is True:
             ethnicities = demographics.get_attribute_values("ethnicity")
-            self.scores_per_location += len(ethnicities)
             self.demographics_list["ethnicity"] = ethnicities
+        self.counted_attributes = tuple(self.demographics_list.keys())  # attributes counted in Location.demographic_counts.
 
         # Bring conflict zone management into FLEE.
         self.spawn_weights = np.array([])
+        self.spawn_weight_buffer = np.zeros(0)  # preallocated storage of spawn_weights.
+        self.spawn_weights_dirty = set()  # indices of locations whose spawn weight needs recomputation.
+        self.spawn_weight_time = 0  # e.time of the last full refresh (see spawning.refresh_spawn_weights).
 
         # classic for replicated locations or loc-par for distributed
         # locations.
@@ -501,13 +521,8 @@ class Ecosystem(flee.Ecosystem):
         forced_redirection: bool = False,
         attributes: dict = {},
     ) -> None:
-        endpoint1_index = -1
-        endpoint2_index = -1
-        for i in range(0, len(self.locationNames)):
-            if self.locationNames[i] == endpoint1:
-                endpoint1_index = i
-            if self.locationNames[i] == endpoint2:
-                endpoint2_index = i
+        endpoint1_index = self.location_index.get(endpoint1, -1)
+        endpoint2_index = self.location_index.get(endpoint2, -1)
 
         if endpoint1_index < 0:
             print("Diagnostic: Ecosystem.locationNames: ", self.locationNames, file=sys.stderr)
@@ -522,23 +537,30 @@ class Ecosystem(flee.Ecosystem):
                     endpoint2, endpoint1), file=sys.stderr)
             sys.exit()
 
-        self.locations[endpoint1_index].links.append(
-            Link(
-                startpoint=self.locations[endpoint1_index],
-                endpoint=self.locations[endpoint2_index],
-                distance=distance,
-                forced_redirection=forced_redirection,
-                attributes=attributes,
-            )
+        link1 = Link(
+            startpoint=self.locations[endpoint1_index],
+            endpoint=self.locations[endpoint2_index],
+            distance=distance,
+            forced_redirection=forced_redirection,
+            attributes=attributes,
         )
-        self.locations[endpoint2_index].links.append(
-            Link(
-                startpoint=self.locations[endpoint2_index],
-                endpoint=self.locations[endpoint1_index],
-                distance=distance,
-                attributes=attributes,
-            )
+        link2 = Link(
+            startpoint=self.locations[endpoint2_index],
+            endpoint=self.locations[endpoint1_index],
+            distance=distance,
+            attributes=attributes,
         )
+        self.link_flows.register(link1)
+        self.link_flows.register(link2)
+        self.locations[endpoint1_index].links.append(link1)
+        self.locations[endpoint2_index].links.append(link2)
+        self.link_index.setdefault((endpoint1, endpoint2), []).append(link1)
+        self.link_index.setdefault((endpoint2, endpoint1), []).append(link2)
+        self.graph.mark_location(endpoint1_index)
+        self.graph.mark_location(endpoint2_index)
+        self.invalidate_route_cache()
+        topology.invalidatePathTables(self.locations[endpoint1_index])
+        topology.invalidatePathTables(self.locations[endpoint2_index])
 
 
     @check_args_type
@@ -558,8 +580,19 @@ class Ecosystem(flee.Ecosystem):
         total = 0
 
         if mode == "low_latency":
-            for loc in self.locations:
-                loc.numAgents = self.mpi.CalcCommWorldTotalSingle(loc.numAgentsOnRank)
+            # The demographic counts of the locations are summed up in the same call as the first location.
+            demographic_buffer = demographics.demographic_count_buffer(self)
+            demographic_totals = None
+            for i, loc in enumerate(self.locations):
+                if i == 0 and len(demographic_buffer) > 0:
+                    numAgent_buffer = np.empty(1 + len(demographic_buffer), dtype="i")
+                    numAgent_buffer[0] = loc.numAgentsOnRank
+                    numAgent_buffer[1:] = demographic_buffer
+                    new_buffer = self.mpi.CalcCommWorldTotal(numAgent_buffer)
+                    loc.numAgents = new_buffer[0]
+                    demographic_totals = new_buffer[1:]
+                else:
+                    loc.numAgents = self.mpi.CalcCommWorldTotalSingle(loc.numAgentsOnRank)
                 total += loc.numAgents
                 # print("location:", self.time, loc.name, loc.numAgents, file=sys.stderr)
                 for link in loc.links:
@@ -573,6 +606,8 @@ class Ecosystem(flee.Ecosystem):
                         #       file=sys.stderr)
                         total += link.numAgents
             self.total_agents = total
+            if demographic_totals is not None:
+                demographics.update_demographic_attributes(self, demographic_totals)
         elif mode == "high_latency":
             buf_len = 0
 
@@ -582,7 +617,10 @@ class Ecosystem(flee.Ecosystem):
                 if CountClosed:
                     buf_len += len(loc.closed_links)
 
-            numAgent_buffer = np.empty(buf_len, dtype="i")
+            # The demographic counts of the locations are summed up in the same call.
+            demographic_buffer = demographics.demographic_count_buffer(self)
+            numAgent_buffer = np.empty(buf_len + len(demographic_buffer), dtype="i")
+            numAgent_buffer[buf_len:] = demographic_buffer
 
             index = 0
             for loc in self.locations:
@@ -610,7 +648,9 @@ class Ecosystem(flee.Ecosystem):
                         link.numAgents = new_buffer[index]
                         index += 1
 
-            self.total_agents = np.sum(new_buffer)
+            self.total_agents = np.sum(new_buffer[:buf_len])
+            if len(demographic_buffer) > 0:
+                demographics.update_demographic_attributes(self, new_buffer[buf_len:])
 
         if self.mpi.rank == 0 and log is True:
             print(
@@ -672,7 +712,41 @@ class Ecosystem(flee.Ecosystem):
 
 
     @check_args_type
-    def insertAgents(self, location, number: int) -> None:
+    def addAgents(self, location, number: int, attribute_columns: Optional[dict] = None) -> None:
+        """
+        Summary:
+            Adds a number of agents to the ecosystem at the specified location,
+            taking them from the population once.
+
+        Args:
+            location (Location): The location to add the agents to.
+            number (int): The number of agents to add.
+            attribute_columns (dict, optional): attribute name -> sequence of
+                <number> values (see spawning.draw_spawn_attribute_columns).
+
+        Returns:
+            None.
+        """
+        if number < 1:
+            return
+
+        if SimulationSettings.spawn_rules["TakeFromPopulation"]:
+            if location.pop > number:
+                location.pop -= number
+                location.numAgentsSpawnedOnRank += number
+                location.numAgentsSpawned += number
+            else:
+                print(
+                    "ERROR: Number of agents in the simulation is larger than the combined "
+                    "population of the conflict zones. Please amend locations.csv." 
+                )
+                location.print()
+                assert location.pop > number
+        self._insert_agent_block(location, number, attribute_columns)
+
+
+    @check_args_type
+    def insertAgents(self, location, number: int, attribute_columns: Optional[dict] = None) -> None:
         """
         Summary: 
             Inserts a number of agents into the ecosystem at the specified
@@ -682,12 +756,46 @@ class Ecosystem(flee.Ecosystem):
         Args:
             location (Location): The location to insert the agents into.
             number (int): The number of agents to insert.
+            attribute_columns (dict, optional): attribute name -> sequence of
+                <number> values (see spawning.draw_spawn_attribute_columns).
+
+        Returns:
+            None.
+        """
+        if number < 1:
+            return
+
+        self._insert_agent_block(location, number, attribute_columns)
+
+
+    def _insert_agent_block(self, location, number: int, attribute_columns: Optional[dict]) -> None:
+        """
+        Summary:
+            Creates the agents of a block of <number> new agents that are
+            assigned to this rank (round robin on total_agents, as in addAgent).
+            Private function, use addAgents or insertAgents instead.
+
+        Args:
+            location (Location): The location of the new agents.
+            number (int): The number of agents in the block (on all ranks).
+            attribute_columns (dict, optional): attribute name -> sequence of <number> values.
 
         Returns:
             None.
         """
-        for _ in range(0, number):
-            self.insertAgent(location=location)
+        local = np.flatnonzero((self.total_agents + 1 + np.arange(number)) % self.mpi.size == self.mpi.rank)
+        self.total_agents += number
+
+        if attribute_columns is None:
+            attribute_columns = {}
+        columns = {name: [values[i] for i in local] for name, values in attribute_columns.items()}
+
+        if isinstance(self.agents, agentstore.AgentStore):
+            self.agents.append_block(location, len(local), columns)
+        else:
+            names = list(columns.keys())
+            for values in zip(*columns.values()) if len(names) > 0 else [()] * len(local):
+                self.agents.append(Person(self, location=location, attributes=dict(zip(names, values))))
 
 
     @check_args_type
@@ -704,17 +812,22 @@ class Ecosystem(flee.Ecosystem):
             None. 
         """
 
-        new_agents = []
+        keep = []
         for agent in self.agents:
             if agent.location.name not in location_names:
-                new_agents += [agent]
+                keep += [True]
             else:
                 # print("Agent removed: ", agent.location.name)
                 # agent is removed from ecosystem and number of agents in
                 # location drops by one.
                 agent.location.numAgentsOnRank -= 1
+                demographics.count_agents(agent.location, agent.attributes, -1)
+                keep += [False]
 
-        self.agents = new_agents
+        if isinstance(self.agents, agentstore.AgentStore):
+            self.agents.retain(keep)
+        else:
+            self.agents = [a for a, k in zip(self.agents, keep) if k]
         print("clearLocationsFromAgents()", file=sys.stderr)
         # when numAgentsOnRank has changed, we need to updateNumAgents (1x
         # MPI_Allreduce)
@@ -751,6 +864,185 @@ class Ecosystem(flee.Ecosystem):
         return len(self.agents)
 
 
+    @check_args_type
+    def store_location_scores(self, locations: list, scores: np.ndarray) -> None:
+        """
+        Summary:
+            Stores the location scores calculated by scoring.calculateLocationScores
+            in the shared scores array (see Location.setScore).
+
+        Args:
+            locations (list): The locations.
+            scores (np.ndarray): The score of each location.
+
+        Returns:
+            None.
+        """
+        ids = np.fromiter((loc.id for loc in locations), dtype=np.int64, count=len(locations))
+        Ecosystem.scores[ids * self.scores_per_location] = scores
+
+
+    def _rank_counters(self, links: list) -> dict:
+        """
+        Summary:
+            Returns the location and link counters that only cover the agents
+            on this rank. They are summed over all ranks when used, so the
+            counters of several ranks can be combined by adding them up.
+
+        Args:
+            links (list): Link objects, in checkpoint order.
+
+        Returns:
+            dict: counter name -> values per location or link.
+        """
+        return {
+            "location_agents": np.array([loc.numAgentsOnRank for loc in self.locations], dtype=np.int64),
+            "location_spawned": np.array([loc.numAgentsSpawnedOnRank for loc in self.locations], dtype=np.int64),
+            "demographic_counts": [dict(loc.demographic_counts) for loc in self.locations],
+            "link_agents": np.array([link.numAgentsOnRank for link in links], dtype=np.int64),
+        }
+
+
+    def _set_rank_counters(self, links: list, counters: list) -> None:
+        """
+        Summary:
+            Sets the rank-local location and link counters to the sum of the
+            counters of one or more checkpoint shards (see _rank_counters).
+
+        Args:
+            links (list): Link objects, in checkpoint order.
+            counters (list): counters of the shards assigned to this rank.
+
+        Returns:
+            None.
+        """
+        for i, loc in enumerate(self.locations):
+            loc.numAgentsOnRank = sum(int(c["location_agents"][i]) for c in counters)
+            loc.numAgentsSpawnedOnRank = sum(int(c["location_spawned"][i]) for c in counters)
+            loc.demographic_counts = {}
+            for c in counters:
+                for value, n in c["demographic_counts"][i].items():
+                    loc.demographic_counts[value] = loc.demographic_counts.get(value, 0) + n
+        for k, link in enumerate(links):
+            link.numAgentsOnRank = sum(int(c["link_agents"][k]) for c in counters)
+
+
+    @check_args_type
+    def write_checkpoint(self, file_name: str, ig=None) -> None:
+        """
+        Summary:
+            Writes the simulation state to a checkpoint (see flee/checkpoint.py).
+            Each rank writes a shard with its own agents, concurrently. With
+            checkpoints.mpi_io, the shards are written with MPI-IO into the single
+            file <file_name>; otherwise, each shard is a separate file (see
+            checkpoint.shard_file_name). Collective: to be called on all ranks,
+            between time steps.
+
+        Args:
+            file_name (str): name of the checkpoint.
+            ig (InputGeography, optional): input geography whose time stepping state is saved.
+
+        Returns:
+            None.
+        """
+        comm = self.mpi.comm
+        links = checkpoint.enumerate_links(self)
+        extra = {
+            "rank": self.mpi.rank,
+            "num_shards": self.mpi.size,
+            "shard_sizes": comm.allgather(len(self.agents)),
+            "counters": self._rank_counters(links),
+        }
+        if self.mpi.rank == 0:
+            extra["scores"] = Ecosystem.scores.copy()
+        arrays = checkpoint.get_state(self, Person, ig, links, shared=self.mpi.rank == 0, extra=extra)
+
+        directory = os.path.dirname(file_name)
+        if self.mpi.rank == 0 and directory != "":
+            os.makedirs(directory, exist_ok=True)
+        comm.Barrier()
+
+        if SimulationSettings.checkpoints.get("MPIIO", False) is True:
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            data = np.frombuffer(buffer.getbuffer(), dtype=np.uint8)
+            sizes = comm.allgather(len(data))
+            header = checkpoint.container_header(sizes)
+            fh = MPI.File.Open(comm, file_name, MPI.MODE_WRONLY | MPI.MODE_CREATE)
+            fh.Set_size(0)
+            if self.mpi.rank == 0:
+                fh.Write_at(0, np.frombuffer(header, dtype=np.uint8))
+            fh.Write_at_all(len(header) + sum(sizes[:self.mpi.rank]), data)
+            fh.Close()
+        else:
+            with open(checkpoint.shard_file_name(file_name, self.mpi.rank), "wb") as f:
+                np.savez(f, **arrays)
+        comm.Barrier()
+
+
+    @check_args_type
+    def read_checkpoint(self, file_name: str, ig=None) -> None:
+        """
+        Summary:
+            Restores a checkpoint written by write_checkpoint, on the same or a
+            different number of ranks. On the same number of ranks, each rank
+            takes over the agents and random number generator states of the rank
+            that wrote its shard, and the simulation continues exactly as before.
+            Otherwise, the agents are redistributed in equal contiguous blocks,
+            the rank-local counters of shard s are added to rank s % size, and
+            ranks without a shard keep their own random number generator states.
+            Collective: to be called on all ranks.
+
+        Args:
+            file_name (str): name of the checkpoint.
+            ig (InputGeography, optional): input geography whose time stepping state is restored.
+
+        Returns:
+            None.
+        """
+        shards = checkpoint.CheckpointShards(file_name)
+        # The agents of shard 0 are only read if this rank needs them (below).
+        arrays = shards.load(0, ["state", "link_start", "link_end", "link_distance"])
+        links = checkpoint.match_links(self, arrays)
+        shared_state = checkpoint.load_state(self, arrays, links)
+        checkpoint.restore_shared_state(self, shared_state, links, ig)
+        Ecosystem.scores = shared_state["scores"].copy()
+
+        num_shards = shared_state["num_shards"]
+        shard_sizes = shared_state["shard_sizes"]
+        rank, size = self.mpi.rank, self.mpi.size
+
+        # Agents: shard <rank> as a whole, or an equal block of all agents.
+        if num_shards == size:
+            blocks = [(rank, 0, shard_sizes[rank])]
+        else:
+            first = rank * sum(shard_sizes) // size
+            last = (rank + 1) * sum(shard_sizes) // size
+            blocks = []
+            shard_start = 0
+            for s, n in enumerate(shard_sizes):
+                start, stop = max(first, shard_start), min(last, shard_start + n)
+                if start < stop:
+                    blocks.append((s, start - shard_start, stop - shard_start))
+                shard_start += n
+
+        states = {}
+        parts = []
+        for s in sorted(set([s for s, _, _ in blocks] + list(range(rank, num_shards, size)))):
+            shard_arrays = shards.load(s)
+            states[s] = shared_state if s == 0 else checkpoint.load_state(self, shard_arrays, links)
+            for b, start, stop in blocks:
+                if b == s:
+                    parts.append((checkpoint.agent_columns(shard_arrays), states[s]["agents"], start, stop))
+
+        columns, agent_state = checkpoint.merge_agent_columns(parts)
+        checkpoint.set_agents(self, columns, agent_state, Person, links)
+        self._set_rank_counters(links, [states[s]["counters"] for s in range(rank, num_shards, size)])
+        # Last, as type checking (FLEE_TYPE_CHECK) draws from the random module.
+        if rank < num_shards:
+            checkpoint.restore_random_state(states[rank])
+
+
     @check_args_type
     def synchronize_locations(self, start_loc_local: int, end_loc_local: int, Debug: bool = False) -> None:
         """
@@ -792,8 +1084,6 @@ class Ecosystem(flee.Ecosystem):
             # print(self.mpi.rank, local_scores, scores, sizes, offsets)
         self.mpi.comm.Allgatherv(local_scores, [Ecosystem.scores, sizes, offsets, MPI.DOUBLE])
 
-        demographics.update_locations_demographic_attributes(self, parallel_mode=True)
-
         if Debug and self.mpi.rank == 0:
             print("end of synchronize_locations", file=sys.stderr)
 
@@ -811,22 +1101,26 @@ class Ecosystem(flee.Ecosystem):
             None.
 
         """
+        spawning.refresh_spawn_weights(self) # Required to correctly incorporate TakeFromPopulation and ConflictSpawnDecay.
+
         if self.time == 0:
             # print("rank, num_agents:", self.mpi.rank, len(self.agents))
 
             # Update all scores three times to ensure code starts with updated
             # scores.
-            for i, loc in enumerate(self.locations):
-                if i % self.mpi.size == self.mpi.rank:
-                    loc.updateAllScores(time=self.time)
-            demographics.update_demographic_attributes(self)
+            local_locations = [loc for i, loc in enumerate(self.locations) if i % self.mpi.size == self.mpi.rank]
+            for loc in local_locations:
+                loc.time = self.time
+            scoring.updateLocationScores(self.time, self, local_locations)
+            if len(self.demographics_list) > 0:
+                # Afterwards, the demographic counts are summed up in updateNumAgents.
+                demographics.update_demographic_attributes(self, self.mpi.CalcCommWorldTotal(demographics.demographic_count_buffer(self)))
 
         if self.parallel_mode == "classic":
             for loc in self.locations:
                 loc.time = self.time
                 loc.routes = {}
-                scoring.updateLocationScore(self.time, loc)
-                demographics.update_demographic_attributes(self)
+            scoring.updateLocationScores(self.time, self)
 
         elif self.parallel_mode == "loc-par":
             # update scores in reverse order for efficiency.
@@ -841,9 +1135,10 @@ class Ecosystem(flee.Ecosystem):
             if self.mpi.rank < lpr_remainder:
                 num_locs_on_this_rank += 1
 
-            for i in range(offset, offset + num_locs_on_this_rank):
-                self.locations[i].updateAllScores(time=self.time)
-            demographics.update_demographic_attributes(self)
+            local_locations = self.locations[offset : offset + num_locs_on_this_rank]
+            for loc in local_locations:
+                loc.time = self.time
+            scoring.updateLocationScores(self.time, self, local_locations)
 
             self.synchronize_locations(
                 start_loc_local=offset, end_loc_local=offset + num_locs_on_this_rank
@@ -871,29 +1166,55 @@ class Ecosystem(flee.Ecosystem):
         for i, le in enumerate(self.locations):
             le.numAgentsSpawned = spawn_totals[i]
 
+        self.invalidate_route_cache()
+
         # update agent locations
-        for a in self.agents:
-            a.evolve(self, time=self.time)
+        decisions = None
+        if moving.use_batched_movechance():
+            decisions = moving.drawMoveDecisions(self, self.time)
+
+        if decisions is not None and isinstance(self.agents, agentstore.AgentStore) and not SimulationSettings.farming:
+            movers = self.agents.prepare_evolve(self.time) & decisions
+            for i in np.flatnonzero(movers):
+                self.agents.view(i).move(self, time=self.time)
+        else:
+            for i, a in enumerate(self.agents):
+                if decisions is None:
+                    a.evolve(self, time=self.time)
+                else:
+                    a.evolve(self, time=self.time, move_decision=bool(decisions[i]))
 
         # print("NumAgents after evolve:", file=sys.stderr)
         self.updateNumAgents(CountClosed=True, log=False)
 
-        for a in self.agents:
-            a.finish_travel(self, time=self.time)
-            a.timesteps_since_departure += 1
+        if isinstance(self.agents, agentstore.AgentStore):
+            # finish_travel() only affects agents that are on a link.
+            for i in np.flatnonzero(self.agents.travelling[:len(self.agents)]):
+                self.agents.view(i).finish_travel(self, time=self.time)
+            self.agents.advance_departure_counters(np.ones(len(self.agents), dtype=bool))
+        else:
+            for a in self.agents:
+                a.finish_travel(self, time=self.time)
+                a.timesteps_since_departure += 1
 
         if SimulationSettings.log_levels["agent"] > 0:
             write_agents_par(rank=self.mpi.rank, agents=self.agents, time=self.time)
 
         if SimulationSettings.log_levels["link"] > 0:
-            write_links_par(rank=self.mpi.rank, locations=self.locations, time=self.time)
+            if linkflow.use_aggregated_link_log():
+                linkflow.write_link_flows(self, self.time, rank=self.mpi.rank, comm=self.mpi.comm)
+            else:
+                write_links_par(rank=self.mpi.rank, locations=self.locations, time=self.time)
 
-        for a in self.agents:
-            a.recent_travel_distance = (
-                a.recent_travel_distance
-                + (a.distance_moved_this_timestep / SimulationSettings.move_rules["MaxMoveSpeed"])
-            ) / 2.0
-            a.distance_moved_this_timestep = 0
+        if isinstance(self.agents, agentstore.AgentStore):
+            self.agents.update_recent_travel_distance(SimulationSettings.move_rules["MaxMoveSpeed"])
+        else:
+            for a in self.agents:
+                a.recent_travel_distance = (
+                    a.recent_travel_distance
+                    + (a.distance_moved_this_timestep / SimulationSettings.move_rules["MaxMoveSpeed"])
+                ) / 2.0
+                a.distance_moved_this_timestep = 0
 
         # print("NumAgents after finish_travel:", file=sys.stderr)
         self.updateNumAgents(log=False)
@@ -909,6 +1230,7 @@ class Ecosystem(flee.Ecosystem):
                     if a.location.camp == True:
                         outcome = random.random()
                         if outcome < a.location.attributes.get("deactivation_probability", 0.0):
+                            demographics.count_agents(a.location, a.attributes, -1)
                             a.location = None
 
         self.time += 1
@@ -990,10 +1312,12 @@ class Ecosystem(flee.Ecosystem):
                 file=sys.stderr,
             )
         self.locations.append(loc)
-        self.spawn_weights = np.append(self.spawn_weights, [0.0])
         self.locationNames.append(loc.name)
+        self.location_index[loc.name] = len(self.locations) - 1
+        loc.graph = self.graph
+        loc.counted_attributes = self.counted_attributes
 
-        spawning.refresh_spawn_weights(self)
+        spawning.add_spawn_location(self)
 
 
         return loc
@@ -145,13 +145,8 @@ class Ecosystem(pflee.Ecosystem):
         Returns:
             None.
         """
-        endpoint1_index = -1
-        endpoint2_index = -1
-        for i, location_name in enumerate(self.locationNames):
-            if location_name == endpoint1:
-                endpoint1_index = i
-            if location_name == endpoint2:
-                endpoint2_index = i
+        endpoint1_index = self.location_index.get(endpoint1, -1)
+        endpoint2_index = self.location_index.get(endpoint2, -1)
 
         if endpoint1_index < 0:
             print("Diagnostic: Ecosystem.locationNames: ", self.locationNames)
@@ -170,22 +165,26 @@ class Ecosystem(pflee.Ecosystem):
             )
             sys.exit()
 
-        self.locations[endpoint1_index].links.append(
-            Link(
-                startpoint=self.locations[endpoint1_index],
-                endpoint=self.locations[endpoint2_index],
-                distance=distance,
-                forced_redirection=forced_redirection,
-                link_type=link_type,
-            )
+        link1 = Link(
+            startpoint=self.locations[endpoint1_index],
+            endpoint=self.locations[endpoint2_index],
+            distance=distance,
+            forced_redirection=forced_redirection,
+            link_type=link_type,
         )
-        self.locations[endpoint2_index].links.append(
-            Link(
-                startpoint=self.locations[endpoint2_index],
-                endpoint=self.locations[endpoint1_index],
-                distance=distance,
-            )
+        link2 = Link(
+            startpoint=self.locations[endpoint2_index],
+            endpoint=self.locations[endpoint1_index],
+            distance=distance,
         )
+        self.link_flows.register(link1)
+        self.link_flows.register(link2)
+        self.locations[endpoint1_index].links.append(link1)
+        self.locations[endpoint2_index].links.append(link2)
+        self.link_index.setdefault((endpoint1, endpoint2), []).append(link1)
+        self.link_index.setdefault((endpoint2, endpoint1), []).append(link2)
+        self.graph.mark_location(endpoint1_index)
+        self.graph.mark_location(endpoint2_index)
 
 
 # -------------------------------------------------------------------------
@@ -0,0 +1,214 @@
+import os
+import sys
+import numpy as np
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Day-indexed event scheduler.
+# Timed inputs (closures.csv, location_changes.csv, conflicts.csv, the conflict
+# dates in locations.csv and flood_level.csv) are converted once into events
+# indexed by day, so that each time step only visits the events that are due,
+# rather than scanning the input tables.
+
+CONFLICT_THRESHOLD = 0.000001
+
+
+class EventSchedule:
+    """
+    Events indexed by day and by kind. Events of a kind that are due on the
+    same day are kept in the order in which they were added.
+    """
+
+    def __init__(self, source=None):
+        """
+        Summary:
+            Creates an empty schedule.
+
+        Args:
+            source (optional): the input the schedule was built from, used to detect changes.
+
+        Returns:
+            None.
+        """
+        self.events = {} # day -> kind -> list of events.
+        self.source = source
+        self.source_length = len(source) if source is not None else 0
+
+
+    def __len__(self):
+        """
+        Returns the total number of scheduled events.
+        """
+        return sum(len(events) for kinds in self.events.values() for events in kinds.values())
+
+
+    @check_args_type
+    def add(self, day: int, kind: str, event) -> None:
+        """
+        Summary:
+            Adds an event of a given kind on a given day.
+
+        Args:
+            day (int): day on which the event is due.
+            kind (str): kind of the event (e.g. "close", "conflict").
+            event: event data, interpreted by the caller.
+
+        Returns:
+            None.
+        """
+        self.events.setdefault(day, {}).setdefault(kind, []).append(event)
+
+
+    @check_args_type
+    def due(self, day: int, kind: str) -> list:
+        """
+        Summary:
+            Returns the events of a given kind that are due on a given day.
+
+        Args:
+            day (int): day.
+            kind (str): kind of the events.
+
+        Returns:
+            list: events, in the order in which they were added.
+        """
+        kinds = self.events.get(day)
+        if kinds is None:
+            return []
+        return kinds.get(kind, [])
+
+
+    def is_stale(self, source) -> bool:
+        """
+        Summary:
+            Returns whether the schedule was built from a different (or since extended) input.
+
+        Args:
+            source: the current input.
+
+        Returns:
+            bool: True if the schedule needs to be rebuilt.
+        """
+        return source is not self.source or len(source) != self.source_length
+
+
+@check_args_type
+def build_closure_schedule(closures: list) -> EventSchedule:
+    """
+    Summary:
+        Indexes the closures of an Ecosystem by day. Each closure
+        [type, name1, name2, start, end] gives a "close" event on its
+        start day and a "reopen" event on its end day.
+
+    Args:
+        closures (list): closures, as stored in Ecosystem.closures.
+
+    Returns:
+        EventSchedule: schedule with "closure" events of the form (action, closure).
+    """
+    schedule = EventSchedule(closures)
+    for c in closures:
+        schedule.add(int(c[3]), "closure", ("close", c))
+        schedule.add(int(c[4]), "closure", ("reopen", c))
+    return schedule
+
+
+@check_args_type
+def add_location_change_events(schedule: EventSchedule, location_changes: list) -> None:
+    """
+    Summary:
+        Adds the rows of location_changes.csv (location_name,new_location_type,date)
+        as "location_change" events of the form (location_name, new_location_type).
+
+    Args:
+        schedule (EventSchedule): schedule to add the events to.
+        location_changes (list): rows of location_changes.csv.
+
+    Returns:
+        None.
+    """
+    for change in location_changes:
+        schedule.add(int(change[2]), "location_change", (change[0], change[1]))
+
+
+@check_args_type
+def add_conflict_table_events(schedule: EventSchedule, conflicts: dict) -> None:
+    """
+    Summary:
+        Adds the change points of a conflicts.csv table as "conflict" events of
+        the form (action, name, intensity). A zone that is in conflict on day 0
+        is added ("add"); after day 0, the intensity is set ("set") on the days
+        on which a conflict starts or ends. Intensity changes of an ongoing
+        conflict are not enacted, as before.
+
+    Args:
+        schedule (EventSchedule): schedule to add the events to.
+        conflicts (dict): location name -> conflict intensity per day.
+
+    Returns:
+        None.
+    """
+    for name, intensities in conflicts.items():
+        intensities = np.asarray(intensities, dtype=np.float64)
+        if len(intensities) == 0:
+            continue
+        if intensities[0] > CONFLICT_THRESHOLD:
+            schedule.add(0, "conflict", ("add", name, float(intensities[0])))
+        previous = intensities[:-1]
+        current = intensities[1:]
+        onset = (current > CONFLICT_THRESHOLD) & (previous < CONFLICT_THRESHOLD)
+        offset = (current < CONFLICT_THRESHOLD) & (previous >= CONFLICT_THRESHOLD)
+        for day in (np.nonzero(onset | offset)[0] + 1).tolist():
+            schedule.add(day, "conflict", ("set", name, float(intensities[day])))
+
+
+@check_args_type
+def add_location_conflict_events(schedule: EventSchedule, locations: list) -> None:
+    """
+    Summary:
+        Adds the conflict zones of locations.csv (location type "conflict" in
+        column 5, with a conflict date in column 6) as "conflict" events of the
+        form ("add", name, 1.0). Zones with a conflict date of 0 (or none) are
+        conflict zones from the start, and are not added again; the others are
+        loaded as towns (see InputGeography.StoreInputGeographyInEcosystem).
+
+    Args:
+        schedule (EventSchedule): schedule to add the events to.
+        locations (list): rows of locations.csv.
+
+    Returns:
+        None.
+    """
+    for loc in locations:
+        if "conflict" in loc[5].lower():
+            conflict_date = int(loc[6]) if len(loc[6]) > 0 else 0
+            if conflict_date > 0:
+                schedule.add(conflict_date, "conflict", ("add", loc[0], 1.0))
+
+
+@check_args_type
+def add_attribute_change_events(schedule: EventSchedule, attribute_name: str, table: dict) -> None:
+    """
+    Summary:
+        Adds the days on which a per-location attribute table (e.g. flood_level.csv)
+        changes value as events of kind <attribute_name>, of the form (name, value).
+        Values are converted to int, as in InputGeography.UpdateLocationAttributes.
+
+    Args:
+        schedule (EventSchedule): schedule to add the events to.
+        attribute_name (str): name of the attribute.
+        table (dict): location name -> attribute value per day.
+
+    Returns:
+        None.
+    """
+    for name, values in table.items():
+        if name == "#Day":
+            continue
+        values = np.trunc(np.asarray(values, dtype=np.float64)).astype(np.int64)
+        for day in (np.nonzero(values[1:] != values[:-1])[0] + 1).tolist():
+            schedule.add(day, attribute_name, (name, int(values[day])))
@@ -1,10 +1,13 @@
 from flee.SimulationSettings import SimulationSettings
 from flee import crawling
+import flee.spawning as spawning
 import flee.lib_math as lm
+import itertools
 import numpy as np
+import operator
 import os
 
-from typing import List, Optional, Tuple
+from typing import Optional
 
 if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
     from beartype import beartype as check_args_type
@@ -53,84 +56,190 @@ def updateLocationScore(time: int, loc) -> None:
 
     # #score multiplier for flooding
     if loc.flood_zone: #different to other weather forecaster terms as it only affects flood zones
+        score = applyFloodScore(time, loc, score)
 
-        flood_level = loc.attributes.get("flood_level")
-        
-        if flood_level is not None:
-            score *= lm.interp(SimulationSettings.move_rules["FloodLocWeights"], flood_level)
-        
-            #Flooding Forecaster Location Score Implementation:
-            if SimulationSettings.move_rules["FloodForecaster"] is True:
-
-                #Get the forecast timescale e.g. 5 day weather forecast
-                forecast_timescale = SimulationSettings.move_rules["FloodForecasterTimescale"]
-
-                #Get the forecast length e.g. only know the forecast until day 7
-                forecast_end_time = SimulationSettings.move_rules["FloodForecasterEndTime"] 
-
-                # If there is a forecast timescale and endtime are set
-                # If forecast_timescale is greater than 1 and the current time step is less than the forecast end time
-                if forecast_timescale is not None:
-                    if forecast_end_time is not None:
-                        if (forecast_timescale > 1.0) and (time <= forecast_end_time): 
+    loc.setScore(0, score)
+    # print(time, loc.name,loc.camp,loc.foreign,loc.scores)
+
+    if SimulationSettings.move_rules["FixedRoutes"] is True:
+        #print("INFO: Generating location routes.", file=sys.stderr)
+        crawling.generateLocationRoutes(loc, time)
+
+
+@check_args_type
+def applyFloodScore(time: int, loc, score: float) -> float:
+    """
+    Summary:
+        Applies the flood level (and flood forecaster) multipliers of a
+        flood zone to its location score.
+
+    Args:
+        time (int): The current timestep
+        loc (Location): The flood zone location
+        score (float): The location score before the flood multipliers
+
+    Returns:
+        float: The location score including the flood multipliers.
+    """
+    flood_level = loc.attributes.get("flood_level")
+    
+    if flood_level is not None:
+        score *= lm.interp(SimulationSettings.move_rules["FloodLocWeights"], flood_level)
+    
+        #Flooding Forecaster Location Score Implementation:
+        if SimulationSettings.move_rules["FloodForecaster"] is True:
+
+            #Get the forecast timescale e.g. 5 day weather forecast
+            forecast_timescale = SimulationSettings.move_rules["FloodForecasterTimescale"]
+
+            #Get the forecast length e.g. only know the forecast until day 7
+            forecast_end_time = SimulationSettings.move_rules["FloodForecasterEndTime"] 
+
+            # If there is a forecast timescale and endtime are set
+            # If forecast_timescale is greater than 1 and the current time step is less than the forecast end time
+            if forecast_timescale is not None:
+                if forecast_end_time is not None:
+                    if (forecast_timescale > 1.0) and (time <= forecast_end_time): 
+                
+                        #Set the default score value
+                        flood_forecast_score = 0.0 #no forecast, no flooding
+
+                        #No agent awareness weighting for flood forecast location score. 
+
+                        #Forecast loop: iterate over the location flood level weights for the forecast timescale
+                        for x in range(1, forecast_timescale + 1): #iterates over the 5 day forecast, ignoring the current day
+
+                            #the day of the forcast we're considering 
+                            forecast_day = time + x 
+
+                            # If the simulation length is less than the end of the forecast, then the forecast will be shorter
+                            if forecast_day >= forecast_end_time:
+                                # Set the forecast day to the end of the simulation
+                                forecast_day = forecast_end_time  # same as time + x
+
+                            #Get the forecast flood level for the location on the day we're considering in the for loop
+                            forecast_flood_level = loc.attributes.get("forecast_flood_level",0.0)
                     
-                            #Set the default score value
-                            flood_forecast_score = 0.0 #no forecast, no flooding
-
-                            #No agent awareness weighting for flood forecast location score. 
-
-                            #Forecast loop: iterate over the location flood level weights for the forecast timescale
-                            for x in range(1, forecast_timescale + 1): #iterates over the 5 day forecast, ignoring the current day
-
-                                #the day of the forcast we're considering 
-                                forecast_day = time + x 
-
-                                # If the simulation length is less than the end of the forecast, then the forecast will be shorter
-                                if forecast_day >= forecast_end_time:
-                                    # Set the forecast day to the end of the simulation
-                                    forecast_day = forecast_end_time  # same as time + x
-
-                                #Get the forecast flood level for the location on the day we're considering in the for loop
-                                forecast_flood_level = loc.attributes.get("forecast_flood_level",0.0)
-                        
-                                # print("forecast_flood_level",forecast_flood_level, file=sys.stderr)
-                                # print("forecast_day",forecast_day, file=sys.stderr)
-                                # forecast_flood_level = loc.attributes.get("forecast_flood_level",0)[forecast_day]
-                                # [forecast_day]
-
-                        
-                                # if it's not zero, then we need to modify the base forecast value, otherwise leave the base as it will zero.
-                                if forecast_flood_level > 0.0: 
-                                    #get the endpoint locations current flood level weight based on that flood level.
-                                    forecast_flood_level_weight = lm.interp(SimulationSettings.move_rules["FloodLocWeights"], forecast_flood_level) 
-                                    
-                                    #get the current flood forecaster weight e.g. how important the current day is in the forecast
-                                    flood_forecaster_weight = float(SimulationSettings.move_rules["FloodForecasterWeights"][forecast_day])
+                            # print("forecast_flood_level",forecast_flood_level, file=sys.stderr)
+                            # print("forecast_day",forecast_day, file=sys.stderr)
+                            # forecast_flood_level = loc.attributes.get("forecast_flood_level",0)[forecast_day]
+                            # [forecast_day]
+
+                    
+                            # if it's not zero, then we need to modify the base forecast value, otherwise leave the base as it will zero.
+                            if forecast_flood_level > 0.0: 
+                                #get the endpoint locations current flood level weight based on that flood level.
+                                forecast_flood_level_weight = lm.interp(SimulationSettings.move_rules["FloodLocWeights"], forecast_flood_level) 
                                 
-                                    #modify the flood_forecast_score using the flood level on the current day and the imporatance of the current day in the forecast loop
-                                    flood_forecast_score += forecast_flood_level_weight * flood_forecaster_weight
+                                #get the current flood forecaster weight e.g. how important the current day is in the forecast
+                                flood_forecaster_weight = float(SimulationSettings.move_rules["FloodForecasterWeights"][forecast_day])
+                            
+                                #modify the flood_forecast_score using the flood level on the current day and the imporatance of the current day in the forecast loop
+                                flood_forecast_score += forecast_flood_level_weight * flood_forecaster_weight
 
-                                #break the loop if we've reached the end of the forecast data 
-                                if forecast_day == forecast_end_time:
-                                    break
+                            #break the loop if we've reached the end of the forecast data 
+                            if forecast_day == forecast_end_time:
+                                break
 
-                            #the flood_forecast_base now represents the total weight of the flooding during the forecast for the endpoint location,
-                            # this needed to be divided by the total number of days in the forecast to get the average weight based on the severity and relative imporatance of the forecasted days
-                            flood_forecast_score *= float(flood_forecast_score/forecast_timescale)
+                        #the flood_forecast_base now represents the total weight of the flooding during the forecast for the endpoint location,
+                        # this needed to be divided by the total number of days in the forecast to get the average weight based on the severity and relative imporatance of the forecasted days
+                        flood_forecast_score *= float(flood_forecast_score/forecast_timescale)
 
-                            # Make the flood_forecast_base effect the actual base score
-                            score *= flood_forecast_score
+                        # Make the flood_forecast_base effect the actual base score
+                        score *= flood_forecast_score
 
-                    else:
-                        print("WARNING: flood_forecaster_endtime is not set in simsetting.yml", file=sys.stderr)
                 else:
-                    print("WARNING: flood_forecaster_timescale is not set in simsetting.yml", file=sys.stderr)
+                    print("WARNING: flood_forecaster_endtime is not set in simsetting.yml", file=sys.stderr)
+            else:
+                print("WARNING: flood_forecaster_timescale is not set in simsetting.yml", file=sys.stderr)
 
+    return score
 
-    loc.setScore(0, score)
-    # print(time, loc.name,loc.camp,loc.foreign,loc.scores)
+
+_score_attributes = operator.attrgetter("foreign", "camp", "idpcamp", "conflict", "flood_zone")
+
+
+@check_args_type
+def calculateLocationScores(time: int, locations: list) -> np.ndarray:
+    """
+    Summary:
+        Batched version of updateLocationScore: calculates the score of
+        all given locations with array operations over their foreign, camp,
+        conflict, IPC and flood attributes. The multipliers are applied in
+        the same order as in updateLocationScore, so the scores are identical.
+
+    Args:
+        time (int): The current timestep
+        locations (list): The locations to calculate the score for
+
+    Returns:
+        np.ndarray: score per location.
+    """
+    n = len(locations)
+    move_rules = SimulationSettings.move_rules
+    score = np.ones(n) #default score
+
+    # One pass over the locations: foreign, camp, idpcamp, conflict and flood_zone columns.
+    columns = np.fromiter(itertools.chain.from_iterable(map(_score_attributes, locations)), dtype=np.float64, count=5 * n).reshape(n, 5)
+    foreign = columns[:, 0] == 1.0
+    camp = (columns[:, 1] != 0.0) | (columns[:, 2] == 1.0)
+    conflict = columns[:, 3]
+    flood_zone = np.flatnonzero(columns[:, 4] != 0.0)
+
+    #score multiplier for foreign
+    if foreign.any():
+        if move_rules["UseEconomicPull"]:
+            for k in np.flatnonzero(foreign).tolist():
+                attributes = locations[k].attributes
+                score[k] += score[k] * (float(attributes["trade_volume"]) + float(attributes["hdi"])**2)
+        score[foreign] *= move_rules["ForeignWeight"]
+
+    if move_rules["AvoidFoodDeprivedLocations"] and time > 0:
+        domestic = np.flatnonzero(~foreign)
+        ipc_level = np.array([float(locations[k].attributes["region_IPC_level"]) for k in domestic.tolist()])
+        score[domestic] *= 1.0 - (ipc_level / 100.0)**2
+
+    #score multiplier for camps
+    score[camp] *= move_rules["CampWeight"]
+
+    #score multiplier for conflict
+    in_conflict = np.flatnonzero(conflict > 0.0)
+    if len(in_conflict) > 0:
+        time_of_conflict = np.array([locations[k].time_of_conflict for k in in_conflict.tolist()])
+        decay = spawning.conflict_decay_factors(time - time_of_conflict)
+        score[in_conflict] *= np.power(move_rules["ConflictWeight"], decay * conflict[in_conflict])
+
+    #score multiplier for flooding (flood zones only)
+    for k in flood_zone.tolist():
+        score[k] = applyFloodScore(time, locations[k], float(score[k]))
+
+    return score
+
+
+@check_args_type
+def updateLocationScores(time: int, e, locations: Optional[list] = None) -> None:
+    """
+    Summary:
+        Updates the score of all (or the given) locations of an Ecosystem
+        with calculateLocationScores, and stores them with
+        Ecosystem.store_location_scores. With FixedRoutes, routes are
+        generated per location using the scores of the preceding locations,
+        so updateLocationScore is used for each location instead.
+
+    Args:
+        time (int): The current timestep
+        e (Ecosystem): The Ecosystem
+        locations (Optional[list], optional): The locations to update. Defaults to all locations.
+
+    Returns:
+        None.
+    """
+    if locations is None:
+        locations = e.locations
 
     if SimulationSettings.move_rules["FixedRoutes"] is True:
-        #print("INFO: Generating location routes.", file=sys.stderr)
-        crawling.generateLocationRoutes(loc, time)
+        for loc in locations:
+            updateLocationScore(time, loc)
+        return
 
+    e.store_location_scores(locations, calculateLocationScores(time, locations))
@@ -20,6 +20,162 @@ __refugees_raw = 0
 __refugee_debt = 0
 
 
+def get_spawning_state():
+    """
+    Summary:
+        Returns the module state of the spawning functions (see flee/checkpoint.py).
+
+    Args:
+        None.
+
+    Returns:
+        dict: raw refugee count and refugee debt.
+    """
+    return {"refugees_raw": __refugees_raw, "refugee_debt": __refugee_debt}
+
+
+def set_spawning_state(state):
+    """
+    Summary:
+        Restores the module state returned by get_spawning_state.
+
+    Args:
+        state (dict): raw refugee count and refugee debt.
+
+    Returns:
+        None.
+    """
+    global __refugees_raw, __refugee_debt
+    __refugees_raw = state["refugees_raw"]
+    __refugee_debt = state["refugee_debt"]
+
+
+def add_spawn_location(e):
+    """
+    Summary:
+        Extends the spawn weights with an entry for the most recently added
+        location. Spawn weights are stored in a preallocated array (capacity
+        doubling), and the weight of the new location is computed lazily
+        (see update_spawn_weights), so that adding N locations takes O(N) time.
+
+    Args:
+        e (Ecosystem): Ecosystem object
+
+    Returns:
+        None.
+    """
+    n = len(e.locations)
+    if n > len(e.spawn_weight_buffer):
+        buffer = np.zeros(max(16, 2 * len(e.spawn_weight_buffer), n))
+        buffer[:n - 1] = e.spawn_weight_buffer[:n - 1]
+        e.spawn_weight_buffer = buffer
+
+    e.spawn_weights = e.spawn_weight_buffer[:n]
+    e.spawn_weights[n - 1] = 0.0
+    e.spawn_weights_dirty.add(n - 1)
+
+
+def mark_spawn_weight_dirty(e, i):
+    """
+    Summary:
+        Marks the spawn weight of location <i> for recomputation, e.g. after
+        a change in its conflict state. Recomputation is deferred until the
+        weights are used (see update_spawn_weights).
+
+    Args:
+        e (Ecosystem): Ecosystem object
+        i (int): index of the location in e.locations.
+
+    Returns:
+        None.
+    """
+    e.spawn_weights_dirty.add(i)
+
+
+def conflict_decay_factors(time_since_conflict):
+    """
+    Summary:
+        Vectorised version of SimulationSettings.get_conflict_decay.
+
+    Args:
+        time_since_conflict (np.ndarray): time since each conflict started, in days.
+
+    Returns:
+        np.ndarray: the conflict spawn decay factor for each conflict.
+    """
+    decay = SimulationSettings.spawn_rules["conflict_spawn_decay"]
+    if decay is None:
+        return np.ones(len(time_since_conflict))
+    if len(decay) < 1:
+        print("Warning: no conflict spawn decay set. Defaulting to no decay", file=sys.stderr)
+        return np.ones(len(time_since_conflict))
+
+    factors = np.array([float(decay[k]) for k in range(0, len(decay))])
+    interval = SimulationSettings.spawn_rules["conflict_spawn_decay_interval"]
+    i = np.minimum(np.trunc(time_since_conflict / interval).astype(np.int64), len(decay) - 1)
+    if SimulationSettings.log_levels["conflict"] > 0:
+        for t, k in zip(time_since_conflict, i):
+            print("Conflict zone spawn status: time elapsed {}, decay factor {}".format(t, factors[k]), file=sys.stderr)
+    return factors[i]
+
+
+def _calculate_spawn_weights(e, indices):
+    """
+    Summary:
+        Calculates the spawn weights of the locations with the given indices,
+        using array operations over those locations.
+
+    Args:
+        e (Ecosystem): Ecosystem object
+        indices (np.ndarray): indices of the locations in e.locations.
+
+    Returns:
+        np.ndarray: spawn weight per location in <indices>.
+    """
+    conflict_pop_weight = 1.0
+    attribute_weights = {} #TODO: Implement (food security stretch goal)
+
+    n = len(indices)
+    weights = np.zeros(n)
+
+    # Conflict-driven spawning
+    if SimulationSettings.spawn_rules["conflict_driven_spawning"]: # Conflicts spawn fixed numbers of agents.
+        return weights
+
+    locs = [e.locations[i] for i in indices]
+    pop = np.fromiter((l.pop for l in locs), dtype=float, count=n)
+    conflict = np.fromiter((l.conflict for l in locs), dtype=float, count=n)
+    in_conflict = conflict > 0.0
+
+    # Adding conflict-based weighting for spawning.
+    c = np.flatnonzero(in_conflict)
+    multiplier = conflict[c]
+    if SimulationSettings.spawn_rules["conflict_spawn_decay"]:
+        time_of_conflict = np.fromiter((locs[k].time_of_conflict for k in c), dtype=np.int64, count=len(c))
+        multiplier = conflict[c] * conflict_decay_factors(e.time - time_of_conflict)
+
+    # Pop+conflict weight
+    weights[c] = pop[c] * conflict_pop_weight * multiplier
+
+    # This option reduces spawning to 0 in non-conflict zones.
+    spawning_locations = in_conflict if SimulationSettings.spawn_rules["conflict_zone_spawning_only"] else np.ones(n, dtype=bool)
+
+    if SimulationSettings.spawn_rules["starvation_driven_spawning"] is True and e.time > 0:
+        s = np.flatnonzero(spawning_locations)
+        ipc = np.zeros(len(s))
+        for j, k in enumerate(s):
+            if "region_IPC_level" not in locs[k].attributes.keys():
+                print("ERROR: spawn_rules.starvation_driven_spawning is set in simulationsetting.yml, but no IPC input data (region_attributes_IPC.csv) has been loaded.", file=sys.stderr)
+                print(f"Location attributes: {locs[k].attributes}", file=sys.stderr)
+                print(f"INFO: Error occurred for Location {locs[k].name}, region {locs[k].region}.", file=sys.stderr)
+                sys.exit()
+            ipc[j] = locs[k].attributes["region_IPC_level"]
+
+        weights[s] += pop[s] * ipc / 100.0
+
+    return weights
+
+
 def refresh_spawn_weights(e):
     """
     Summary:
@@ -35,44 +191,56 @@ def refresh_spawn_weights(e):
     Returns:
         None.
     """
+    e.spawn_weights[:] = _calculate_spawn_weights(e, np.arange(len(e.locations)))
+    e.spawn_weights_dirty.clear()
+    e.spawn_weight_total = sum(e.spawn_weights)
+    e.spawn_weight_time = e.time
 
-    conflict_pop_weight = 1.0
-    attribute_weights = {} #TODO: Implement (food security stretch goal)
-
-
-    for i in range(0, len(e.locations)):
 
-        # First reset weight to 0.0.
-        e.spawn_weights[i] = 0.0
+def update_spawn_weights(e):
+    """
+    Summary:
+        Recomputes the spawn weights of the locations that were added or
+        marked dirty since the last refresh (see mark_spawn_weight_dirty).
+        If the last refresh was on an earlier day, all weights are refreshed,
+        as the conflict spawn decay of every conflict zone depends on the day.
 
-        # Conflict-driven spawning
-        if not SimulationSettings.spawn_rules["conflict_driven_spawning"]: # This branch should be skipped if conflicts spawn fixed numbers of agents.
+    Args:
+        e (Ecosystem): Ecosystem object
 
-            if SimulationSettings.spawn_rules["conflict_zone_spawning_only"]: # This option reduces spawning to 0 in non-conflict zones.
-                if e.locations[i].conflict <= 0.0:
-                    continue
+    Returns:
+        None.
+    """
+    if e.spawn_weight_time != e.time:
+        refresh_spawn_weights(e)
+        return
 
-            if e.locations[i].conflict > 0.0: # Adding conflict-based weighting for spawning.
-                # Conflict decay multiplier
-                multiplier = e.locations[i].conflict
-                if SimulationSettings.spawn_rules["conflict_spawn_decay"]:
-                    multiplier = e.locations[i].conflict * SimulationSettings.get_location_conflict_decay(e.time, e.locations[i])
+    if len(e.spawn_weights_dirty) == 0:
+        return
 
-                # Pop+conflict weight
-                e.spawn_weights[i] = e.locations[i].pop * conflict_pop_weight * multiplier
+    indices = np.array(sorted(e.spawn_weights_dirty), dtype=np.int64)
+    e.spawn_weights[indices] = _calculate_spawn_weights(e, indices)
+    e.spawn_weights_dirty.clear()
+    e.spawn_weight_total = sum(e.spawn_weights)
 
-            if SimulationSettings.spawn_rules["starvation_driven_spawning"] is True:
-                if e.time > 0:
-                    if "region_IPC_level" not in e.locations[i].attributes.keys():
-                        print("ERROR: spawn_rules.starvation_driven_spawning is set in simulationsetting.yml, but no IPC input data (region_attributes_IPC.csv) has been loaded.", file=sys.stderr)
-                        print(f"Location attributes: {e.locations[i].attributes}", file=sys.stderr)
-                        print(f"INFO: Error occurred for Location {e.locations[i].name}, region {e.locations[i].region}.", file=sys.stderr)
-                        sys.exit()
 
-                    e.spawn_weights[i] += e.locations[i].pop * e.locations[i].attributes["region_IPC_level"] / 100.0
+def draw_spawn_attribute_columns(e, loc, number):
+  """
+  Summary:
+      Draws the attributes of <number> new agents at a location: demographic
+      attributes (one batched draw per attribute) and social connectivity.
 
+  Args:
+      e (Ecosystem): Ecosystem object
+      loc (Location): Location object
+      number (int): Number of agents
 
-    e.spawn_weight_total = sum(e.spawn_weights)
+  Returns:
+      Dict: attribute name -> list of <number> values (see Ecosystem.addAgents).
+  """
+  columns = demographics.decode_columns(demographics.draw_samples_batch(e, loc, number))
+  columns["connections"] = np.random.poisson(SimulationSettings.spawn_rules["AverageSocialConnectivity"], number).tolist()
+  return columns
 
 
 def add_initial_refugees(e, d, loc):
@@ -98,10 +266,7 @@ def add_initial_refugees(e, d, loc):
       num_refugees += int(d.get_field(loc.name, 0, FullInterpolation=True))
 
   num_refugees += int(loc.attributes.get("initial_idps",0))
-  for i in range(0, num_refugees):
-      attributes = demographics.draw_samples(e, loc)
-      attributes["connections"] = np.random.poisson(SimulationSettings.spawn_rules["AverageSocialConnectivity"])
-      e.insertAgent(location=loc, attributes=attributes) # Parallelization is incorporated in the addAgent function.
+  e.insertAgents(location=loc, number=num_refugees, attribute_columns=draw_spawn_attribute_columns(e, loc, num_refugees)) # Parallelization is incorporated in the insertAgents function.
 
 
 @check_args_type
@@ -147,10 +312,7 @@ def spawn_daily_displaced(e, t, d):
                 num_spawned = np.random.poisson(SimulationSettings.spawn_rules["displaced_per_conflict_day"] * e.locations[i].conflict)
 
         ## Doing the actual spawning here.
-        for j in range(0, num_spawned):
-            attributes = demographics.draw_samples(e, e.locations[i])
-            attributes["connections"] = np.random.poisson(SimulationSettings.spawn_rules["AverageSocialConnectivity"])
-            e.addAgent(location=e.locations[i], attributes=attributes) # Parallelization is incorporated in the addAgent function.
+        e.addAgents(location=e.locations[i], number=num_spawned, attribute_columns=draw_spawn_attribute_columns(e, e.locations[i], num_spawned)) # Parallelization is incorporated in the addAgents function.
 
         new_refs += num_spawned
 
@@ -175,10 +337,7 @@ def spawn_daily_displaced(e, t, d):
                 num_spawned = np.random.poisson(int(lm.interp(SimulationSettings.spawn_rules["displaced_per_flood_day"], flood_level)))
 
         ## Doing the actual spawning here.
-        for j in range(0, num_spawned):
-            attributes = demographics.draw_samples(e, e.locations[i])
-            attributes["connections"] = np.random.poisson(SimulationSettings.spawn_rules["AverageSocialConnectivity"])
-            e.addAgent(location=e.locations[i], attributes=attributes) # Parallelization is incorporated in the addAgent function.
+        e.addAgents(location=e.locations[i], number=num_spawned, attribute_columns=draw_spawn_attribute_columns(e, e.locations[i], num_spawned)) # Parallelization is incorporated in the addAgents function.
 
         new_refs += num_spawned
 
@@ -209,11 +368,7 @@ def spawn_daily_displaced(e, t, d):
         __refugee_debt = 0
 
       #Insert refugee agents
-      locs = e.pick_spawn_locations(new_refs)
-      for i in range(0, new_refs):
-        attributes = demographics.draw_samples(e, locs[i])
-        attributes["connections"] = np.random.poisson(SimulationSettings.spawn_rules["AverageSocialConnectivity"])
-        e.addAgent(location=locs[i], attributes=attributes) 
+      _add_agents_per_location(e, e.pick_spawn_locations(new_refs))
 
     return new_refs, __refugees_raw, __refugee_debt
 
@@ -231,9 +386,27 @@ def spawn_agents(e, number):
         None.
     """
     #Insert refugee agents
-    for i in range(0, number):
-        loc = e.pick_spawn_location()
-        attributes = demographics.draw_samples(e, loc)
-        attributes["connections"] = np.random.poisson(SimulationSettings.spawn_rules["AverageSocialConnectivity"])
-        e.addAgent(location=loc, attributes=attributes) 
+    _add_agents_per_location(e, e.pick_spawn_locations(number))
+
+
+def _add_agents_per_location(e, locs):
+    """
+    Summary:
+        Adds one new agent per entry in <locs>, with one batched attribute
+        draw and one addAgents call per distinct location.
 
+    Args:
+        e (Ecosystem): Ecosystem object
+        locs (List[Location]): spawn location of each agent
+
+    Returns:
+        None.
+    """
+    agents_per_location = {}
+    for loc in locs:
+        if id(loc) not in agents_per_location:
+            agents_per_location[id(loc)] = [loc, 0]
+        agents_per_location[id(loc)][1] += 1
+
+    for loc, number in agents_per_location.values():
+        e.addAgents(location=loc, number=number, attribute_columns=draw_spawn_attribute_columns(e, loc, number))
@@ -0,0 +1,216 @@
+import csv
+import os
+import sys
+import warnings
+from typing import List
+import numpy as np
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Columnar time series inputs.
+# Time series input files (conflicts.csv, flood_level.csv, region_attributes_IPC.csv)
+# are read in bulk into a single 2-D array, with a row per day and a column per
+# location or region. InputGeography exposes the columns as a dict of column
+# name -> list of values per day, and updates the location
+# attributes of a day with a single gather from the array (see
+# LocationColumns), with the mapping of locations to columns resolved once.
+
+
+class TimeSeriesTable:
+    """
+    Values per day (rows) and per location or region (columns).
+    """
+
+    def __init__(self, columns: List[str], values: np.ndarray):
+        """
+        Summary:
+            Creates a table.
+
+        Args:
+            columns (List[str]): column names.
+            values (np.ndarray): 2-D array of values, with a column per name.
+
+        Returns:
+            None.
+        """
+        self.columns = columns
+        self.values = values
+        self.column_index = {}
+        for j, name in enumerate(columns):
+            if len(name) > 0:
+                self.column_index[name] = j
+        # Columns as lists of values per day (the form of InputGeography.conflicts and attributes).
+        self.series = {name: values[:, j].tolist() for name, j in self.column_index.items()}
+        self.source = self.series # dict of values per day that the table represents.
+
+    @classmethod
+    def from_dict(cls, series: dict):
+        """
+        Summary:
+            Creates a table from a dict of column name -> values per day,
+            e.g. an InputGeography.attributes entry that was set directly.
+
+        Args:
+            series (dict): column name -> values per day (all of the same length).
+
+        Returns:
+            TimeSeriesTable: the table.
+        """
+        columns = list(series.keys())
+        days = min([len(values) for values in series.values()], default=0)
+        values = np.zeros([days, len(columns)])
+        for j, name in enumerate(columns):
+            values[:, j] = series[name][:days]
+        table = cls(columns, values)
+        table.source = series
+        return table
+
+
+@check_args_type
+def read_time_series_csv(csv_name: str, first_column: int = 0, value_type: str = "float") -> TimeSeriesTable:
+    """
+    Summary:
+        Reads a time series CSV file: a header row with column names, followed
+        by a row of values per day.
+
+    Args:
+        csv_name (str): csv file name.
+        first_column (int, optional): first column to include (1 excludes the day column).
+        value_type (str, optional): type of the values (int or float).
+
+    Returns:
+        TimeSeriesTable: the table.
+    """
+    with open(csv_name, newline="", encoding="utf-8") as csvfile:
+        header = next(csv.reader([csvfile.readline()]), [])
+        columns = [name.strip() for name in header]
+        try:
+            with warnings.catch_warnings():
+                # An empty table is not an error.
+                warnings.simplefilter("ignore", UserWarning)
+                values = np.loadtxt(
+                    csvfile,
+                    delimiter=",",
+                    dtype=np.int64 if value_type == "int" else np.float64,
+                    comments=None,
+                    ndmin=2,
+                )
+        except ValueError as error:
+            print("ERROR: unable to read time series file {}: {}".format(csv_name, error), file=sys.stderr)
+            sys.exit()
+
+    if values.size == 0:
+        values = np.zeros([0, len(columns)], dtype=values.dtype)
+    if values.shape[1] != len(columns):
+        print(
+            "ERROR: time series file {} has {} columns in its header, but {} columns of values.".format(
+                csv_name, len(columns), values.shape[1]),
+            file=sys.stderr,
+        )
+        sys.exit()
+    return TimeSeriesTable(columns[first_column:], values[:, first_column:])
+
+
+class LocationColumns:
+    """
+    Mapping of the locations of an Ecosystem to the columns of a TimeSeriesTable,
+    used by InputGeography.UpdateLocationAttributes.
+    """
+
+    def __init__(self, e, table: TimeSeriesTable, attribute_name: str):
+        """
+        Summary:
+            Resolves the column of each location: the column with the name of the
+            location or, for regional attributes (attribute_name starting with
+            "region_"), the column of its region if there is no column for the
+            location itself. Regional attributes are not set for locations that
+            have a column of their own.
+
+        Args:
+            e (Ecosystem): ecosystem object.
+            table (TimeSeriesTable): attribute table.
+            attribute_name (str): name of the attribute.
+
+        Returns:
+            None.
+        """
+        self.e = e
+        self.table = table
+        self.num_locations = len(e.locations)
+        self.regional = attribute_name.startswith("region_")
+        self.own_columns = np.array(
+            [table.column_index.get(loc.name, -1) for loc in e.locations], dtype=np.int64
+        )
+        if self.regional:
+            region_columns = np.array(
+                [table.column_index.get(loc.region, -1) for loc in e.locations], dtype=np.int64
+            )
+            self.region_locations = np.nonzero((self.own_columns < 0) & (region_columns >= 0))[0]
+            self.region_columns = region_columns[self.region_locations]
+            self.day_column = table.column_index.get("#Day", -1)
+        # Default value of a forecast for locations without a column of their own.
+        self.zero_forecast = [0] * table.values.shape[0]
+
+    def matches(self, e, table: TimeSeriesTable) -> bool:
+        """
+        Summary:
+            Returns whether this mapping was resolved for the current locations of e and table.
+
+        Args:
+            e (Ecosystem): ecosystem object.
+            table (TimeSeriesTable): attribute table.
+
+        Returns:
+            bool: True if the mapping can be used.
+        """
+        return self.e is e and self.table is table and self.num_locations == len(e.locations)
+
+    def own_values(self, time: int) -> list:
+        """
+        Summary:
+            Returns the value of each location with a column of its own on day
+            <time> (converted to int), and 0 for all other locations.
+
+        Args:
+            time (int): day.
+
+        Returns:
+            list: int value per location.
+        """
+        values = np.zeros(self.num_locations, dtype=np.int64)
+        located = self.own_columns >= 0
+        if np.any(located):
+            values[located] = np.trunc(self.table.values[time, self.own_columns[located]])
+        return values.tolist()
+
+    def region_values(self, time: int) -> list:
+        """
+        Summary:
+            Returns the value of the region of each location in region_locations
+            on day <time>, interpolated linearly between the days in the "#Day"
+            column (as lib_math.dict_interp).
+
+        Args:
+            time (int): day.
+
+        Returns:
+            list: float value per location in region_locations.
+        """
+        if self.day_column < 0:
+            raise KeyError("#Day")
+        days = self.table.values[:, self.day_column]
+        if len(days) == 0 or time < days[0] or time > days[-1]:
+            raise ValueError(f"dict_interp failed: Index_val {time} outside interpolation range of dict_interp {days.tolist()}.")
+
+        i = max(int(np.searchsorted(days, time, side="left")) - 1, 0)
+        if i + 1 >= len(days) or not days[i] <= time <= days[i + 1]:
+            raise RuntimeError("dict_interp failed: Interpolation failed due to input in invalid format.")
+
+        x0, x1 = days[i], days[i + 1]
+        y0 = self.table.values[i, self.region_columns].astype(np.float64)
+        y1 = self.table.values[i + 1, self.region_columns].astype(np.float64)
+        return (y0 + (y1 - y0) * (time - x0) / (x1 - x0)).tolist()
@@ -0,0 +1,614 @@
+import os
+import numpy as np
+from beartype.typing import List, Tuple
+from flee.SimulationSettings import SimulationSettings
+
+if os.getenv("FLEE_TYPE_CHECK") is not None and os.environ["FLEE_TYPE_CHECK"].lower() == "true":
+    from beartype import beartype as check_args_type
+else:
+    def check_args_type(func):
+        return func
+
+# Precomputed candidate paths per location (optimisations.path_tables).
+# The loop-free paths that moving.calculateLinkWeight and
+# crawling.calculateLocCrawlLinkWeight enumerate only depend on the graph
+# topology and on AwarenessLevel. They are therefore enumerated once per
+# location, stored as integer arrays, and reused until a link connected to
+# one of the locations on those paths changes.
+
+
+class PathTable:
+    """
+    Candidate paths starting from a single location.
+    """
+
+    def __init__(self, source, mode: str) -> None:
+        """
+        Summary:
+            Initializes an empty path table.
+
+        Args:
+            source (Location): location from which all paths start.
+            mode (str): "route" for the marker handling of moving.calculateLinkWeight,
+                "crawl" for that of crawling.calculateLocCrawlLinkWeight.
+
+        Returns:
+            None.
+        """
+        self.source = source
+        self.mode = mode
+        self.awareness_level = SimulationSettings.move_rules["AwarenessLevel"]
+
+        self.nodes = [] # Locations visited by any path (table-local index).
+        self.endpoint_index = None # Per path: table-local index of the endpoint.
+        self.endpoints = [] # Unique endpoints of the paths.
+        self.endpoint_nodes = None # Per endpoint: index in self.nodes.
+        self.links = [] # Per path: the last link of the path.
+        self.link_distances = None # Per path: distance of the last link.
+        self.prior_distances = None # Per path: distance travelled before the last link.
+        self.path_offsets = None # CSR offsets into self.path_nodes.
+        self.path_nodes = None # Node indices of each path, excluding the source.
+
+        self._denominators = {}
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def getRoute(self, k: int) -> List[str]:
+        """
+        Summary:
+            Returns path k as a list of location names, excluding the source.
+
+        Args:
+            k (int): index of the path.
+
+        Returns:
+            List[str]: route of path k.
+        """
+        return [self.nodes[j].name for j in self.path_nodes[self.path_offsets[k]:self.path_offsets[k+1]]]
+
+    def getRoutes(self) -> List[List[str]]:
+        """
+        Summary:
+            Returns all paths as lists of location names, excluding the source.
+
+        Args:
+            None.
+
+        Returns:
+            List[List[str]]: routes of all paths.
+        """
+        return [self.getRoute(k) for k in range(0, len(self))]
+
+    def getDistanceDenominators(self) -> np.ndarray:
+        """
+        Summary:
+            Returns (DistanceSoftening + distance)**DistancePower for each path,
+            evaluated in the same order of operations as moving.calculateLinkWeight.
+
+        Args:
+            None.
+
+        Returns:
+            np.ndarray: distance denominators per path.
+        """
+        key = (SimulationSettings.move_rules["DistanceSoftening"], SimulationSettings.move_rules["DistancePower"])
+        if key not in self._denominators:
+            self._denominators[key] = np.array([
+                float(key[0] + d + p)**key[1] for d, p in zip(self.link_distances.tolist(), self.prior_distances.tolist())
+            ])
+        return self._denominators[key]
+
+
+def _crawlPaths(table, g, node_ids, endpoint_ids, paths, slot: int, prior_distance: float, origin, step: int) -> None:
+    """
+    Summary:
+        Enumerates paths recursively over the CSR arrays of the compiled graph,
+        visiting links in the same order as moving.calculateLinkWeight (mode
+        "route") or crawling.calculateLocCrawlLinkWeight (mode "crawl").
+        origin holds the location indices of the path so far.
+    """
+    end = int(g.link_end[slot])
+    if end not in node_ids:
+        node_ids[end] = len(table.nodes)
+        table.nodes.append(g.e.locations[end])
+
+    path = origin + [end]
+    distance = float(g.link_distance[slot])
+
+    if not g.marker[end]:
+        if end not in endpoint_ids:
+            endpoint_ids[end] = len(table.endpoints)
+            table.endpoints.append(g.e.locations[end])
+        paths.append((endpoint_ids[end], g.links[slot], distance, prior_distance, [node_ids[j] for j in path[1:]]))
+    elif table.mode == "route":
+        # Markers are ignored in the pathfinding, so the step does not increment.
+        step -= 1
+
+    if table.awareness_level > step:
+        for next_slot in g.open_links(end).tolist():
+            if int(g.link_end[next_slot]) not in path:
+                _crawlPaths(table, g, node_ids, endpoint_ids, paths, next_slot, prior_distance + distance, path, step + 1)
+
+
+@check_args_type
+def buildPathTable(source, mode: str = "route") -> PathTable:
+    """
+    Summary:
+        Enumerates all loop-free candidate paths from a location up to
+        AwarenessLevel steps over the compiled graph of its Ecosystem (see
+        CompiledGraph), and registers the table with every location on those
+        paths, so that it can be invalidated when their links change.
+
+    Args:
+        source (Location): location from which all paths start.
+        mode (str, optional): "route" or "crawl" (see PathTable). Defaults to "route".
+
+    Returns:
+        PathTable: the candidate paths.
+    """
+    g = source.graph.update()
+    i = g.e.location_index[source.name]
+
+    table = PathTable(source, mode)
+    table.nodes.append(source)
+    node_ids = {i: 0}
+    endpoint_ids = {}
+    paths = []
+
+    for slot in g.open_links(i).tolist():
+        _crawlPaths(table, g, node_ids, endpoint_ids, paths, slot, 0.0, [i], 1)
+
+    n = len(paths)
+    table.endpoint_index = np.fromiter((p[0] for p in paths), dtype=np.int32, count=n)
+    table.links = [p[1] for p in paths]
+    table.link_distances = np.fromiter((p[2] for p in paths), dtype=np.float64, count=n)
+    table.prior_distances = np.fromiter((p[3] for p in paths), dtype=np.float64, count=n)
+    table.path_offsets = np.zeros(n + 1, dtype=np.int64)
+    table.path_offsets[1:] = np.cumsum([len(p[4]) for p in paths])
+    table.path_nodes = np.fromiter((j for p in paths for j in p[4]), dtype=np.int32, count=int(table.path_offsets[-1]))
+    table.endpoint_nodes = np.array([node_ids[j] for j in sorted(endpoint_ids, key=endpoint_ids.get)], dtype=np.int32)
+
+    for node in table.nodes:
+        node.path_dependents[id(source)] = source
+
+    return table
+
+
+@check_args_type
+def getPathTable(source, mode: str = "route") -> PathTable:
+    """
+    Summary:
+        Returns the path table of a location, (re)building it when it does not
+        exist yet, was invalidated, or AwarenessLevel has changed.
+
+    Args:
+        source (Location): location from which all paths start.
+        mode (str, optional): "route" or "crawl" (see PathTable). Defaults to "route".
+
+    Returns:
+        PathTable: the candidate paths.
+    """
+    table = source.path_tables.get(mode, None)
+    if table is None or table.awareness_level != SimulationSettings.move_rules["AwarenessLevel"]:
+        table = buildPathTable(source, mode)
+        source.path_tables[mode] = table
+    return table
+
+
+def use_path_tables() -> bool:
+    """
+    Summary:
+        Returns whether precomputed path tables are used for route selection
+        (optimisations.path_tables in simsetting.yml).
+
+    Args:
+        None.
+
+    Returns:
+        bool: True if path tables should be used.
+    """
+    return bool(SimulationSettings.optimisations.get("PathTables", False))
+
+
+@check_args_type
+def invalidatePathTables(loc) -> None:
+    """
+    Summary:
+        Discards the path tables of all locations with paths that pass through
+        or end at the given location. To be called whenever the links of the
+        location, or its marker status, change.
+
+    Args:
+        loc (Location): location whose links have changed.
+
+    Returns:
+        None.
+    """
+    for dependent in loc.path_dependents.values():
+        dependent.path_tables = {}
+    loc.path_dependents = {}
+
+
+class WalkTable:
+    """
+    Walk counts from a single location, for the dynamic-programming
+    route engine (move_rules.route_engine: dp).
+    """
+
+    # Maximum number of distance bins that a single (virtual) edge spans.
+    BINS_PER_EDGE = 8
+
+    def __init__(self, source) -> None:
+        """
+        Summary:
+            Initializes an empty walk table.
+
+        Args:
+            source (Location): location from which all walks start.
+
+        Returns:
+            None.
+        """
+        self.source = source
+        self.awareness_level = SimulationSettings.move_rules["AwarenessLevel"]
+
+        self.nodes = [source] # Non-marker locations within reach (index 0 is the source).
+        self.visited = [source] # All locations within reach, including markers.
+        self.edge_start = None # Per virtual edge: node index of its start.
+        self.edge_end = None # Per virtual edge: node index of its end.
+        self.edge_links = [] # Per virtual edge: its links (markers are crossed without taking a step).
+        self.edge_distances = None # Per virtual edge: total distance of its links.
+        self.edge_shift = None # Per virtual edge: lower bound of its distance, in bins.
+        self.in_edges = [] # Per node: indices of the virtual edges that end there.
+        self.bin_width = 1.0
+        self.min_distance = 0.0
+        self.counts = None # counts[k, v, b]: number of k-step walks to node v with distance bin b.
+
+        self._bounds = {}
+
+    def getBoundWeights(self, distance_softening: float, distance_power: float, weight_power: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Summary:
+            Returns the distance factor of the upper-bound weight of each bin,
+            the bound-weighted walk counts per step and node, and their sum per node.
+
+        Args:
+            distance_softening (float): DistanceSoftening.
+            distance_power (float): DistancePower.
+            weight_power (float): WeightPower.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: h[b], H[k-1, v, b] and S[v].
+        """
+        key = (distance_softening, distance_power, weight_power)
+        if key not in self._bounds:
+            num_bins = self.counts.shape[2]
+            lower = np.maximum(np.arange(num_bins) * self.bin_width, self.min_distance)
+            h = np.array([(float(distance_softening + lo)**distance_power)**(-weight_power) for lo in lower.tolist()])
+            weighted = self.counts[1:] * h[np.newaxis, np.newaxis, :]
+            totals = weighted.sum(axis=(0, 2))
+            totals[0] = 0.0 # walks that end at the source are never valid.
+            self._bounds[key] = (h, weighted, totals)
+        return self._bounds[key]
+
+
+def _findVirtualEdges(u, link, chain, chain_names, edges) -> None:
+    """
+    Summary:
+        Follows a link from u, crossing marker locations without taking a step,
+        and records every resulting virtual edge to a non-marker location.
+    """
+    chain = chain + [link]
+    if link.endpoint.marker is False:
+        edges.append((u, link.endpoint, chain))
+        return
+
+    chain_names = chain_names + [link.endpoint.name]
+    for lel in link.endpoint.links:
+        if lel.endpoint.name not in chain_names:
+            _findVirtualEdges(u, lel, chain, chain_names, edges)
+
+
+@check_args_type
+def buildWalkTable(source) -> WalkTable:
+    """
+    Summary:
+        Counts the walks from a location up to AwarenessLevel steps, binned by
+        a lower bound of their distance. Walks may contain loops, which the
+        route engine rejects after sampling. Markers do not count as a step,
+        as in moving.calculateLinkWeight.
+
+    Args:
+        source (Location): location from which all walks start.
+
+    Returns:
+        WalkTable: the walk counts.
+    """
+    table = WalkTable(source)
+    awareness_level = table.awareness_level
+
+    node_ids = {id(source): 0}
+    visited_ids = {id(source)}
+    edges = []
+    level = {id(source): 0}
+    frontier = [source]
+
+    # Breadth-first search over virtual edges up to AwarenessLevel steps.
+    while len(frontier) > 0:
+        next_frontier = []
+        for u in frontier:
+            if level[id(u)] >= awareness_level:
+                continue
+            found = []
+            for link in u.links:
+                _findVirtualEdges(u, link, [], [u.name], found)
+            for start, end, chain in found:
+                for lel in chain:
+                    if id(lel.endpoint) not in visited_ids:
+                        visited_ids.add(id(lel.endpoint))
+                        table.visited.append(lel.endpoint)
+                if id(end) not in node_ids:
+                    node_ids[id(end)] = len(table.nodes)
+                    table.nodes.append(end)
+                    level[id(end)] = level[id(u)] + 1
+                    next_frontier.append(end)
+                edges.append((node_ids[id(start)], node_ids[id(end)], chain))
+        frontier = next_frontier
+
+    n = len(edges)
+    table.edge_start = np.fromiter((e[0] for e in edges), dtype=np.int64, count=n)
+    table.edge_end = np.fromiter((e[1] for e in edges), dtype=np.int64, count=n)
+    table.edge_links = [e[2] for e in edges]
+    table.edge_distances = np.array([sum(lel.get_distance() for lel in e[2]) for e in edges], dtype=np.float64)
+
+    if n > 0 and table.edge_distances.max() > 0.0:
+        table.bin_width = float(table.edge_distances.max()) / WalkTable.BINS_PER_EDGE
+        table.min_distance = float(table.edge_distances.min())
+    table.edge_shift = np.minimum(np.floor(table.edge_distances / table.bin_width), WalkTable.BINS_PER_EDGE).astype(np.int64)
+
+    table.in_edges = [[] for _ in table.nodes]
+    for i in range(0, n):
+        table.in_edges[table.edge_end[i]].append(i)
+
+    num_bins = WalkTable.BINS_PER_EDGE * awareness_level + 1
+    table.counts = np.zeros((awareness_level + 1, len(table.nodes), num_bins))
+    table.counts[0, 0, 0] = 1.0
+    for k in range(1, awareness_level + 1):
+        for shift in np.unique(table.edge_shift):
+            idx = np.flatnonzero(table.edge_shift == shift)
+            np.add.at(table.counts[k, :, shift:], table.edge_end[idx], table.counts[k - 1, table.edge_start[idx], :num_bins - shift])
+
+    for node in table.visited:
+        node.path_dependents[id(source)] = source
+
+    return table
+
+
+@check_args_type
+def getWalkTable(source) -> WalkTable:
+    """
+    Summary:
+        Returns the walk table of a location, (re)building it when it does not
+        exist yet, was invalidated, or AwarenessLevel has changed.
+
+    Args:
+        source (Location): location from which all walks start.
+
+    Returns:
+        WalkTable: the walk counts.
+    """
+    table = source.path_tables.get("walk", None)
+    if table is None or table.awareness_level != SimulationSettings.move_rules["AwarenessLevel"]:
+        table = buildWalkTable(source)
+        source.path_tables["walk"] = table
+    return table
+
+
+class CompiledGraph:
+    """
+    Compressed-sparse-row (CSR) view of the locations and links of an
+    Ecosystem, used to build path tables (see buildPathTable) and for graph
+    export. The links starting
+    at location i are stored in slots offsets[i] to offsets[i+1]: first the
+    open links (Location.links), then the closed ones (Location.closed_links),
+    each in list order.
+
+    The view is maintained by the Ecosystem: locations whose links or type
+    change are marked with mark_location(), and only their rows and link
+    slots are rewritten on the next update(). The view is rebuilt completely
+    when locations are added, or when a location gains or loses links.
+    """
+
+    def __init__(self, e) -> None:
+        """
+        Summary:
+            Creates an (empty) compiled view of the Ecosystem graph.
+
+        Args:
+            e (Ecosystem): the Ecosystem.
+
+        Returns:
+            None.
+        """
+        self.e = e
+        self.num_locations = 0
+        self.dirty_locations = set()
+        self.structure_dirty = True
+
+        # Per location.
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.movechance = np.zeros(0)
+        self.conflict = np.zeros(0)
+        self.camp = np.zeros(0, dtype=bool)
+        self.idpcamp = np.zeros(0, dtype=bool)
+        self.town = np.zeros(0, dtype=bool)
+        self.forward = np.zeros(0, dtype=bool)
+        self.marker = np.zeros(0, dtype=bool)
+        self.flood_zone = np.zeros(0, dtype=bool)
+        self.foreign = np.zeros(0, dtype=bool)
+
+        # Per link slot.
+        self.links = []
+        self.link_start = np.zeros(0, dtype=np.int32)
+        self.link_end = np.zeros(0, dtype=np.int32)
+        self.link_distance = np.zeros(0)
+        self.link_closed = np.zeros(0, dtype=bool)
+        self.link_forced_redirection = np.zeros(0, dtype=bool)
+
+    @check_args_type
+    def mark_location(self, i: int) -> None:
+        """
+        Summary:
+            Marks a location whose type, conflict state or links have changed.
+
+        Args:
+            i (int): index of the location in Ecosystem.locations.
+
+        Returns:
+            None.
+        """
+        if i >= 0:
+            self.dirty_locations.add(i)
+
+    def invalidate(self) -> None:
+        """
+        Summary:
+            Forces a complete rebuild on the next update().
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+        self.structure_dirty = True
+
+    def _location_links(self, loc) -> list:
+        return loc.links + loc.closed_links
+
+    def _set_location(self, i: int, loc) -> None:
+        self.movechance[i] = loc.movechance
+        self.conflict[i] = loc.conflict
+        self.camp[i] = loc.camp
+        self.idpcamp[i] = loc.idpcamp
+        self.town[i] = loc.town
+        self.forward[i] = loc.forward
+        self.marker[i] = loc.marker
+        self.flood_zone[i] = loc.flood_zone
+        self.foreign[i] = loc.foreign
+
+    def _set_links(self, i: int, links: list) -> None:
+        first = int(self.offsets[i])
+        index = self.e.location_index
+        for j, link in enumerate(links):
+            self.links[first + j] = link
+            self.link_start[first + j] = i
+            self.link_end[first + j] = index[link.endpoint.name]
+            self.link_distance[first + j] = link.get_distance()
+            self.link_closed[first + j] = link.closed
+            self.link_forced_redirection[first + j] = link.forced_redirection
+
+    def _build(self) -> None:
+        locations = self.e.locations
+        n = len(locations)
+        location_links = [self._location_links(loc) for loc in locations]
+
+        self.num_locations = n
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(links) for links in location_links])
+
+        for name in ["movechance", "conflict"]:
+            setattr(self, name, np.zeros(n))
+        for name in ["camp", "idpcamp", "town", "forward", "marker", "flood_zone", "foreign"]:
+            setattr(self, name, np.zeros(n, dtype=bool))
+
+        num_links = int(self.offsets[-1])
+        self.links = [None] * num_links
+        self.link_start = np.zeros(num_links, dtype=np.int32)
+        self.link_end = np.zeros(num_links, dtype=np.int32)
+        self.link_distance = np.zeros(num_links)
+        self.link_closed = np.zeros(num_links, dtype=bool)
+        self.link_forced_redirection = np.zeros(num_links, dtype=bool)
+
+        for i in range(0, n):
+            self._set_location(i, locations[i])
+            self._set_links(i, location_links[i])
+
+        self.structure_dirty = False
+        self.dirty_locations = set()
+
+    @check_args_type
+    def update(self) -> "CompiledGraph":
+        """
+        Summary:
+            Brings the view up to date with the Ecosystem: rewrites the rows
+            and link slots of the marked locations, or rebuilds the view if
+            its structure has changed.
+
+        Args:
+            None.
+
+        Returns:
+            CompiledGraph: this view.
+        """
+        if self.structure_dirty or self.num_locations != len(self.e.locations):
+            self._build()
+            return self
+
+        for i in self.dirty_locations:
+            loc = self.e.locations[i]
+            links = self._location_links(loc)
+            if len(links) != self.offsets[i + 1] - self.offsets[i]:
+                self._build()
+                return self
+            self._set_location(i, loc)
+            self._set_links(i, links)
+        self.dirty_locations = set()
+        return self
+
+    @check_args_type
+    def open_links(self, i: int) -> np.ndarray:
+        """
+        Summary:
+            Returns the slots of the open links starting at a location.
+
+        Args:
+            i (int): index of the location.
+
+        Returns:
+            np.ndarray: link slot indices.
+        """
+        slots = np.arange(self.offsets[i], self.offsets[i + 1])
+        return slots[~self.link_closed[slots]]
+
+    @check_args_type
+    def toDict(self) -> dict:
+        """
+        Summary:
+            Returns the view as a dictionary of arrays (see Ecosystem.export_graph).
+
+        Args:
+            None.
+
+        Returns:
+            dict: array name -> array.
+        """
+        return {
+            "location_names": np.array([loc.name for loc in self.e.locations]),
+            "offsets": self.offsets,
+            "movechance": self.movechance,
+            "conflict": self.conflict,
+            "camp": self.camp,
+            "idpcamp": self.idpcamp,
+            "town": self.town,
+            "forward": self.forward,
+            "marker": self.marker,
+            "flood_zone": self.flood_zone,
+            "foreign": self.foreign,
+            "link_start": self.link_start,
+            "link_end": self.link_end,
+            "link_distance": self.link_distance,
+            "link_closed": self.link_closed,
+            "link_forced_redirection": self.link_forced_redirection,
+        }
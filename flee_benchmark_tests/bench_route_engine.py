@@ -0,0 +1,104 @@
+from flee import flee, moving
+import sys
+import argparse
+import random
+import time
+import numpy as np
+
+"""
+Benchmark of the route selection engines (move_rules.route_engine):
+path enumeration (selectRoute) versus the dynamic-programming sampler,
+on a grid road network with diagonal links.
+"""
+
+
+def build_grid(size, seed=1):
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+    random.seed(seed)
+
+    e = flee.Ecosystem()
+    for i in range(0, size * size):
+        location_type = "camp" if i % 7 == 0 else None
+        e.addLocation(name="L{}".format(i), movechance=0.3, location_type=location_type)
+
+    for i in range(0, size):
+        for j in range(0, size):
+            k = i * size + j
+            if j + 1 < size:
+                e.linkUp(endpoint1="L{}".format(k), endpoint2="L{}".format(k + 1), distance=random.uniform(20.0, 120.0))
+            if i + 1 < size:
+                e.linkUp(endpoint1="L{}".format(k), endpoint2="L{}".format(k + size), distance=random.uniform(20.0, 120.0))
+            if i + 1 < size and j + 1 < size:
+                e.linkUp(endpoint1="L{}".format(k), endpoint2="L{}".format(k + size + 1), distance=random.uniform(30.0, 170.0))
+
+    source = e.locations[(size // 2) * size + size // 2]
+    e.addAgent(location=source, attributes={})
+    return e
+
+
+def time_engine(e, engine, num_routes):
+    flee.SimulationSettings.move_rules["RouteEngine"] = engine
+    a = e.agents[0]
+
+    # The first call includes building the walk table (dp engine only).
+    t0 = time.time()
+    destinations = {}
+    route = moving.selectRoute(a, time=0)
+    t1 = time.time()
+    for _ in range(0, num_routes):
+        route = moving.selectRoute(a, time=0)
+        destinations[route[-1]] = destinations.get(route[-1], 0) + 1
+    t2 = time.time()
+
+    flee.SimulationSettings.move_rules["RouteEngine"] = "enumerate"
+    return t1 - t0, (t2 - t1) / num_routes, destinations
+
+
+def total_variation(observed, expected):
+    n = float(sum(observed.values()))
+    keys = set(observed.keys()) | set(expected.keys())
+    return 0.5 * sum(abs(observed.get(k, 0) / n - expected.get(k, 0.0)) for k in keys)
+
+
+def destination_probabilities(e):
+    weights, routes = moving.selectRoute(e.agents[0], time=0, return_all_routes=True)
+    total = sum(weights)
+    expected = {}
+    for w, r in zip(weights, routes):
+        expected[r[-1]] = expected.get(r[-1], 0.0) + w / total
+    return len(routes), expected
+
+
+def bench_route_engine(size=15, max_awareness=5, num_routes=200):
+    # TVD: total variation distance between the sampled and exact destination distributions.
+    print("awareness,paths,enumerate first (s),enumerate per route (s),dp first (s),dp per route (s),speedup,enumerate TVD,dp TVD")
+    for level in range(1, max_awareness + 1):
+        e = build_grid(size)
+        flee.SimulationSettings.move_rules["AwarenessLevel"] = level
+
+        random.seed(level)
+        np.random.seed(level)
+        paths, expected = destination_probabilities(e)
+        enum_first, enum_route, enum_dest = time_engine(e, "enumerate", num_routes)
+        dp_first, dp_route, dp_dest = time_engine(e, "dp", num_routes)
+
+        print("{},{},{:.4f},{:.6f},{:.4f},{:.6f},{:.1f},{:.3f},{:.3f}".format(
+            level, paths, enum_first, enum_route, dp_first, dp_route, enum_route / dp_route,
+            total_variation(enum_dest, expected), total_variation(dp_dest, expected)))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Compare the enumerate and dp route engines at increasing awareness levels.")
+    parser.add_argument("-s", "--size", type=int, default=15,
+                        help="Width and height of the grid network.")
+    parser.add_argument("-a", "--maxawareness", type=int, default=5,
+                        help="Highest awareness level to benchmark.")
+    parser.add_argument("-n", "--numroutes", type=int, default=200,
+                        help="Number of routes selected per engine and awareness level.")
+
+    args = parser.parse_args()
+
+    bench_route_engine(size=args.size, max_awareness=args.maxawareness, num_routes=args.numroutes)
@@ -1,4 +1,4 @@
-from flee import flee, spawning
+from flee import flee, spawning, checkpoint, inputbundle
 from flee.datamanager import handle_refugee_data, read_period
 from flee.datamanager import DataTable #DataTable.subtract_dates()
 from flee import InputGeography
@@ -31,22 +31,27 @@ if __name__ == "__main__":
 
   e = flee.Ecosystem(start_date, demographics_test_prefix=input_csv_directory)
 
-  ig = InputGeography.InputGeography()
+  if len(SimulationSettings.optimisations["InputBundleCache"]) > 0:
+    # Set up from a compiled input bundle (compiled on first use, see flee/inputbundle.py).
+    e,lm,ig,d = inputbundle.load_cached_bundle(input_csv_directory, validation_data_directory, SimulationSettings.optimisations["InputBundleCache"], e, start_date, data_layout="data_layout.csv", population_scaledown_factor=SimulationSettings.optimisations["PopulationScaleDownFactor"], start_empty=SimulationSettings.spawn_rules["EmptyCampsOnDay0"])
 
-  ig.ReadLocationsFromCSV("%s/locations.csv" % input_csv_directory)
+  else:
+    ig = InputGeography.InputGeography()
 
-  ig.ReadLinksFromCSV("%s/routes.csv" % input_csv_directory)
+    ig.ReadLocationsFromCSV("%s/locations.csv" % input_csv_directory)
 
-  ig.ReadClosuresFromCSV("%s/closures.csv" % input_csv_directory)
+    ig.ReadLinksFromCSV("%s/routes.csv" % input_csv_directory)
 
-  e,lm = ig.StoreInputGeographyInEcosystem(e)
+    ig.ReadClosuresFromCSV("%s/closures.csv" % input_csv_directory)
 
-  if SimulationSettings.spawn_rules["read_from_agents_csv_file"] == True:
-      ig.ReadAgentsFromCSV(e, "%s/agents.csv" % input_csv_directory)
+    e,lm = ig.StoreInputGeographyInEcosystem(e)
+
+    d = handle_refugee_data.RefugeeTable(csvformat="generic", data_directory=validation_data_directory, start_date=start_date, data_layout="data_layout.csv", population_scaledown_factor=SimulationSettings.optimisations["PopulationScaleDownFactor"], start_empty=SimulationSettings.spawn_rules["EmptyCampsOnDay0"])
 
-  d = handle_refugee_data.RefugeeTable(csvformat="generic", data_directory=validation_data_directory, start_date=start_date, data_layout="data_layout.csv", population_scaledown_factor=SimulationSettings.optimisations["PopulationScaleDownFactor"], start_empty=SimulationSettings.spawn_rules["EmptyCampsOnDay0"])
+    d.ReadL1Corrections("%s/registration_corrections.csv" % input_csv_directory)
 
-  d.ReadL1Corrections("%s/registration_corrections.csv" % input_csv_directory)
+  if SimulationSettings.spawn_rules["read_from_agents_csv_file"] == True:
+      ig.ReadAgentsFromCSV(e, "%s/agents.csv" % input_csv_directory)
 
   output_header_string = "Day,Date,"
 
@@ -65,7 +70,11 @@ if __name__ == "__main__":
   refugee_debt = 0
   refugees_raw = 0 #raw (interpolated) data from TOTAL UNHCR refugee count only.
 
-  for t in range(0,end_time):
+  # Resume from a checkpoint (written by an earlier run with the same inputs) if one is given.
+  if len(SimulationSettings.checkpoints["RestartFile"]) > 0:
+    e.read_checkpoint(SimulationSettings.checkpoints["RestartFile"], ig)
+
+  for t in range(e.time,end_time):
 
     #if t>0:
     ig.AddNewConflictZones(e,t)
@@ -114,3 +123,6 @@ if __name__ == "__main__":
       output += ",{}".format(e.numIDPs())
 
     print(output)
+
+    if checkpoint.checkpoint_due(e.time):
+      e.write_checkpoint(checkpoint.checkpoint_file_name(e.time), ig)
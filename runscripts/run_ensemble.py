@@ -0,0 +1,74 @@
+from flee import flee, spawning, ensemble
+from flee.datamanager import handle_refugee_data, read_period
+from flee import InputGeography
+import sys
+from flee.SimulationSettings import SimulationSettings
+
+if __name__ == "__main__":
+
+  start_date,end_time = read_period.read_sim_period("{}/sim_period.csv".format(sys.argv[1]))
+
+  if len(sys.argv)<5:
+    print("Please run using: python3 run_ensemble.py <your_csv_directory> <your_refugee_data_directory> <duration in days> <number of replicas> <optional: simsettings.yml> <optional: number of concurrent replicas> > <output_directory>/<output_csv_filename>")
+
+  input_csv_directory = sys.argv[1]
+  validation_data_directory = sys.argv[2]
+  if int(sys.argv[3]) > 0:
+    end_time = int(sys.argv[3])
+  replicas = int(sys.argv[4])
+
+  if len(sys.argv)>5:
+    flee.SimulationSettings.ReadFromYML(sys.argv[5])
+  else:
+    flee.SimulationSettings.ReadFromYML("simsetting.yml")
+
+  processes = None
+  if len(sys.argv)>6:
+    processes = int(sys.argv[6])
+
+  # Conflict file will be read if modelling conflict-driven displacement. Ignored otherwise.
+  flee.SimulationSettings.ConflictInputFile = "%s/conflicts.csv" % input_csv_directory
+  # Flood file will be read if modelling flood-driven displacement. Ignored otherwise.
+  flee.SimulationSettings.FloodLevelInputFile = "%s/flood_level.csv" % input_csv_directory
+
+  # The scenario is read and set up once, and shared by all replicas (see flee/ensemble.py).
+  e = flee.Ecosystem(start_date, demographics_test_prefix=input_csv_directory)
+
+  ig = InputGeography.InputGeography()
+
+  ig.ReadLocationsFromCSV("%s/locations.csv" % input_csv_directory)
+
+  ig.ReadLinksFromCSV("%s/routes.csv" % input_csv_directory)
+
+  ig.ReadClosuresFromCSV("%s/closures.csv" % input_csv_directory)
+
+  e,lm = ig.StoreInputGeographyInEcosystem(e)
+
+  if SimulationSettings.spawn_rules["read_from_agents_csv_file"] == True:
+      ig.ReadAgentsFromCSV(e, "%s/agents.csv" % input_csv_directory)
+
+  d = handle_refugee_data.RefugeeTable(csvformat="generic", data_directory=validation_data_directory, start_date=start_date, data_layout="data_layout.csv", population_scaledown_factor=SimulationSettings.optimisations["PopulationScaleDownFactor"], start_empty=SimulationSettings.spawn_rules["EmptyCampsOnDay0"])
+
+  d.ReadL1Corrections("%s/registration_corrections.csv" % input_csv_directory)
+
+  camp_locations = e.get_camp_names()
+
+  output_header_string = "Replica,Day,"
+
+  for l in camp_locations:
+      spawning.add_initial_refugees(e,d,lm[l])
+      output_header_string += "%s sim,%s data," % (lm[l].name, lm[l].name)
+
+  output_header_string += "total refugees (simulation)"
+
+  results = ensemble.run_ensemble(e, ig, d, end_time, list(range(0, replicas)), camp_names=camp_locations, processes=processes)
+
+  print(output_header_string)
+
+  for r, series in enumerate(results):
+    for t in range(0, len(series["total"])):
+      output = "%s,%s" % (r, t)
+      for l in camp_locations:
+        output += ",%s,%s" % (series[l][t], d.get_field(l, t))
+      output += ",%s" % (series["total"][t])
+      print(output)
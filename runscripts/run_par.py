@@ -1,5 +1,5 @@
 from flee import pflee as flee
-from flee import spawning
+from flee import spawning, checkpoint
 from flee.datamanager import handle_refugee_data, read_period
 from flee.datamanager import DataTable #DataTable.subtract_dates()
 from flee import InputGeography
@@ -69,7 +69,11 @@ if __name__ == "__main__":
   refugee_debt = 0
   refugees_raw = 0 #raw (interpolated) data from TOTAL UNHCR refugee count only.
 
-  for t in range(0,end_time):
+  # Resume from a checkpoint (written by an earlier run with the same inputs, on any number of ranks) if one is given.
+  if len(SimulationSettings.checkpoints["RestartFile"]) > 0:
+    e.read_checkpoint(SimulationSettings.checkpoints["RestartFile"], ig)
+
+  for t in range(e.time,end_time):
     
     #if t>0:
     ig.AddNewConflictZones(e,t)
@@ -120,3 +124,6 @@ if __name__ == "__main__":
     if e.getRankN(t):
         print(output)
 
+    if checkpoint.checkpoint_due(e.time):
+      e.write_checkpoint(checkpoint.checkpoint_file_name(e.time), ig)
+
@@ -0,0 +1,66 @@
+import numpy as np
+from flee import flee
+from tests import toy_model
+
+"""
+Tests for the bulk agent operations Ecosystem.addAgents and Ecosystem.insertAgents.
+"""
+
+LOCATIONS = [
+    {"name": "A", "movechance": 1.0, "pop": 1000},
+    {"name": "B", "movechance": 1.0, "pop": 10, "attributes": {"farmer_fraction": "0.25"}},
+]
+LINKS = [("A", "B", 10.0)]
+
+
+def make_ecosystem(store_type="list", cohorts=False):
+    flee.SimulationSettings.optimisations["AgentStore"] = store_type
+    flee.SimulationSettings.optimisations["Cohorts"] = cohorts
+    e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+    flee.SimulationSettings.optimisations["AgentStore"] = "list"
+    flee.SimulationSettings.optimisations["Cohorts"] = False
+    return e
+
+
+def test_add_agents():
+    with toy_model.settings(spawn_rules={"TakeFromPopulation": True}):
+        for store_type, cohorts in [("list", False), ("array", False), ("list", True)]:
+            e = make_ecosystem(store_type, cohorts)
+            a, b = e.locations
+
+            genders = ["male", "female", "female", "male"] * 25
+            e.addAgents(location=a, number=100, attribute_columns={"gender": genders})
+            e.insertAgents(location=a, number=50)
+
+            assert a.pop == 900
+            assert a.numAgentsSpawned == 100
+            assert a.numAgents == 150
+            assert e.numAgents() == 150
+
+            if not cohorts:
+                assert [x.attributes["gender"] for x in e.agents[:100]] == genders
+                assert e.agents[120].attributes == {"connections": 0}
+                assert e.agents[0].location is a
+                assert e.agents[0].home_location is a
+
+            # More agents than population: the population is taken once, down to zero.
+            e.addAgents(location=b, number=20)
+            assert b.pop == 0
+            assert b.numAgentsSpawned == 20
+            assert b.numAgents == 20
+
+
+def test_insert_agents_farmers():
+    with toy_model.settings(spawn_rules={"TakeFromPopulation": True}):
+        np.random.seed(6)
+        for store_type in ["list", "array"]:
+            e = make_ecosystem(store_type)
+            e.insertAgents(location=e.locations[1], number=4000)
+
+            farmers = sum(x.attributes["farmer"] for x in e.agents)
+            assert abs(farmers / 4000 - 0.25) < 0.03
+
+
+if __name__ == "__main__":
+    test_add_agents()
+    test_insert_agents_farmers()
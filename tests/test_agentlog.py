@@ -0,0 +1,167 @@
+import os
+import numpy as np
+from flee import agentlog
+from tests import toy_model
+
+"""
+Tests for the columnar binary agent logs (log_levels.agent_format: binary).
+"""
+
+
+LOGGED_LOCATIONS = [
+    {"name": "A", "movechance": 1.0, "x": 1.5, "y": -2.0},
+    {"name": "B", "movechance": 0.5},
+    {"name": "C", "location_type": "camp"},
+]
+LOGGED_LINKS = [("A", "B", 30.0), ("A", "C", 120.0), ("B", "C", 15.0)]
+
+
+def run_logged_model(path, store_type, agent_format, log_level, end_time=8):
+    log_levels = {"agent": log_level, "agent_format": agent_format}
+    move_rules = {"MaxMoveSpeed": 50.0, "MaxWalkSpeed": 50.0}
+    with toy_model.settings(optimisations={"AgentStore": store_type}, log_levels=log_levels, move_rules=move_rules):
+        toy_model.seed(3)
+
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            e = toy_model.build_ecosystem(LOGGED_LOCATIONS, LOGGED_LINKS)
+            l1 = e.locations[0]
+            for i in range(0, 50):
+                e.addAgent(location=l1, attributes={"gender": ["male", "female"][i % 2], "age": i})
+            # Attributes that are set for some agents only, and unhashable values.
+            e.addAgent(location=l1, attributes={"gender": "male", "age": 60, "group": (1, 2)})
+            e.addAgent(location=l1, attributes={"gender": "male", "age": 61, "group": [3]})
+
+            toy_model.run(e, end_time)
+            agentlog.close_agent_logs()
+        finally:
+            os.chdir(cwd)
+
+
+def test_binary_log_converts_to_csv(tmp_path):
+    for store_type in ["list", "array"]:
+        for log_level in [1, 3]:
+            csv_dir = tmp_path / "{}-{}-csv".format(store_type, log_level)
+            bin_dir = tmp_path / "{}-{}-bin".format(store_type, log_level)
+            csv_dir.mkdir()
+            bin_dir.mkdir()
+            run_logged_model(str(csv_dir), store_type, "csv", log_level)
+            run_logged_model(str(bin_dir), store_type, "binary", log_level)
+
+            assert not os.path.exists(str(bin_dir / "agents.out.0"))
+            agentlog.convert_to_csv(str(bin_dir / "agents.out.0.bin"), str(bin_dir / "agents.out.0"))
+            with open(str(csv_dir / "agents.out.0"), encoding="utf-8") as f:
+                expected = f.read()
+            with open(str(bin_dir / "agents.out.0"), encoding="utf-8") as f:
+                assert f.read() == expected
+
+
+def test_read_agent_log(tmp_path):
+    run_logged_model(str(tmp_path), "array", "binary", 1, end_time=5)
+    sessions = agentlog.read_agent_log(str(tmp_path / "agents.out.0.bin"))
+    assert len(sessions) == 1
+
+    columns = sessions[0]["columns"]
+    assert len(columns["time"]) == 5 * 52
+    assert columns["time"].tolist() == sorted(columns["time"].tolist())
+    assert [p[0] for p in sessions[0]["places"]][:3] == ["A", "B", "C"]
+    assert sessions[0]["attribute_names"] == ["connections", "gender", "age", "group"]
+    assert sessions[0]["attributes"].shape == (4, 5 * 52)
+
+
+TRAJECTORY_LOCATIONS = [
+    {"name": "A", "movechance": 0.3},
+    {"name": "B", "movechance": 0.3},
+    {"name": "C", "location_type": "camp", "attributes": {"deactivation_probability": 0.05}},
+]
+TRAJECTORY_LINKS = [("A", "B", 10.0), ("B", "C", 80.0)]
+
+
+def run_trajectory_model(path, store_type, agent_format, end_time=45, clear_day=-1):
+    log_levels = {"agent": 2, "agent_format": agent_format}
+    move_rules = {"MaxMoveSpeed": 50.0, "HarvestMonths": [2]}
+    # Agents that are removed by clearLocationsFromAgents can not be deactivated as well.
+    spawn_rules = {"camps_are_sinks": clear_day < 0}
+    with toy_model.settings(optimisations={"AgentStore": store_type}, log_levels=log_levels, move_rules=move_rules, spawn_rules=spawn_rules) as settings:
+        settings.farming = True
+        toy_model.seed(5)
+
+        def spawn(e, t):
+            # Agents are spawned during the run.
+            for i in range(0, 3):
+                e.addAgent(location=e.locations[0], attributes={"gender": ["male", "female"][i % 2]})
+
+        def clear(e, t):
+            if t == clear_day:
+                e.clearLocationsFromAgents(["B"])
+            return [a.harvesting for a in e.agents]
+
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            e = toy_model.build_ecosystem(TRAJECTORY_LOCATIONS, TRAJECTORY_LINKS, start_date="2010-01-20")
+            harvesting = toy_model.run(e, end_time, before=spawn, after=clear)
+            agentlog.close_agent_logs()
+        finally:
+            os.chdir(cwd)
+    return harvesting
+
+
+def test_trajectory_log(tmp_path):
+    for store_type in ["list", "array"]:
+        rows_dir = tmp_path / "{}-rows".format(store_type)
+        events_dir = tmp_path / "{}-events".format(store_type)
+        rows_dir.mkdir()
+        events_dir.mkdir()
+        run_trajectory_model(str(rows_dir), store_type, "binary")
+        harvesting = run_trajectory_model(str(events_dir), store_type, "events")
+
+        rows = agentlog.read_agent_log(str(rows_dir / "agents.out.0.bin"))[0]
+        events = agentlog.read_trajectory_log(str(events_dir / "agents.out.0.events"))[0]
+        names = [p[0] for p in rows["places"]]
+        columns = rows["columns"]
+        # Far fewer events than rows.
+        assert len(events["columns"]["time"]) * 2 < len(columns["time"])
+
+        for t in range(0, 45):
+            day = (columns["time"] == t) & (columns["hop"] == 0)
+            snapshot = agentlog.trajectory_snapshot(events, t)
+            assert snapshot["agent_id"].tolist() == columns["agent"][day].tolist()
+            assert snapshot["location"].tolist() == [names[p] for p in columns["location"][day]]
+            assert snapshot["home_location"].tolist() == [names[p] for p in columns["home_location"][day]]
+            assert snapshot["travelling"].tolist() == ((columns["flags"][day] & agentlog.TRAVELLING) > 0).tolist()
+            assert snapshot["places_travelled"].tolist() == columns["places_travelled"][day].tolist()
+            assert snapshot["harvesting"].tolist() == [harvesting[t][i] for i in snapshot["agent_id"]]
+
+        # The path of an agent follows its rows.
+        path = agentlog.agent_trajectory(events, 0)
+        assert path[0] == (0, "spawn", "A", 1)
+        assert [event for _, event, _, _ in path if event.startswith("harvest")] == ["harvest_leave", "harvest_return"]
+        agent = (columns["agent"] == 0) & (columns["hop"] == 0)
+        assert [p for _, event, p, _ in path if event in ["depart", "arrive"]][-1] == names[columns["location"][agent][-1]]
+
+
+def test_trajectory_log_renumbering(tmp_path):
+    snapshots = {}
+    for store_type in ["list", "array"]:
+        path = tmp_path / store_type
+        path.mkdir()
+        run_trajectory_model(str(path), store_type, "events", end_time=20, clear_day=10)
+        events = agentlog.read_trajectory_log(str(path / "agents.out.0.events"))[0]
+        assert len(events["renumberings"]) == 1
+        snapshots[store_type] = [agentlog.trajectory_snapshot(events, t) for t in range(0, 20)]
+
+        removed = events["columns"]["event"] == agentlog.REMOVE
+        assert np.all(events["columns"]["time"][removed] == 11)
+        removed_ids = events["columns"]["agent_id"][removed]
+        # Removed agents were in B, and no longer appear from then on.
+        before = snapshots[store_type][10]
+        assert set(before["agent_id"][before["location"] == "B"].tolist()) == set(removed_ids.tolist())
+        assert len(set(snapshots[store_type][11]["agent_id"].tolist()) & set(removed_ids.tolist())) == 0
+        # Agent ids remain those of the spawn order.
+        assert snapshots[store_type][19]["agent_id"].max() < 60
+
+    for list_snapshot, array_snapshot in zip(snapshots["list"], snapshots["array"]):
+        for name in list_snapshot:
+            assert list_snapshot[name].tolist() == array_snapshot[name].tolist()
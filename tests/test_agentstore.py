@@ -0,0 +1,79 @@
+from flee import agentstore
+from tests import toy_model
+
+"""
+Tests for the array-backed agent store (optimisations.agent_store: array).
+"""
+
+LOCATIONS = [
+    {"name": "A", "movechance": 1.0},
+    {"name": "B", "movechance": 0.5},
+    {"name": "C", "movechance": 0.5},
+    {"name": "D", "location_type": "camp", "capacity": 40},
+    {"name": "E", "location_type": "camp"},
+]
+LINKS = [("A", "B", 30.0), ("A", "C", 80.0), ("B", "D", 40.0), ("C", "E", 20.0), ("B", "C", 25.0)]
+
+
+def run_small_model(store_type, end_time=10):
+    with toy_model.settings(
+        optimisations={"AgentStore": store_type},
+        move_rules={"MaxMoveSpeed": 50.0, "MaxWalkSpeed": 50.0, "AwarenessLevel": 2},
+    ):
+        toy_model.seed(42)
+        e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+        for i in range(0, 100):
+            e.addAgent(location=e.locations[0], attributes={"gender": ["male", "female"][i % 2]})
+        toy_model.run(e, end_time)
+    return e
+
+
+def test_agentstore_matches_list():
+    e_list = run_small_model("list")
+    e_array = run_small_model("array")
+
+    assert isinstance(e_array.agents, agentstore.AgentStore)
+    assert len(e_array.agents) == len(e_list.agents)
+
+    for a, b in zip(e_list.agents, e_array.agents):
+        assert a.location.name == b.location.name
+        assert a.travelling == b.travelling
+        assert a.places_travelled == b.places_travelled
+        assert a.recent_travel_distance == b.recent_travel_distance
+        assert a.attributes == dict(b.attributes.items())
+
+    for l1, l2 in zip(e_list.locations, e_array.locations):
+        assert l1.numAgents == l2.numAgents
+
+
+def test_agentstore_views():
+    with toy_model.settings(optimisations={"AgentStore": "array"}):
+        e = toy_model.build_ecosystem([{"name": "A", "movechance": 1.0}, {"name": "B", "movechance": 1.0}], [("A", "B", 10.0)])
+        l1, l2 = e.locations
+
+        for _ in range(0, 3000):
+            e.addAgent(location=l1, attributes={"age": 20})
+
+        assert len(e.agents) == 3000
+        assert e.agents.capacity >= 3000
+
+        a = e.agents[-1]
+        a.attributes["_temp_route"] = ["B"]
+        assert a.attributes["_temp_route"] == ["B"]
+        del a.attributes["_temp_route"]
+        assert "_temp_route" not in a.attributes
+        assert a.attributes["age"] == 20
+
+        a.location = l1.links[0]
+        assert a.location.endpoint is l2
+        a.location = None
+        assert a.location is None
+        a.location = l2
+
+        e.clearLocationsFromAgents(["A"])
+        assert len(e.agents) == 1
+
+
+if __name__ == "__main__":
+    test_agentstore_matches_list()
+    test_agentstore_views()
@@ -0,0 +1,100 @@
+import os
+import random
+import numpy as np
+from flee import InputGeography, flee, spawning
+from flee.datamanager import handle_refugee_data
+
+"""
+Tests for the binary checkpoint/restart of serial simulations (flee/checkpoint.py).
+"""
+
+
+def setup_simulation():
+    flee.SimulationSettings.ConflictInputFile = os.path.join("test_data", "test_input_csv", "flare-out.csv")
+
+    e = flee.Ecosystem()
+    ig = InputGeography.InputGeography()
+    ig.ReadLocationsFromCSV(csv_name=os.path.join("test_data", "test_input_csv/locations.csv"))
+    ig.ReadLinksFromCSV(csv_name=os.path.join("test_data", "test_input_csv/routes.csv"))
+    ig.ReadClosuresFromCSV(csv_name=os.path.join("test_data", "test_input_csv/closures.csv"))
+    e, lm = ig.StoreInputGeographyInEcosystem(e=e)
+
+    d = handle_refugee_data.RefugeeTable(
+        csvformat="generic",
+        data_directory=os.path.join("test_data", "test_input_csv", "refugee_data"),
+        start_date="2010-01-01",
+        data_layout="data_layout.csv",
+    )
+    for camp_name in ["D", "E", "F"]:
+        for _ in range(0, int(d.get_field(name=camp_name, day=0, FullInterpolation=True))):
+            e.addAgent(location=lm[camp_name], attributes={})
+    return e, ig, d
+
+
+def run_days(e, ig, d, end_time):
+    trace = []
+    for t in range(e.time, end_time):
+        ig.AddNewConflictZones(e=e, time=t)
+        spawning.spawn_daily_displaced(e, t, d)
+        spawning.refresh_spawn_weights(e)
+        e.enact_border_closures(time=t)
+        e.evolve()
+        trace.append(
+            [loc.numAgents for loc in e.locations]
+            + [link.numAgents for loc in e.locations for link in loc.links + loc.closed_links]
+        )
+    return trace
+
+
+def agent_state(e):
+    return [
+        (a.location.name if a.location is not None else None, a.home_location.name, a.travelling,
+         a.distance_travelled_on_link, a.recent_travel_distance, a.timesteps_since_departure,
+         a.places_travelled, [loc.name for loc in a.route], dict(a.attributes))
+        for a in e.agents
+    ]
+
+
+def run_restart(tmp_path, store_type, cohorts=False):
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+    try:
+        flee.SimulationSettings.optimisations["AgentStore"] = store_type
+        flee.SimulationSettings.optimisations["Cohorts"] = cohorts
+        file_name = os.path.join(str(tmp_path), "checkpoint-{}.npz".format(store_type))
+
+        random.seed(3)
+        np.random.seed(3)
+        e, ig, d = setup_simulation()
+        trace = run_days(e, ig, d, 6)
+        # Days 5-8 have a border closure, with agents on the closed links.
+        e.write_checkpoint(file_name, ig)
+        trace += run_days(e, ig, d, 25)
+        reference = agent_state(e)
+
+        random.seed(7)
+        np.random.seed(7)
+        e, ig, d = setup_simulation()
+        e.read_checkpoint(file_name, ig)
+        assert e.time == 6
+        # The restored locations use the compiled graph of the new Ecosystem.
+        assert all(loc.graph is e.graph for loc in e.locations)
+        restarted = trace[:6] + run_days(e, ig, d, 25)
+
+        assert restarted == trace
+        assert agent_state(e) == reference
+        if cohorts:
+            assert e.cohorts.total() > 0
+    finally:
+        flee.SimulationSettings.ReadFromYML("empty.yml")
+
+
+def test_checkpoint_list(tmp_path):
+    run_restart(tmp_path, "list")
+
+
+def test_checkpoint_array(tmp_path):
+    run_restart(tmp_path, "array")
+
+
+def test_checkpoint_cohorts(tmp_path):
+    run_restart(tmp_path, "array", cohorts=True)
@@ -31,5 +31,53 @@ def test_close_location():
     print("Test successful!")
 
 
+def test_closures_keep_link_identity():
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+
+    e = flee.Ecosystem()
+
+    a = e.addLocation(name="A", movechance=1.0, country="X")
+    b = e.addLocation(name="B", movechance=0.0, country="X")
+    c = e.addLocation(name="C", movechance=0.0, country="Y")
+
+    e.linkUp(endpoint1="A", endpoint2="B", distance=10.0)
+    e.linkUp(endpoint1="A", endpoint2="C", distance=10.0)
+    e.linkUp(endpoint1="B", endpoint2="C", distance=10.0)
+    links = {loc.name: list(loc.links) for loc in e.locations}
+
+    # An agent travelling on a link that closes still refers to the closed link.
+    e.addAgent(location=a, attributes={})
+    agent = e.agents[-1]
+    agent.location = a.links[1]
+    agent.travelling = True
+
+    e.close_border("X", "Y")
+    assert [link.endpoint.name for link in a.links] == ["B"]
+    assert a.closed_links == [links["A"][1]]
+    assert agent.location is a.closed_links[0] and agent.location.closed
+    assert c.links == [] and len(c.closed_links) == 2
+
+    e.reopen_border("X", "Y")
+    assert not agent.location.closed
+    for loc in e.locations:
+        assert sorted(loc.links, key=id) == sorted(links[loc.name], key=id)
+        assert loc.closed_links == []
+
+    assert e.close_location(location_name="B")
+    assert a.links == [links["A"][1]] and c.links == [links["C"][0]]
+    assert b.links == [] and len(b.closed_links) == 2
+
+    assert e.reopen_location(location_name="B")
+    assert len(a.links) == 2 and len(b.links) == 2 and len(c.links) == 2
+
+    # One-way: only the links into B are closed and reopened.
+    assert e.close_location(location_name="B", twoway=False)
+    assert len(b.links) == 2 and len(a.links) == 1 and len(c.links) == 1
+    assert e.reopen_location(location_name="B", twoway=False)
+    assert len(a.links) == 2 and len(c.links) == 2
+    assert e.link_index[("A", "B")] == [links["A"][0]]
+
+
 if __name__ == "__main__":
     test_close_location()
+    test_closures_keep_link_identity()
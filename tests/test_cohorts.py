@@ -0,0 +1,98 @@
+import math
+import numpy as np
+import pytest
+from flee import flee, moving, cohorts
+from tests import toy_model
+
+"""
+Tests for cohort mode (optimisations.cohorts).
+"""
+
+LOCATIONS = [
+    {"name": "A", "movechance": 0.3},
+    {"name": "B", "movechance": 0.3},
+    {"name": "C", "location_type": "camp"},
+    {"name": "D", "location_type": "camp", "capacity": 1000},
+]
+LINKS = [("A", "B", 40.0), ("B", "C", 120.0), ("B", "D", 60.0), ("A", "D", 150.0)]
+
+
+def location_counts(e, t):
+    return [loc.numAgents for loc in e.locations]
+
+
+def run_model(use_cohorts, num_agents=3000, end_time=8):
+    with toy_model.settings(
+        optimisations={"Cohorts": use_cohorts},
+        move_rules={"MaxMoveSpeed": 50.0, "MaxWalkSpeed": 35.0, "AwarenessLevel": 2},
+    ):
+        e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+        for i in range(0, num_agents):
+            e.addAgent(location=e.locations[0], attributes={"gender": ["male", "female"][i % 2]})
+
+        counts = toy_model.run(e, end_time, after=location_counts)
+    return e, counts
+
+
+def test_cohorts_conserve_agents():
+    toy_model.seed(5)
+    e, _ = run_model(True)
+
+    in_locations = sum(loc.numAgents for loc in e.locations)
+    on_links = sum(link.numAgents for loc in e.locations for link in loc.links)
+    assert in_locations + on_links == e.numAgents() == 3000
+
+    # Only agents in transit are individual Person objects.
+    for a in e.agents:
+        assert a.travelling or len(a.route) > 0
+    assert len(e.cohorts) <= 2 * 2 * len(e.locations)
+    assert sum(e.cohorts.counts.values()) + len(e.agents) == 3000
+
+
+def test_cohorts_statistically_equivalent():
+    toy_model.seed(3)
+    _, reference = run_model(False)
+    _, cohort = run_model(True)
+
+    n = 3000
+    for ref, coh in zip(reference, cohort):
+        for x, y in zip(ref, coh):
+            p = x / n
+            tolerance = 6.0 * math.sqrt(2.0 * max(p * (1.0 - p), 1.0 / n) / n)
+            assert abs(x - y) / n < tolerance
+
+
+def test_select_route_counts():
+    with toy_model.settings(move_rules={"AwarenessLevel": 2}):
+        e = toy_model.build_ecosystem(
+            [{"name": "A", "movechance": 1.0}, {"name": "B", "location_type": "camp"}, {"name": "C", "location_type": "camp"}],
+            [("A", "B", 10.0), ("A", "C", 30.0)],
+        )
+        e.addAgent(location=e.locations[0], attributes={})
+
+        np.random.seed(2)
+        route_counts = moving.selectRouteCounts(e.agents[0], 0, 10000)
+        assert sum(n for _, n in route_counts) == 10000
+
+        weights, routes = moving.selectRoute(e.agents[0], time=0, return_all_routes=True)
+        total = sum(weights)
+        expected = {tuple(r[1:]): w / total for r, w in zip(routes, weights)}
+        for route, n in route_counts:
+            p = expected[tuple(route)]
+            assert abs(n / 10000 - p) < 5.0 * math.sqrt(p * (1.0 - p) / 10000)
+
+
+def test_cohort_settings():
+    with toy_model.settings():
+        cohorts.check_cohort_settings()
+        # Agents re-created from a cohort would have lost their recent travel distance.
+        flee.SimulationSettings.move_rules["AvoidShortStints"] = True
+        with pytest.raises(SystemExit):
+            cohorts.check_cohort_settings()
+
+
+if __name__ == "__main__":
+    test_cohorts_conserve_agents()
+    test_cohorts_statistically_equivalent()
+    test_select_route_counts()
+    test_cohort_settings()
@@ -1,4 +1,5 @@
-from flee.datamanager import handle_refugee_data
+import numpy as np
+from flee.datamanager import DataTable, handle_refugee_data
 
 """
 Generation 1 code. Incorporates only distance, travel always takes one day.
@@ -46,5 +47,44 @@ def test_datatable():
     print("SUCCESS")
 
 
+
+def test_dense_tables():
+    print("Testing dense daily values against the data tables.")
+
+    rng = np.random.default_rng(1)
+    tables = []
+    for n in [1, 2, 5, 20]:
+        days = np.sort(rng.choice(np.arange(-30, 300), size=n, replace=False)).astype(float)
+        tables.append(np.column_stack([days, rng.integers(0, 10000, size=n) / 3.0]))
+    # Duplicate days, and entries that are not in chronological order.
+    tables.append(np.array([[0.0, 5.0], [10.0, 7.0], [10.0, 20.0], [40.0, 100.0]]))
+    tables.append(np.array([[20.0, 5.0], [10.0, 7.0], [40.0, 100.0]]))
+
+    d = DataTable.DataTable.from_tables(
+        header=["total", "a", "b", "c", "d", "e", "f"],
+        data_table=[tables[3]] + tables,
+        start_date="2010-01-01",
+    )
+    assert d.dense_columns.tolist() == [True, True, True, True, True, True, False]
+
+    for column in range(0, len(d.header)):
+        for day in range(-40, 400):
+            assert d.get_interpolated_data(column, day) == d._scan_interpolated_data(column, day)
+            d.dense_columns[column] = False
+            raw = d.get_raw_data(column, day)
+            interpolated = d.is_interpolated(d.header[column], day)
+            d.dense_columns[column] = column < 6
+            assert d.get_raw_data(column, day) == raw
+            assert d.is_interpolated(d.header[column], day) == interpolated
+
+    # Camp totals, with and without a column that is not in chronological order.
+    for d in [d, DataTable.DataTable.from_tables(header=d.header[:6], data_table=d.data_table[:6], start_date="2010-01-01")]:
+        for day in range(1, 400):
+            expected = 0
+            for column in range(1, len(d.header)):
+                expected += d._scan_interpolated_data(column, day) - d._scan_interpolated_data(column, day - 1)
+            assert d.get_daily_difference(day) == expected
+
+
 if __name__ == "__main__":
     test_datatable()
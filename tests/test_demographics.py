@@ -1,18 +1,19 @@
+import numpy as np
 from flee import flee, demographics
+from tests import toy_model
 
 def make_ecosystem(yaml="empty.yml"):
     flee.SimulationSettings.ReadFromYML(yaml)
 
-    e = flee.Ecosystem()
+    e = toy_model.build_ecosystem(
+        [
+            {"name": "A", "x": 0.0, "y": 0.0, "movechance": 1.0, "foreign": False},
+            {"name": "B", "x": 1.0, "y": 1.0, "movechance": 1.0, "foreign": False},
+            {"name": "C", "x": 100.0, "y": 100.0, "movechance": 1.0, "foreign": False},
+        ],
+        [("A", "B", 100.0), ("B", "C", 100.0)],
+    )
     e.demographics_test_prefix = "test_data/test_data_idp"
-
-    e.addLocation(name="A", x=0.0, y=0.0, movechance=1.0, foreign=False)
-    e.addLocation(name="B", x=1.0, y=1.0, movechance=1.0, foreign=False)
-    e.addLocation(name="C", x=100.0, y=100.0, movechance=1.0, foreign=False)
-
-    e.linkUp(endpoint1="A", endpoint2="B", distance=100.0)
-    e.linkUp(endpoint1="B", endpoint2="C", distance=100.0)
-
     return e
 
 
@@ -42,3 +43,68 @@ def test_load_demographics_csv():
 
     assert len(demographics.get_attribute_values("religion")) == 3
     assert not demographics.__demographics["religion"].isnull().values.any()
+
+
+def test_draw_samples_batch():
+    e = make_ecosystem()
+    e.locations[0].name = "T1"
+
+    demographics._read_demographic_csv(e, "test_data/test_data_dflee/test_input_csv/demographics_age.csv")
+
+    df = demographics.__demographics["age"]
+    n = 20000
+    np.random.seed(4)
+
+    for loc, column in [(e.locations[0], "T1"), (e.locations[1], "Default")]:
+        columns = demographics.draw_samples_batch(e, loc, n)
+        assert len(columns["age"]) == n
+
+        samples = demographics.decode_samples(columns, n)
+        assert len(samples) == n
+        assert set(s["age"] for s in samples) <= set(df["age"].to_list())
+
+        # Sampled frequencies match the weights in the CSV file.
+        p = df[column].to_numpy() / df[column].sum()
+        observed = np.bincount(columns["age"], minlength=len(p)) / n
+        assert np.all(np.abs(observed - p) < 5.0 * np.sqrt(p * (1.0 - p) / n) + 1.0 / n)
+
+    assert demographics.draw_samples(e, e.locations[0])["age"] in df["age"].to_list()
+
+
+COUNTED_LOCATIONS = [
+    {"name": "A", "movechance": 1.0, "attributes": {}},
+    {"name": "B", "movechance": 1.0, "attributes": {}},
+    {"name": "C", "location_type": "camp", "pop": 100, "attributes": {}},
+]
+COUNTED_LINKS = [("A", "B", 100.0), ("B", "C", 200.0)]
+
+
+def check_demographic_counts(e, t):
+    # Agents on links are in transit, and are not counted in a location.
+    for loc in e.locations:
+        counts = {}
+        for agent in e.agents:
+            if agent.location is loc:
+                counts[agent.attributes["ethnicity"]] = counts.get(agent.attributes["ethnicity"], 0) + 1
+        assert {v: n for v, n in loc.demographic_counts.items() if n > 0} == counts
+
+
+def test_incremental_demographic_counts():
+    move_rules = {"MatchCampEthnicity": True, "MaxMoveSpeed": 120.0, "CampWeight": 5.0}
+    for agent_store in ["list", "array"]:
+        with toy_model.settings(move_rules=move_rules, optimisations={"AgentStore": agent_store}) as settings:
+            e = toy_model.build_ecosystem(COUNTED_LOCATIONS, COUNTED_LINKS, demographics_test_prefix="test_data/test_data_idp/input_csv")
+            a, c = e.locations[0], e.locations[2]
+            # The counted attributes belong to each Ecosystem: another one without matching rules changes nothing here.
+            settings.move_rules["MatchCampEthnicity"] = False
+            flee.Ecosystem()
+            settings.move_rules["MatchCampEthnicity"] = True
+
+            toy_model.seed(2)
+            for i in range(0, 20):
+                e.addAgent(location=a, attributes={"ethnicity": "ethntypeA" if i % 2 else "ethntypeB"})
+            e.addAgents(c, 2, {"ethnicity": ["ethntypeA", "ethntypeA"]})
+
+            toy_model.run(e, 6, after=check_demographic_counts)
+
+            assert c.attributes["ethntypeA"] > 2
@@ -410,6 +410,54 @@ def test_agent_flood_awareness():
     print("Test successful! Flood awareness correctly set. Weather forecaster working.")
 
 
+def test_flood_forecast_per_location():
+    """
+    Summary:
+        Test that the forecast-weighted flood terms, calculated once per location
+        and day, match the per-agent forecaster loops, and are recalculated when
+        the day or the flood level of the location changes.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+    flee.SimulationSettings.move_rules["FloodRulesEnabled"] = True
+    flee.SimulationSettings.move_rules["FloodLocWeights"] = [0.0,0.3,0.6,0.9,1.0]
+    flee.SimulationSettings.move_rules["FloodForecasterTimescale"] = 3
+    flee.SimulationSettings.move_rules["FloodForecasterEndTime"] = 6
+    flee.SimulationSettings.move_rules["FloodForecasterWeights"] = [1.0, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.3, 0.1]
+
+    e = flee.Ecosystem()
+    loc = e.addLocation(name="A", location_type="flood_zone")
+    loc.attributes["flood_level"] = 1
+    loc.attributes["forecast_flood_levels"] = [0.0,2.0,1.0,0.0,3.0,2.0,1.0,1.0]
+
+    def reference(time, level):
+        # Forecaster loops of calculateMoveChance (forecast levels) and getEndPointScore (current level).
+        movechance_base = 0.0
+        endpoint_base = 0.0
+        for x in range(1, 4):
+            day = min(time + x, 6)
+            forecast_weight = flee.SimulationSettings.move_rules["FloodForecasterWeights"][day]
+            forecast_level = int(loc.attributes["forecast_flood_levels"][day])
+            if forecast_level > 0.0:
+                movechance_base += moving.lm.interp(flee.SimulationSettings.move_rules["FloodLocWeights"], forecast_level) * forecast_weight
+                endpoint_base += moving.lm.interp(flee.SimulationSettings.move_rules["FloodLocWeights"], level) * forecast_weight
+            if day == 6:
+                break
+        return float(movechance_base/3), endpoint_base * float(endpoint_base/3)
+
+    for time in range(0, 7):
+        assert moving.getFloodForecast(loc, time) == reference(time, 1)
+
+    loc.attributes["flood_level"] = 3
+    assert moving.getFloodForecast(loc, 6) == reference(6, 3)
+
+    flee.SimulationSettings.ReadFromYML("empty.yml")
 
 
 if __name__ == "__main__":
@@ -417,4 +465,5 @@ if __name__ == "__main__":
     test_flood_level_location_attribute()
     test_flood_forecaster()
     test_agent_flood_awareness()
+    test_flood_forecast_per_location()
     pass
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+from flee import InputGeography, ensemble, flee
+from flee.datamanager import handle_refugee_data
+from tests import toy_model
+
+"""
+Tests for the fork-based ensemble runner (flee/ensemble.py).
+"""
+
+
+def setup_scenario():
+    flee.SimulationSettings.ConflictInputFile = os.path.join("test_data", "test_input_csv", "flare-out.csv")
+
+    e = flee.Ecosystem()
+    ig = InputGeography.InputGeography()
+    ig.ReadLocationsFromCSV(csv_name=os.path.join("test_data", "test_input_csv/locations.csv"))
+    ig.ReadLinksFromCSV(csv_name=os.path.join("test_data", "test_input_csv/routes.csv"))
+    ig.ReadClosuresFromCSV(csv_name=os.path.join("test_data", "test_input_csv/closures.csv"))
+    e, lm = ig.StoreInputGeographyInEcosystem(e=e)
+
+    d = handle_refugee_data.RefugeeTable(
+        csvformat="generic",
+        data_directory=os.path.join("test_data", "test_input_csv", "refugee_data"),
+        start_date="2010-01-01",
+        data_layout="data_layout.csv",
+    )
+    for camp_name in ["D", "E", "F"]:
+        for _ in range(0, int(d.get_field(name=camp_name, day=0, FullInterpolation=True))):
+            e.addAgent(location=lm[camp_name], attributes={})
+    return e, ig, d
+
+
+def test_ensemble():
+    with toy_model.settings():
+        e, ig, d = setup_scenario()
+        camps = ["D", "E", "F"]
+
+        results = ensemble.run_ensemble(
+            e, ig, d, 20, [1, 2, 1, 1],
+            camp_names=camps,
+            settings=[None, None, None, {"move_rules": {"CampWeight": 100.0}}],
+            processes=2,
+        )
+        assert len(results) == 4
+        for name in camps + ["total"]:
+            assert len(results[0][name]) == 20
+            # Replicas with the same seed and settings are identical.
+            assert np.array_equal(results[0][name], results[2][name])
+
+        # The scenario and settings of this process are untouched.
+        assert e.time == 0
+        assert flee.SimulationSettings.move_rules["CampWeight"] != 100.0
+
+        # A replica is the same simulation as a serial run with the same seed.
+        toy_model.seed(1)
+        serial = ensemble.run_replica(e, ig, d, 20, camps)
+        for name in camps + ["total"]:
+            assert np.array_equal(serial[name], results[0][name])
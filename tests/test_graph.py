@@ -0,0 +1,85 @@
+import os
+import numpy as np
+from flee import topology
+from tests import toy_model
+
+"""
+Tests for the compiled CSR view of the location graph (Ecosystem.get_graph).
+"""
+
+
+def build_ecosystem():
+    return toy_model.build_ecosystem(
+        [
+            {"name": "A", "movechance": 1.0},
+            {"name": "B", "movechance": 0.5},
+            {"name": "C", "location_type": "camp"},
+            {"name": "D", "location_type": "marker"},
+        ],
+        [("A", "B", 10.0), ("B", "C", 20.0), ("B", "D", 5.0)],
+    )
+
+
+def check_graph(e):
+    # The incrementally maintained view equals a freshly built one.
+    reference = topology.CompiledGraph(e).update().toDict()
+    for key, value in e.get_graph().toDict().items():
+        assert np.array_equal(value, reference[key]), key
+
+
+def test_graph():
+    with toy_model.settings():
+        e = build_ecosystem()
+        g = e.get_graph()
+
+        assert list(g.offsets) == [0, 1, 4, 5, 6]
+        assert list(g.link_end[g.offsets[1]:g.offsets[2]]) == [0, 2, 3]
+        assert list(g.link_distance[g.offsets[1]:g.offsets[2]]) == [10.0, 20.0, 5.0]
+        assert list(g.camp) == [False, False, True, False]
+        assert list(g.marker) == [False, False, False, True]
+        assert not g.link_closed.any()
+
+        e.close_link("B", "C", twoway=False)
+        g = e.get_graph()
+        assert list(g.link_end[g.open_links(1)]) == [0, 3]
+        assert g.link_closed.sum() == 1
+        check_graph(e)
+
+        e.reopen_link("B", "C", twoway=False)
+        e.set_forced_redirection("A", "B", True)
+        e.add_conflict_zone("A")
+        e.change_location_type("D", "town")
+        g = e.get_graph()
+        assert not g.link_closed.any()
+        assert g.link_forced_redirection[0]
+        assert g.conflict[0] > 0.0
+        assert not g.marker[3] and g.town[3]
+        check_graph(e)
+
+        _ = e.addLocation(name="E", movechance=1.0)
+        e.linkUp(endpoint1="E", endpoint2="C", distance=3.0)
+        assert e.get_graph().num_locations == 5
+        assert e.get_graph().offsets[-1] == 8
+        check_graph(e)
+
+
+def test_export_graph(tmp_path):
+    with toy_model.settings():
+        e = build_ecosystem()
+        e.close_link("B", "C", twoway=False)
+        file_name = os.path.join(tmp_path, "graph.npz")
+        vertices, edges = e.export_graph(file_name=file_name)
+
+        assert vertices == ["A", "B", "C", "D"]
+        # Open links only.
+        assert edges == [["A", "B", 10.0], ["B", "A", 10.0], ["B", "D", 5.0], ["C", "B", 20.0], ["D", "B", 5.0]]
+        assert e.export_graph(use_ids_instead_of_names=True)[1][2] == [1, 3, 5.0]
+
+        with np.load(file_name) as data:
+            assert list(data["location_names"]) == ["A", "B", "C", "D"]
+            assert data["link_start"].shape == (6,)
+            assert data["link_closed"].sum() == 1
+
+
+if __name__ == "__main__":
+    test_graph()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import numpy as np
+from flee import InputGeography, flee, inputbundle
+from flee.datamanager import handle_refugee_data
+from tests import toy_model
+
+"""
+Tests for compiled input bundles (flee/inputbundle.py).
+"""
+
+
+def make_scenario(path):
+    input_csv = os.path.join(path, "input_csv")
+    shutil.copytree(os.path.join("test_data", "test_input_csv"), input_csv)
+
+    # Custom location and link attributes, and a forced redirection.
+    with open(os.path.join(input_csv, "locations.csv"), encoding="utf-8") as f:
+        lines = f.read().strip().split("\n")
+    lines = [lines[0] + ",ethnicity"] + [line + ",group{}".format(i % 2) for i, line in enumerate(lines[1:])]
+    with open(os.path.join(input_csv, "locations.csv"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    with open(os.path.join(input_csv, "routes.csv"), "a", encoding="utf-8") as f:
+        f.write('"B","C",90,2\n')
+    with open(os.path.join(input_csv, "registration_corrections.csv"), "w", encoding="utf-8") as f:
+        f.write("D,2010-01-21\n")
+    return input_csv, os.path.join(input_csv, "refugee_data")
+
+
+def read_scenario(input_csv, data_dir):
+    e = flee.Ecosystem()
+    ig = InputGeography.InputGeography()
+    ig.ReadLocationsFromCSV(os.path.join(input_csv, "locations.csv"))
+    ig.ReadLinksFromCSV(os.path.join(input_csv, "routes.csv"))
+    ig.ReadClosuresFromCSV(os.path.join(input_csv, "closures.csv"))
+    e, lm = ig.StoreInputGeographyInEcosystem(e)
+
+    d = handle_refugee_data.RefugeeTable(
+        csvformat="generic", data_directory=data_dir, start_date="2010-01-01", data_layout="data_layout.csv"
+    )
+    d.ReadL1Corrections(os.path.join(input_csv, "registration_corrections.csv"))
+    return e, lm, ig, d
+
+
+def describe(e):
+    locations = []
+    for loc in e.locations:
+        locations.append((
+            loc.name, loc.region, loc.country, loc.x, loc.y, loc.movechance, loc.capacity, loc.pop,
+            loc.foreign, loc.camp, loc.town, loc.conflict, loc.attributes, loc.major_routes,
+            [(link.endpoint.name, link.get_distance(), link.forced_redirection, link.attributes) for link in loc.links],
+        ))
+    return locations, e.closures
+
+
+def test_bundle(tmp_path):
+    input_csv, data_dir = make_scenario(str(tmp_path))
+    with toy_model.settings() as settings:
+        settings.ConflictInputFile = os.path.join(input_csv, "flare-out.csv")
+
+        e1, lm1, ig1, d1 = read_scenario(input_csv, data_dir)
+
+        cache = os.path.join(str(tmp_path), "bundles")
+        e2, lm2, ig2, d2 = inputbundle.load_cached_bundle(input_csv, data_dir, cache, flee.Ecosystem(), "2010-01-01")
+
+        assert describe(e1) == describe(e2)
+        assert list(lm1.keys()) == list(lm2.keys())
+        for field in ["locations", "links", "major_routes", "closures", "location_changes", "conflicts", "attributes", "columns", "link_columns"]:
+            assert getattr(ig1, field) == getattr(ig2, field)
+
+        assert d1.header == d2.header
+        for table1, table2 in zip(d1.data_table, d2.data_table):
+            assert np.array_equal(table1, table2)
+        for day in range(0, 120, 7):
+            for name in d1.header:
+                assert d1.get_field(name, day) == d2.get_field(name, day)
+
+        # The cached bundle is reused, until one of the input files changes.
+        bundles = os.listdir(cache)
+        assert len(bundles) == 1
+        inputbundle.load_cached_bundle(input_csv, data_dir, cache, flee.Ecosystem(), "2010-01-01")
+        assert os.listdir(cache) == bundles
+
+        with open(os.path.join(data_dir, "D.csv"), "a", encoding="utf-8") as f:
+            f.write("2010-05-01,4000\n")
+        e3, lm3, ig3, d3 = inputbundle.load_cached_bundle(input_csv, data_dir, cache, flee.Ecosystem(), "2010-01-01")
+        assert len(os.listdir(cache)) == 2
+        assert d3.get_field("D", 200) == 4000
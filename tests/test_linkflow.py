@@ -0,0 +1,108 @@
+import gzip
+import os
+import pytest
+from flee import flee, linkflow
+from tests import toy_model
+
+"""
+Tests for the link flow counters and the aggregated link log (log_levels.link_format: aggregated).
+"""
+
+
+LOCATIONS = [
+    {"name": "A", "movechance": 1.0},
+    {"name": "B", "movechance": 0.5},
+    {"name": "C", "location_type": "camp"},
+]
+LINKS = [("A", "B", 30.0), ("A", "C", 120.0), ("B", "C", 15.0)]
+
+
+def run_link_model(path, link_format, link_level, link_interval=1, end_time=10):
+    log_levels = {"link": link_level, "link_format": link_format, "link_interval": link_interval}
+    with toy_model.settings(log_levels=log_levels, move_rules={"MaxMoveSpeed": 50.0}):
+        toy_model.seed(7)
+
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+            for i in range(0, 60):
+                e.addAgent(location=e.locations[0], attributes={"gender": ["male", "female"][i % 2], "age": i % 3})
+
+            toy_model.run(e, end_time)
+            linkflow.close_link_logs()
+        finally:
+            os.chdir(cwd)
+    return e
+
+
+def test_aggregated_link_log(tmp_path):
+    for link_level in [1, 2]:
+        csv_dir = tmp_path / "{}-csv".format(link_level)
+        aggregated_dir = tmp_path / "{}-aggregated".format(link_level)
+        csv_dir.mkdir()
+        aggregated_dir.mkdir()
+        run_link_model(str(csv_dir), "csv", link_level)
+        run_link_model(str(aggregated_dir), "aggregated", link_level)
+
+        assert not os.path.exists(str(aggregated_dir / "links.out.0"))
+        with open(str(csv_dir / "links.out.0"), encoding="utf-8") as f:
+            expected = f.read().splitlines()
+        with gzip.open(str(aggregated_dir / "links.out.csv.gz"), "rt", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert lines[0] == expected[0]
+        # The same counts, in link order rather than location order.
+        assert sorted(lines[1:]) == sorted(expected[1:])
+        assert any(line.endswith(",gender:male") for line in lines) == (link_level > 1)
+
+
+def test_link_interval(tmp_path):
+    e = run_link_model(str(tmp_path), "aggregated", 1, link_interval=4, end_time=9)
+    with gzip.open(str(tmp_path / "links.out.csv.gz"), "rt", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert sorted(set(int(line.split(",")[0]) for line in lines[1:])) == [0, 4, 8]
+    last = [line.split(",") for line in lines[1:] if line.startswith("8,")]
+    assert [int(row[3]) for row in last] == [link.cumNumAgents for link in e.link_flows.links]
+
+
+def test_link_flow_counts():
+    with toy_model.settings(log_levels={"link": 2}):
+        e = toy_model.build_ecosystem([{"name": "A", "attributes": {}}, {"name": "B", "attributes": {}}], [("A", "B", 10.0)])
+        l1, l2 = e.locations
+        a1 = flee.Person(l1, {"gender": "male", "group": [1]})
+        a2 = flee.Person(l1, {"gender": "female", "group": [1]})
+        link = l1.links[0]
+        link.IncrementNumAgents(a1)
+        link.IncrementNumAgents(a2)
+        link.IncrementNumAgents(a1)
+        l2.links[0].IncrementNumAgents(a2)
+
+        assert link.cumNumAgents == 3
+        assert link.cumNumAgentsByAttribute == {"connections": {0: 3}, "gender": {"male": 2, "female": 1}, "group": {"[1]": 3}}
+        assert l2.links[0].cumNumAgents == 1
+
+        # Links that were not created by linkUp have no agent counts.
+        other = flee.Link(l1, l2, 5.0)
+        assert other.cumNumAgents == 0
+        with pytest.raises(SystemExit):
+            other.IncrementNumAgents(a1)
+
+        # With a communicator, the counts of all ranks are reduced on rank 0.
+        try:
+            from mpi4py import MPI
+        except ImportError:
+            MPI = None
+        if MPI is not None:
+            for link_level in [1, 2]:
+                flee.SimulationSettings.log_levels["link"] = link_level
+                flows = linkflow.LinkFlows()
+                flows.register(link)
+                flows.add(link, a1)
+                counts, attribute_counts, attributes = flows.reduce(MPI.COMM_WORLD)
+                assert counts.tolist() == [MPI.COMM_WORLD.Get_size()]
+                flows.add(link, a1)
+                counts, attribute_counts, attributes = flows.reduce(MPI.COMM_WORLD)
+                assert counts.tolist() == [2 * MPI.COMM_WORLD.Get_size()]
+                if link_level > 1:
+                    assert attributes == [("connections", 0), ("gender", "male"), ("group", "[1]")]
+                    assert attribute_counts.tolist() == [[2, 2, 2]]
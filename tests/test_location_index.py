@@ -0,0 +1,64 @@
+from tests import toy_model
+
+"""
+Tests for the name and link indices maintained by the Ecosystem.
+"""
+
+
+def build_ecosystem():
+    return toy_model.build_ecosystem(
+        [{"name": "A", "movechance": 1.0}, {"name": "B", "movechance": 0.5}, {"name": "C", "location_type": "camp", "capacity": 1}],
+        [("A", "B", 10.0), ("B", "C", 20.0)],
+    )
+
+
+def test_location_index():
+    with toy_model.settings():
+        e = build_ecosystem()
+
+        for i in range(0, len(e.locations)):
+            assert e.location_index[e.locationNames[i]] == i
+            assert e._convert_location_name_to_index(e.locationNames[i]) == i
+
+        e.add_conflict_zone("B")
+        assert e.locations[1].conflict > 0.0
+        e.set_conflict_intensity("B", 0.0)
+        assert e.locations[1].conflict < 0.0
+
+
+def test_link_index():
+    with toy_model.settings():
+        e = build_ecosystem()
+
+        assert len(e.link_index[("A", "B")]) == 1
+        assert e.link_index[("A", "B")][0] is e.locations[0].links[0]
+        assert e.link_index[("B", "A")][0].endpoint is e.locations[0]
+
+        e.set_forced_redirection("A", "B", True)
+        assert e.locations[0].links[0].forced_redirection
+
+        e.close_link("B", "C", twoway=False)
+        assert ("B", "C") not in e.link_index
+        assert len(e.link_index[("C", "B")]) == 1
+
+        e.reopen_link("B", "C", twoway=False)
+        assert e.link_index[("B", "C")][0] in e.locations[1].links
+
+
+def test_dest_is_full_camp():
+    with toy_model.settings():
+        e = build_ecosystem()
+
+        e.addAgent(location=e.locations[0], attributes={})
+        a = e.agents[-1]
+        a.route = ["B", "C"]
+        assert not a.check_dest_is_full_camp(e)
+
+        e.locations[2].numAgents = 5
+        assert a.check_dest_is_full_camp(e)
+
+
+if __name__ == "__main__":
+    test_location_index()
+    test_link_index()
+    test_dest_is_full_camp()
@@ -0,0 +1,84 @@
+import math
+import random
+import numpy as np
+from flee import flee, moving
+from tests import toy_model
+
+"""
+Tests for the batched move-chance stage (optimisations.batched_movechance).
+"""
+
+LOCATIONS = [
+    {"name": "A", "movechance": 0.2, "pop": 20000},
+    {"name": "B", "movechance": 0.5, "pop": 500},
+    {"name": "C", "movechance": 0.7, "pop": 30000},
+    {"name": "D", "location_type": "camp"},
+]
+LINKS = [("A", "D", 500.0), ("B", "D", 500.0), ("C", "D", 500.0)]
+SETTINGS = {"move_rules": {"MovechancePopScaleFactor": 0.1}}
+
+
+def build_ecosystem(store_type="list", num_agents=4000):
+    flee.SimulationSettings.optimisations["AgentStore"] = store_type
+    e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+    for loc in e.locations[:3]:
+        for _ in range(0, num_agents):
+            e.addAgent(location=loc, attributes={})
+
+    flee.SimulationSettings.optimisations["AgentStore"] = "list"
+    return e
+
+
+def test_location_movechances_match_reference():
+    with toy_model.settings(**SETTINGS):
+        e = build_ecosystem()
+        movechances, forecasts = moving.calculateLocationMoveChances(e, 0)
+
+        assert forecasts is None
+        for i, loc in enumerate(e.locations):
+            a = flee.Person(loc, {})
+            assert movechances[i] == moving.calculateMoveChance(a, False, 0)[0]
+
+
+def test_batched_decisions_statistically_equivalent():
+    with toy_model.settings(**SETTINGS):
+        toy_model.seed(1)
+
+        for store_type in ["list", "array"]:
+            e = build_ecosystem(store_type)
+            n = 4000
+
+            decisions = moving.drawMoveDecisions(e, 0)
+            reference = np.array([random.random() < moving.calculateMoveChance(a, False, 0)[0] for a in e.agents])
+
+            for k in range(0, 3):
+                p = moving.calculateMoveChance(e.agents[k * n], False, 0)[0]
+                batched = decisions[k * n:(k + 1) * n].mean()
+                ref = reference[k * n:(k + 1) * n].mean()
+                tolerance = 5.0 * math.sqrt(2.0 * p * (1.0 - p) / n)
+                assert abs(batched - ref) < tolerance
+                assert abs(batched - p) < tolerance
+
+
+def test_batched_evolve_statistically_equivalent():
+    results = {}
+    with toy_model.settings(**SETTINGS):
+        for batched in [False, True]:
+            for store_type in ["list", "array"]:
+                toy_model.seed(2)
+                e = build_ecosystem(store_type, num_agents=2000)
+                flee.SimulationSettings.optimisations["BatchedMoveChance"] = batched
+                toy_model.run(e, 3)
+                flee.SimulationSettings.optimisations["BatchedMoveChance"] = False
+                results[(batched, store_type)] = np.array([l.numAgents for l in e.locations[:3]])
+
+    reference = results[(False, "list")]
+    for key, counts in results.items():
+        # Remaining agents per origin location agree within sampling noise.
+        assert np.all(np.abs(counts - reference) < 5.0 * np.sqrt(2000) + 1)
+
+
+if __name__ == "__main__":
+    test_location_movechances_match_reference()
+    test_batched_decisions_statistically_equivalent()
+    test_batched_evolve_statistically_equivalent()
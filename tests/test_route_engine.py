@@ -0,0 +1,86 @@
+import math
+import random
+from flee import flee, moving, topology
+from tests import toy_model
+
+"""
+Tests for the dynamic-programming route engine (move_rules.route_engine: dp).
+"""
+
+LOCATIONS = [
+    {"name": "A", "movechance": 1.0},
+    {"name": "B", "movechance": 0.5},
+    {"name": "C", "location_type": "conflict_zone"},
+    {"name": "M", "location_type": "marker"},
+    {"name": "D", "location_type": "camp"},
+    {"name": "E", "location_type": "camp"},
+    {"name": "F", "movechance": 0.3},
+]
+LINKS = [
+    ("A", "B", 30.0), ("A", "C", 80.0), ("B", "M", 15.0), ("M", "D", 25.0),
+    ("C", "E", 20.0), ("B", "C", 25.0), ("E", "F", 135.0), ("D", "F", 45.0),
+]
+
+
+def build_ecosystem():
+    e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+    e.addAgent(location=e.locations[0], attributes={})
+    return e, e.locations[0]
+
+
+def test_walk_table_counts():
+    with toy_model.settings(move_rules={"AwarenessLevel": 3}):
+        e, l1 = build_ecosystem()
+        table = topology.getWalkTable(l1)
+
+        # Markers are crossed without taking a step, so they are no table nodes.
+        assert "M" not in [n.name for n in table.nodes]
+        assert "M" in [n.name for n in table.visited]
+
+        # One-step walks lead to B and C. D is two steps away (via B and marker M).
+        assert table.counts[1].sum() == 2
+        for k in range(1, 4):
+            assert table.counts[k].sum() > 0
+
+
+def test_dp_engine_matches_enumeration():
+    for awareness_level in [1, 2, 3]:
+        with toy_model.settings(move_rules={"AwarenessLevel": awareness_level}):
+            e, l1 = build_ecosystem()
+            a = e.agents[0]
+
+            weights, routes = moving.selectRoute(a, time=0, return_all_routes=True)
+            total = sum(weights)
+            expected = {tuple(r[1:]): w / total for r, w in zip(routes, weights)}
+
+            flee.SimulationSettings.move_rules["RouteEngine"] = "dp"
+            random.seed(3)
+            n = 20000
+            observed = {}
+            for _ in range(0, n):
+                route = tuple(moving.selectRoute(a, time=0))
+                observed[route] = observed.get(route, 0) + 1
+
+        assert set(observed.keys()) <= set(expected.keys())
+        for route, p in expected.items():
+            tolerance = 5.0 * math.sqrt(p * (1.0 - p) / n) + 1.0 / n
+            assert abs(observed.get(route, 0) / n - p) < tolerance
+
+
+def test_dp_engine_invalidation():
+    with toy_model.settings(move_rules={"AwarenessLevel": 2, "RouteEngine": "dp"}):
+        e, l1 = build_ecosystem()
+
+        moving.selectRoute(e.agents[0], time=0)
+        assert "walk" in l1.path_tables
+
+        e.close_link("A", "C", twoway=False)
+        assert "walk" not in l1.path_tables
+        for _ in range(0, 200):
+            assert moving.selectRoute(e.agents[0], time=0)[0] == "B"
+
+
+if __name__ == "__main__":
+    test_walk_table_counts()
+    test_dp_engine_matches_enumeration()
+    test_dp_engine_invalidation()
@@ -0,0 +1,107 @@
+import itertools
+import pytest
+from flee import moving
+from tests import toy_model
+
+"""
+Tests for the per-location route cache (optimisations.route_cache).
+"""
+
+LOCATIONS = [
+    {"name": "A", "movechance": 1.0},
+    {"name": "B", "movechance": 0.5},
+    {"name": "C", "movechance": 0.5},
+    {"name": "D", "location_type": "camp", "capacity": 30},
+    {"name": "E", "location_type": "camp"},
+]
+LINKS = [("A", "B", 30.0), ("A", "C", 80.0), ("B", "D", 40.0), ("C", "E", 20.0), ("B", "C", 25.0)]
+
+
+def check_cache_entries(e, time):
+    """
+    Compares the cached route tables of all agents in a location with the
+    weights and routes of the uncached selectRoute.
+    """
+    checked = 0
+    for a in e.agents:
+        if a.location is None or a.travelling:
+            continue
+        entry = a.location.route_cache.get(moving.getDecisionClass(a))
+        if entry is None:
+            continue
+        caps = tuple(moving.getCapMultiplier(loc, 0) for loc in entry["cap_locations"])
+        if caps != entry["caps"]:
+            moving.refreshRouteCacheEntry(entry, caps)
+
+        weights, routes = moving.selectRoute(a, time=time, return_all_routes=True)
+        weights, routes = moving.pruneRoutes(weights, [route[1:] for route in routes])
+        assert entry["choices"] == routes
+        assert entry["cum_weights"] == pytest.approx(list(itertools.accumulate(moving.normalizeWeights(weights=weights))))
+        checked += 1
+    return checked
+
+
+def close_on_day_5(e, t):
+    if t == 5:
+        e.close_link("B", "D")
+
+
+def check_day(e, t):
+    # The entries of this time step are compared with the weights of the same step.
+    return check_cache_entries(e, t)
+
+
+def run_model(route_cache, end_time=10):
+    with toy_model.settings(
+        optimisations={"RouteCache": route_cache},
+        move_rules={"MaxMoveSpeed": 50.0, "MaxWalkSpeed": 50.0, "AwarenessLevel": 2, "WomenAvoidHazards": True},
+    ):
+        toy_model.seed(7)
+        moving.resetRouteCacheStats()
+
+        e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+        for i in range(0, 200):
+            e.addAgent(location=e.locations[0], attributes={"gender": ["male", "female"][i % 2]})
+
+        checked = sum(toy_model.run(e, end_time, before=close_on_day_5, after=check_day if route_cache else None))
+    return e, checked
+
+
+def test_route_cache_matches_reference():
+    _, checked = run_model(False)
+    assert checked == 0
+    assert moving.getRouteCacheStats()["misses"] == 0
+
+    _, checked = run_model(True)
+    stats = moving.getRouteCacheStats()
+    assert stats["misses"] > 0
+    assert stats["hits"] > 0
+    assert stats["revalidations"] > 0
+    # The cached route tables equal those of selectRoute.
+    assert checked > 0
+
+
+def test_route_cache_invalidation():
+    with toy_model.settings(optimisations={"RouteCache": True}):
+        e = toy_model.build_ecosystem(
+            [{"name": "A", "movechance": 1.0}, {"name": "B", "location_type": "camp"}, {"name": "C", "location_type": "camp"}],
+            [("A", "B", 10.0), ("A", "C", 10.0)],
+        )
+        l1 = e.locations[0]
+        e.addAgent(location=l1, attributes={})
+
+        moving.selectRoute(e.agents[0], time=0)
+        assert len(l1.route_cache) == 1
+
+        e.close_link("A", "B", twoway=False)
+        assert len(l1.route_cache) == 0
+        assert moving.selectRoute(e.agents[0], time=0) == ["C"]
+
+        moving.selectRoute(e.agents[0], time=0)
+        e.change_location_type("C", "town")
+        assert len(l1.route_cache) == 0
+
+
+if __name__ == "__main__":
+    test_route_cache_matches_reference()
+    test_route_cache_invalidation()
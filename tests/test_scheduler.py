@@ -0,0 +1,72 @@
+from flee import scheduler
+from tests import toy_model
+
+"""
+Tests for the day-indexed event scheduler.
+"""
+
+
+def test_closure_schedule():
+    with toy_model.settings():
+        e = toy_model.build_ecosystem(
+            [{"name": "A", "movechance": 1.0}, {"name": "B", "movechance": 1.0}, {"name": "C", "location_type": "camp"}],
+            [("A", "B", 10.0), ("B", "C", 10.0)],
+        )
+
+        e.closures = [["link", "A", "B", 2, 4], ["link", "B", "C", 4, 4]]
+        open_links = []
+        for t in range(0, 6):
+            e.enact_border_closures(time=t, twoway=False)
+            open_links.append((len(e.locations[0].links), len(e.locations[1].links)))
+
+        # A closure that opens and closes on the same day is closed and then reopened.
+        assert open_links == [(1, 2), (1, 2), (0, 2), (0, 2), (1, 2), (1, 2)]
+
+        # Closures added after the schedule was built are picked up.
+        e.closures.append(["link", "A", "B", 6, 9])
+        e.enact_border_closures(time=6, twoway=False)
+        assert len(e.locations[0].links) == 0
+
+
+def test_conflict_table_events():
+    schedule = scheduler.EventSchedule()
+    scheduler.add_conflict_table_events(schedule, {"A": [1.0, 1.0, 0.5, 0.0, 0.0], "B": [0.0, 0.0, 0.8, 0.0, 0.3]})
+
+    assert schedule.due(0, "conflict") == [("add", "A", 1.0)]
+    assert schedule.due(1, "conflict") == []
+    # Intensity changes of an ongoing conflict are not events.
+    assert schedule.due(2, "conflict") == [("set", "B", 0.8)]
+    assert schedule.due(3, "conflict") == [("set", "A", 0.0), ("set", "B", 0.0)]
+    assert schedule.due(4, "conflict") == [("set", "B", 0.3)]
+    assert len(schedule) == 5
+
+
+def test_location_conflict_events():
+    schedule = scheduler.EventSchedule()
+    # name, region, country, gps_x, gps_y, location_type, conflict_date, population
+    locations = [
+        ["A", "AB", "ABC", "1.0", "1.0", "conflict_zone", "0", "100"],
+        ["B", "AB", "ABC", "1.0", "1.0", "conflict_zone", "10", "100"],
+        ["C", "AB", "ABC", "1.0", "1.0", "town", "5", "100"],
+        ["D", "AB", "ABC", "1.0", "1.0", "conflict_zone", "", "100"],
+    ]
+    scheduler.add_location_conflict_events(schedule, locations)
+
+    # A and D are conflict zones from the start.
+    assert schedule.due(10, "conflict") == [("add", "B", 1.0)]
+    assert len(schedule) == 1
+
+
+def test_attribute_change_events():
+    schedule = scheduler.EventSchedule()
+    scheduler.add_attribute_change_events(schedule, "flood_level", {"#Day": [0, 1, 2], "F1": [0.0, 2.0, 2.0], "F2": [1.0, 1.0, 0.0]})
+
+    assert schedule.due(1, "flood_level") == [("F1", 2)]
+    assert schedule.due(2, "flood_level") == [("F2", 0)]
+    assert schedule.due(2, "conflict") == []
+
+
+if __name__ == "__main__":
+    test_closure_schedule()
+    test_conflict_table_events()
+    test_attribute_change_events()
@@ -0,0 +1,52 @@
+import random
+from flee import scoring
+from tests import toy_model
+
+"""
+Tests for the batched location scoring (scoring.calculateLocationScores).
+"""
+
+
+LOCATION_TYPES = ["town", "camp", "idpcamp", "conflict_zone", "flood_zone", "marker"]
+LOCATIONS = [
+    {
+        "name": "L{}".format(i),
+        "location_type": LOCATION_TYPES[i % 6],
+        "foreign": i % 7 == 0,
+        "attributes": {"trade_volume": "2.5", "hdi": "0.7"} if i % 7 == 0 else {},
+    }
+    for i in range(0, 60)
+]
+
+
+def test_batched_scores_identical():
+    move_rules = {
+        "ConflictWeight": 0.25,
+        "CampWeight": 2.5,
+        "ForeignWeight": 1.7,
+        "UseEconomicPull": True,
+        "AvoidFoodDeprivedLocations": True,
+        "FloodLocWeights": [1.0, 0.8, 0.5, 0.2, 0.1],
+    }
+    spawn_rules = {"conflict_spawn_decay": [1.0, 0.7, 0.4], "conflict_spawn_decay_interval": 3}
+    with toy_model.settings(move_rules=move_rules, spawn_rules=spawn_rules):
+        toy_model.seed(4)
+        e = toy_model.build_ecosystem(LOCATIONS, [])
+        for loc in e.locations:
+            loc.attributes["region_IPC_level"] = random.randint(0, 40)
+            if loc.flood_zone:
+                loc.attributes["flood_level"] = random.uniform(0.0, 3.5)
+
+        for i in range(0, 60, 5):
+            e.time = i // 5
+            e.add_conflict_zone("L{}".format(i), conflict_intensity=random.uniform(0.1, 1.0))
+
+        for time in [0, 5, 10]:
+            scores = scoring.calculateLocationScores(time, e.locations)
+            for k, loc in enumerate(e.locations):
+                scoring.updateLocationScore(time, loc)
+                assert scores[k] == loc.scores[0]
+
+
+if __name__ == "__main__":
+    test_batched_scores_identical()
@@ -1,5 +1,5 @@
+import numpy as np
 from flee import flee, spawning, demographics
-from flee.datamanager import handle_refugee_data
 
 #TODO: expand testing suite.
 
@@ -25,3 +25,71 @@ def test_get_attribute_ratio():
 
     assert demographics.get_attribute_ratio(l1, "british") == 0.02
 
+
+
+def reference_spawn_weight(e, loc):
+    # Per-location spawn weight, as calculated before the vectorised implementation.
+    if loc.conflict <= 0.0 and flee.SimulationSettings.spawn_rules["conflict_zone_spawning_only"]:
+        return 0.0
+    weight = 0.0
+    if loc.conflict > 0.0:
+        multiplier = loc.conflict
+        if flee.SimulationSettings.spawn_rules["conflict_spawn_decay"]:
+            multiplier = loc.conflict * flee.SimulationSettings.get_location_conflict_decay(e.time, loc)
+        weight = loc.pop * 1.0 * multiplier
+    if flee.SimulationSettings.spawn_rules["starvation_driven_spawning"] is True and e.time > 0:
+        weight += loc.pop * loc.attributes["region_IPC_level"] / 100.0
+    return weight
+
+
+def test_spawn_weights():
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+    flee.SimulationSettings.spawn_rules["conflict_spawn_decay"] = [1.0, 0.5, 0.25]
+    flee.SimulationSettings.spawn_rules["conflict_spawn_decay_interval"] = 2
+
+    e = flee.Ecosystem()
+    for i in range(0, 40):
+        e.addLocation(name="L{}".format(i), pop=1000 + 37 * i, attributes={"region_IPC_level": float(i % 5)})
+    assert len(e.spawn_weights) == 40
+    assert len(e.spawn_weights_dirty) == 40
+
+    for i in range(0, 40, 3):
+        e.add_conflict_zone("L{}".format(i), conflict_intensity=0.5 + 0.1 * (i % 4))
+    e.remove_conflict_zone("L6")
+
+    # Dirty locations are recomputed when spawn locations are picked.
+    e.pick_spawn_locations(5)
+    assert len(e.spawn_weights_dirty) == 0
+    assert e.spawn_weights.tolist() == [reference_spawn_weight(e, loc) for loc in e.locations]
+
+    for spawning_only in [False, True]:
+        flee.SimulationSettings.spawn_rules["conflict_zone_spawning_only"] = spawning_only
+        flee.SimulationSettings.spawn_rules["starvation_driven_spawning"] = True
+        for t in range(0, 7):
+            e.time = t
+            spawning.refresh_spawn_weights(e)
+            assert e.spawn_weights.tolist() == [reference_spawn_weight(e, loc) for loc in e.locations]
+
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+
+
+def test_spawn_weight_decay_across_days():
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+    try:
+        flee.SimulationSettings.spawn_rules["conflict_spawn_decay"] = [1.0, 0.5, 0.25]
+        flee.SimulationSettings.spawn_rules["conflict_spawn_decay_interval"] = 1
+
+        e = flee.Ecosystem()
+        for name in ["A", "B", "C"]:
+            e.addLocation(name=name, pop=1000)
+
+        # A conflict zone added on a later day also updates the decay of the earlier ones.
+        expected = [[1000.0, 0.0, 0.0], [500.0, 1000.0, 0.0], [250.0, 500.0, 1000.0]]
+        for t, name in enumerate(["A", "B", "C"]):
+            e.add_conflict_zone(name, conflict_intensity=1.0)
+            e.pick_spawn_locations(1)
+            assert e.spawn_weights.tolist() == expected[t]
+            assert e.spawn_weights.tolist() == [reference_spawn_weight(e, loc) for loc in e.locations]
+            e.evolve()
+    finally:
+        flee.SimulationSettings.ReadFromYML("empty.yml")
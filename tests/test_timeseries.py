@@ -0,0 +1,57 @@
+import os
+from flee import InputGeography, lib_math
+from tests import toy_model
+
+"""
+Tests for the columnar time series inputs (flee/timeseries.py).
+"""
+
+
+def test_read_time_series():
+    ig = InputGeography.InputGeography()
+    ig.ReadConflictInputCSV(os.path.join("test_data", "test_input_csv", "conflicts.csv"))
+    assert list(ig.conflicts.keys()) == ["A", "B"]
+    assert ig.conflicts["A"][0] == 1.0
+    assert isinstance(ig.conflicts["A"][0], float)
+    assert ig.conflict_table.values.shape == (len(ig.conflicts["A"]), 2)
+
+    ig.ReadAttributeInputCSV("region_IPC", "float", os.path.join("test_data", "test_input_csv", "region_attributes_IPC.csv"))
+    assert ig.attributes["region_IPC"]["#Day"] == [0.0, 10.0, 20.0, 501.0]
+    assert ig.attributes["region_IPC"]["D"] == [20.0, 5.0, 15.0, 0.0]
+
+
+LOCATIONS = [
+    {"name": "A", "region": "AB", "attributes": {}},
+    {"name": "B", "region": "AB", "attributes": {}},
+    {"name": "D1", "region": "D", "attributes": {}},
+    {"name": "X", "region": "unknown", "attributes": {}},
+]
+
+
+def test_location_attributes():
+    with toy_model.settings():
+        e = toy_model.build_ecosystem(LOCATIONS, [])
+
+        ig = InputGeography.InputGeography()
+        ig.ReadAttributeInputCSV("region_IPC", "float", os.path.join("test_data", "test_input_csv", "region_attributes_IPC.csv"))
+        ig.attributes["flood_level"] = {"A": [0, 1, 2], "X": [3, 2, 1]}
+        ig.attributes["forecast_flood_levels"] = {"A": [0, 1, 2], "X": [3, 2, 1]}
+
+        for time in [0, 5, 13, 20, 400]:
+            ig.UpdateLocationAttributes(e, "region_IPC", time)
+            for loc in e.locations[:3]:
+                assert loc.attributes["region_IPC"] == lib_math.dict_interp(ig.attributes["region_IPC"], loc.region, "#Day", time)
+            assert "region_IPC" not in e.locations[3].attributes
+
+        for time in range(0, 3):
+            ig.UpdateLocationAttributes(e, "flood_level", time)
+            assert [loc.attributes["flood_level"] for loc in e.locations] == [time, 0, 0, 3 - time]
+
+        ig.UpdateLocationAttributes(e, "forecast_flood_levels", 0)
+        assert e.locations[0].attributes["forecast_flood_levels"] is ig.attributes["forecast_flood_levels"]["A"]
+        assert e.locations[1].attributes["forecast_flood_levels"] == [0, 0, 0]
+
+        # Attributes that are replaced are picked up.
+        ig.attributes["flood_level"] = {"B": [5, 6, 7]}
+        ig.UpdateLocationAttributes(e, "flood_level", 1)
+        assert [loc.attributes["flood_level"] for loc in e.locations] == [0, 6, 0, 0]
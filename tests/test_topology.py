@@ -0,0 +1,119 @@
+import numpy as np
+from flee import flee, moving, crawling, topology
+from tests import toy_model
+
+"""
+Tests for the precomputed path tables (optimisations.path_tables).
+"""
+
+LOCATIONS = [
+    {"name": "A", "movechance": 1.0},
+    {"name": "B", "movechance": 0.5},
+    {"name": "C", "movechance": 0.5},
+    {"name": "M", "location_type": "marker"},
+    {"name": "D", "location_type": "camp", "capacity": 30},
+    {"name": "E", "location_type": "camp"},
+    {"name": "F", "movechance": 0.3},
+]
+LINKS = [
+    ("A", "B", 30.0), ("A", "C", 80.0), ("B", "M", 15.0), ("M", "D", 25.0),
+    ("C", "E", 20.0), ("B", "C", 25.0), ("E", "F", 35.0), ("D", "F", 45.0),
+]
+
+
+def settings(awareness_level=3, **optimisations):
+    return toy_model.settings(
+        optimisations=optimisations,
+        move_rules={"MaxMoveSpeed": 50.0, "MaxWalkSpeed": 50.0, "AwarenessLevel": awareness_level},
+    )
+
+
+def check_path_tables(e, time):
+    """
+    Compares the path table of each location that has agents with the weights
+    and routes of the recursive selectRoute.
+    """
+    checked = 0
+    for loc in e.locations:
+        agents = [a for a in e.agents if a.location is loc and not a.travelling]
+        if len(agents) == 0:
+            continue
+        weights, routes = moving.selectRoute(agents[0], time=time, return_all_routes=True)
+
+        table = topology.getPathTable(loc)
+        caps = np.array([moving.getCapMultiplier(ep, 0) for ep in table.endpoints])
+        table_weights = moving.calculatePathTableCores(agents[0], table, time) * caps[table.endpoint_index]
+        assert table.getRoutes() == [r[1:] for r in routes]
+        assert table_weights.tolist() == weights
+
+        entry = loc.route_cache.get(moving.getDecisionClass(agents[0]))
+        if entry is not None:
+            assert entry["routes"] == table.getRoutes()
+        checked += 1
+    return checked
+
+
+def close_and_reopen(e, t):
+    if t == 4:
+        e.close_link("B", "C")
+    if t == 7:
+        e.reopen_link("B", "C")
+
+
+def run_model(path_tables, route_cache=False, end_time=10):
+    with settings(PathTables=path_tables, RouteCache=route_cache):
+        toy_model.seed(11)
+        e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+        for i in range(0, 200):
+            e.addAgent(location=e.locations[0], attributes={})
+
+        return sum(toy_model.run(e, end_time, before=close_and_reopen, after=check_path_tables))
+
+
+def test_path_table_matches_recursion():
+    for awareness_level in [1, 2, 3, 4]:
+        with settings(awareness_level):
+            e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+            l1 = e.locations[0]
+            e.addAgent(location=l1, attributes={})
+            a = e.agents[0]
+
+            weights, routes = moving.selectRoute(a, time=0, return_all_routes=True)
+
+            table = topology.getPathTable(l1)
+            caps = np.array([moving.getCapMultiplier(ep, 0) for ep in table.endpoints])
+            table_weights = moving.calculatePathTableCores(a, table, 0) * caps[table.endpoint_index]
+
+            assert table.getRoutes() == [r[1:] for r in routes]
+            assert table_weights.tolist() == weights
+
+
+def test_path_tables_match_reference():
+    # Path tables, before and after links close and reopen, with and without the route cache.
+    assert run_model(True) > 10
+    assert run_model(True, route_cache=True) > 10
+
+
+def test_path_tables_crawl_and_invalidation():
+    with settings():
+        e = toy_model.build_ecosystem(LOCATIONS, LINKS)
+        l1 = e.locations[0]
+
+        reference = crawling.generateLocationRoutes(l1, 0)
+        flee.SimulationSettings.optimisations["PathTables"] = True
+        assert crawling.generateLocationRoutes(l1, 0) == reference
+        assert "crawl" in l1.path_tables
+
+        table = topology.getPathTable(l1)
+        assert len(table) > 0
+
+        # Closing a link two steps away invalidates the tables that pass through it.
+        e.close_link("E", "F", twoway=False)
+        assert len(l1.path_tables) == 0
+        assert ["C", "E", "F"] not in topology.getPathTable(l1).getRoutes()
+
+
+if __name__ == "__main__":
+    test_path_table_matches_recursion()
+    test_path_tables_match_reference()
+    test_path_tables_crawl_and_invalidation()
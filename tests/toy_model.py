@@ -0,0 +1,67 @@
+import contextlib
+import copy
+import random
+import numpy as np
+from flee import flee
+
+"""
+Helpers for the tests that run small toy models: simulation settings that are
+restored afterwards, seeding, and Ecosystems built from lists of locations and links.
+"""
+
+
+@contextlib.contextmanager
+def settings(**sections):
+    """
+    Reads empty.yml and updates the given sections of the simulation settings,
+    e.g. settings(optimisations={"AgentStore": "array"}). empty.yml is read
+    again on exit, also when the test fails.
+    """
+    flee.SimulationSettings.ReadFromYML("empty.yml")
+    try:
+        for section, values in sections.items():
+            getattr(flee.SimulationSettings, section).update(values)
+        yield flee.SimulationSettings
+    finally:
+        flee.SimulationSettings.ReadFromYML("empty.yml")
+
+
+def seed(value):
+    """
+    Seeds the random and numpy.random generators.
+    """
+    random.seed(value)
+    np.random.seed(value)
+
+
+def build_ecosystem(locations, links, **kwargs):
+    """
+    Returns a new Ecosystem (created with the given keyword arguments) with the
+    given locations (keyword arguments of addLocation) and links ((endpoint1,
+    endpoint2, distance) tuples). The arguments are copied, so that Locations
+    never share an attributes dict.
+    """
+    e = flee.Ecosystem(**kwargs)
+    for location in locations:
+        e.addLocation(**copy.deepcopy(location))
+    for endpoint1, endpoint2, distance in links:
+        e.linkUp(endpoint1=endpoint1, endpoint2=endpoint2, distance=distance)
+    return e
+
+
+def run(e, end_time, before=None, after=None):
+    """
+    Evolves e up to day <end_time>. before(e, t) is called before and
+    after(e, t) after each day, if given.
+
+    Returns:
+        list: the values returned by after(e, t), per day.
+    """
+    results = []
+    for t in range(e.time, end_time):
+        if before is not None:
+            before(e, t)
+        e.evolve()
+        if after is not None:
+            results.append(after(e, t))
+    return results
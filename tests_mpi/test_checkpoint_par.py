@@ -0,0 +1,106 @@
+import os
+import subprocess
+
+"""
+Tests for the sharded checkpoint/restart of parallel runs (pflee.Ecosystem.write_checkpoint).
+"""
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+input_csv = os.path.join(root, "test_data", "test_input_csv")
+
+# Restores a checkpoint and prints (on rank 0) the number of agents per
+# location and link, and the location scores, as summed over all ranks.
+STATE_SCRIPT = """
+import sys
+import numpy as np
+from flee import pflee as flee
+from flee import InputGeography
+from flee.datamanager import read_period
+
+input_csv_directory, settings_file, restart_file = sys.argv[1:4]
+start_date, _ = read_period.read_sim_period("{}/sim_period.csv".format(input_csv_directory))
+flee.SimulationSettings.ReadFromYML(settings_file)
+flee.SimulationSettings.ConflictInputFile = "%s/conflicts.csv" % input_csv_directory
+flee.SimulationSettings.FloodLevelInputFile = "%s/flood_level.csv" % input_csv_directory
+
+e = flee.Ecosystem(start_date, demographics_test_prefix=input_csv_directory)
+ig = InputGeography.InputGeography()
+ig.ReadLocationsFromCSV("%s/locations.csv" % input_csv_directory)
+ig.ReadLinksFromCSV("%s/routes.csv" % input_csv_directory)
+ig.ReadClosuresFromCSV("%s/closures.csv" % input_csv_directory)
+e, lm = ig.StoreInputGeographyInEcosystem(e)
+
+e.read_checkpoint(restart_file, ig)
+e.updateNumAgents(log=False)
+num_agents = e.mpi.comm.allreduce(len(e.agents))
+if e.getRankN(0):
+    print("time,{}".format(e.time))
+    print("agents,{}".format(num_agents))
+    for loc in e.locations:
+        print("location,{},{},{}".format(loc.name, loc.numAgents, ",".join(str(l.numAgents) for l in loc.links)))
+    print("scores,{}".format(",".join(repr(float(x)) for x in flee.Ecosystem.scores)))
+"""
+
+
+def run_par(path, cores, settings):
+    settings_file = os.path.join(path, "simsetting-{}.yml".format(len(os.listdir(path))))
+    with open(settings_file, "w", encoding="utf_8") as f:
+        f.write(settings)
+
+    cmd = [
+        "mpirun", "-np", str(cores), "python3",
+        os.path.join(root, "runscripts", "run_par.py"),
+        input_csv, os.path.join(input_csv, "refugee_data"), "12", settings_file,
+    ]
+    proc = subprocess.run(cmd, cwd=path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    assert proc.returncode == 0, proc.stderr.decode("utf-8")
+    return proc.stdout.decode("utf-8").strip().split("\n")
+
+
+def restored_state(path, cores, settings, restart_file):
+    script = os.path.join(path, "restored_state.py")
+    with open(script, "w", encoding="utf_8") as f:
+        f.write(STATE_SCRIPT)
+    settings_file = os.path.join(path, "simsetting-state.yml")
+    with open(settings_file, "w", encoding="utf_8") as f:
+        f.write(settings)
+
+    cmd = ["mpirun", "-np", str(cores), "python3", script, input_csv, settings_file, restart_file]
+    proc = subprocess.run(cmd, cwd=path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    assert proc.returncode == 0, proc.stderr.decode("utf-8")
+    return proc.stdout.decode("utf-8").strip().split("\n")
+
+
+def check_restart(path, cores_before, cores_after, mpi_io):
+    settings = "checkpoints:\n  interval: 5\n  directory: {}\n  mpi_io: {}\n".format(os.path.join(str(path), "ck"), mpi_io)
+    out = run_par(str(path), cores_before, settings)
+    assert len(out) == 13
+
+    restart_file = os.path.join(str(path), "ck", "checkpoint-5.npz")
+    restarted = run_par(str(path), cores_after, settings + "  restart_file: {}\n".format(restart_file))
+    # Header, followed by days 5 to 11.
+    assert len(restarted) == 8
+    assert restarted[0] == out[0]
+    if cores_before == cores_after:
+        assert restarted[1:] == out[6:]
+    else:
+        # Total number of agents in the simulation.
+        assert [line.split(",")[13] for line in restarted[1:]] == [line.split(",")[13] for line in out[6:]]
+        # The agents are moved with other random numbers after the restart, so
+        # the restored state itself is compared with the state on the original ranks.
+        expected = restored_state(str(path), cores_before, settings, restart_file)
+        assert expected[0] == "time,5"
+        assert any(line.startswith("location,") and line.split(",")[2] != "0" for line in expected)
+        assert restored_state(str(path), cores_after, settings, restart_file) == expected
+
+
+def test_par_checkpoint_same_ranks(tmp_path):
+    check_restart(tmp_path, 2, 2, False)
+
+
+def test_par_checkpoint_fewer_ranks(tmp_path):
+    check_restart(tmp_path, 2, 1, False)
+
+
+def test_par_checkpoint_mpiio_more_ranks(tmp_path):
+    check_restart(tmp_path, 1, 2, True)